@@ -1,10 +1,38 @@
+import os
 import json
+import asyncio
+import logging
 import re
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Awaitable, Callable, Dict, List, Any, Optional, Tuple
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
-import requests
+import httpx
+from document_text import DocumentText
+import async_runner
+from llm_client import (
+    LLM_RESPONSE_FORMAT, RESPONSE_FORMAT_REJECTED_CODES, LLMAPIError, call_with_retry, call_with_retry_async,
+    get_async_client, get_session, mark_response_format_unsupported, response_format_supported
+)
+from llm_cache import ResponseCache, get_default_response_cache
+from prompt_packer import LLM_PROMPT_TOKEN_BUDGET, PackResult, PromptPacker, estimate_tokens
+from response_schemas import RESPONSE_SCHEMAS
+from single_flight import FlightAbandoned, SingleFlight, get_default_single_flight
+from tolerant_json import loads_tolerant
+
+logger = logging.getLogger(__name__)
+
+# 调用失败或未配置API密钥时是否返回模拟响应（演示用，默认关闭，失败时直接报错）
+LLM_MOCK_FALLBACK = os.environ.get('LLM_MOCK_FALLBACK', '0').lower() in ('1', 'true', 'yes', 'on')
+# 综合分析模式：single（所有内容一次分析，默认）、map_reduce（分段并行分析后汇总）、auto（内容片段较多时分段）
+# 分段分析每个片段一次调用再加一次汇总，调用次数和token消耗更多，需要时由部署方显式开启
+LLM_ANALYSIS_MODE = os.environ.get('LLM_ANALYSIS_MODE', 'single').lower()
+# auto模式下启用分段分析的最少内容片段数
+LLM_MAP_REDUCE_MIN_SECTIONS = int(os.environ.get('LLM_MAP_REDUCE_MIN_SECTIONS', '10') or 10)
+# 分段分析的最大并发调用数
+LLM_MAP_CONCURRENCY = int(os.environ.get('LLM_MAP_CONCURRENCY', '4') or 4)
+# 是否合并相同的进行中AI调用（相同API密钥、地址、模型和提示词的并发调用只发出一次请求）
+LLM_SINGLE_FLIGHT = os.environ.get('LLM_SINGLE_FLIGHT', '1').lower() in ('1', 'true', 'yes', 'on')
 
 class AgentType(Enum):
     """AI Agent类型枚举"""
@@ -30,6 +58,8 @@ class ExtractedContent:
     start_heading: str
     end_heading: str
     confidence: float
+    priority: int = 0                           # 对应提取目标的优先级，追加提取的内容为0
+    span: Optional[Tuple[int, int]] = None      # 在文档文本中的字符范围（用于去除重叠内容）
 
 @dataclass
 class AnalysisResult:
@@ -39,6 +69,16 @@ class AnalysisResult:
     recommendations: List[str]
     extracted_data: Dict[str, Any]
     confidence_score: float
+    prompt_stats: Dict[str, Any] = field(default_factory=dict)  # 分析提示词的token统计
+
+@dataclass
+class SpeculativeExtraction:
+    """预先执行的追加提取准备工作（与关键词无关的结构候选标题及其章节内容，见prepare_additional_extraction）"""
+    task: "asyncio.Future[Dict[str, Any]]"
+
+    def cancel(self):
+        """不需要追加提取时取消（已在进程池中执行的部分会执行完，结果直接丢弃）"""
+        self.task.cancel()
 
 @dataclass
 class ChatContext:
@@ -52,7 +92,9 @@ class ChatContext:
 class AIAnalyzer:
     """AI文档分析器 - Multi-Agent系统核心"""
     
-    def __init__(self, api_key: str = None, base_url: str = "https://apistudy.mycache.cn/v1", model: str = "deepseek-v3"):
+    def __init__(self, api_key: str = None, base_url: str = "https://apistudy.mycache.cn/v1", model: str = "deepseek-v3",
+                 response_cache: Optional[ResponseCache] = None, mock_fallback: Optional[bool] = None,
+                 single_flight: Optional[SingleFlight] = None):
         """
         初始化AI分析器
         
@@ -60,13 +102,38 @@ class AIAnalyzer:
             api_key: API密钥
             base_url: API基础URL
             model: 使用的模型名称
+            response_cache: AI响应缓存，默认使用进程默认缓存（未配置时不缓存）
+            mock_fallback: 调用失败时是否返回模拟响应，默认使用LLM_MOCK_FALLBACK配置
+            single_flight: 进行中调用的合并器，默认使用进程内共享的合并器（LLM_SINGLE_FLIGHT关闭时不合并）
         """
         self.api_key = api_key
         self.base_url = base_url.rstrip('/')
         self.model = model
+        self.response_cache = response_cache if response_cache is not None else get_default_response_cache()
+        self.mock_fallback = LLM_MOCK_FALLBACK if mock_fallback is None else mock_fallback
+        if single_flight is None and LLM_SINGLE_FLIGHT:
+            single_flight = get_default_single_flight()
+        self.single_flight = single_flight
+        self.prompt_token_budget = LLM_PROMPT_TOKEN_BUDGET
+        self.analysis_mode = LLM_ANALYSIS_MODE
+        self.map_reduce_min_sections = LLM_MAP_REDUCE_MIN_SECTIONS
+        self.map_concurrency = max(1, LLM_MAP_CONCURRENCY)
+        self.response_format_mode = LLM_RESPONSE_FORMAT
         self.chat_contexts: Dict[str, ChatContext] = {}
         self.timeout = 60  # 请求超时时间（秒）
-        
+        self.mock_responses = 0  # 已使用的模拟响应次数（基于模拟响应的结果不应缓存）
+        self._content_extractor = None
+    
+    def _get_content_extractor(self):
+        """获取共享的内容提取器，使同一分析中的所有提取目标复用已加载的文档文本"""
+        if self._content_extractor is None:
+            from content_extractor import ContentExtractor
+            self._content_extractor = ContentExtractor()
+        return self._content_extractor
+        
+    # 需求分析最多尝试次数
+    REQUIREMENT_MAX_RETRIES = 3
+    
     def analyze_user_requirement(self, user_request: str, document_structure: Dict[str, Any]) -> List[ExtractionTarget]:
         """
         需求分析Agent - 分析用户需求并生成提取目标
@@ -78,46 +145,87 @@ class AIAnalyzer:
         Returns:
             提取目标列表
         """
-        print(f"\n=== 需求分析Agent开始工作 ===")
-        print(f"用户需求: {user_request}")
-        
-        # 构建提示词
-        prompt = self._build_requirement_analysis_prompt(user_request, document_structure)
+        prompt = self._start_requirement_analysis(user_request, document_structure)
         
         # 重试机制，最多重试3次
-        max_retries = 3
-        for attempt in range(max_retries):
-            print(f"尝试第 {attempt + 1} 次分析...")
+        for attempt in range(self.REQUIREMENT_MAX_RETRIES):
+            logger.debug("尝试第 %s 次分析...", attempt + 1)
             
             # 调用AI分析需求
-            response = self._call_ai_api(prompt, AgentType.REQUIREMENT_ANALYZER)
+            response = self._call_ai_api(prompt, AgentType.REQUIREMENT_ANALYZER, response_schema="extraction_targets")
             
-            # 解析AI响应，生成提取目标
-            extraction_targets = self._parse_extraction_targets(response, user_request, document_structure)
+            extraction_targets, prompt = self._review_requirement_attempt(
+                response, attempt, prompt, user_request, document_structure
+            )
+            if extraction_targets:
+                return extraction_targets
+        
+        return self._requirement_analysis_failed()
+    
+    async def analyze_user_requirement_async(self, user_request: str,
+                                             document_structure: Dict[str, Any]) -> List[ExtractionTarget]:
+        """需求分析Agent的异步版本（等待AI响应期间不占用线程）"""
+        prompt = self._start_requirement_analysis(user_request, document_structure)
+        
+        for attempt in range(self.REQUIREMENT_MAX_RETRIES):
+            logger.debug("尝试第 %s 次分析...", attempt + 1)
             
+            response = await self._call_ai_api_async(
+                prompt, AgentType.REQUIREMENT_ANALYZER, response_schema="extraction_targets"
+            )
+            
+            extraction_targets, prompt = self._review_requirement_attempt(
+                response, attempt, prompt, user_request, document_structure
+            )
             if extraction_targets:
-                print(f"✓ 成功生成了 {len(extraction_targets)} 个提取目标")
-                for target in extraction_targets:
-                    print(f"  - {target.title} (优先级: {target.priority})")
                 return extraction_targets
-            else:
-                print(f"✗ 第 {attempt + 1} 次尝试失败，AI没有生成有效的提取目标")
-                if attempt < max_retries - 1:
-                    print("准备重试...")
-                    # 可以稍微修改提示词，增加强调
-                    if attempt == 1:
-                        prompt = prompt.replace("必须严格按照JSON格式返回", "极其重要：必须严格按照JSON格式返回，确保格式正确")
         
+        return self._requirement_analysis_failed()
+    
+    def _start_requirement_analysis(self, user_request: str, document_structure: Dict[str, Any]) -> str:
+        """记录需求分析开始并构建提示词"""
+        logger.info("需求分析Agent开始工作")
+        logger.info("用户需求: %s", user_request)
+        
+        return self._build_requirement_analysis_prompt(user_request, document_structure)
+    
+    def _review_requirement_attempt(self, response: str, attempt: int, prompt: str, user_request: str,
+                                    document_structure: Dict[str, Any]) -> Tuple[List[ExtractionTarget], str]:
+        """
+        解析一次需求分析的响应
+        
+        Returns:
+            (提取目标列表, 下一次尝试使用的提示词)
+        """
+        # 解析AI响应，生成提取目标
+        extraction_targets = self._parse_extraction_targets(response, user_request, document_structure)
+        
+        if extraction_targets:
+            logger.info("✓ 成功生成了 %s 个提取目标", len(extraction_targets))
+            for target in extraction_targets:
+                logger.debug("- %s (优先级: %s)", target.title, target.priority)
+            return extraction_targets, prompt
+        
+        logger.warning("✗ 第 %s 次尝试失败，AI没有生成有效的提取目标", attempt + 1)
+        if attempt < self.REQUIREMENT_MAX_RETRIES - 1:
+            logger.debug("准备重试...")
+            # 可以稍微修改提示词，增加强调
+            if attempt == 1:
+                prompt = prompt.replace("必须严格按照JSON格式返回", "极其重要：必须严格按照JSON格式返回，确保格式正确")
+        return [], prompt
+    
+    def _requirement_analysis_failed(self) -> List[ExtractionTarget]:
         # 所有重试都失败了
-        print("⚠️ 所有重试都失败了，AI无法生成有效的提取目标")
-        print("这通常意味着：1) API配置问题 2) 用户需求过于模糊 3) 文档结构复杂")
+        logger.warning("所有重试都失败了，AI无法生成有效的提取目标")
+        logger.warning("这通常意味着：1) API配置问题 2) 用户需求过于模糊 3) 文档结构复杂")
         
         # 返回空列表，不进行Python智能分析
         return []
     
     def extract_content_by_targets(self, extraction_targets: List[ExtractionTarget], 
                                  document_structure: Dict[str, Any], 
-                                 full_document_path: str) -> List[ExtractedContent]:
+                                 full_document_path: str,
+                                 document_text: Optional[DocumentText] = None) -> List[ExtractedContent]:
         """
         内容提取Agent - 根据目标提取文档内容
         
@@ -125,26 +233,29 @@ class AIAnalyzer:
             extraction_targets: 提取目标列表
             document_structure: 文档结构
             full_document_path: 完整文档路径
+            document_text: 已加载的DocumentText（为空时加载一次并在所有目标间共享）
             
         Returns:
             提取的内容列表
         """
-        print(f"\n=== 内容提取Agent开始工作 ===")
+        logger.info("内容提取Agent开始工作")
         
-        from content_extractor import ContentExtractor
-        extractor = ContentExtractor()
+        extractor = self._get_content_extractor()
+        if document_text is None:
+            document_text = extractor.load_document_text(full_document_path, document_structure)
         
         extracted_contents = []
         
         for target in extraction_targets:
-            print(f"提取目标: {target.title}")
+            logger.debug("提取目标: %s", target.title)
             
             # 根据标题和关键词提取内容
             content = extractor.extract_content_by_title_and_keywords(
                 document_path=full_document_path,
                 document_structure=document_structure,
                 target_title=target.title,
-                keywords=target.keywords
+                keywords=target.keywords,
+                document_text=document_text
             )
             
             if content:
@@ -153,12 +264,14 @@ class AIAnalyzer:
                     content=content['content'],
                     start_heading=content.get('start_heading', ''),
                     end_heading=content.get('end_heading', ''),
-                    confidence=content.get('confidence', 0.8)
+                    confidence=content.get('confidence', 0.8),
+                    priority=target.priority,
+                    span=content.get('span')
                 )
                 extracted_contents.append(extracted_content)
-                print(f"  ✓ 成功提取 {len(content['content'])} 字符")
+                logger.debug("✓ 成功提取 %s 字符", len(content['content']))
             else:
-                print(f"  ✗ 未找到相关内容")
+                logger.debug("✗ 未找到相关内容")
         
         return extracted_contents
     
@@ -175,21 +288,22 @@ class AIAnalyzer:
         Returns:
             分析结果
         """
-        print(f"\n=== 综合分析Agent开始工作 ===")
-        print(f"分析 {len(extracted_contents)} 个内容片段")
+        logger.info("综合分析Agent开始工作")
+        logger.info("分析 %s 个内容片段", len(extracted_contents))
         
         # 构建综合分析提示词
-        prompt = self._build_comprehensive_analysis_prompt(
+        prompt, pack = self._build_comprehensive_analysis_prompt(
             user_request, extracted_contents, document_structure
         )
         
         # 调用AI进行分析
-        response = self._call_ai_api(prompt, AgentType.ANALYZER)
+        response = self._call_ai_api(prompt, AgentType.ANALYZER, response_schema="analysis_result")
         
         # 解析分析结果
         analysis_result = self._parse_analysis_result(response, extracted_contents)
+        analysis_result.prompt_stats = pack.stats()
         
-        print(f"✓ 综合分析完成，置信度: {analysis_result.confidence_score}")
+        logger.info("✓ 综合分析完成，置信度: %s", analysis_result.confidence_score)
         return analysis_result
 
     def enhanced_comprehensive_analysis(self, user_request: str, extracted_contents: List[ExtractedContent], 
@@ -205,26 +319,271 @@ class AIAnalyzer:
         Returns:
             增强的分析结果
         """
-        print(f"\n=== 增强版综合分析Agent开始工作 ===")
-        print(f"深度分析 {len(extracted_contents)} 个内容片段")
+        if self._use_map_reduce(extracted_contents):
+            return self.map_reduce_analysis(user_request, extracted_contents, document_structure)
+        
+        logger.info("增强版综合分析Agent开始工作")
+        logger.info("深度分析 %s 个内容片段", len(extracted_contents))
         
         # 构建增强的分析提示词
-        prompt = self._build_enhanced_analysis_prompt(
+        prompt, pack = self._build_enhanced_analysis_prompt(
             user_request, extracted_contents, document_structure
         )
         
         # 调用AI进行深度分析
-        response = self._call_ai_api(prompt, AgentType.ANALYZER)
+        response = self._call_ai_api(prompt, AgentType.ANALYZER, response_schema="analysis_result")
         
         # 解析增强的分析结果
         analysis_result = self._parse_enhanced_analysis_result(response, extracted_contents)
+        analysis_result.prompt_stats = pack.stats()
+        
+        logger.info("✓ 增强版综合分析完成，置信度: %s", analysis_result.confidence_score)
+        return analysis_result
+    
+    async def enhanced_comprehensive_analysis_async(self, user_request: str,
+                                                    extracted_contents: List[ExtractedContent],
+                                                    document_structure: Dict[str, Any],
+                                                    on_token: Optional[Callable[[str], None]] = None) -> AnalysisResult:
+        """增强版综合分析Agent的异步版本，提供on_token时流式回调AI的增量输出"""
+        if self._use_map_reduce(extracted_contents):
+            return await self.map_reduce_analysis_async(user_request, extracted_contents, document_structure, on_token)
+        
+        logger.info("增强版综合分析Agent开始工作")
+        logger.info("深度分析 %s 个内容片段", len(extracted_contents))
+        
+        prompt, pack = self._build_enhanced_analysis_prompt(
+            user_request, extracted_contents, document_structure
+        )
+        
+        response = await self._call_ai_api_async(
+            prompt, AgentType.ANALYZER, on_token=on_token, response_schema="analysis_result"
+        )
+        
+        analysis_result = self._parse_enhanced_analysis_result(response, extracted_contents)
+        analysis_result.prompt_stats = pack.stats()
         
-        print(f"✓ 增强版综合分析完成，置信度: {analysis_result.confidence_score}")
+        logger.info("✓ 增强版综合分析完成，置信度: %s", analysis_result.confidence_score)
         return analysis_result
+    
+    def _use_map_reduce(self, extracted_contents: List[ExtractedContent]) -> bool:
+        """根据分析模式和内容片段数决定是否分段并行分析"""
+        if self.analysis_mode == 'map_reduce':
+            return len(extracted_contents) > 1
+        if self.analysis_mode == 'auto':
+            return len(extracted_contents) >= self.map_reduce_min_sections
+        return False
+    
+    def map_reduce_analysis(self, user_request: str, extracted_contents: List[ExtractedContent],
+                            document_structure: Dict[str, Any]) -> AnalysisResult:
+        """分段并行分析（同步入口，在后台事件循环中执行）"""
+        return async_runner.submit(
+            self.map_reduce_analysis_async(user_request, extracted_contents, document_structure)
+        ).result()
+    
+    async def map_reduce_analysis_async(self, user_request: str, extracted_contents: List[ExtractedContent],
+                                        document_structure: Dict[str, Any],
+                                        on_token: Optional[Callable[[str], None]] = None) -> AnalysisResult:
+        """
+        分段并行分析（map-reduce）
+        
+        每个内容片段单独分析（并发数受map_concurrency限制），再用一次汇总调用合并为AnalysisResult，
+        耗时取决于最慢的片段而不是片段总数。
+        
+        Args:
+            user_request: 用户请求
+            extracted_contents: 提取的内容列表
+            document_structure: 文档结构
+            on_token: 汇总调用的增量文本回调
+            
+        Returns:
+            分析结果
+        """
+        contents, duplicates = PromptPacker(self.prompt_token_budget).deduplicate(extracted_contents)
+        logger.info("分段并行分析开始: %s 个内容片段（去重 %s 个），并发数 %s",
+                    len(contents), len(duplicates), self.map_concurrency)
+        
+        semaphore = asyncio.Semaphore(self.map_concurrency)
+        
+        async def analyze_section(content: ExtractedContent) -> Tuple[Dict[str, Any], int]:
+            prompt = self._build_section_analysis_prompt(user_request, content)
+            async with semaphore:
+                response = await self._call_ai_api_async(
+                    prompt, AgentType.ANALYZER, response_schema="section_analysis"
+                )
+            return self._parse_section_analysis(response, content), estimate_tokens(prompt)
+        
+        outcomes = await asyncio.gather(*(analyze_section(content) for content in contents), return_exceptions=True)
+        
+        partials = []
+        errors = []
+        map_tokens = 0
+        for content, outcome in zip(contents, outcomes):
+            if isinstance(outcome, LLMAPIError):
+                logger.warning("章节 '%s' 分析失败: %s", content.title, outcome)
+                errors.append(outcome)
+                continue
+            if isinstance(outcome, BaseException):
+                raise outcome
+            partial, tokens = outcome
+            partials.append(partial)
+            map_tokens += tokens
+        
+        if errors and not partials:
+            raise errors[0]
+        
+        # 汇总
+        prompt, pack = self._build_reduce_analysis_prompt(user_request, partials, document_structure)
+        response = await self._call_ai_api_async(
+            prompt, AgentType.ANALYZER, on_token=on_token, response_schema="analysis_result"
+        )
+        analysis_result = self._parse_enhanced_analysis_result(response, extracted_contents)
+        
+        analysis_result.prompt_stats = {
+            **pack.stats(),
+            'mode': 'map_reduce',
+            'prompt_tokens': pack.prompt_tokens + map_tokens,
+            'reduce_prompt_tokens': pack.prompt_tokens,
+            'map_calls': len(contents),
+            'failed_sections': len(errors),
+            'duplicate_count': len(duplicates)
+        }
+        
+        logger.info("✓ 分段并行分析完成（%s 个片段成功，%s 个失败），置信度: %s",
+                    len(partials), len(errors), analysis_result.confidence_score)
+        return analysis_result
+    
+    def _build_section_analysis_prompt(self, user_request: str, content: ExtractedContent) -> str:
+        """构建单个内容片段的分析提示词（map阶段）"""
+        header = f"""
+# 文档章节分析任务
+
+## 分析目标
+用户请求：{user_request}
 
+## 章节：{content.title}
+**置信度**: {content.confidence:.2f}
+**内容**:
+"""
+        footer = """
+
+## 分析要求
+只分析本章节中与用户请求相关的内容，不要推测章节以外的信息，并以JSON格式返回结果：
+
+{
+    "summary": "本章节与用户请求相关的要点总结（包含具体的事实、数字、时间等关键信息）",
+    "key_points": {
+        "要点名称": "具体说明"
+    },
+    "recommendations": ["针对本章节内容的建议"],
+    "extracted_data": {
+        "数据名称": "从本章节中提取的具体值"
+    },
+    "relevance": 0.9
+}
+
+relevance为本章节与用户请求的相关程度（0.0-1.0）；如果本章节与用户请求无关，summary返回空字符串。
+"""
+        pack = PromptPacker(self.prompt_token_budget).pack(
+            [content], estimate_tokens(header) + estimate_tokens(footer)
+        )
+        section_text = pack.contents[0].content if pack.contents else ''
+        return header + section_text + footer
+    
+    def _parse_section_analysis(self, response: str, content: ExtractedContent) -> Dict[str, Any]:
+        """解析单个内容片段的分析结果，JSON解析失败时保留原始回复作为总结"""
+        partial = {
+            'title': content.title,
+            'priority': content.priority,
+            'summary': '',
+            'key_points': {},
+            'recommendations': [],
+            'extracted_data': {},
+            'relevance': content.confidence
+        }
+        
+        try:
+            data = self._loads_json_object(self._clean_json_response(response))
+        except ValueError:
+            logger.debug("章节 '%s' 的分析结果不是有效JSON，使用原始回复", content.title)
+            partial['summary'] = response.strip()[:1000]
+            return partial
+        
+        partial['summary'] = str(data.get('summary') or '')
+        for key in ('key_points', 'extracted_data'):
+            if isinstance(data.get(key), dict):
+                partial[key] = data[key]
+        if isinstance(data.get('recommendations'), list):
+            partial['recommendations'] = data['recommendations']
+        try:
+            partial['relevance'] = float(data.get('relevance', content.confidence))
+        except (TypeError, ValueError):
+            pass
+        return partial
+    
+    def _build_reduce_analysis_prompt(self, user_request: str, partials: List[Dict[str, Any]],
+                                      document_structure: Dict[str, Any]) -> Tuple[str, PackResult]:
+        """构建汇总各片段分析结果的提示词（reduce阶段），返回提示词和打包结果"""
+        # 每个片段的分析结果整理为一段文本，仍按优先级和相关度在预算内打包
+        sections = []
+        for partial in partials:
+            lines = []
+            if partial['summary']:
+                lines.append(f"要点总结：{partial['summary']}")
+            for name, value in partial['key_points'].items():
+                lines.append(f"- {name}：{value}")
+            for name, value in partial['extracted_data'].items():
+                lines.append(f"- 数据 {name}：{value}")
+            for recommendation in partial['recommendations']:
+                lines.append(f"- 建议：{recommendation}")
+            if not lines:
+                continue
+            sections.append(ExtractedContent(
+                title=partial['title'],
+                content='\n'.join(lines),
+                start_heading='',
+                end_heading='',
+                confidence=partial['relevance'],
+                priority=partial['priority']
+            ))
+        
+        header = f"""
+# 文档深度分析任务（汇总各章节分析）
+
+## 分析目标
+用户请求：{user_request}
+
+## 请求意图分析
+{self._analyze_request_intent(user_request)}
+
+## 文档信息
+{self._build_document_info(document_structure)}
+
+## 各章节分析结果
+以下是对相关章节分别分析得到的要点，请合并去重、综合归纳，形成完整的分析结论：
+"""
+        if not sections:
+            header += "\n（各章节均未发现与用户请求直接相关的内容）\n"
+        
+        footer = self._build_analysis_requirements()
+        # 各片段已在map阶段去重，这里只按预算裁剪
+        packer = PromptPacker(self.prompt_token_budget, remove_duplicates=False)
+        pack = packer.pack(sections, estimate_tokens(header) + estimate_tokens(footer))
+        
+        prompt = header
+        for i, section in enumerate(pack.contents, 1):
+            prompt += f"""
+### 章节 {i}: {section.title}
+**相关度**: {section.confidence:.2f}
+{section.content}
+"""
+        prompt += footer
+        
+        pack.prompt_tokens = estimate_tokens(prompt)
+        return prompt, pack
+    
     def _build_enhanced_analysis_prompt(self, user_request: str, extracted_contents: List[ExtractedContent], 
-                                      document_structure: Dict[str, Any]) -> str:
-        """构建增强分析提示词"""
+                                      document_structure: Dict[str, Any]) -> Tuple[str, PackResult]:
+        """构建增强分析提示词（提取内容在token预算内打包），返回提示词和打包结果"""
         
         # 分析用户需求的意图和深度
         request_analysis = self._analyze_request_intent(user_request)
@@ -233,7 +592,7 @@ class AIAnalyzer:
         content_summary = self._build_content_summary(extracted_contents)
         document_info = self._build_document_info(document_structure)
         
-        prompt = f"""
+        header = f"""
 # 增强版文档深度分析任务
 
 ## 分析目标
@@ -251,16 +610,29 @@ class AIAnalyzer:
 ## 详细内容
 """
         
-        for i, content in enumerate(extracted_contents, 1):
+        footer = self._build_analysis_requirements()
+        
+        # 单个内容最多2000字符，整体不超过token预算
+        packer = PromptPacker(self.prompt_token_budget, max_section_chars=2000)
+        pack = packer.pack(extracted_contents, estimate_tokens(header) + estimate_tokens(footer))
+        
+        prompt = header
+        for i, content in enumerate(pack.contents, 1):
             prompt += f"""
 ### 内容 {i}: {content.title}
 **置信度**: {content.confidence:.2f}
 **内容**:
-{content.content[:2000]}{"..." if len(content.content) > 2000 else ""}
+{content.content}
 
 """
+        prompt += footer
         
-        prompt += f"""
+        pack.prompt_tokens = estimate_tokens(prompt)
+        return prompt, pack
+    
+    def _build_analysis_requirements(self) -> str:
+        """深度分析的输出要求（JSON结构和分析原则），整体分析和分段汇总共用"""
+        return f"""
 
 ## 深度分析要求
 
@@ -324,8 +696,6 @@ class AIAnalyzer:
 
 请确保分析结果具体、详细、有价值，能够为用户提供真正有用的信息和指导。
 """
-        
-        return prompt
 
     def _analyze_request_intent(self, user_request: str) -> str:
         """分析用户请求的意图和深度需求"""
@@ -386,13 +756,13 @@ class AIAnalyzer:
 
     def _parse_enhanced_analysis_result(self, response: str, extracted_contents: List[ExtractedContent]) -> AnalysisResult:
         """解析增强分析结果"""
-        print(f"AI增强分析响应：{response[:500]}...")
+        logger.debug("AI增强分析响应：%s...", response[:500])
         
         # 清理响应，提取JSON部分
         cleaned_response = self._clean_analysis_response(response)
         
         try:
-            data = json.loads(cleaned_response)
+            data = self._loads_json_object(cleaned_response)
             
             result = AnalysisResult(
                 summary=data.get('summary', ''),
@@ -414,32 +784,32 @@ class AIAnalyzer:
             
             # 验证结果的完整性
             if not result.summary:
-                print("警告：AI没有提供分析总结")
+                logger.warning("AI没有提供分析总结")
                 result.summary = "基于提取的文档内容，需要进一步分析。请查看详细分析部分获取具体信息。"
             
             if not result.detailed_analysis:
-                print("警告：AI没有提供详细分析")
+                logger.warning("AI没有提供详细分析")
                 result.detailed_analysis = {
                     "内容概览": "已从文档中提取相关内容，但需要更详细的分析。",
                     "建议": "请基于提取的内容进行人工review。"
                 }
             
             if not result.recommendations:
-                print("警告：AI没有提供建议")
+                logger.warning("AI没有提供建议")
                 result.recommendations = ["建议详细阅读提取的文档内容", "如有疑问，请咨询相关专业人士"]
                 
-            print(f"✓ 增强分析结果解析成功，置信度: {result.confidence_score}")
+            logger.debug("✓ 增强分析结果解析成功，置信度: %s", result.confidence_score)
             return result
             
-        except json.JSONDecodeError as e:
-            print(f"JSON解析失败: {e}")
-            print(f"响应内容: {cleaned_response[:500]}...")
+        except ValueError as e:
+            logger.warning("JSON解析失败: %s", e)
+            logger.debug("响应内容: %s...", cleaned_response[:500])
             
             # fallback到基础分析
             return self._create_fallback_enhanced_analysis(extracted_contents)
         
         except Exception as e:
-            print(f"增强分析结果解析失败: {e}")
+            logger.warning("增强分析结果解析失败: %s", e)
             return self._create_fallback_enhanced_analysis(extracted_contents)
 
     def _create_fallback_enhanced_analysis(self, extracted_contents: List[ExtractedContent]) -> AnalysisResult:
@@ -501,7 +871,7 @@ class AIAnalyzer:
         Returns:
             最终分析结果
         """
-        print(f"\n=== 带追加提取的综合分析开始 ===")
+        logger.info("带追加提取的综合分析开始")
         
         # 第一步：基于初次提取内容进行分析
         initial_analysis = self.comprehensive_analysis(user_request, extracted_contents, document_structure)
@@ -512,7 +882,7 @@ class AIAnalyzer:
         )
         
         if need_additional:
-            print(f"\n=== 需要追加提取，开始补充提取 ===")
+            logger.info("需要追加提取，开始补充提取")
             
             # 第三步：从用户问题中提取关键词并搜索
             additional_contents = self._perform_additional_extraction(
@@ -520,7 +890,7 @@ class AIAnalyzer:
             )
             
             if additional_contents:
-                print(f"追加提取了 {len(additional_contents)} 个内容")
+                logger.info("追加提取了 %s 个内容", len(additional_contents))
                 
                 # 合并内容
                 all_contents = extracted_contents + additional_contents
@@ -533,9 +903,9 @@ class AIAnalyzer:
                 
                 return final_analysis
             else:
-                print("追加提取未找到额外内容，使用初始分析结果")
+                logger.info("追加提取未找到额外内容，使用初始分析结果")
         else:
-            print("无需追加提取，初次提取内容充足")
+            logger.info("无需追加提取，初次提取内容充足")
         
         return initial_analysis
     
@@ -544,7 +914,7 @@ class AIAnalyzer:
                                         initial_analysis: AnalysisResult,
                                         document_structure: Dict[str, Any]) -> bool:
         """判断是否需要追加提取"""
-        print(f"\n=== 判断是否需要追加提取 ===")
+        logger.info("判断是否需要追加提取")
         
         # 构建判断提示词
         prompt = self._build_additional_extraction_judgment_prompt(
@@ -552,11 +922,30 @@ class AIAnalyzer:
         )
         
         # 调用AI进行判断
-        response = self._call_ai_api(prompt, AgentType.REQUIREMENT_ANALYZER)
+        response = self._call_ai_api(
+            prompt, AgentType.REQUIREMENT_ANALYZER, response_schema="additional_extraction_decision"
+        )
         
         # 解析判断结果
         return self._parse_additional_extraction_decision(response)
     
+    async def _judge_need_additional_extraction_async(self, user_request: str,
+                                                      extracted_contents: List[ExtractedContent],
+                                                      initial_analysis: AnalysisResult,
+                                                      document_structure: Dict[str, Any]) -> bool:
+        """判断是否需要追加提取（异步版本）"""
+        logger.info("判断是否需要追加提取")
+        
+        prompt = self._build_additional_extraction_judgment_prompt(
+            user_request, extracted_contents, initial_analysis, document_structure
+        )
+        
+        response = await self._call_ai_api_async(
+            prompt, AgentType.REQUIREMENT_ANALYZER, response_schema="additional_extraction_decision"
+        )
+        
+        return self._parse_additional_extraction_decision(response)
+    
     def _build_additional_extraction_judgment_prompt(self, user_request: str,
                                                    extracted_contents: List[ExtractedContent],
                                                    initial_analysis: AnalysisResult,
@@ -603,30 +992,29 @@ class AIAnalyzer:
     
     def _parse_additional_extraction_decision(self, response: str) -> bool:
         """解析追加提取判断结果"""
-        print(f"AI追加提取判断响应：{response[:200]}...")
+        logger.debug("AI追加提取判断响应：%s...", response[:200])
         
         try:
-            # 提取标记内容
-            start_marker = '<ADDITIONAL_EXTRACTION_DECISION>'
-            end_marker = '</ADDITIONAL_EXTRACTION_DECISION>'
-            
-            start_idx = response.find(start_marker)
-            end_idx = response.find(end_marker)
+            # 提取标记内容（结构化输出时没有标记，直接是JSON）
+            marked_content = self._extract_marked(
+                response, '<ADDITIONAL_EXTRACTION_DECISION>', '</ADDITIONAL_EXTRACTION_DECISION>'
+            )
+            if marked_content is None:
+                marked_content = self._clean_json_response(response)
             
-            if start_idx != -1 and end_idx != -1:
-                marked_content = response[start_idx + len(start_marker):end_idx].strip()
-                data = json.loads(marked_content)
+            if marked_content:
+                data = self._loads_json_object(marked_content)
                 
                 need_additional = data.get('need_additional', False)
                 reason = data.get('reason', '未知原因')
                 suggested_keywords = data.get('suggested_keywords', [])
                 confidence = data.get('confidence', 0.5)
                 
-                print(f"AI判断结果：{'需要' if need_additional else '不需要'}追加提取")
-                print(f"判断理由：{reason}")
+                logger.info("AI判断结果：%s追加提取", '需要' if need_additional else '不需要')
+                logger.debug("判断理由：%s", reason)
                 if suggested_keywords:
-                    print(f"建议关键词：{suggested_keywords}")
-                print(f"判断置信度：{confidence}")
+                    logger.debug("建议关键词：%s", suggested_keywords)
+                logger.debug("判断置信度：%s", confidence)
                 
                 # 保存建议的关键词，供后续使用
                 self._suggested_keywords = suggested_keywords
@@ -634,35 +1022,121 @@ class AIAnalyzer:
                 return need_additional
                 
         except (json.JSONDecodeError, ValueError) as e:
-            print(f"解析AI追加提取判断失败：{e}")
+            logger.warning("解析AI追加提取判断失败：%s", e)
         
         # 如果解析失败，默认不追加提取
-        print("AI判断解析失败，默认不追加提取")
+        logger.warning("AI判断解析失败，默认不追加提取")
         return False
     
+    def _additional_extraction_keywords(self, user_request: str) -> List[str]:
+        """追加提取使用的关键词：优先使用AI判断时建议的关键词，没有则从用户请求中提取"""
+        keywords = getattr(self, '_suggested_keywords', [])
+        if not keywords:
+            keywords = self._extract_user_keywords_for_additional_search(user_request)
+        return keywords
+    
+    def start_speculative_additional_extraction(self, document_structure: Dict[str, Any],
+                                                full_document_path: str,
+                                                existing_contents: List[ExtractedContent]) -> SpeculativeExtraction:
+        """
+        在CPU进程池中预先执行追加提取中与关键词无关的部分，与初步分析和追加提取判断的AI调用并行
+        
+        必须在事件循环中调用；需要追加提取时由perform_additional_extraction_async采用，
+        判断不需要追加提取时调用cancel()取消。
+        """
+        import analysis_tasks
+        task = asyncio.ensure_future(async_runner.run_cpu(
+            analysis_tasks.prepare_additional_extraction, document_structure, full_document_path, existing_contents
+        ))
+        # 结果可能被丢弃，提前取出异常避免"未处理异常"警告
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return SpeculativeExtraction(task=task)
+    
+    async def perform_additional_extraction_async(self, user_request: str,
+                                                  document_structure: Dict[str, Any],
+                                                  full_document_path: str,
+                                                  existing_contents: List[ExtractedContent],
+                                                  speculative: Optional[SpeculativeExtraction] = None,
+                                                  keywords: Optional[List[str]] = None) -> List[ExtractedContent]:
+        """执行追加提取（异步），复用预先找到的结构候选标题和章节内容，只提取AI关键词新增的标题"""
+        if keywords is None:
+            keywords = self._additional_extraction_keywords(user_request)
+        prepared = None
+        if speculative is not None and not speculative.task.cancelled():
+            try:
+                prepared = await speculative.task
+                logger.info("采用预先提取的 %s 个候选章节", len(prepared['sections']))
+            except Exception as e:
+                logger.warning("预先执行的追加提取失败，重新提取: %s", e)
+        
+        import analysis_tasks
+        return await async_runner.run_cpu(
+            analysis_tasks.perform_additional_extraction,
+            user_request, document_structure, full_document_path, existing_contents, keywords, prepared
+        )
+    
+    def prepare_additional_extraction(self, document_structure: Dict[str, Any],
+                                      full_document_path: str,
+                                      existing_contents: List[ExtractedContent],
+                                      document_text: Optional[DocumentText] = None) -> Dict[str, Any]:
+        """
+        追加提取中与关键词无关的部分：结构相关的候选标题，以及其中排名靠前的标题按精确匹配提取的章节内容
+        
+        Returns:
+            {'structure_headings': 结构相关的候选标题, 'sections': {标题文本: 提取结果}}，
+            作为_perform_additional_extraction的prepared参数
+        """
+        headings = document_structure.get('headings', [])
+        existing_titles = {content.title for content in existing_contents}
+        structure_headings = self._find_sibling_and_related_headings(
+            existing_titles, self._build_document_hierarchy(headings), headings
+        )
+        
+        # 最终结果最多取5个标题，进入前5的结构候选一定在结构候选自身的前5名中
+        sections = {}
+        candidates = self._rank_additional_candidates(structure_headings, existing_titles)[:5]
+        if candidates:
+            extractor = self._get_content_extractor()
+            if document_text is None:
+                document_text = extractor.load_document_text(full_document_path, document_structure)
+            for heading in candidates:
+                content = extractor.extract_content_by_exact_title(
+                    full_document_path, document_structure, heading['text'], document_text=document_text
+                )
+                if content:
+                    sections[heading['text']] = content
+        return {'structure_headings': structure_headings, 'sections': sections}
+    
     def _perform_additional_extraction(self, user_request: str, 
                                      document_structure: Dict[str, Any],
                                      full_document_path: str,
-                                     existing_contents: List[ExtractedContent]) -> List[ExtractedContent]:
-        """执行智能追加提取 - 优先基于文档结构"""
-        print(f"\n=== 执行智能追加提取 ===")
+                                     existing_contents: List[ExtractedContent],
+                                     document_text: Optional[DocumentText] = None,
+                                     keywords: Optional[List[str]] = None,
+                                     prepared: Optional[Dict[str, Any]] = None) -> List[ExtractedContent]:
+        """
+        执行智能追加提取 - 优先基于文档结构
+        
+        prepared为prepare_additional_extraction的结果时，复用其中的结构候选标题和已提取的章节内容
+        """
+        logger.info("执行智能追加提取")
         
         # 获取建议的关键词，如果没有则从用户请求中提取
-        keywords = getattr(self, '_suggested_keywords', [])
-        if not keywords:
-            keywords = self._extract_user_keywords_for_additional_search(user_request)
+        if keywords is None:
+            keywords = self._additional_extraction_keywords(user_request)
         
-        print(f"追加提取关键词：{keywords}")
+        logger.info("追加提取关键词：%s", keywords)
         
         # 策略1: 基于文档结构智能查找相关标题
         structure_based_headings = self._find_additional_headings_by_structure(
-            user_request, keywords, document_structure, existing_contents
+            user_request, keywords, document_structure, existing_contents,
+            structure_headings=prepared['structure_headings'] if prepared else None
         )
         
         # 策略2: 如果结构化查找结果不足，进行关键词搜索补充
         keyword_based_headings = []
         if len(structure_based_headings) < 3:  # 如果找到的标题较少，进行补充搜索
-            print("结构化查找结果较少，进行关键词补充搜索...")
+            logger.debug("结构化查找结果较少，进行关键词补充搜索...")
             keyword_based_headings = self._find_additional_relevant_headings(
                 keywords, document_structure.get('headings', []), existing_contents
             )
@@ -674,28 +1148,33 @@ class AIAnalyzer:
         all_relevant_headings = structure_based_headings + keyword_based_headings[:2]  # 最多补充2个关键词匹配的
         
         if not all_relevant_headings:
-            print("未找到需要追加提取的相关标题")
+            logger.info("未找到需要追加提取的相关标题")
             return []
         
-        print(f"总共找到 {len(all_relevant_headings)} 个相关标题需要追加提取")
+        logger.info("总共找到 %s 个相关标题需要追加提取", len(all_relevant_headings))
         for heading in all_relevant_headings:
             method = "结构化" if heading in structure_based_headings else "关键词"
-            print(f"  - {method}匹配: {heading['text']}")
+            logger.debug("- %s匹配: %s", method, heading['text'])
         
-        # 提取这些标题的内容
-        from content_extractor import ContentExtractor
-        extractor = ContentExtractor()
+        # 提取这些标题的内容（预先提取过的章节直接使用，其余复用已加载的文档文本）
+        prepared_sections = prepared['sections'] if prepared else {}
+        extractor = self._get_content_extractor()
         
         additional_contents = []
         for heading_info in all_relevant_headings:
-            print(f"追加提取标题：{heading_info['text']}")
-            
-            content = extractor.extract_content_by_title_and_keywords(
-                document_path=full_document_path,
-                document_structure=document_structure,
-                target_title=heading_info['text'],
-                keywords=keywords
-            )
+            logger.debug("追加提取标题：%s", heading_info['text'])
+            
+            content = prepared_sections.get(heading_info['text'])
+            if content is None:
+                if document_text is None:
+                    document_text = extractor.load_document_text(full_document_path, document_structure)
+                content = extractor.extract_content_by_title_and_keywords(
+                    document_path=full_document_path,
+                    document_structure=document_structure,
+                    target_title=heading_info['text'],
+                    keywords=keywords,
+                    document_text=document_text
+                )
             
             if content:
                 extracted_content = ExtractedContent(
@@ -703,57 +1182,59 @@ class AIAnalyzer:
                     content=content['content'],
                     start_heading=content.get('start_heading', ''),
                     end_heading=content.get('end_heading', ''),
-                    confidence=content.get('confidence', 0.7)  # 追加提取的置信度稍低
+                    confidence=content.get('confidence', 0.7),  # 追加提取的置信度稍低
+                    span=content.get('span')
                 )
                 additional_contents.append(extracted_content)
-                print(f"  ✓ 成功追加提取 {len(content['content'])} 字符")
+                logger.debug("✓ 成功追加提取 %s 字符", len(content['content']))
             else:
-                print(f"  ✗ 追加提取失败")
+                logger.debug("✗ 追加提取失败")
         
         return additional_contents
     
     def _find_additional_headings_by_structure(self, user_request: str, 
                                              keywords: List[str],
                                              document_structure: Dict[str, Any],
-                                             existing_contents: List[ExtractedContent]) -> List[Dict]:
-        """基于文档结构智能查找相关标题"""
-        print(f"\n--- 基于文档结构查找相关标题 ---")
+                                             existing_contents: List[ExtractedContent],
+                                             structure_headings: Optional[List[Dict]] = None) -> List[Dict]:
+        """基于文档结构智能查找相关标题（structure_headings为预先查找的结构相关标题）"""
+        logger.debug("基于文档结构查找相关标题")
         
         headings = document_structure.get('headings', [])
         existing_titles = {content.title for content in existing_contents}
         
-        # 构建文档层级结构映射
-        structure_map = self._build_document_hierarchy(headings)
-        
-        # 策略1: 查找与已提取内容同级别或相关的章节
-        related_by_structure = self._find_sibling_and_related_headings(
-            existing_titles, structure_map, headings
-        )
+        # 策略1: 查找与已提取内容同级别或相关的章节（与关键词无关，可能已预先查找）
+        related_by_structure = structure_headings
+        if related_by_structure is None:
+            related_by_structure = self._find_sibling_and_related_headings(
+                existing_titles, self._build_document_hierarchy(headings), headings
+            )
         
         # 策略2: 基于用户需求智能推断需要的章节类型
         related_by_intent = self._find_headings_by_user_intent(
             user_request, keywords, headings, existing_titles
         )
         
-        # 合并和排序结果
-        all_candidates = related_by_structure + related_by_intent
+        # 合并、去重并按相关性排序
+        sorted_candidates = self._rank_additional_candidates(related_by_structure + related_by_intent, existing_titles)
         
-        # 去重并按相关性排序
+        logger.debug("结构化查找找到 %s 个候选标题", len(sorted_candidates))
+        return sorted_candidates[:5]  # 最多返回5个
+    
+    @staticmethod
+    def _rank_additional_candidates(candidates: List[Dict], existing_titles: set) -> List[Dict]:
+        """候选标题去重（保留先出现的）并按优先级排序（结构相关性 + 关键词匹配度）"""
         unique_candidates = {}
-        for candidate in all_candidates:
+        for candidate in candidates:
             title = candidate['text']
             if title not in unique_candidates and title not in existing_titles:
                 unique_candidates[title] = candidate
         
-        # 按优先级排序（结构相关性 + 关键词匹配度）
-        sorted_candidates = sorted(
+        return sorted(
             unique_candidates.values(),
             key=lambda x: x.get('priority_score', 0),
             reverse=True
         )
-        
-        print(f"结构化查找找到 {len(sorted_candidates)} 个候选标题")
-        return sorted_candidates[:5]  # 最多返回5个
     
     def _build_document_hierarchy(self, headings: List[Dict]) -> Dict[str, Any]:
         """构建文档层级结构映射"""
@@ -936,7 +1417,7 @@ class AIAnalyzer:
         
         keywords = [word for word in words if word not in stop_words and len(word) >= 2]
         
-        print(f"从用户请求中提取的追加搜索关键词：{keywords}")
+        logger.debug("从用户请求中提取的追加搜索关键词：%s", keywords)
         return keywords[:5]  # 最多5个关键词
     
     def _find_additional_relevant_headings(self, keywords: List[str], 
@@ -987,7 +1468,7 @@ class AIAnalyzer:
         Returns:
             (AI回复, 是否需要重新提取)
         """
-        print(f"\n=== 对话管理Agent开始工作 ===")
+        logger.info("对话管理Agent开始工作")
         
         # 获取或创建对话上下文
         if conversation_id not in self.chat_contexts:
@@ -1006,10 +1487,10 @@ class AIAnalyzer:
         need_extraction = self._should_extract_new_content(user_message, context)
         
         if need_extraction:
-            print("判断需要重新提取内容")
+            logger.info("判断需要重新提取内容")
             response = "我理解您的新需求，让我重新分析文档内容..."
         else:
-            print("判断无需重新提取，基于已有信息回复")
+            logger.info("判断无需重新提取，基于已有信息回复")
             # 基于聊天记录和已有分析结果回复
             response = self._generate_chat_response(user_message, context)
         
@@ -1033,12 +1514,12 @@ class AIAnalyzer:
         Returns:
             (AI回复, 是否需要重新提取)
         """
-        print(f"\n=== 增强版对话管理Agent开始工作 ===")
-        print(f"消息: {user_message[:100]}...")
+        logger.info("增强版对话管理Agent开始工作")
+        logger.debug("消息: %s...", user_message[:100])
         
         # 分析用户意图
         intent_analysis = self._analyze_user_intent(user_message, chat_history or [])
-        print(f"用户意图: {intent_analysis['intent_type']}")
+        logger.info("用户意图: %s", intent_analysis['intent_type'])
         
         # 判断是否需要重新提取
         need_extraction = self._should_extract_new_content_enhanced(
@@ -1046,10 +1527,10 @@ class AIAnalyzer:
         )
         
         if need_extraction:
-            print("判断需要重新提取内容")
+            logger.info("判断需要重新提取内容")
             response = self._generate_extraction_needed_response(user_message, intent_analysis)
         else:
-            print("基于已有信息生成回复")
+            logger.info("基于已有信息生成回复")
             # 基于分析结果和聊天历史生成智能回复
             response = self._generate_enhanced_chat_response(
                 user_message, intent_analysis, analysis_result, chat_history or []
@@ -1351,17 +1832,9 @@ class AIAnalyzer:
     
     def _build_comprehensive_analysis_prompt(self, user_request: str, 
                                            extracted_contents: List[ExtractedContent],
-                                           document_structure: Dict[str, Any]) -> str:
-        """构建综合分析提示词"""
-        content_summary = []
-        for i, content in enumerate(extracted_contents, 1):
-            content_summary.append(f"""
-=== 提取内容 {i}: {content.title} ===
-内容: {content.content}
-置信度: {content.confidence}
-""")
-        
-        prompt = f"""
+                                           document_structure: Dict[str, Any]) -> Tuple[str, PackResult]:
+        """构建综合分析提示词（提取内容在token预算内打包），返回提示词和打包结果"""
+        head = f"""
 你是一个专业的文档综合分析专家。用户提出了具体的分析需求，我已经根据需求从文档中提取了相关内容，现在请你基于这些内容来全面回答用户的问题。
 
 用户的原始需求：
@@ -1373,7 +1846,8 @@ class AIAnalyzer:
 - 已提取章节数：{len(extracted_contents)}
 
 提取的相关内容：
-{chr(10).join(content_summary)}
+"""
+        tail = f"""
 
 分析任务：
 请仔细阅读所有提取的内容，针对用户的具体需求进行深度分析，从内容中提取关键信息和数据，并提供实用的建议和总结。
@@ -1418,64 +1892,379 @@ class AIAnalyzer:
 
 希望这个分析对你有帮助。如果需要了解更多细节，请告诉我。
 """
-        return prompt
+        pack = PromptPacker(self.prompt_token_budget).pack(extracted_contents, estimate_tokens(head) + estimate_tokens(tail))
+        
+        content_summary = []
+        for i, content in enumerate(pack.contents, 1):
+            content_summary.append(f"""
+=== 提取内容 {i}: {content.title} ===
+内容: {content.content}
+置信度: {content.confidence}
+""")
+        
+        prompt = head + chr(10).join(content_summary) + tail
+        pack.prompt_tokens = estimate_tokens(prompt)
+        return prompt, pack
     
-    def _call_ai_api(self, prompt: str, agent_type: AgentType) -> str:
+    def _build_api_request(self, prompt: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """构建AI API请求的URL、请求头和请求体（同步和异步调用共用）"""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        data = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": "你是一个专业的文档分析助手。"},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.3
+        }
+        
+        return f"{self.base_url}/chat/completions", headers, data
+    
+    def _get_cached_response(self, data: Dict[str, Any], agent_type: AgentType) -> Tuple[Optional[str], Optional[str]]:
+        """
+        查询AI响应缓存
+        
+        Returns:
+            (缓存键, 缓存的响应)；未启用缓存时缓存键为None，未命中时响应为None
         """
-        调用AI API
+        if self.response_cache is None:
+            return None, None
+        
+        cache_key = ResponseCache.make_key(
+            data["model"], self.base_url, agent_type.value,
+            json.dumps(data["messages"], ensure_ascii=False), data["temperature"]
+        )
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("AI响应缓存命中: %s", agent_type.value)
+        return cache_key, cached
+    
+    def _store_response(self, cache_key: Optional[str], content: str):
+        """缓存成功的AI响应（模拟响应和失败的调用不会缓存）"""
+        if cache_key and content:
+            self.response_cache.set(cache_key, content)
+    
+    def _response_formats(self, response_schema: Optional[str]) -> List[Optional[Dict[str, Any]]]:
+        """按降级顺序列出本次调用要尝试的response_format（最后的None表示不请求结构化输出）"""
+        if not response_schema or self.response_format_mode == 'off':
+            return [None]
+        
+        if self.response_format_mode in ('json_schema', 'json_object'):
+            kinds = [self.response_format_mode]
+        else:
+            kinds = ['json_schema', 'json_object']
+        
+        formats = []
+        for kind in kinds:
+            if not response_format_supported(self.base_url, self.model, kind):
+                continue
+            if kind == 'json_schema':
+                formats.append({
+                    "type": "json_schema",
+                    "json_schema": {"name": response_schema, "schema": RESPONSE_SCHEMAS[response_schema], "strict": False}
+                })
+            else:
+                formats.append({"type": "json_object"})
+        return formats + [None]
+    
+    @staticmethod
+    def _with_response_format(data: Dict[str, Any], response_format: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """在请求体中加入response_format（部分接口要求消息中出现JSON字样才接受json_object）"""
+        if response_format is None:
+            return data
+        messages = [dict(message) for message in data["messages"]]
+        messages[0]["content"] += "请只输出JSON。"
+        return {**data, "messages": messages, "response_format": response_format}
+    
+    def _response_format_rejected(self, error: LLMAPIError, response_format: Optional[Dict[str, Any]],
+                                  rejected: List[str]) -> bool:
+        """请求的结构化输出被接口拒绝时记录并返回True，由调用方降级为下一种格式重发"""
+        if response_format is None or error.status_code not in RESPONSE_FORMAT_REJECTED_CODES:
+            return False
+        logger.info("接口拒绝 %s 结构化输出（%s），降级重试", response_format["type"], error.status_code)
+        rejected.append(response_format["type"])
+        return True
+    
+    def _remember_rejected_formats(self, rejected: List[str]):
+        """降级后调用成功，说明被拒绝的格式确实不受支持，之后不再尝试"""
+        for kind in rejected:
+            mark_response_format_unsupported(self.base_url, self.model, kind)
+    
+    def _call_ai_api(self, prompt: str, agent_type: AgentType, response_schema: Optional[str] = None) -> str:
+        """
+        调用AI API（网络错误、429和5xx按退避策略重试，API地址持续失败时熔断）
         
         Args:
             prompt: 提示词
             agent_type: Agent类型
+            response_schema: 期望的JSON结构名称（见RESPONSE_SCHEMAS），提供时请求结构化输出，
+                接口不支持时逐级降级
             
         Returns:
             AI响应
+            
+        Raises:
+            LLMAPIError: 调用失败且未启用模拟响应
         """
-        print(f"调用 {agent_type.value} Agent...")
+        logger.debug("调用 %s Agent...", agent_type.value)
         
         if not self.api_key:
-            # 模拟响应用于演示
-            return self._get_mock_response(agent_type, prompt)
+            return self._fallback_response(agent_type, prompt, LLMAPIError("未配置API密钥"))
+        
+        # 通过进程内共享的连接池调用AI API，复用已建立的连接
+        url, headers, data = self._build_api_request(prompt)
         
+        cache_key, cached = self._get_cached_response(data, agent_type)
+        if cached is not None:
+            return cached
+        
+        logger.debug("调用API: %s", url)
         try:
-            # 使用requests调用AI API
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            data = {
-                "model": self.model,
-                "messages": [
-                    {"role": "system", "content": "你是一个专业的文档分析助手。"},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.3
-            }
+            return self._call_shared(
+                self._flight_key(data, agent_type, response_schema), cache_key,
+                lambda: self._request_ai_api(url, headers, data, response_schema)
+            )
+        except LLMAPIError as e:
+            return self._fallback_response(agent_type, prompt, e)
+        except ValueError as e:
+            return self._fallback_response(agent_type, prompt, LLMAPIError(f"API响应格式错误: {e}"))
+    
+    def _request_ai_api(self, url: str, headers: Dict[str, str], data: Dict[str, Any],
+                        response_schema: Optional[str]) -> str:
+        """发出请求（按结构化输出的降级顺序），返回回复文本"""
+        rejected = []
+        for response_format in self._response_formats(response_schema):
+            request_data = self._with_response_format(data, response_format)
+            try:
+                response = call_with_retry(self.base_url, lambda: get_session(self.base_url).post(
+                    url=url,
+                    headers=headers,
+                    json=request_data,
+                    timeout=self.timeout
+                ))
+            except LLMAPIError as e:
+                if self._response_format_rejected(e, response_format, rejected):
+                    continue
+                raise
+            break
+        self._remember_rejected_formats(rejected)
+        return self._parse_completion(response.json())
+    
+    def _flight_key(self, data: Dict[str, Any], agent_type: AgentType, response_schema: Optional[str]) -> str:
+        """合并进行中调用的键：在缓存键的基础上区分API密钥（不同密钥的调用不合并，避免共享鉴权错误）"""
+        return ResponseCache.make_key(
+            data["model"], self.base_url, agent_type.value,
+            json.dumps([self.api_key, response_schema, data["messages"]], ensure_ascii=False), data["temperature"]
+        )
+    
+    def _call_shared(self, flight_key: str, cache_key: Optional[str], send: Callable[[], str]) -> str:
+        """
+        发出请求并缓存结果；已有相同的调用在进行中时等待并共享其结果（成功或失败）
+        
+        发起方先写入缓存再分发结果，之后到达的相同调用直接命中缓存。
+        """
+        if self.single_flight is None:
+            content = send()
+            self._store_response(cache_key, content)
+            return content
+        
+        while True:
+            flight, leader = self.single_flight.join(flight_key)
+            if leader:
+                break
+            logger.debug("相同的AI调用正在进行，等待其结果")
+            try:
+                return flight.wait()
+            except FlightAbandoned:
+                continue
+        
+        try:
+            content = send()
+            self._store_response(cache_key, content)
+        except BaseException as e:
+            self.single_flight.finish(flight_key, flight, error=e)
+            raise
+        self.single_flight.finish(flight_key, flight, result=content)
+        return content
+    
+    async def _call_shared_async(self, flight_key: str, cache_key: Optional[str],
+                                 send: Callable[[Optional[Callable[[str], None]]], Awaitable[str]],
+                                 on_token: Optional[Callable[[str], None]]) -> str:
+        """
+        _call_shared的异步版本：发起方的流式输出同时转发给等待中的调用方
+        
+        发起方被取消时通知等待者重新发起，不影响其他用户的分析。
+        """
+        if self.single_flight is None:
+            content = await send(on_token)
+            await async_runner.run_blocking(self._store_response, cache_key, content)
+            return content
+        
+        while True:
+            flight, leader = self.single_flight.join(flight_key)
+            if leader:
+                break
+            logger.debug("相同的AI调用正在进行，等待其结果")
+            try:
+                return await flight.wait_async(on_token)
+            except FlightAbandoned:
+                continue
+        
+        def relay(text: str):
+            on_token(text)
+            flight.publish(text)
+        
+        try:
+            content = await send(relay if on_token is not None else None)
+            await async_runner.run_blocking(self._store_response, cache_key, content)
+        except asyncio.CancelledError:
+            self.single_flight.abandon(flight_key, flight)
+            raise
+        except BaseException as e:
+            self.single_flight.finish(flight_key, flight, error=e)
+            raise
+        self.single_flight.finish(flight_key, flight, result=content)
+        return content
+    
+    async def _call_ai_api_async(self, prompt: str, agent_type: AgentType,
+                                 on_token: Optional[Callable[[str], None]] = None,
+                                 response_schema: Optional[str] = None) -> str:
+        """
+        异步调用AI API（与_call_ai_api行为一致，等待响应和退避期间不占用线程）
+        
+        Args:
+            prompt: 提示词
+            agent_type: Agent类型
+            on_token: 增量文本回调，提供时以stream方式调用，每收到一段输出就回调一次
+            response_schema: 期望的JSON结构名称，提供时请求结构化输出
             
-            url = f"{self.base_url}/chat/completions"
+        Returns:
+            AI响应（完整文本）
             
-            print(f"调用API: {url}")
-            response = requests.post(
-                url=url,
-                headers=headers,
-                json=data,
-                timeout=self.timeout
+        Raises:
+            LLMAPIError: 调用失败且未启用模拟响应
+        """
+        logger.debug("调用 %s Agent（异步）...", agent_type.value)
+        
+        if not self.api_key:
+            return self._fallback_response(agent_type, prompt, LLMAPIError("未配置API密钥"))
+        
+        url, headers, data = self._build_api_request(prompt)
+        
+        cache_key, cached = await async_runner.run_blocking(self._get_cached_response, data, agent_type)
+        if cached is not None:
+            if on_token is not None:
+                on_token(cached)
+            return cached
+        
+        logger.debug("调用API: %s", url)
+        try:
+            return await self._call_shared_async(
+                self._flight_key(data, agent_type, response_schema), cache_key,
+                lambda relay: self._request_ai_api_async(url, headers, data, response_schema, relay), on_token
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result["choices"][0]["message"]["content"]
-            else:
-                print(f"API调用失败: {response.status_code} - {response.text}")
-                return self._get_mock_response(agent_type, prompt)
-                
-        except requests.exceptions.RequestException as e:
-            print(f"网络请求失败: {e}")
-            return self._get_mock_response(agent_type, prompt)
-        except Exception as e:
-            print(f"API调用失败: {e}")
-            return self._get_mock_response(agent_type, prompt)
+        except LLMAPIError as e:
+            return self._fallback_response(agent_type, prompt, e)
+        except ValueError as e:
+            return self._fallback_response(agent_type, prompt, LLMAPIError(f"API响应格式错误: {e}"))
+    
+    async def _request_ai_api_async(self, url: str, headers: Dict[str, str], data: Dict[str, Any],
+                                    response_schema: Optional[str],
+                                    on_token: Optional[Callable[[str], None]]) -> str:
+        """_request_ai_api的异步版本（提供on_token时以stream方式）"""
+        rejected = []
+        for response_format in self._response_formats(response_schema):
+            request_data = self._with_response_format(data, response_format)
+            try:
+                content = await self._send_ai_api_async(url, headers, request_data, on_token)
+            except LLMAPIError as e:
+                if self._response_format_rejected(e, response_format, rejected):
+                    continue
+                raise
+            break
+        self._remember_rejected_formats(rejected)
+        return content
+    
+    async def _send_ai_api_async(self, url: str, headers: Dict[str, str], data: Dict[str, Any],
+                                 on_token: Optional[Callable[[str], None]]) -> str:
+        """发送一次异步请求（提供on_token时以stream方式），返回回复文本"""
+        if on_token is not None:
+            return await self._stream_ai_api(url, headers, data, on_token)
+        
+        client = get_async_client(self.base_url)
+        response = await call_with_retry_async(self.base_url, lambda: client.post(
+            url,
+            headers=headers,
+            json=data,
+            timeout=self.timeout
+        ))
+        return self._parse_completion(response.json())
+    
+    async def _stream_ai_api(self, url: str, headers: Dict[str, str], data: Dict[str, Any],
+                             on_token: Callable[[str], None]) -> str:
+        """
+        以stream方式调用AI API，逐段回调增量文本（只在收到第一段输出之前重试）
+        
+        Returns:
+            拼接后的完整响应
+        """
+        client = get_async_client(self.base_url)
+        request = client.build_request(
+            'POST', url, headers=headers, json={**data, "stream": True}, timeout=self.timeout
+        )
+        response = await call_with_retry_async(self.base_url, lambda: client.send(request, stream=True))
+        
+        chunks = []
+        try:
+            # 部分兼容接口会忽略stream参数，直接返回完整JSON
+            if 'text/event-stream' not in response.headers.get('content-type', ''):
+                content = self._parse_completion(json.loads(await response.aread()))
+                on_token(content)
+                return content
+            
+            async for line in response.aiter_lines():
+                line = line.strip()
+                if not line.startswith('data:'):
+                    continue
+                payload = line[5:].strip()
+                if payload == '[DONE]':
+                    break
+                try:
+                    choice = json.loads(payload)["choices"][0]
+                except (ValueError, KeyError, IndexError):
+                    continue
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    chunks.append(delta)
+                    on_token(delta)
+        except httpx.HTTPError as e:
+            raise LLMAPIError(f"流式响应中断: {e}")
+        except ValueError as e:
+            raise LLMAPIError(f"API响应格式错误: {e}")
+        finally:
+            await response.aclose()
+        
+        return ''.join(chunks)
+    
+    @staticmethod
+    def _parse_completion(result: Any) -> str:
+        """从chat/completions响应中取出回复文本"""
+        try:
+            return result["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise LLMAPIError(f"API响应格式错误: {e}")
+    
+    def _fallback_response(self, agent_type: AgentType, prompt: str, error: LLMAPIError) -> str:
+        """调用失败时：启用模拟响应（mock_fallback）则返回模拟数据，否则抛出错误"""
+        if not self.mock_fallback:
+            raise error
+        logger.warning("%s，使用模拟响应", error)
+        self.mock_responses += 1
+        return self._get_mock_response(agent_type, prompt)
     
     def _get_mock_response(self, agent_type: AgentType, prompt: str) -> str:
         """获取模拟响应（用于演示）"""
@@ -1555,18 +2344,18 @@ class AIAnalyzer:
     
     def _parse_extraction_targets(self, response: str, user_request: str = "", document_structure: Dict[str, Any] = None) -> List[ExtractionTarget]:
         """解析AI响应，生成提取目标"""
-        print(f"AI原始响应：{response[:500]}...")
+        logger.debug("AI原始响应：%s...", response[:500])
         
         # 清理响应，去除可能的非JSON内容
         cleaned_response = self._clean_json_response(response)
         
         try:
-            data = json.loads(cleaned_response)
+            data = self._loads_json_object(cleaned_response)
             targets = []
             
             extraction_targets_list = data.get('extraction_targets', [])
             if not extraction_targets_list:
-                print("警告：AI响应中没有extraction_targets字段")
+                logger.warning("AI响应中没有extraction_targets字段")
                 return []
             
             for target_data in extraction_targets_list:
@@ -1577,62 +2366,82 @@ class AIAnalyzer:
                     description=target_data.get('description', '')
                 )
                 targets.append(target)
-                print(f"解析目标：{target.title} (优先级: {target.priority})")
+                logger.debug("解析目标：%s (优先级: %s)", target.title, target.priority)
             
             if not targets:
-                print("警告：AI没有生成任何有效的提取目标")
+                logger.warning("AI没有生成任何有效的提取目标")
                 return []
                 
             return targets
             
-        except json.JSONDecodeError as e:
-            print(f"JSON解析失败：{e}")
-            print(f"清理后的响应：{cleaned_response}")
+        except ValueError as e:
+            logger.warning("JSON解析失败：%s", e)
+            logger.debug("清理后的响应：%s", cleaned_response)
             
             # 完全依赖AI判断，不使用Python智能分析回退
             # 如果JSON解析失败，返回空列表，让上层重试
             return []
     
+    @staticmethod
+    def _extract_marked(response: str, start_marker: str, end_marker: str) -> Optional[str]:
+        """
+        提取特殊标记内的内容
+        
+        输出被截断时可能只有开始标记，此时返回开始标记之后的全部内容（由loads_tolerant修复）。
+        
+        Returns:
+            标记内的内容，没有开始标记时返回None
+        """
+        start_idx = response.find(start_marker)
+        if start_idx == -1:
+            return None
+        start_idx += len(start_marker)
+        end_idx = response.find(end_marker, start_idx)
+        if end_idx == -1:
+            end_idx = len(response)
+        return response[start_idx:end_idx].strip()
+    
+    @staticmethod
+    def _loads_json_object(text: str) -> Dict[str, Any]:
+        """容错解析JSON对象（修复代码块包裹、尾随逗号和截断），结果不是对象时抛出ValueError"""
+        data = loads_tolerant(text)
+        if not isinstance(data, dict):
+            raise ValueError(f"期望JSON对象，实际为{type(data).__name__}")
+        return data
+    
     def _clean_json_response(self, response: str) -> str:
         """清理AI响应，提取纯JSON部分"""
         # 去除前后空白
         response = response.strip()
         
         # 首先尝试提取特殊标记内的内容
-        start_marker = '<EXTRACTION_TARGETS>'
-        end_marker = '</EXTRACTION_TARGETS>'
-        
-        start_idx = response.find(start_marker)
-        end_idx = response.find(end_marker)
-        
-        if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-            # 提取标记内的内容
-            marked_content = response[start_idx + len(start_marker):end_idx].strip()
-            print(f"从标记中提取内容: {marked_content[:200]}...")
+        marked_content = self._extract_marked(response, '<EXTRACTION_TARGETS>', '</EXTRACTION_TARGETS>')
+        if marked_content is not None:
+            logger.debug("从标记中提取内容: %s...", marked_content[:200])
             return marked_content
         
-        # 如果没有找到标记，回退到寻找JSON格式
+        # 如果没有找到标记，回退到寻找JSON格式（结构化输出时整个响应就是JSON）。
+        # 只截掉开头的说明文字：JSON的结束位置和被截断的输出都由loads_tolerant处理
         start_idx = response.find('{')
-        end_idx = response.rfind('}')
         
-        if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-            json_part = response[start_idx:end_idx + 1]
-            print(f"从响应中提取JSON: {json_part[:200]}...")
+        if start_idx != -1:
+            json_part = response[start_idx:]
+            logger.debug("从响应中提取JSON: %s...", json_part[:200])
             return json_part
         
         # 如果找不到完整的JSON，返回原始响应
-        print("未找到有效的JSON或标记内容，返回原始响应")
+        logger.debug("未找到有效的JSON或标记内容，返回原始响应")
         return response
     
     def _parse_analysis_result(self, response: str, extracted_contents: List[ExtractedContent]) -> AnalysisResult:
         """解析分析结果"""
-        print(f"AI分析响应：{response[:300]}...")
+        logger.debug("AI分析响应：%s...", response[:300])
         
         # 清理响应，提取JSON部分（支持ANALYSIS_RESULT标记）
         cleaned_response = self._clean_analysis_response(response)
         
         try:
-            data = json.loads(cleaned_response)
+            data = self._loads_json_object(cleaned_response)
             
             result = AnalysisResult(
                 summary=data.get('summary', ''),
@@ -1644,20 +2453,20 @@ class AIAnalyzer:
             
             # 验证结果的完整性
             if not result.summary:
-                print("警告：AI没有提供分析总结")
+                logger.warning("AI没有提供分析总结")
             
             if not result.detailed_analysis:
-                print("警告：AI没有提供详细分析")
+                logger.warning("AI没有提供详细分析")
             
             if not result.recommendations:
-                print("警告：AI没有提供建议")
+                logger.warning("AI没有提供建议")
                 
-            print(f"✓ 分析结果解析成功，置信度: {result.confidence_score}")
+            logger.debug("✓ 分析结果解析成功，置信度: %s", result.confidence_score)
             return result
             
         except (json.JSONDecodeError, ValueError) as e:
-            print(f"分析结果解析失败：{e}")
-            print(f"清理后的响应：{cleaned_response}")
+            logger.warning("分析结果解析失败：%s", e)
+            logger.debug("清理后的响应：%s", cleaned_response)
             
             # 生成基础分析结果，避免返回空
             return AnalysisResult(
@@ -1673,15 +2482,9 @@ class AIAnalyzer:
         response = response.strip()
         
         # 首先尝试提取ANALYSIS_RESULT标记内的内容
-        start_marker = '<ANALYSIS_RESULT>'
-        end_marker = '</ANALYSIS_RESULT>'
-        
-        start_idx = response.find(start_marker)
-        end_idx = response.find(end_marker)
-        
-        if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-            marked_content = response[start_idx + len(start_marker):end_idx].strip()
-            print(f"从ANALYSIS_RESULT标记中提取内容: {marked_content[:200]}...")
+        marked_content = self._extract_marked(response, '<ANALYSIS_RESULT>', '</ANALYSIS_RESULT>')
+        if marked_content is not None:
+            logger.debug("从ANALYSIS_RESULT标记中提取内容: %s...", marked_content[:200])
             return marked_content
         
         # 如果没有找到标记，回退到通用的JSON提取
@@ -1697,7 +2500,7 @@ class AIAnalyzer:
         prompt = self._build_reextraction_judgment_prompt(user_message, context)
         
         # 调用AI进行判断
-        response = self._call_ai_api(prompt, AgentType.CHAT_MANAGER)
+        response = self._call_ai_api(prompt, AgentType.CHAT_MANAGER, response_schema="reextraction_decision")
         
         # 解析AI的判断结果
         return self._parse_reextraction_decision(response, user_message)
@@ -1745,35 +2548,32 @@ class AIAnalyzer:
     
     def _parse_reextraction_decision(self, response: str, user_message: str) -> bool:
         """解析AI的重新提取判断结果"""
-        print(f"AI重新提取判断响应：{response[:200]}...")
+        logger.debug("AI重新提取判断响应：%s...", response[:200])
         
         try:
-            # 提取标记内容
-            start_marker = '<REEXTRACTION_DECISION>'
-            end_marker = '</REEXTRACTION_DECISION>'
-            
-            start_idx = response.find(start_marker)
-            end_idx = response.find(end_marker)
+            # 提取标记内容（结构化输出时没有标记，直接是JSON）
+            marked_content = self._extract_marked(response, '<REEXTRACTION_DECISION>', '</REEXTRACTION_DECISION>')
+            if marked_content is None:
+                marked_content = self._clean_json_response(response)
             
-            if start_idx != -1 and end_idx != -1:
-                marked_content = response[start_idx + len(start_marker):end_idx].strip()
-                data = json.loads(marked_content)
+            if marked_content:
+                data = self._loads_json_object(marked_content)
                 
                 need_reextraction = data.get('need_reextraction', True)
                 reason = data.get('reason', '未知原因')
                 confidence = data.get('confidence', 0.5)
                 
-                print(f"AI判断结果：{'需要' if need_reextraction else '不需要'}重新提取")
-                print(f"判断理由：{reason}")
-                print(f"置信度：{confidence}")
+                logger.info("AI判断结果：%s重新提取", '需要' if need_reextraction else '不需要')
+                logger.debug("判断理由：%s", reason)
+                logger.debug("置信度：%s", confidence)
                 
                 return need_reextraction
                 
         except (json.JSONDecodeError, ValueError) as e:
-            print(f"解析AI判断失败：{e}")
+            logger.warning("解析AI判断失败：%s", e)
         
         # 如果解析失败，使用简单规则作为后备
-        print("AI判断解析失败，使用后备规则")
+        logger.warning("AI判断解析失败，使用后备规则")
         return self._fallback_reextraction_judgment(user_message)
     
     def _fallback_reextraction_judgment(self, user_message: str) -> bool:
@@ -1797,7 +2597,7 @@ class AIAnalyzer:
     
     def _get_default_extraction_targets(self) -> List[ExtractionTarget]:
         """获取默认提取目标（已弃用，完全依赖AI判断）"""
-        print("警告：不应该调用默认提取目标方法，系统应完全依赖AI判断")
+        logger.warning("不应该调用默认提取目标方法，系统应完全依赖AI判断")
         return []
     
     def _generate_smart_extraction_targets_deprecated(self, user_request: str, document_structure: Dict[str, Any]) -> List[ExtractionTarget]:
@@ -1806,11 +2606,12 @@ class AIAnalyzer:
         
         # 分析用户需求关键词
         user_keywords = self._extract_user_keywords(user_request)
-        print(f"用户需求关键词: {user_keywords}")
+        logger.debug("用户需求关键词: %s", user_keywords)
         
         # 基于文档标题结构查找相关章节
         relevant_sections = self._find_relevant_sections(user_keywords, headings)
-        print(f"找到相关章节: {[section['text'] for section in relevant_sections]}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("找到相关章节: %s", [section['text'] for section in relevant_sections])
         
         # 生成提取目标
         extraction_targets = []
@@ -1854,8 +2655,8 @@ class AIAnalyzer:
         # 去重并过滤
         keywords = list(set([kw for kw in all_keywords if len(kw) >= 2]))
         
-        print(f"原始输入: {user_request}")
-        print(f"提取的关键词: {keywords}")
+        logger.debug("原始输入: %s", user_request)
+        logger.debug("提取的关键词: %s", keywords)
         
         return keywords
     
@@ -1863,7 +2664,7 @@ class AIAnalyzer:
         """查找与关键词相关的文档章节"""
         relevant_sections = []
         
-        print(f"在{len(headings)}个标题中搜索关键词: {keywords}")
+        logger.debug("在%s个标题中搜索关键词: %s", len(headings), keywords)
         
         for heading in headings:
             heading_text = heading.get('text', '')
@@ -1879,7 +2680,7 @@ class AIAnalyzer:
                 if keyword_lower in heading_lower:
                     relevance_score += 10
                     matched_keywords.append(keyword)
-                    print(f"  精确匹配: '{keyword}' in '{heading_text}'")
+                    logger.debug("精确匹配: '%s' in '%s'", keyword, heading_text)
                 
                 # 部分字符匹配
                 elif any(char in heading_lower for char in keyword_lower if len(char) > 0):
@@ -1887,7 +2688,7 @@ class AIAnalyzer:
                     if char_matches >= len(keyword_lower) * 0.6:  # 60%字符匹配
                         relevance_score += 5
                         matched_keywords.append(f"{keyword}(部分)")
-                        print(f"  部分匹配: '{keyword}' 在 '{heading_text}' 中匹配了{char_matches}个字符")
+                        logger.debug("部分匹配: '%s' 在 '%s' 中匹配了%s个字符", keyword, heading_text, char_matches)
             
             # 如果相关性分数足够高，添加到相关章节
             if relevance_score > 0:
@@ -1899,9 +2700,10 @@ class AIAnalyzer:
         # 按相关性分数排序
         relevant_sections.sort(key=lambda x: x['relevance_score'], reverse=True)
         
-        print(f"找到{len(relevant_sections)}个相关章节，前10个:")
-        for i, section in enumerate(relevant_sections[:10]):
-            print(f"  {i+1}. {section['text']} (分数:{section['relevance_score']}, 匹配:{section['matched_keywords']})")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("找到%s个相关章节，前10个:", len(relevant_sections))
+            for i, section in enumerate(relevant_sections[:10]):
+                logger.debug("%s. %s (分数:%s, 匹配:%s)", i+1, section['text'], section['relevance_score'], section['matched_keywords'])
         
         # 返回前8个最相关的章节（增加数量以提高覆盖率）
         return relevant_sections[:8]
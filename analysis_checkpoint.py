@@ -0,0 +1,189 @@
+import os
+import glob
+import json
+import time
+import logging
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows开发环境只有单个进程，不需要跨进程认领
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_FILE_PREFIX = 'checkpoint_'
+
+# 当前进程持有的检查点（POSIX记录锁在同一进程内不互斥，需要单独记录）
+_held_paths = set()
+_held_lock = threading.Lock()
+
+
+class AnalysisCheckpoint:
+    """
+    实时分析的检查点 - 任务参数和已完成步骤的产物，保存在用户数据目录（data/<user_id>/）
+
+    与产物缓存接口相同（get/set），作为流水线的checkpoint传入；检查点只属于一个任务，
+    因此使用模拟响应等不进入共享缓存的产物也会保存。任务结束（完成、失败或取消）时删除，
+    进程退出时仍存在的检查点在下次启动时恢复执行（使用了用户API密钥的任务等用户重新提供密钥后恢复），
+    已完成的步骤直接使用保存的产物。
+
+    执行中的任务持有检查点的文件锁，多个worker同时启动时每个中断的任务只会被一个worker认领。
+    使用POSIX记录锁（lockf）而不是flock：进程池fork出的子进程不会继承记录锁，worker退出后锁即释放。
+    检查点中不保存API密钥等凭据（由调用方在内存中持有），文件权限为0600。
+    """
+
+    def __init__(self, path: str, job: Dict[str, Any], artifacts: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.job = job
+        self._artifacts: Dict[str, Any] = artifacts or {}
+        self._lock_fd: Optional[int] = None
+        self._discarded = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def path_for(user_data_folder: str, conversation_id: str) -> str:
+        return os.path.join(user_data_folder, f'{_FILE_PREFIX}{conversation_id}.json')
+
+    @classmethod
+    def create(cls, user_data_folder: str, conversation_id: str, job: Dict[str, Any]) -> 'AnalysisCheckpoint':
+        """为新任务创建检查点（当前进程认领）"""
+        checkpoint = cls(cls.path_for(user_data_folder, conversation_id), dict(job, created_at=time.time()))
+        # 锁文件和检查点在同一目录，认领前目录必须存在
+        os.makedirs(user_data_folder, exist_ok=True)
+        checkpoint.claim()
+        checkpoint._save()
+        return checkpoint
+
+    def claim(self) -> bool:
+        """认领检查点（加非阻塞的排他文件锁），已被其他进程持有时返回False"""
+        if self._lock_fd is not None:
+            return True
+        with _held_lock:
+            if self.path in _held_paths:
+                return False
+            if fcntl is not None:
+                fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+                try:
+                    fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    os.close(fd)
+                    return False
+                self._lock_fd = fd
+            else:
+                self._lock_fd = -1
+            _held_paths.add(self.path)
+        return True
+
+    def release(self):
+        """释放认领（检查点保留，之后可以再次恢复）"""
+        with _held_lock:
+            if self._lock_fd is None:
+                return
+            if self._lock_fd >= 0:
+                os.close(self._lock_fd)
+            self._lock_fd = None
+            _held_paths.discard(self.path)
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取保存的步骤产物，未保存时返回None"""
+        with self._lock:
+            entry = self._artifacts.get(key)
+        return entry.get('value') if entry else None
+
+    def set(self, key: str, value: Any, node: str = '') -> bool:
+        """保存步骤产物（整个检查点原子重写）"""
+        with self._lock:
+            if self._discarded:
+                return False
+            self._artifacts[key] = {'node': node, 'value': value}
+        return self._save()
+
+    def _save(self) -> bool:
+        with self._lock:
+            if self._discarded:
+                return False
+            data = {'job': self.job, 'artifacts': self._artifacts}
+            entry_dir = os.path.dirname(self.path)
+            try:
+                os.makedirs(entry_dir, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=entry_dir, suffix='.tmp')
+                try:
+                    os.chmod(tmp_path, 0o600)
+                    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                        json.dump(data, f, ensure_ascii=False)
+                    os.replace(tmp_path, self.path)
+                except Exception:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+                return True
+            except Exception as e:
+                logger.warning("保存分析检查点失败: %s", e)
+                return False
+
+    def discard(self):
+        """任务结束：删除检查点并释放认领（可重复调用）"""
+        with self._lock:
+            if self._discarded:
+                return
+            self._discarded = True
+            for path in (self.path, self.path + '.lock'):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning("删除分析检查点失败: %s", e)
+        self.release()
+
+    @classmethod
+    def load(cls, path: str) -> Optional['AnalysisCheckpoint']:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return cls(path, data['job'], data.get('artifacts', {}))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("读取分析检查点失败 %s: %s", path, e)
+            return None
+
+
+def claim_checkpoint(path: str) -> Optional[AnalysisCheckpoint]:
+    """
+    认领指定的检查点
+
+    Returns:
+        当前进程认领的检查点；不存在或已被其他任务持有（正在执行）时返回None
+    """
+    if not os.path.exists(path):
+        return None
+    probe = AnalysisCheckpoint(path, {})
+    if not probe.claim():
+        return None
+    # 认领后重新读取：等待认领期间任务可能已经结束并删除了检查点
+    checkpoint = AnalysisCheckpoint.load(path)
+    if checkpoint is None:
+        probe.discard()
+        return None
+    checkpoint._lock_fd = probe._lock_fd
+    return checkpoint
+
+
+def claim_interrupted(data_folder: str) -> List[AnalysisCheckpoint]:
+    """
+    认领所有中断的分析（检查点存在且没有进程持有）
+
+    Returns:
+        当前进程认领的检查点，按创建时间排序
+    """
+    claimed = []
+    for path in glob.glob(os.path.join(data_folder, '*', f'{_FILE_PREFIX}*.json')):
+        checkpoint = claim_checkpoint(path)
+        if checkpoint is not None:
+            claimed.append(checkpoint)
+    claimed.sort(key=lambda checkpoint: checkpoint.job.get('created_at', 0))
+    return claimed
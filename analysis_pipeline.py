@@ -0,0 +1,328 @@
+import inspect
+import marshal
+import hashlib
+import functools
+from dataclasses import asdict
+from typing import Any, Callable, Dict, List, Optional
+
+import analysis_tasks
+import prompt_packer
+import tolerant_json
+import response_schemas
+from async_runner import run_cpu
+from parse_cache import get_default_cache
+from document_parser import default_parser_version
+from document_text import DocumentText
+from heading_index import HeadingIndex
+from content_extractor import ContentExtractor
+from ai_analyzer import AIAnalyzer, AnalysisResult, ExtractedContent, ExtractionTarget, SpeculativeExtraction
+from pipeline import Artifact, Node, Param, Pipeline, Uncached
+
+# 文档分析的七个步骤：解析 → 需求分析 → 内容提取 → 初步分析 → 追加提取判断 → 追加提取 → 最终分析。
+# 各接口共用同一组步骤定义，只在分析方式（普通/增强流式）上有区别；输入未变化的步骤直接复用缓存产物。
+
+
+def _file_fingerprint(file_path: str) -> str:
+    """文件内容摘要（与解析缓存共用按修改时间记忆的摘要）"""
+    cache = get_default_cache()
+    if cache is not None:
+        return cache.file_digest(file_path)
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _analyzer_fingerprint(analyzer: AIAnalyzer) -> List[Any]:
+    """影响AI输出的分析器配置（API密钥不影响结果，不参与）"""
+    return [analyzer.model, analyzer.base_url, analyzer.analysis_mode, analyzer.map_reduce_min_sections,
+            analyzer.prompt_token_budget]
+
+
+def _source_version(*parts: Any) -> str:
+    """
+    步骤版本：实现步骤的提示词模板、响应解析和提取逻辑（函数、类或模块）的源码摘要
+
+    修改提示词或逻辑后已缓存的产物自动失效，不需要手动提升版本；
+    提示词未变化的AI调用仍会命中按提示词摘要缓存的AI响应，不会重新请求。
+    """
+    sha256 = hashlib.sha256()
+    for part in parts:
+        try:
+            sha256.update(inspect.getsource(part).encode('utf-8'))
+        except (OSError, TypeError):
+            # 只部署了字节码时使用函数的字节码
+            functions = [part] if inspect.isfunction(part) else [
+                value for value in vars(part).values() if inspect.isfunction(value)
+            ]
+            for function in functions:
+                sha256.update(marshal.dumps(function.__code__))
+    return sha256.hexdigest()[:16]
+
+
+# 各步骤的实现（参与步骤版本）
+_RESPONSE_PARSING = (
+    AIAnalyzer._extract_marked, AIAnalyzer._loads_json_object, AIAnalyzer._clean_json_response,
+    response_schemas, tolerant_json,
+)
+_CONTENT_EXTRACTION = (ContentExtractor, DocumentText, HeadingIndex)
+_MAP_REDUCE_ANALYSIS = (
+    AIAnalyzer._use_map_reduce, AIAnalyzer.map_reduce_analysis_async, AIAnalyzer._build_section_analysis_prompt,
+    AIAnalyzer._parse_section_analysis, AIAnalyzer._build_reduce_analysis_prompt,
+    AIAnalyzer._parse_enhanced_analysis_result, prompt_packer,
+)
+_COMPREHENSIVE_ANALYSIS = (
+    AIAnalyzer.comprehensive_analysis, AIAnalyzer._build_comprehensive_analysis_prompt,
+    AIAnalyzer._parse_analysis_result, AIAnalyzer._clean_analysis_response, AIAnalyzer._get_default_analysis_result,
+) + _MAP_REDUCE_ANALYSIS + _RESPONSE_PARSING
+_ENHANCED_ANALYSIS = (
+    AIAnalyzer.enhanced_comprehensive_analysis_async, AIAnalyzer._build_enhanced_analysis_prompt,
+    AIAnalyzer._build_analysis_requirements, AIAnalyzer._analyze_request_intent, AIAnalyzer._build_content_summary,
+    AIAnalyzer._build_document_info, AIAnalyzer._create_fallback_enhanced_analysis,
+) + _MAP_REDUCE_ANALYSIS + _RESPONSE_PARSING
+
+_REQUIREMENT_VERSION = _source_version(
+    AIAnalyzer._build_requirement_analysis_prompt, AIAnalyzer._review_requirement_attempt,
+    AIAnalyzer._parse_extraction_targets, *_RESPONSE_PARSING
+)
+_EXTRACTION_VERSION = _source_version(AIAnalyzer.extract_content_by_targets, *_CONTENT_EXTRACTION)
+_JUDGMENT_VERSION = _source_version(
+    AIAnalyzer._build_additional_extraction_judgment_prompt, AIAnalyzer._parse_additional_extraction_decision,
+    AIAnalyzer._additional_extraction_keywords, AIAnalyzer._extract_user_keywords_for_additional_search,
+    *_RESPONSE_PARSING
+)
+_ADDITIONAL_EXTRACTION_VERSION = _source_version(
+    AIAnalyzer._perform_additional_extraction, AIAnalyzer._find_additional_headings_by_structure,
+    AIAnalyzer._rank_additional_candidates, AIAnalyzer._build_document_hierarchy,
+    AIAnalyzer._find_sibling_and_related_headings, AIAnalyzer._find_headings_by_user_intent,
+    AIAnalyzer._analyze_existing_content_patterns, AIAnalyzer._calculate_structure_similarity,
+    AIAnalyzer._extract_intent_keywords, AIAnalyzer._calculate_intent_match,
+    AIAnalyzer._find_additional_relevant_headings, *_CONTENT_EXTRACTION
+)
+
+
+def _decode_contents(data: List[Dict[str, Any]]) -> List[ExtractedContent]:
+    contents = []
+    for item in data:
+        content = ExtractedContent(**item)
+        if content.span is not None:
+            content.span = tuple(content.span)
+        contents.append(content)
+    return contents
+
+
+def _encode_list(items: List[Any]) -> List[Dict[str, Any]]:
+    return [asdict(item) for item in items]
+
+
+PARAMS = [
+    Param('file_path', _file_fingerprint),
+    Param('user_request'),
+    Param('analyzer', _analyzer_fingerprint),
+]
+
+ARTIFACTS = [
+    Artifact('document_structure', dict),
+    Artifact('extraction_targets', list, _encode_list, lambda data: [ExtractionTarget(**item) for item in data]),
+    Artifact('extracted_contents', list, _encode_list, _decode_contents),
+    Artifact('initial_analysis', AnalysisResult, asdict, lambda data: AnalysisResult(**data)),
+    Artifact('need_additional', bool),
+    Artifact('additional_keywords', list),
+    Artifact('additional_contents', list, _encode_list, _decode_contents),
+    Artifact('final_analysis', AnalysisResult, asdict, lambda data: AnalysisResult(**data)),
+]
+
+
+def _unless_mocked(func: Callable[..., Any]) -> Callable[..., Any]:
+    """AI步骤：调用失败后使用了模拟响应时，结果不写入缓存"""
+    @functools.wraps(func)
+    def wrapper(analyzer: AIAnalyzer, **kwargs):
+        before = analyzer.mock_responses
+        result = func(analyzer=analyzer, **kwargs)
+        return result if analyzer.mock_responses == before else Uncached(result)
+    return wrapper
+
+
+def _unless_mocked_async(func: Callable[..., Any]) -> Callable[..., Any]:
+    """_unless_mocked的异步版本"""
+    @functools.wraps(func)
+    async def wrapper(analyzer: AIAnalyzer, **kwargs):
+        before = analyzer.mock_responses
+        result = await func(analyzer=analyzer, **kwargs)
+        return result if analyzer.mock_responses == before else Uncached(result)
+    return wrapper
+
+
+def _stream_to(on_token: Optional[Callable[[int, str], None]], step: int) -> Optional[Callable[[str], None]]:
+    if on_token is None:
+        return None
+    return lambda text: on_token(step, text)
+
+
+# ===== 步骤实现 =====
+
+def _parse(file_path: str) -> Dict[str, Any]:
+    return analysis_tasks.parse_document(file_path)
+
+
+async def _parse_async(file_path: str) -> Dict[str, Any]:
+    # 解析和提取是CPU密集计算，放到进程池中执行，不影响其他分析的AI调用和进度推送
+    return await run_cpu(analysis_tasks.parse_document, file_path)
+
+
+@_unless_mocked
+def _analyze_requirement(analyzer: AIAnalyzer, user_request: str,
+                         document_structure: Dict[str, Any]) -> List[ExtractionTarget]:
+    return analyzer.analyze_user_requirement(user_request, document_structure)
+
+
+@_unless_mocked_async
+async def _analyze_requirement_async(analyzer: AIAnalyzer, user_request: str,
+                                     document_structure: Dict[str, Any]) -> List[ExtractionTarget]:
+    return await analyzer.analyze_user_requirement_async(user_request, document_structure)
+
+
+def _extract(analyzer: AIAnalyzer, extraction_targets: List[ExtractionTarget],
+             document_structure: Dict[str, Any], file_path: str) -> List[ExtractedContent]:
+    return analyzer.extract_content_by_targets(extraction_targets, document_structure, file_path)
+
+
+async def _extract_async(analyzer: AIAnalyzer, extraction_targets: List[ExtractionTarget],
+                         document_structure: Dict[str, Any], file_path: str) -> List[ExtractedContent]:
+    return await run_cpu(analysis_tasks.extract_content_by_targets, extraction_targets, document_structure, file_path)
+
+
+@_unless_mocked
+def _comprehensive_analysis(analyzer: AIAnalyzer, user_request: str, extracted_contents: List[ExtractedContent],
+                            document_structure: Dict[str, Any]) -> AnalysisResult:
+    return analyzer.comprehensive_analysis(user_request, extracted_contents, document_structure)
+
+
+@_unless_mocked_async
+async def _enhanced_analysis_async(analyzer: AIAnalyzer, user_request: str,
+                                   extracted_contents: List[ExtractedContent], document_structure: Dict[str, Any],
+                                   on_token: Optional[Callable[[int, str], None]] = None) -> AnalysisResult:
+    return await analyzer.enhanced_comprehensive_analysis_async(
+        user_request, extracted_contents, document_structure, on_token=_stream_to(on_token, 4)
+    )
+
+
+@_unless_mocked
+def _judge_additional(analyzer: AIAnalyzer, user_request: str, extracted_contents: List[ExtractedContent],
+                      initial_analysis: AnalysisResult, document_structure: Dict[str, Any]):
+    need_additional = analyzer._judge_need_additional_extraction(
+        user_request, extracted_contents, initial_analysis, document_structure
+    )
+    # 判断时AI建议的关键词作为产物传给追加提取，复用缓存的判断结果时关键词保持一致
+    return need_additional, analyzer._additional_extraction_keywords(user_request)
+
+
+@_unless_mocked_async
+async def _judge_additional_async(analyzer: AIAnalyzer, user_request: str,
+                                  extracted_contents: List[ExtractedContent],
+                                  initial_analysis: AnalysisResult, document_structure: Dict[str, Any]):
+    need_additional = await analyzer._judge_need_additional_extraction_async(
+        user_request, extracted_contents, initial_analysis, document_structure
+    )
+    return need_additional, analyzer._additional_extraction_keywords(user_request)
+
+
+def _additional_extraction(analyzer: AIAnalyzer, user_request: str, document_structure: Dict[str, Any],
+                           file_path: str, extracted_contents: List[ExtractedContent],
+                           need_additional: bool, additional_keywords: List[str]) -> List[ExtractedContent]:
+    return analyzer._perform_additional_extraction(
+        user_request, document_structure, file_path, extracted_contents, keywords=additional_keywords
+    )
+
+
+async def _additional_extraction_async(analyzer: AIAnalyzer, user_request: str, document_structure: Dict[str, Any],
+                                       file_path: str, extracted_contents: List[ExtractedContent],
+                                       need_additional: bool, additional_keywords: List[str],
+                                       speculative: Optional[SpeculativeExtraction] = None) -> List[ExtractedContent]:
+    return await analyzer.perform_additional_extraction_async(
+        user_request, document_structure, file_path, extracted_contents,
+        speculative=speculative, keywords=additional_keywords
+    )
+
+
+@_unless_mocked
+def _final_comprehensive_analysis(analyzer: AIAnalyzer, user_request: str, document_structure: Dict[str, Any],
+                                  extracted_contents: List[ExtractedContent],
+                                  additional_contents: List[ExtractedContent],
+                                  initial_analysis: AnalysisResult) -> AnalysisResult:
+    final_analysis = analyzer.comprehensive_analysis(
+        user_request, extracted_contents + additional_contents, document_structure
+    )
+    final_analysis.extracted_data["追加提取"] = f"补充了{len(additional_contents)}个相关章节"
+    return final_analysis
+
+
+@_unless_mocked_async
+async def _final_enhanced_analysis_async(analyzer: AIAnalyzer, user_request: str,
+                                         document_structure: Dict[str, Any],
+                                         extracted_contents: List[ExtractedContent],
+                                         additional_contents: List[ExtractedContent],
+                                         initial_analysis: AnalysisResult,
+                                         on_token: Optional[Callable[[int, str], None]] = None) -> AnalysisResult:
+    return await analyzer.enhanced_comprehensive_analysis_async(
+        user_request, extracted_contents + additional_contents, document_structure,
+        on_token=_stream_to(on_token, 7)
+    )
+
+
+def _build_pipeline(enhanced: bool) -> Pipeline:
+    """
+    构建分析流水线
+
+    Args:
+        enhanced: 使用增强版综合分析（异步执行，支持流式输出），否则使用普通综合分析
+    """
+    if enhanced:
+        version = _source_version(*_ENHANCED_ANALYSIS)
+        analysis = dict(name='enhanced_analysis', run_async=_enhanced_analysis_async, runtime=('on_token',),
+                        version=version)
+        final = dict(name='final_enhanced_analysis', run_async=_final_enhanced_analysis_async, runtime=('on_token',),
+                     version=version)
+    else:
+        version = _source_version(*_COMPREHENSIVE_ANALYSIS)
+        analysis = dict(name='comprehensive_analysis', run=_comprehensive_analysis, version=version)
+        final = dict(name='final_comprehensive_analysis', run=_final_comprehensive_analysis,
+                     version=_source_version(_final_comprehensive_analysis, *_COMPREHENSIVE_ANALYSIS))
+
+    nodes = [
+        # 解析结果已有按文件内容缓存的解析缓存，不再重复写入产物缓存
+        Node('parse', ('file_path',), ('document_structure',), run=_parse, run_async=_parse_async,
+             step=1, version=default_parser_version(), cache=False),
+        Node('requirement_analysis', ('analyzer', 'user_request', 'document_structure'), ('extraction_targets',),
+             run=_analyze_requirement, run_async=_analyze_requirement_async, step=2,
+             version=_REQUIREMENT_VERSION, required=True),
+        Node('extraction', ('analyzer', 'extraction_targets', 'document_structure', 'file_path'),
+             ('extracted_contents',), run=_extract, run_async=_extract_async, step=3,
+             version=_EXTRACTION_VERSION, required=True),
+        Node(inputs=('analyzer', 'user_request', 'extracted_contents', 'document_structure'),
+             outputs=('initial_analysis',), step=4, **analysis),
+        Node('additional_judgment',
+             ('analyzer', 'user_request', 'extracted_contents', 'initial_analysis', 'document_structure'),
+             ('need_additional', 'additional_keywords'),
+             run=_judge_additional, run_async=_judge_additional_async, step=5, version=_JUDGMENT_VERSION),
+        Node('additional_extraction',
+             ('analyzer', 'user_request', 'document_structure', 'file_path', 'extracted_contents',
+              'need_additional', 'additional_keywords'),
+             ('additional_contents',), run=_additional_extraction, run_async=_additional_extraction_async,
+             step=6, version=_ADDITIONAL_EXTRACTION_VERSION, runtime=('speculative',),
+             when=lambda need_additional, **inputs: need_additional,
+             default=lambda **inputs: []),
+        Node(inputs=('analyzer', 'user_request', 'document_structure', 'extracted_contents',
+                     'additional_contents', 'initial_analysis'),
+             outputs=('final_analysis',), step=7,
+             when=lambda additional_contents, **inputs: bool(additional_contents),
+             default=lambda initial_analysis, **inputs: initial_analysis, **final),
+    ]
+    return Pipeline(PARAMS, ARTIFACTS, nodes)
+
+
+# 同步接口使用的流水线（普通综合分析，在请求线程中执行）
+ANALYSIS_PIPELINE = _build_pipeline(enhanced=False)
+# 实时接口使用的流水线（增强分析，流式输出，在后台事件循环中执行）
+REALTIME_ANALYSIS_PIPELINE = _build_pipeline(enhanced=True)
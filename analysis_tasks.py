@@ -0,0 +1,42 @@
+from typing import Any, Dict, List, Optional
+
+import pdf_text
+from parse_cache import configure_default_cache
+from document_parser import DocumentParser
+from ai_analyzer import AIAnalyzer, ExtractedContent, ExtractionTarget
+
+# 在CPU进程池中执行的分析任务（模块级函数，参数和返回值都可以pickle）。
+# 每个任务使用新的解析器/分析器，文档文本从解析缓存读取，工作进程不长期持有文档内容。
+
+
+def init_worker(parse_cache_dir: Optional[str] = None):
+    """工作进程初始化：使用与主进程相同的解析缓存；已经在进程池中，PDF改为串行提取，避免嵌套进程池"""
+    if parse_cache_dir:
+        configure_default_cache(parse_cache_dir)
+    pdf_text.PDF_EXTRACT_WORKERS = 1
+
+
+def parse_document(file_path: str) -> Dict[str, Any]:
+    """解析文档结构（记录字符范围，文档文本写入解析缓存供后续提取使用）"""
+    return DocumentParser().parse_document(file_path, record_spans=True)
+
+
+def extract_content_by_targets(extraction_targets: List[ExtractionTarget], document_structure: Dict[str, Any],
+                               file_path: str) -> List[ExtractedContent]:
+    """根据提取目标提取文档内容"""
+    return AIAnalyzer().extract_content_by_targets(extraction_targets, document_structure, file_path)
+
+
+def prepare_additional_extraction(document_structure: Dict[str, Any], file_path: str,
+                                  existing_contents: List[ExtractedContent]) -> Dict[str, Any]:
+    """追加提取中与关键词无关的部分（结构候选标题及其章节内容），在追加提取判断完成前预先执行"""
+    return AIAnalyzer().prepare_additional_extraction(document_structure, file_path, existing_contents)
+
+
+def perform_additional_extraction(user_request: str, document_structure: Dict[str, Any], file_path: str,
+                                  existing_contents: List[ExtractedContent], keywords: List[str],
+                                  prepared: Optional[Dict[str, Any]] = None) -> List[ExtractedContent]:
+    """按关键词追加提取（关键词由主进程确定，prepared为预先执行的准备结果）"""
+    return AIAnalyzer()._perform_additional_extraction(
+        user_request, document_structure, file_path, existing_contents, keywords=keywords, prepared=prepared
+    )
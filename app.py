@@ -1,14 +1,30 @@
 import os
+import logging
 import json
 import uuid
 import time
+import asyncio
 import threading
 from flask import Flask, request, render_template, jsonify, flash, redirect, url_for, session, Response
 from werkzeug.utils import secure_filename
 from document_parser import DocumentParser
 from ai_analyzer import AIAnalyzer
+from parse_cache import configure_default_cache
+from llm_cache import configure_default_response_cache, get_default_response_cache
+from artifact_cache import configure_default_artifact_cache
 import tempfile
 import shutil
+from logging_config import configure_logging
+import async_runner
+import analysis_tasks
+from async_runner import run_blocking
+from job_scheduler import JobScheduler, QueueFullError
+from pipeline import EmptyArtifactError, PipelineObserver
+from analysis_checkpoint import AnalysisCheckpoint, claim_checkpoint, claim_interrupted
+from analysis_pipeline import ANALYSIS_PIPELINE, REALTIME_ANALYSIS_PIPELINE
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here-change-in-production'
@@ -25,9 +41,37 @@ DATA_FOLDER = 'data'
 if not os.path.exists(DATA_FOLDER):
     os.makedirs(DATA_FOLDER)
 
+# 配置解析缓存：按文件内容哈希共享，所有用户和worker复用同一份解析结果
+PARSE_CACHE_FOLDER = os.path.join(DATA_FOLDER, 'parse_cache')
+configure_default_cache(PARSE_CACHE_FOLDER)
+# 实时分析的文档解析和内容提取在独立的进程池中执行，工作进程使用同一解析缓存
+async_runner.configure_cpu_pool(analysis_tasks.init_worker, (PARSE_CACHE_FOLDER,))
+# AI响应缓存（相同文档、相同需求的重复分析直接返回，不再消耗token）
+LLM_CACHE_PATH = os.path.join(DATA_FOLDER, 'llm_cache.sqlite3')
+configure_default_response_cache(LLM_CACHE_PATH)
+# 分析步骤产物缓存：重新分析时输入未变化的步骤（如文档解析、相同需求的提取）直接复用
+PIPELINE_CACHE_FOLDER = os.path.join(DATA_FOLDER, 'pipeline_cache')
+configure_default_artifact_cache(PIPELINE_CACHE_FOLDER)
+
+# 实时分析任务调度：固定数量的分析同时执行，其余排队，队列满时拒绝
+analysis_scheduler = JobScheduler()
+
 # 全局进度追踪字典
 progress_tracker = {}
+# 进度或流式输出变化时通知SSE流（代替固定间隔轮询）
+progress_condition = threading.Condition()
 analysis_results_store = {}  # 存储分析结果
+analysis_owners = {}  # 实时分析任务所属的用户（只有发起者可以取消）
+analysis_checkpoints = {}  # 未结束的实时分析的检查点
+
+# 最后一个进度订阅（SSE连接）断开后等待多少秒仍无人订阅则自动取消分析（0表示不自动取消）
+ANALYSIS_CANCEL_GRACE = int(os.environ.get('ANALYSIS_CANCEL_GRACE', '15') or 0)
+# SSE心跳间隔（秒），用于及时发现已断开的连接
+SSE_HEARTBEAT_INTERVAL = 10
+# 因服务重启中断、等待用户重新提供API密钥的分析保留多久（秒，从提交时算起），超时后删除检查点（0表示一直保留）
+ANALYSIS_RESUME_TTL = int(os.environ.get('ANALYSIS_RESUME_TTL', str(24 * 3600)) or 0)
+progress_subscribers = {}  # 每个分析当前的SSE连接数
+progress_subscribers_lock = threading.Lock()
 chat_history_store = {}  # 存储聊天记录
 
 def get_user_session_id():
@@ -71,10 +115,10 @@ def save_analysis_result(user_id, conversation_id, data):
         with open(analysis_file, 'w', encoding='utf-8') as f:
             json.dump(analysis_data, f, ensure_ascii=False, indent=2)
         
-        print(f"分析结果已保存: {analysis_file}")
+        logger.debug("分析结果已保存: %s", analysis_file)
         return True
     except Exception as e:
-        print(f"保存分析结果失败: {e}")
+        logger.error("保存分析结果失败: %s", e)
         return False
 
 def save_chat_history(user_id, conversation_id, messages):
@@ -92,10 +136,10 @@ def save_chat_history(user_id, conversation_id, messages):
         with open(chat_file, 'w', encoding='utf-8') as f:
             json.dump(chat_data, f, ensure_ascii=False, indent=2)
         
-        print(f"聊天记录已保存: {chat_file}")
+        logger.debug("聊天记录已保存: %s", chat_file)
         return True
     except Exception as e:
-        print(f"保存聊天记录失败: {e}")
+        logger.error("保存聊天记录失败: %s", e)
         return False
 
 def load_analysis_result(user_id, conversation_id):
@@ -109,7 +153,7 @@ def load_analysis_result(user_id, conversation_id):
                 return json.load(f)
         return None
     except Exception as e:
-        print(f"加载分析结果失败: {e}")
+        logger.error("加载分析结果失败: %s", e)
         return None
 
 def load_chat_history(user_id, conversation_id):
@@ -123,7 +167,7 @@ def load_chat_history(user_id, conversation_id):
                 return json.load(f)
         return None
     except Exception as e:
-        print(f"加载聊天记录失败: {e}")
+        logger.error("加载聊天记录失败: %s", e)
         return None
 
 def update_progress(conversation_id, step, status, message, result=None):
@@ -162,7 +206,272 @@ def update_progress(conversation_id, step, status, message, result=None):
     progress['current_step'] = step
     progress['last_update'] = time.time()
     
-    print(f"进度更新 [{conversation_id}] Step {step}: {status} - {message}")
+    logger.debug("进度更新 [%s] Step %s: %s - %s", conversation_id, step, status, message)
+    notify_progress()
+
+def append_stream_output(conversation_id, step, text):
+    """追加某一步骤中AI流式输出的文本片段，SSE流据此推送增量事件"""
+    progress = progress_tracker.get(conversation_id)
+    if progress is None:
+        return
+    
+    stream_output = progress.setdefault('stream_output', {})
+    stream_output[step] = stream_output.get(step, '') + text
+    notify_progress()
+
+def update_queue_progress(conversation_id, position, wait_seconds):
+    """更新排队状态（步骤0），position为0表示开始执行"""
+    if position == 0:
+        if conversation_id in progress_tracker:
+            update_progress(conversation_id, 0, 'completed', '开始分析')
+        return
+    update_progress(conversation_id, 0, 'queued', f'排队等待中，当前第 {position} 位', {
+        'queue_position': position,
+        'estimated_wait': wait_seconds
+    })
+
+def _mark_cancelled(conversation_id, reason):
+    update_progress(conversation_id, -1, 'cancelled', f'分析已取消（{reason}）')
+    progress_tracker[conversation_id]['status'] = 'cancelled'
+    notify_progress()
+    logger.info("分析已取消 [%s]: %s", conversation_id, reason)
+
+def cancel_analysis(conversation_id, reason):
+    """取消排队中或执行中的实时分析，成功时在进度中标记为已取消"""
+    if not analysis_scheduler.cancel(conversation_id):
+        return False
+    
+    # 排队中被取消的任务不会执行，在这里删除检查点和所属用户
+    analysis_owners.pop(conversation_id, None)
+    checkpoint = analysis_checkpoints.pop(conversation_id, None)
+    if checkpoint is not None:
+        checkpoint.discard()
+    
+    _mark_cancelled(conversation_id, reason)
+    return True
+
+def _subscribe_progress(conversation_id):
+    with progress_subscribers_lock:
+        progress_subscribers[conversation_id] = progress_subscribers.get(conversation_id, 0) + 1
+
+def _unsubscribe_progress(conversation_id):
+    """SSE连接断开：最后一个订阅者离开后，宽限期内无人重新连接则自动取消分析"""
+    with progress_subscribers_lock:
+        remaining = progress_subscribers.get(conversation_id, 1) - 1
+        if remaining > 0:
+            progress_subscribers[conversation_id] = remaining
+            return
+        progress_subscribers.pop(conversation_id, None)
+    
+    if ANALYSIS_CANCEL_GRACE > 0:
+        timer = threading.Timer(ANALYSIS_CANCEL_GRACE, _cancel_if_abandoned, (conversation_id,))
+        timer.daemon = True
+        timer.start()
+
+def _cancel_if_abandoned(conversation_id):
+    with progress_subscribers_lock:
+        if progress_subscribers.get(conversation_id):
+            return
+    cancel_analysis(conversation_id, '页面已关闭')
+
+def notify_progress():
+    """唤醒正在等待进度变化的SSE流"""
+    with progress_condition:
+        progress_condition.notify_all()
+
+def _step_contents(artifacts):
+    """初次提取和追加提取的全部内容"""
+    return artifacts['extracted_contents'] + (artifacts.get('additional_contents') or [])
+
+# 实时分析各步骤的进度文字：(执行中, 完成, 产物为空时的失败信息)
+REALTIME_STEP_MESSAGES = {
+    1: ('正在解析文档结构...', '文档结构解析完成', None),
+    2: ('正在分析用户需求，生成提取目标...', 'AI需求分析完成', 'AI无法理解您的需求或生成提取目标'),
+    3: ('正在从文档中智能提取相关内容...', '内容提取完成', '未能从文档中提取到相关内容'),
+    4: ('正在对提取的内容进行深度AI分析...', '初步分析完成', None),
+    5: ('正在判断是否需要补充更多内容...', '追加提取判断完成', None),
+    6: ('正在搜索并提取额外的相关内容...', '追加提取完成', None),
+    7: ('正在基于完整内容进行最终AI分析...', '最终分析完成', None),
+}
+
+def _realtime_step_result(step, artifacts):
+    """实时进度中各步骤完成时的结果摘要"""
+    if step == 1:
+        document_structure = artifacts['document_structure']
+        return {
+            'total_headings': len(document_structure.get('headings', [])),
+            'document_type': document_structure.get('document_type', '未知')
+        }
+    if step == 2:
+        extraction_targets = artifacts['extraction_targets']
+        return {
+            'targets_count': len(extraction_targets),
+            'targets': [{'title': t.title, 'priority': t.priority} for t in extraction_targets]
+        }
+    if step == 3:
+        extracted_contents = artifacts['extracted_contents']
+        return {
+            'extracted_count': len(extracted_contents),
+            'total_content_length': sum(len(c.content) for c in extracted_contents)
+        }
+    if step == 4:
+        initial_analysis = artifacts['initial_analysis']
+        return {
+            'summary_length': len(initial_analysis.summary),
+            'analysis_points': len(initial_analysis.detailed_analysis),
+            'recommendations_count': len(initial_analysis.recommendations),
+            'confidence_score': initial_analysis.confidence_score,
+            'prompt_stats': initial_analysis.prompt_stats
+        }
+    if step == 5:
+        need_additional = artifacts['need_additional']
+        return {
+            'need_additional': need_additional,
+            'reason': '需要更多信息以全面回答用户问题' if need_additional else '当前提取的内容已足够'
+        }
+    if step == 6:
+        return {'additional_count': len(artifacts['additional_contents'])}
+    final_analysis = artifacts['final_analysis']
+    return {
+        'final_confidence': final_analysis.confidence_score,
+        'total_content_sources': len(_step_contents(artifacts)),
+        'prompt_stats': final_analysis.prompt_stats
+    }
+
+class RealtimeProgressObserver(PipelineObserver):
+    """把流水线的步骤执行情况写入实时进度（SSE推送）"""
+    
+    def __init__(self, conversation_id, runtime):
+        self.conversation_id = conversation_id
+        self.runtime = runtime
+    
+    def on_start(self, node, artifacts):
+        update_progress(self.conversation_id, node.step, 'running', REALTIME_STEP_MESSAGES[node.step][0])
+    
+    def on_complete(self, node, artifacts, cached):
+        message = REALTIME_STEP_MESSAGES[node.step][1]
+        if cached:
+            message += '（复用已有结果）'
+        update_progress(self.conversation_id, node.step, 'completed', message,
+                        _realtime_step_result(node.step, artifacts))
+        
+        if node.step == 3 and not cached:
+            # 追加提取中与关键词无关的部分（结构候选标题的章节内容）与后续AI调用并行预先执行
+            # （提取结果来自缓存时后续步骤通常也已缓存，不再预先执行）
+            self.runtime['speculative'] = artifacts['analyzer'].start_speculative_additional_extraction(
+                artifacts['document_structure'], artifacts['file_path'], artifacts['extracted_contents']
+            )
+        elif node.step == 5 and not artifacts['need_additional']:
+            # 不需要追加提取，取消预先执行的部分，让出进程池
+            speculative = self.runtime.pop('speculative', None)
+            if speculative is not None:
+                speculative.cancel()
+
+# 分步骤接口各步骤的名称、说明和产物为空时的失败信息
+STEPS_LOG_MESSAGES = {
+    1: ('解析文档结构', '正在分析文档标题层级结构...', None),
+    2: ('AI需求分析', '正在分析用户需求，生成提取目标...', 'AI无法理解您的需求或生成提取目标'),
+    3: ('内容提取', '正在根据AI分析结果提取相关内容...', 'AI生成了提取目标，但未能从文档中提取到相关内容'),
+    4: ('初步分析', '正在对提取的内容进行初步AI分析...', None),
+    5: ('追加提取判断', '正在判断是否需要追加提取更多相关内容...', None),
+    6: ('追加提取', '正在搜索并提取额外的相关内容...', None),
+    7: ('最终分析', '正在基于完整内容进行最终AI分析...', None),
+}
+
+def _steps_log_result(step, artifacts):
+    """分步骤接口中各步骤完成时的结果"""
+    if step == 1:
+        document_structure = artifacts['document_structure']
+        return {
+            'total_headings': len(document_structure.get('headings', [])),
+            'document_type': document_structure.get('document_type', '未知')
+        }
+    if step == 2:
+        return {
+            'targets_count': len(artifacts['extraction_targets']),
+            'targets': [
+                {
+                    'title': target.title,
+                    'priority': target.priority,
+                    'description': target.description
+                }
+                for target in artifacts['extraction_targets']
+            ]
+        }
+    if step == 3:
+        return {
+            'extracted_count': len(artifacts['extracted_contents']),
+            'contents': [
+                {
+                    'title': content.title,
+                    'content_length': len(content.content),
+                    'confidence': content.confidence,
+                    'preview': content.content[:200] + '...' if len(content.content) > 200 else content.content
+                }
+                for content in artifacts['extracted_contents']
+            ]
+        }
+    if step == 4:
+        initial_analysis = artifacts['initial_analysis']
+        return {
+            'summary': initial_analysis.summary,
+            'confidence_score': initial_analysis.confidence_score,
+            'analysis_points': len(initial_analysis.detailed_analysis),
+            'recommendations_count': len(initial_analysis.recommendations),
+            'prompt_stats': initial_analysis.prompt_stats
+        }
+    if step == 5:
+        need_additional = artifacts['need_additional']
+        return {
+            'need_additional': need_additional,
+            'reason': '需要更多信息以全面回答用户问题' if need_additional else '当前提取的内容已足够'
+        }
+    if step == 6:
+        return {
+            'additional_count': len(artifacts['additional_contents']),
+            'additional_contents': [
+                {
+                    'title': content.title,
+                    'content_length': len(content.content),
+                    'confidence': content.confidence
+                }
+                for content in artifacts['additional_contents']
+            ]
+        }
+    final_analysis = artifacts['final_analysis']
+    return {
+        'final_confidence': final_analysis.confidence_score,
+        'total_content_sources': len(_step_contents(artifacts)),
+        'prompt_stats': final_analysis.prompt_stats
+    }
+
+class StepsLogObserver(PipelineObserver):
+    """把流水线的步骤执行情况记录为分步骤接口返回的steps列表"""
+    
+    def __init__(self, steps):
+        self.steps = steps
+    
+    def _append(self, node):
+        name, description, _ = STEPS_LOG_MESSAGES[node.step]
+        self.steps.append({
+            'step': node.step,
+            'name': name,
+            'status': 'running',
+            'description': description
+        })
+    
+    def on_start(self, node, artifacts):
+        self._append(node)
+    
+    def on_complete(self, node, artifacts, cached):
+        if not self.steps or self.steps[-1]['step'] != node.step:
+            self._append(node)
+        self.steps[-1].update({
+            'status': 'completed',
+            'result': _steps_log_result(node.step, artifacts)
+        })
+        if cached:
+            self.steps[-1]['cached'] = True
 
 def clean_old_files(user_folder, max_age_hours=24):
     """清理超过指定时间的旧文件"""
@@ -175,7 +484,7 @@ def clean_old_files(user_folder, max_age_hours=24):
                 if file_age > max_age_hours * 3600:  # 转换为秒
                     os.remove(file_path)
     except Exception as e:
-        print(f"清理旧文件失败: {str(e)}")
+        logger.error("清理旧文件失败: %s", e)
 
 def get_user_files_info(user_id):
     """获取用户文件信息"""
@@ -196,7 +505,7 @@ def get_user_files_info(user_id):
                 })
                 total_size += file_size
     except Exception as e:
-        print(f"获取文件信息失败: {str(e)}")
+        logger.error("获取文件信息失败: %s", e)
     
     return {
         'files': files_info,
@@ -252,7 +561,7 @@ def upload_file():
             
             # 解析文档
             parser = DocumentParser()
-            result = parser.parse_document(file_path)
+            result = parser.parse_document(file_path, record_spans=True)
             
             # 注意：现在不立即删除文件，保留供用户管理
             # os.remove(file_path)  # 注释掉这行
@@ -374,7 +683,7 @@ def analyze_document():
                 
                 # 解析文档
                 parser = DocumentParser()
-                result = parser.parse_document(file_path)
+                result = parser.parse_document(file_path, record_spans=True)
                 
                 analysis_time = f"{time.time() - start_time:.2f}s"
                 
@@ -422,48 +731,41 @@ def ai_analyze_document():
         if not os.path.exists(file_path):
             return jsonify({'success': False, 'error': '文件不存在'})
         
-        # 首先获取文档结构
-        parser = DocumentParser()
-        document_structure = parser.parse_document(file_path)
-        
         # 初始化AI分析器
         analyzer = AIAnalyzer(
             api_key=api_key if api_key else None,
             base_url=base_url
         )
         
-        print(f"\n=== 开始AI分析 ===")
-        print(f"用户需求: {user_request}")
-        print(f"文档: {filename}")
-        
-        # 步骤1: 分析用户需求，生成提取目标
-        extraction_targets = analyzer.analyze_user_requirement(
-            user_request, document_structure
-        )
+        logger.info("开始AI分析")
+        logger.info("用户需求: %s", user_request)
+        logger.info("文档: %s", filename)
         
-        # 检查AI是否成功生成提取目标
-        if not extraction_targets:
-            return jsonify({
-                'success': False, 
-                'error': 'AI无法理解您的需求或生成提取目标。请尝试：\n1. 确保API配置正确\n2. 用更具体的表达描述您的需求\n3. 检查文档是否包含相关内容'
+        # 按流水线依次执行解析、需求分析、内容提取和综合分析（含追加提取），输入未变化的步骤复用已有结果
+        try:
+            artifacts = ANALYSIS_PIPELINE.run({
+                'file_path': file_path,
+                'user_request': user_request,
+                'analyzer': analyzer
             })
-        
-        # 步骤2: 根据目标提取内容
-        extracted_contents = analyzer.extract_content_by_targets(
-            extraction_targets, document_structure, file_path
-        )
-        
-        # 检查是否成功提取到内容
-        if not extracted_contents:
+        except EmptyArtifactError as e:
+            # 检查AI是否成功生成提取目标
+            if e.node.step == 2:
+                return jsonify({
+                    'success': False, 
+                    'error': 'AI无法理解您的需求或生成提取目标。请尝试：\n1. 确保API配置正确\n2. 用更具体的表达描述您的需求\n3. 检查文档是否包含相关内容'
+                })
+            
+            # 检查是否成功提取到内容
             return jsonify({
                 'success': False,
-                'error': f'虽然AI生成了{len(extraction_targets)}个提取目标，但未能从文档中提取到相关内容。这可能意味着：\n1. 文档中不包含相关信息\n2. 关键词匹配不准确\n3. 文档结构复杂'
+                'error': f'虽然AI生成了{len(e.artifacts["extraction_targets"])}个提取目标，但未能从文档中提取到相关内容。这可能意味着：\n1. 文档中不包含相关信息\n2. 关键词匹配不准确\n3. 文档结构复杂'
             })
         
-        # 步骤3: 综合分析
-        analysis_result = analyzer.comprehensive_analysis_with_additional_extraction(
-            user_request, extracted_contents, document_structure, file_path
-        )
+        document_structure = artifacts['document_structure']
+        extraction_targets = artifacts['extraction_targets']
+        extracted_contents = artifacts['extracted_contents']
+        analysis_result = artifacts['final_analysis']
         
         # 构建返回结果
         result = {
@@ -500,7 +802,7 @@ def ai_analyze_document():
             }
         }
         
-        print(f"=== AI分析完成 ===")
+        logger.info("AI分析完成")
         
         return jsonify({
             'success': True,
@@ -510,7 +812,7 @@ def ai_analyze_document():
         })
         
     except Exception as e:
-        print(f"AI分析失败: {str(e)}")
+        logger.error("AI分析失败: %s", e)
         return jsonify({'success': False, 'error': f'AI分析失败: {str(e)}'})
 
 @app.route('/api/ai-analyze-steps', methods=['POST'])
@@ -544,191 +846,32 @@ def ai_analyze_document_with_steps():
         }
         
         try:
-            # 步骤1: 解析文档结构
-            steps_result['steps'].append({
-                'step': 1,
-                'name': '解析文档结构',
-                'status': 'running',
-                'description': '正在分析文档标题层级结构...'
-            })
-            
-            parser = DocumentParser()
-            document_structure = parser.parse_document(file_path)
-            
-            steps_result['steps'][-1].update({
-                'status': 'completed',
-                'result': {
-                    'total_headings': len(document_structure.get('headings', [])),
-                    'document_type': document_structure.get('document_type', '未知')
-                }
-            })
-            
-            # 步骤2: AI需求分析
-            steps_result['steps'].append({
-                'step': 2,
-                'name': 'AI需求分析',
-                'status': 'running',
-                'description': '正在分析用户需求，生成提取目标...'
-            })
-            
             analyzer = AIAnalyzer(
                 api_key=api_key if api_key else None,
                 base_url=base_url
             )
             
-            extraction_targets = analyzer.analyze_user_requirement(user_request, document_structure)
-            
-            if not extraction_targets:
-                steps_result['steps'][-1].update({
-                    'status': 'failed',
-                    'error': 'AI无法理解您的需求或生成提取目标'
-                })
-                return jsonify(steps_result)
-            
-            steps_result['steps'][-1].update({
-                'status': 'completed',
-                'result': {
-                    'targets_count': len(extraction_targets),
-                    'targets': [
-                        {
-                            'title': target.title,
-                            'priority': target.priority,
-                            'description': target.description
-                        }
-                        for target in extraction_targets
-                    ]
-                }
-            })
-            
-            # 步骤3: 内容提取
-            steps_result['steps'].append({
-                'step': 3,
-                'name': '内容提取',
-                'status': 'running',
-                'description': '正在根据AI分析结果提取相关内容...'
-            })
-            
-            extracted_contents = analyzer.extract_content_by_targets(
-                extraction_targets, document_structure, file_path
-            )
-            
-            if not extracted_contents:
+            # 按流水线逐步执行，每个步骤的执行情况记录到steps中；输入未变化的步骤复用已有结果
+            try:
+                artifacts = ANALYSIS_PIPELINE.run(
+                    {'file_path': file_path, 'user_request': user_request, 'analyzer': analyzer},
+                    observer=StepsLogObserver(steps_result['steps'])
+                )
+            except EmptyArtifactError as e:
                 steps_result['steps'][-1].update({
                     'status': 'failed',
-                    'error': 'AI生成了提取目标，但未能从文档中提取到相关内容'
+                    'error': STEPS_LOG_MESSAGES[e.node.step][2]
                 })
                 return jsonify(steps_result)
             
-            steps_result['steps'][-1].update({
-                'status': 'completed',
-                'result': {
-                    'extracted_count': len(extracted_contents),
-                    'contents': [
-                        {
-                            'title': content.title,
-                            'content_length': len(content.content),
-                            'confidence': content.confidence,
-                            'preview': content.content[:200] + '...' if len(content.content) > 200 else content.content
-                        }
-                        for content in extracted_contents
-                    ]
-                }
-            })
-            
-            # 步骤4: 初步分析
-            steps_result['steps'].append({
-                'step': 4,
-                'name': '初步分析',
-                'status': 'running',
-                'description': '正在对提取的内容进行初步AI分析...'
-            })
-            
-            initial_analysis = analyzer.comprehensive_analysis(user_request, extracted_contents, document_structure)
-            
-            steps_result['steps'][-1].update({
-                'status': 'completed',
-                'result': {
-                    'summary': initial_analysis.summary,
-                    'confidence_score': initial_analysis.confidence_score,
-                    'analysis_points': len(initial_analysis.detailed_analysis),
-                    'recommendations_count': len(initial_analysis.recommendations)
-                }
-            })
-            
-            # 步骤5: 追加提取判断
-            steps_result['steps'].append({
-                'step': 5,
-                'name': '追加提取判断',
-                'status': 'running',
-                'description': '正在判断是否需要追加提取更多相关内容...'
-            })
-            
-            need_additional = analyzer._judge_need_additional_extraction(
-                user_request, extracted_contents, initial_analysis, document_structure
-            )
-            
-            steps_result['steps'][-1].update({
-                'status': 'completed',
-                'result': {
-                    'need_additional': need_additional,
-                    'reason': '需要更多信息以全面回答用户问题' if need_additional else '当前提取的内容已足够'
-                }
-            })
-            
-            final_analysis = initial_analysis
-            
-            # 步骤6: 追加提取（如果需要）
-            additional_contents = []
-            if need_additional:
-                steps_result['steps'].append({
-                    'step': 6,
-                    'name': '追加提取',
-                    'status': 'running',
-                    'description': '正在搜索并提取额外的相关内容...'
-                })
-                
-                additional_contents = analyzer._perform_additional_extraction(
-                    user_request, document_structure, file_path, extracted_contents
-                )
-                
-                steps_result['steps'][-1].update({
-                    'status': 'completed',
-                    'result': {
-                        'additional_count': len(additional_contents),
-                        'additional_contents': [
-                            {
-                                'title': content.title,
-                                'content_length': len(content.content),
-                                'confidence': content.confidence
-                            }
-                            for content in additional_contents
-                        ]
-                    }
-                })
-                
-                # 步骤7: 最终分析
-                if additional_contents:
-                    steps_result['steps'].append({
-                        'step': 7,
-                        'name': '最终分析',
-                        'status': 'running',
-                        'description': '正在基于完整内容进行最终AI分析...'
-                    })
-                    
-                    all_contents = extracted_contents + additional_contents
-                    final_analysis = analyzer.comprehensive_analysis(user_request, all_contents, document_structure)
-                    final_analysis.extracted_data["追加提取"] = f"补充了{len(additional_contents)}个相关章节"
-                    
-                    steps_result['steps'][-1].update({
-                        'status': 'completed',
-                        'result': {
-                            'final_confidence': final_analysis.confidence_score,
-                            'total_content_sources': len(all_contents)
-                        }
-                    })
+            extraction_targets = artifacts['extraction_targets']
+            extracted_contents = artifacts['extracted_contents']
+            need_additional = artifacts['need_additional']
+            additional_contents = artifacts['additional_contents']
+            final_analysis = artifacts['final_analysis']
             
             # 构建最终结果 - 包含所有内容用于前端显示
-            all_contents = extracted_contents + (additional_contents if additional_contents else [])
+            all_contents = extracted_contents + additional_contents
             
             final_result = {
                 'analysis_result': {
@@ -782,7 +925,7 @@ def ai_analyze_document_with_steps():
             return jsonify(steps_result)
         
     except Exception as e:
-        print(f"分步骤AI分析失败: {e}")
+        logger.error("分步骤AI分析失败: %s", e)
         return jsonify({
             'success': False, 
             'error': f'分步骤AI分析失败: {str(e)}',
@@ -796,38 +939,242 @@ def progress_stream(conversation_id):
     """Server-Sent Events端点，实时推送分析进度"""
     def generate():
         """生成SSE数据流"""
-        last_step = -1
+        last_update = None
+        sent_lengths = {}  # 每个步骤已推送的流式输出长度
+        last_sent = time.time()
         
-        while True:
-            try:
-                if conversation_id in progress_tracker:
-                    progress = progress_tracker[conversation_id]
-                    current_step = progress.get('current_step', 0)
-                    
-                    # 如果有新的进度更新
-                    if current_step > last_step or progress.get('status') == 'completed':
-                        data = {
-                            'step': current_step,
-                            'steps': progress.get('steps', []),
-                            'status': progress.get('status', 'running'),
-                            'timestamp': time.time()
-                        }
+        _subscribe_progress(conversation_id)
+        try:
+            while True:
+                try:
+                    if conversation_id in progress_tracker:
+                        progress = progress_tracker[conversation_id]
+                        finished = progress.get('status') in ('completed', 'cancelled')
                         
-                        yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
-                        last_step = current_step
+                        # 推送AI流式输出的增量文本（token事件）
+                        for step, text in list(progress.get('stream_output', {}).items()):
+                            sent = sent_lengths.get(step, 0)
+                            if len(text) > sent:
+                                token_data = {
+                                    'step': step,
+                                    'text': text[sent:],
+                                    'timestamp': time.time()
+                                }
+                                yield f"event: token\ndata: {json.dumps(token_data, ensure_ascii=False)}\n\n"
+                                sent_lengths[step] = len(text)
+                                last_sent = time.time()
                         
-                        # 如果分析完成，发送完成信号并退出
-                        if progress.get('status') == 'completed':
-                            break
-                
-                time.sleep(0.5)  # 每500ms检查一次
-                
-            except Exception as e:
-                print(f"SSE流错误: {e}")
-                break
+                        current_step = progress.get('current_step', 0)
+                        
+                        # 如果有新的进度更新（包括同一步骤内的状态变化，如排队位置）
+                        if progress.get('last_update') != last_update or finished:
+                            data = {
+                                'step': current_step,
+                                'steps': progress.get('steps', []),
+                                'status': progress.get('status', 'running'),
+                                'timestamp': time.time()
+                            }
+                            
+                            yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+                            last_update = progress.get('last_update')
+                            last_sent = time.time()
+                            
+                            # 如果分析完成或已取消，发送最终状态并退出
+                            if finished:
+                                break
+                    
+                    # 长时间没有数据时发送心跳，连接断开时写入失败，生成器随即结束
+                    if time.time() - last_sent >= SSE_HEARTBEAT_INTERVAL:
+                        yield ": keep-alive\n\n"
+                        last_sent = time.time()
+                    
+                    # 等待进度变化，最长500ms
+                    with progress_condition:
+                        progress_condition.wait(timeout=0.5)
+                    
+                except Exception as e:
+                    logger.error("SSE流错误: %s", e)
+                    break
+        finally:
+            _unsubscribe_progress(conversation_id)
     
     return Response(generate(), mimetype='text/event-stream')
 
+def start_realtime_analysis(checkpoint, api_key=''):
+    """
+    把实时分析提交到分析队列（在后台事件循环中执行，等待AI响应时不占用线程，同时执行的任务数有上限）
+    
+    任务参数来自检查点，每个步骤完成后产物写入检查点，任务结束后删除检查点。
+    API密钥不写入检查点，只由发起请求的进程在内存中持有；服务重启后由用户通过恢复接口重新提供。
+    
+    Returns:
+        排队位置，0表示已开始执行
+    
+    Raises:
+        QueueFullError: 分析队列已满
+    """
+    job = checkpoint.job
+    conversation_id = job['conversation_id']
+    user_id = job['user_id']
+    filename = job['filename']
+    file_path = job['file_path']
+    user_request = job['user_request']
+    base_url = job['base_url']
+    
+    async def perform_analysis():
+        interrupted = False
+        # 运行时参数：AI流式输出写入进度，追加提取的预先执行结果（内容提取完成后由进度回调启动）
+        runtime = {'on_token': lambda step, text: append_stream_output(conversation_id, step, text)}
+        try:
+            analyzer = AIAnalyzer(
+                api_key=api_key if api_key else None,
+                base_url=base_url
+            )
+            
+            # 按流水线逐步执行（解析和提取在进程池中），输入未变化的步骤复用已有结果
+            try:
+                artifacts = await REALTIME_ANALYSIS_PIPELINE.run_async(
+                    {'file_path': file_path, 'user_request': user_request, 'analyzer': analyzer},
+                    runtime=runtime, observer=RealtimeProgressObserver(conversation_id, runtime),
+                    checkpoint=checkpoint
+                )
+            except EmptyArtifactError as e:
+                update_progress(conversation_id, e.node.step, 'failed', REALTIME_STEP_MESSAGES[e.node.step][2])
+                return
+            
+            extraction_targets = artifacts['extraction_targets']
+            final_analysis = artifacts['final_analysis']
+            
+            # 构建最终结果
+            all_contents = _step_contents(artifacts)
+            
+            final_result = {
+                'analysis_result': {
+                    'summary': final_analysis.summary,
+                    'detailed_analysis': final_analysis.detailed_analysis,
+                    'recommendations': final_analysis.recommendations,
+                    'extracted_data': final_analysis.extracted_data,
+                    'confidence_score': final_analysis.confidence_score
+                },
+                'extracted_contents': [
+                    {
+                        'title': content.title,
+                        'content': content.content,
+                        'start_heading': content.start_heading,
+                        'end_heading': content.end_heading,
+                        'confidence': content.confidence
+                    }
+                    for content in all_contents
+                ],
+                'extraction_targets': [
+                    {
+                        'title': target.title,
+                        'keywords': target.keywords,
+                        'priority': target.priority,
+                        'description': target.description
+                    }
+                    for target in extraction_targets
+                ]
+            }
+            
+            # 保存分析结果
+            analysis_data = {
+                'user_request': user_request,
+                'filename': filename,
+                'analysis_result': final_result['analysis_result'],
+                'extracted_contents': final_result['extracted_contents'],
+                'extraction_targets': final_result['extraction_targets'],
+                'steps_log': progress_tracker[conversation_id]['steps']
+            }
+            
+            await run_blocking(save_analysis_result, user_id, conversation_id, analysis_data)
+            
+            # 将结果存储到内存中供前端获取
+            analysis_results_store[conversation_id] = final_result
+            
+            # 标记完成
+            progress_tracker[conversation_id]['status'] = 'completed'
+            progress_tracker[conversation_id]['final_result'] = final_result
+            notify_progress()
+            
+            logger.info("AI分析完成 [%s]", conversation_id)
+            
+        except asyncio.CancelledError:
+            if not analysis_scheduler.cancel_requested(conversation_id):
+                # 不是用户或页面关闭取消的（进程退出时事件循环关闭）：保留检查点，重启后从最后完成的步骤恢复
+                interrupted = True
+                logger.warning("分析 %s 被中断，将在重启后恢复", conversation_id)
+            raise
+        except Exception as e:
+            if async_runner.is_shutting_down():
+                # 进程退出导致的失败：保留检查点，重启后从最后完成的步骤恢复
+                interrupted = True
+                logger.warning("进程退出，分析 %s 将在重启后恢复", conversation_id)
+                return
+            logger.error("后台分析失败: %s", e)
+            update_progress(conversation_id, -1, 'failed', f'分析失败: {str(e)}')
+        finally:
+            # 失败或取消时预先执行的追加提取不会再被采用
+            speculative = runtime.pop('speculative', None)
+            if speculative is not None:
+                speculative.cancel()
+            # 任务已结束（完成、失败或取消），不再需要恢复，也不能再取消
+            analysis_owners.pop(conversation_id, None)
+            analysis_checkpoints.pop(conversation_id, None)
+            if not interrupted:
+                checkpoint.discard()
+    
+    analysis_owners[conversation_id] = user_id
+    analysis_checkpoints[conversation_id] = checkpoint
+    try:
+        return analysis_scheduler.submit(
+            conversation_id, perform_analysis,
+            lambda position, wait: update_queue_progress(conversation_id, position, wait)
+        )
+    except QueueFullError:
+        analysis_owners.pop(conversation_id, None)
+        analysis_checkpoints.pop(conversation_id, None)
+        raise
+
+def resume_interrupted_analyses():
+    """恢复上次进程退出时中断的实时分析，已完成的步骤直接使用检查点中的产物"""
+    for checkpoint in claim_interrupted(DATA_FOLDER):
+        conversation_id = checkpoint.job.get('conversation_id')
+        try:
+            if not os.path.exists(checkpoint.job['file_path']):
+                logger.warning("中断的分析 %s 的文档已不存在，不再恢复", conversation_id)
+                checkpoint.discard()
+                continue
+            if checkpoint.job.get('api_key'):
+                # 旧版本写入了明文密钥的检查点，不再恢复，直接删除
+                logger.warning("中断的分析 %s 的检查点包含API密钥，已删除", conversation_id)
+                update_progress(conversation_id, -1, 'failed', '服务重启导致分析中断，请重新提交分析')
+                checkpoint.discard()
+                continue
+            if checkpoint.job.get('has_api_key'):
+                # API密钥只保存在原进程的内存中：保留检查点，等用户通过恢复接口重新提供密钥后从中断处继续
+                if ANALYSIS_RESUME_TTL and time.time() - checkpoint.job.get('created_at', 0) > ANALYSIS_RESUME_TTL:
+                    logger.warning("中断的分析 %s 等待API密钥已超时，不再恢复", conversation_id)
+                    checkpoint.discard()
+                    continue
+                logger.info("中断的分析 %s 使用了用户的API密钥，等待用户重新提供后恢复", conversation_id)
+                checkpoint.release()
+                update_progress(conversation_id, 0, 'awaiting_credentials', '服务重启导致分析中断，请重新提供API密钥以从中断处继续')
+                progress_tracker[conversation_id]['status'] = 'awaiting_credentials'
+                notify_progress()
+                continue
+            position = start_realtime_analysis(checkpoint)
+        except QueueFullError:
+            # 保留检查点，下次启动时再恢复
+            logger.warning("分析队列已满，中断的分析 %s 暂不恢复", conversation_id)
+            checkpoint.release()
+            continue
+        except Exception as e:
+            logger.error("恢复中断的分析 %s 失败: %s", conversation_id, e)
+            checkpoint.discard()
+            continue
+        logger.info("已恢复中断的分析 [%s]，排队位置 %s", conversation_id, position)
+
 @app.route('/api/ai-analyze-realtime', methods=['POST'])
 def ai_analyze_document_realtime():
     """AI智能分析文档 - 实时进度版本"""
@@ -854,183 +1201,100 @@ def ai_analyze_document_realtime():
         # 生成对话ID
         conversation_id = 'analysis_' + str(int(time.time())) + '_' + str(uuid.uuid4())[:8]
         
-        # 在后台线程中执行分析
-        def perform_analysis():
-            try:
-                # 步骤1: 解析文档结构
-                update_progress(conversation_id, 1, 'running', '正在解析文档结构...')
-                
-                parser = DocumentParser()
-                document_structure = parser.parse_document(file_path)
-                
-                update_progress(conversation_id, 1, 'completed', '文档结构解析完成', {
-                    'total_headings': len(document_structure.get('headings', [])),
-                    'document_type': document_structure.get('document_type', '未知')
-                })
-                
-                # 步骤2: AI需求分析
-                update_progress(conversation_id, 2, 'running', '正在分析用户需求，生成提取目标...')
-                
-                analyzer = AIAnalyzer(
-                    api_key=api_key if api_key else None,
-                    base_url=base_url
-                )
-                
-                extraction_targets = analyzer.analyze_user_requirement(user_request, document_structure)
-                
-                if not extraction_targets:
-                    update_progress(conversation_id, 2, 'failed', 'AI无法理解您的需求或生成提取目标')
-                    return
-                
-                update_progress(conversation_id, 2, 'completed', 'AI需求分析完成', {
-                    'targets_count': len(extraction_targets),
-                    'targets': [{'title': t.title, 'priority': t.priority} for t in extraction_targets]
-                })
-                
-                # 步骤3: 内容提取
-                update_progress(conversation_id, 3, 'running', '正在从文档中智能提取相关内容...')
-                
-                extracted_contents = analyzer.extract_content_by_targets(
-                    extraction_targets, document_structure, file_path
-                )
-                
-                if not extracted_contents:
-                    update_progress(conversation_id, 3, 'failed', '未能从文档中提取到相关内容')
-                    return
-                
-                update_progress(conversation_id, 3, 'completed', '内容提取完成', {
-                    'extracted_count': len(extracted_contents),
-                    'total_content_length': sum(len(c.content) for c in extracted_contents)
-                })
-                
-                # 步骤4: 初步分析
-                update_progress(conversation_id, 4, 'running', '正在对提取的内容进行深度AI分析...')
-                
-                # 改进：使用增强的分析方法
-                initial_analysis = analyzer.enhanced_comprehensive_analysis(
-                    user_request, extracted_contents, document_structure
-                )
-                
-                update_progress(conversation_id, 4, 'completed', '初步分析完成', {
-                    'summary_length': len(initial_analysis.summary),
-                    'analysis_points': len(initial_analysis.detailed_analysis),
-                    'recommendations_count': len(initial_analysis.recommendations),
-                    'confidence_score': initial_analysis.confidence_score
-                })
-                
-                # 步骤5: 追加提取判断
-                update_progress(conversation_id, 5, 'running', '正在判断是否需要补充更多内容...')
-                
-                need_additional = analyzer._judge_need_additional_extraction(
-                    user_request, extracted_contents, initial_analysis, document_structure
-                )
-                
-                update_progress(conversation_id, 5, 'completed', '追加提取判断完成', {
-                    'need_additional': need_additional,
-                    'reason': '需要更多信息以全面回答用户问题' if need_additional else '当前提取的内容已足够'
-                })
-                
-                final_analysis = initial_analysis
-                additional_contents = []
-                
-                # 步骤6: 追加提取（如果需要）
-                if need_additional:
-                    update_progress(conversation_id, 6, 'running', '正在搜索并提取额外的相关内容...')
-                    
-                    additional_contents = analyzer._perform_additional_extraction(
-                        user_request, document_structure, file_path, extracted_contents
-                    )
-                    
-                    update_progress(conversation_id, 6, 'completed', '追加提取完成', {
-                        'additional_count': len(additional_contents)
-                    })
-                    
-                    # 步骤7: 最终分析
-                    if additional_contents:
-                        update_progress(conversation_id, 7, 'running', '正在基于完整内容进行最终AI分析...')
-                        
-                        all_contents = extracted_contents + additional_contents
-                        final_analysis = analyzer.enhanced_comprehensive_analysis(
-                            user_request, all_contents, document_structure
-                        )
-                        
-                        update_progress(conversation_id, 7, 'completed', '最终分析完成', {
-                            'final_confidence': final_analysis.confidence_score,
-                            'total_content_sources': len(all_contents)
-                        })
-                
-                # 构建最终结果
-                all_contents = extracted_contents + additional_contents
-                
-                final_result = {
-                    'analysis_result': {
-                        'summary': final_analysis.summary,
-                        'detailed_analysis': final_analysis.detailed_analysis,
-                        'recommendations': final_analysis.recommendations,
-                        'extracted_data': final_analysis.extracted_data,
-                        'confidence_score': final_analysis.confidence_score
-                    },
-                    'extracted_contents': [
-                        {
-                            'title': content.title,
-                            'content': content.content,
-                            'start_heading': content.start_heading,
-                            'end_heading': content.end_heading,
-                            'confidence': content.confidence
-                        }
-                        for content in all_contents
-                    ],
-                    'extraction_targets': [
-                        {
-                            'title': target.title,
-                            'keywords': target.keywords,
-                            'priority': target.priority,
-                            'description': target.description
-                        }
-                        for target in extraction_targets
-                    ]
-                }
-                
-                # 保存分析结果
-                analysis_data = {
-                    'user_request': user_request,
-                    'filename': filename,
-                    'analysis_result': final_result['analysis_result'],
-                    'extracted_contents': final_result['extracted_contents'],
-                    'extraction_targets': final_result['extraction_targets'],
-                    'steps_log': progress_tracker[conversation_id]['steps']
-                }
-                
-                save_analysis_result(user_id, conversation_id, analysis_data)
-                
-                # 将结果存储到内存中供前端获取
-                analysis_results_store[conversation_id] = final_result
-                
-                # 标记完成
-                progress_tracker[conversation_id]['status'] = 'completed'
-                progress_tracker[conversation_id]['final_result'] = final_result
-                
-                print(f"AI分析完成 [{conversation_id}]")
-                
-            except Exception as e:
-                print(f"后台分析失败: {e}")
-                update_progress(conversation_id, -1, 'failed', f'分析失败: {str(e)}')
-        
-        # 启动后台分析线程
-        analysis_thread = threading.Thread(target=perform_analysis)
-        analysis_thread.daemon = True
-        analysis_thread.start()
-        
-        return jsonify({
-            'success': True,
+        # 任务参数写入检查点（服务重启后据此恢复），提交到分析队列
+        checkpoint = AnalysisCheckpoint.create(get_user_data_folder(user_id), conversation_id, {
             'conversation_id': conversation_id,
-            'message': '分析已开始，请通过SSE监听进度'
+            'user_id': user_id,
+            'filename': filename,
+            'file_path': file_path,
+            'user_request': user_request,
+            'has_api_key': bool(api_key),
+            'base_url': base_url
         })
+        try:
+            position = start_realtime_analysis(checkpoint, api_key)
+        except QueueFullError as e:
+            checkpoint.discard()
+            logger.warning("分析队列已满，拒绝新任务: %s", e)
+            return _queue_full_response(e)
+        
+        return _analysis_started_response(conversation_id, position)
         
     except Exception as e:
-        print(f"启动AI分析失败: {e}")
+        logger.error("启动AI分析失败: %s", e)
         return jsonify({'success': False, 'error': f'启动AI分析失败: {str(e)}'})
 
+def _queue_full_response(error):
+    """分析队列已满：返回429和建议的重试秒数"""
+    response = jsonify({'success': False, 'error': str(error), 'retry_after': error.retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def _analysis_started_response(conversation_id, position):
+    return jsonify({
+        'success': True,
+        'conversation_id': conversation_id,
+        'queue_position': position,
+        'message': '分析已开始，请通过SSE监听进度' if position == 0 else f'分析已进入队列（第{position}位），请通过SSE监听进度'
+    })
+
+@app.route('/api/analysis/<conversation_id>/resume', methods=['POST'])
+def resume_analysis_request(conversation_id):
+    """继续因服务重启而中断的实时分析（重新提供API密钥），已完成的步骤直接使用检查点中的产物"""
+    try:
+        data = request.get_json(silent=True) or {}
+        api_key = data.get('api_key', '')
+        user_id = get_user_session_id()
+        
+        # 检查点在发起者的数据目录中，其他用户无法恢复
+        checkpoint = claim_checkpoint(AnalysisCheckpoint.path_for(get_user_data_folder(user_id), conversation_id))
+        if checkpoint is None:
+            return jsonify({'success': False, 'error': '分析不存在、已结束或正在进行中'})
+        
+        if checkpoint.job.get('has_api_key') and not api_key:
+            checkpoint.release()
+            return jsonify({'success': False, 'error': '请提供API密钥'})
+        
+        if not os.path.exists(checkpoint.job['file_path']):
+            checkpoint.discard()
+            return jsonify({'success': False, 'error': '文档已不存在，请重新上传后提交分析'})
+        
+        # 重新开始记录进度，已完成的步骤会标记为复用已有结果
+        progress_tracker.pop(conversation_id, None)
+        try:
+            position = start_realtime_analysis(checkpoint, api_key)
+        except QueueFullError as e:
+            # 保留检查点，稍后可以再次恢复
+            checkpoint.release()
+            logger.warning("分析队列已满，暂不恢复分析 %s: %s", conversation_id, e)
+            return _queue_full_response(e)
+        
+        logger.info("已按用户请求恢复中断的分析 [%s]，排队位置 %s", conversation_id, position)
+        return _analysis_started_response(conversation_id, position)
+        
+    except Exception as e:
+        logger.error("恢复分析失败: %s", e)
+        return jsonify({'success': False, 'error': f'恢复分析失败: {str(e)}'})
+
+@app.route('/api/analysis/<conversation_id>/cancel', methods=['POST'])
+def cancel_analysis_request(conversation_id):
+    """取消排队中、执行中（进行中的AI请求会被中断）或等待重新提供API密钥的实时分析"""
+    user_id = get_user_session_id()
+    if analysis_owners.get(conversation_id) != user_id:
+        # 等待重新提供API密钥的分析没有在执行，只有检查点
+        checkpoint = claim_checkpoint(AnalysisCheckpoint.path_for(get_user_data_folder(user_id), conversation_id))
+        if checkpoint is None:
+            return jsonify({'success': False, 'error': '分析不存在或已结束'})
+        checkpoint.discard()
+        _mark_cancelled(conversation_id, '用户取消')
+        return jsonify({'success': True, 'message': '分析已取消'})
+    
+    if not cancel_analysis(conversation_id, '用户取消'):
+        return jsonify({'success': False, 'error': '分析已结束，无法取消'})
+    
+    return jsonify({'success': True, 'message': '分析已取消'})
+
 @app.route('/api/analysis-result/<conversation_id>')
 def get_analysis_result(conversation_id):
     """获取分析结果"""
@@ -1080,7 +1344,7 @@ def ai_chat():
             file_path = os.path.join(user_folder, filename)
             if os.path.exists(file_path):
                 parser = DocumentParser()
-                document_info = parser.parse_document(file_path)
+                document_info = parser.parse_document(file_path, record_spans=True)
         
         # 加载分析结果上下文
         analysis_result = load_analysis_result(user_id, conversation_id)
@@ -1126,7 +1390,7 @@ def ai_chat():
         })
         
     except Exception as e:
-        print(f"AI对话失败: {str(e)}")
+        logger.error("AI对话失败: %s", e)
         return jsonify({'success': False, 'error': f'AI对话失败: {str(e)}'})
 
 @app.route('/api/chat-history/<conversation_id>')
@@ -1147,7 +1411,7 @@ def get_chat_history(conversation_id):
                 'error': '聊天记录不存在'
             })
     except Exception as e:
-        print(f"获取聊天历史失败: {e}")
+        logger.error("获取聊天历史失败: %s", e)
         return jsonify({'success': False, 'error': f'获取聊天历史失败: {str(e)}'})
 
 @app.route('/api/user-sessions')
@@ -1192,7 +1456,7 @@ def get_user_sessions():
                                 'has_chat': os.path.exists(chat_file)
                             })
                     except Exception as e:
-                        print(f"读取会话文件失败 {filename}: {e}")
+                        logger.warning("读取会话文件失败 %s: %s", filename, e)
                         continue
         
         # 按最后更新时间倒序排列
@@ -1204,7 +1468,7 @@ def get_user_sessions():
         })
         
     except Exception as e:
-        print(f"获取用户会话失败: {e}")
+        logger.error("获取用户会话失败: %s", e)
         return jsonify({'success': False, 'error': f'获取用户会话失败: {str(e)}'})
 
 @app.route('/api/ai-reanalyze', methods=['POST'])
@@ -1228,27 +1492,20 @@ def ai_reanalyze():
         if not os.path.exists(file_path):
             return jsonify({'success': False, 'error': '文件不存在'})
         
-        # 重新进行AI分析
-        parser = DocumentParser()
-        document_structure = parser.parse_document(file_path)
-        
         analyzer = AIAnalyzer(
             api_key=api_key if api_key else None,
             base_url=base_url
         )
         
-        # 重新分析
-        extraction_targets = analyzer.analyze_user_requirement(
-            new_request, document_structure
-        )
-        
-        extracted_contents = analyzer.extract_content_by_targets(
-            extraction_targets, document_structure, file_path
+        # 重新分析：只执行到初步分析，文档解析等输入未变化的步骤复用已有结果；
+        # 没有生成提取目标或没有提取到内容时仍基于空内容完成分析（与对话中的重新分析一致，不作为失败）
+        artifacts = ANALYSIS_PIPELINE.run(
+            {'file_path': file_path, 'user_request': new_request, 'analyzer': analyzer},
+            targets=('initial_analysis',), allow_empty=True
         )
         
-        analysis_result = analyzer.comprehensive_analysis(
-            new_request, extracted_contents, document_structure
-        )
+        extracted_contents = artifacts['extracted_contents']
+        analysis_result = artifacts['initial_analysis']
         
         # 更新对话上下文
         if conversation_id in analyzer.chat_contexts:
@@ -1281,7 +1538,7 @@ def ai_reanalyze():
         })
         
     except Exception as e:
-        print(f"AI重新分析失败: {str(e)}")
+        logger.error("AI重新分析失败: %s", e)
         return jsonify({'success': False, 'error': f'AI重新分析失败: {str(e)}'})
 
 @app.route('/api/ai-status', methods=['GET'])
@@ -1296,8 +1553,29 @@ def ai_status():
             'intelligent_extraction', 
             'conversation_management',
             'semantic_matching'
-        ]
+        ],
+        'response_cache': get_default_response_cache().stats() if get_default_response_cache() else None,
+        'analysis_queue': analysis_scheduler.stats()
     })
 
+_app_initialized = False
+
+def init_app():
+    """
+    处理请求的进程启动后的初始化：恢复上次进程退出时中断的实时分析
+    
+    进度只保存在执行任务的进程内存中，必须在实际处理请求的进程中调用，不能在导入时执行：
+    gunicorn由gunicorn.conf.py的post_worker_init在每个worker中调用（使用--preload时主进程不处理请求），
+    直接运行时在自动重载启动的子进程中调用。重复调用无效。
+    """
+    global _app_initialized
+    if _app_initialized:
+        return
+    _app_initialized = True
+    resume_interrupted_analyses()
+
 if __name__ == '__main__':
+    # debug模式下由自动重载启动的子进程处理请求，只在子进程中恢复
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        init_app()
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
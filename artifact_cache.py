@@ -0,0 +1,92 @@
+import os
+import time
+import json
+import logging
+import tempfile
+from typing import Any, Optional
+
+from file_cache import CacheDirEvictor, touch_entry
+
+logger = logging.getLogger(__name__)
+
+# 步骤产物的有效期（秒），默认7天，0表示不过期
+PIPELINE_CACHE_TTL = int(os.environ.get('PIPELINE_CACHE_TTL', str(7 * 24 * 3600)) or 0)
+# 产物缓存总大小上限（MB），超过时按最近最少使用淘汰
+PIPELINE_CACHE_MAX_MB = int(os.environ.get('PIPELINE_CACHE_MAX_MB', '512') or 512)
+
+
+class ArtifactCache:
+    """分析步骤产物缓存 - 以步骤输入的摘要为键，存储为JSON文件，跨用户、跨进程共享"""
+
+    def __init__(self, cache_dir: str, ttl: int = PIPELINE_CACHE_TTL,
+                 max_bytes: int = PIPELINE_CACHE_MAX_MB * 1024 * 1024):
+        """
+        初始化产物缓存
+
+        Args:
+            cache_dir: 缓存目录，多个worker可以指向同一目录
+            ttl: 产物有效期（秒），0表示不过期
+            max_bytes: 缓存目录的总大小上限（字节），写入时定期清理过期和最近最少使用的产物
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+        self._evictor = CacheDirEvictor(cache_dir, max_bytes, ttl)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + '.json')
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取缓存的产物（编码后的JSON数据），未命中或已过期时返回None"""
+        entry_path = self._entry_path(key)
+        try:
+            if self.ttl and time.time() - os.path.getmtime(entry_path) > self.ttl:
+                return None
+            with open(entry_path, 'r', encoding='utf-8') as f:
+                value = json.load(f).get('value')
+            touch_entry(entry_path)
+            return value
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("读取步骤产物缓存失败: %s", e)
+            return None
+
+    def set(self, key: str, value: Any, node: str = '') -> bool:
+        """写入产物（先写临时文件再原子替换，保证并发worker读到完整内容），必要时清理缓存目录"""
+        entry_path = self._entry_path(key)
+        entry_dir = os.path.dirname(entry_path)
+
+        try:
+            os.makedirs(entry_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=entry_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump({'node': node, 'value': value}, f, ensure_ascii=False)
+                os.replace(tmp_path, entry_path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        except Exception as e:
+            logger.warning("写入步骤产物缓存失败: %s", e)
+            return False
+
+        self._evictor.maybe_evict()
+        return True
+
+
+_default_cache: Optional[ArtifactCache] = None
+
+
+def configure_default_artifact_cache(cache_dir: str) -> ArtifactCache:
+    """配置进程默认的产物缓存，未显式传入cache的Pipeline都会使用它"""
+    global _default_cache
+    _default_cache = ArtifactCache(cache_dir)
+    return _default_cache
+
+
+def get_default_artifact_cache() -> Optional[ArtifactCache]:
+    """获取进程默认的产物缓存（未配置时为None，即每次都重新执行）"""
+    return _default_cache
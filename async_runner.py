@@ -0,0 +1,140 @@
+import os
+import atexit
+import asyncio
+import logging
+import threading
+from functools import partial
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Coroutine, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# CPU密集任务（文档解析、内容提取）的进程数（0表示使用CPU核数）
+ANALYSIS_CPU_WORKERS = int(os.environ.get('ANALYSIS_CPU_WORKERS', '0') or 0)
+# 阻塞I/O任务（缓存读写、结果保存）的线程数
+ANALYSIS_IO_THREADS = int(os.environ.get('ANALYSIS_IO_THREADS', '32') or 32)
+
+# 进程退出标志：需要在线程池/进程池关闭之前设置，因此注册为threading的退出回调
+# （先于concurrent.futures的退出处理执行），不可用时退回atexit
+_shutting_down = threading.Event()
+getattr(threading, '_register_atexit', atexit.register)(_shutting_down.set)
+
+
+def is_shutting_down() -> bool:
+    """进程是否正在退出（此时后台任务因线程池/进程池拒绝新任务而失败，不代表任务本身失败）"""
+    return _shutting_down.is_set()
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_pid: Optional[int] = None
+_loop_lock = threading.Lock()
+
+
+def _run_loop(loop: asyncio.AbstractEventLoop, ready: threading.Event):
+    asyncio.set_event_loop(loop)
+    ready.set()
+    loop.run_forever()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """获取（必要时启动）进程内共享的后台事件循环，所有异步分析都在这一个线程中调度"""
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid() or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            thread = threading.Thread(target=_run_loop, args=(loop, ready), name='analysis-event-loop', daemon=True)
+            thread.start()
+            ready.wait()
+            _loop = loop
+            _loop_pid = os.getpid()
+            logger.info("后台事件循环已启动")
+        return _loop
+
+
+def submit(coroutine: Coroutine[Any, Any, Any]) -> Future:
+    """把协程提交到后台事件循环执行，返回可在任意线程等待的Future"""
+    future = asyncio.run_coroutine_threadsafe(coroutine, get_loop())
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def _log_failure(future: Future):
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is not None:
+        logger.error("后台协程执行失败: %s", error)
+
+
+_io_executor: Optional[ThreadPoolExecutor] = None
+_cpu_executor: Optional[ProcessPoolExecutor] = None
+_executors_pid: Optional[int] = None
+_cpu_initializer: Tuple[Optional[Callable[..., None]], tuple] = (None, ())
+_executors_lock = threading.Lock()
+
+
+def configure_cpu_pool(initializer: Optional[Callable[..., None]] = None, initargs: tuple = ()):
+    """设置CPU进程池中每个工作进程启动时执行的初始化函数（需在第一次run_cpu之前调用）"""
+    global _cpu_initializer
+    _cpu_initializer = (initializer, initargs)
+
+
+def _check_pid():
+    global _io_executor, _cpu_executor, _executors_pid
+    if _executors_pid != os.getpid():
+        _io_executor = None
+        _cpu_executor = None
+        _executors_pid = os.getpid()
+
+
+def _get_io_executor() -> ThreadPoolExecutor:
+    global _io_executor
+    with _executors_lock:
+        _check_pid()
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(max_workers=ANALYSIS_IO_THREADS, thread_name_prefix='analysis-io')
+        return _io_executor
+
+
+def _get_cpu_executor() -> ProcessPoolExecutor:
+    global _cpu_executor
+    with _executors_lock:
+        _check_pid()
+        if _cpu_executor is None:
+            workers = ANALYSIS_CPU_WORKERS if ANALYSIS_CPU_WORKERS > 0 else (os.cpu_count() or 1)
+            initializer, initargs = _cpu_initializer
+            _cpu_executor = ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs)
+            logger.info("CPU进程池已启动（%s 个进程）", workers)
+        return _cpu_executor
+
+
+def _reset_cpu_executor():
+    global _cpu_executor
+    with _executors_lock:
+        if _cpu_executor is not None:
+            _cpu_executor.shutdown(wait=False)
+        _cpu_executor = None
+
+
+async def run_blocking(func, *args, **kwargs):
+    """在I/O线程池中执行阻塞的函数（缓存读写、文件保存），不阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_io_executor(), partial(func, *args, **kwargs))
+
+
+async def run_cpu(func, *args, **kwargs):
+    """
+    在CPU进程池中执行CPU密集的函数（文档解析、内容提取），不与事件循环争用GIL
+
+    func必须是模块级函数，参数和返回值必须可以pickle；进程池异常时改为在I/O线程池中执行。
+    """
+    loop = asyncio.get_running_loop()
+    call = partial(func, *args, **kwargs)
+    try:
+        return await loop.run_in_executor(_get_cpu_executor(), call)
+    except BrokenProcessPool as e:
+        logger.warning("CPU进程池异常，改为在线程中执行: %s", e)
+        _reset_cpu_executor()
+        return await loop.run_in_executor(_get_io_executor(), call)
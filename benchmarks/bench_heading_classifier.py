@@ -0,0 +1,86 @@
+"""
+标题分类器微基准：对比逐个re.match模式的旧循环与编译后的单次扫描匹配器
+
+用法：
+    python benchmarks/bench_heading_classifier.py [--lines 1000000] [--seed 42]
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document_parser import DocumentParser
+
+
+SAMPLE_LINES = [
+    '第三章 投标人须知',
+    '第二节 评标办法',
+    '第十二条 履约保证金',
+    '1. 项目概况',
+    '2.3 资格要求',
+    '4.1.2 技术参数',
+    '5.2.1.3 验收标准',
+    '一、采购需求',
+    '（二）商务条款',
+    '(三)付款方式',
+    'A. 总体要求',
+    '(B) 售后服务',
+    '投标人应当具备独立承担民事责任的能力，并提供有效的营业执照副本复印件。',
+    '投标保证金金额为人民币50000元，须在投标截止时间前到账。',
+    '本项目不接受联合体投标，中标人不得将项目转包或分包。',
+    '2024年3月15日 9:30',
+    '供应商须知前附表',
+    '',
+]
+
+
+def build_corpus(line_count: int, seed: int):
+    rng = random.Random(seed)
+    return [rng.choice(SAMPLE_LINES) for _ in range(line_count)]
+
+
+def legacy_classify(parser: DocumentParser, line: str) -> int:
+    """旧实现：依次尝试未编译的主要模式和次要模式"""
+    for level, pattern in enumerate(parser.heading_patterns, 1):
+        if re.match(pattern, line):
+            return min(level, 7)
+    for level, pattern in enumerate(parser.secondary_patterns, 5):
+        if re.match(pattern, line):
+            return min(level, 7)
+    return 0
+
+
+def run(line_count: int, seed: int):
+    parser = DocumentParser()
+    classifier = parser.heading_classifier
+    corpus = build_corpus(line_count, seed)
+
+    start = time.perf_counter()
+    legacy_levels = [legacy_classify(parser, line) for line in corpus]
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    classify = classifier.classify
+    compiled_levels = [classify(line) for line in corpus]
+    compiled_seconds = time.perf_counter() - start
+
+    if legacy_levels != compiled_levels:
+        raise SystemExit("结果不一致：编译后的分类器与旧实现判断的标题级别不同")
+
+    headings = sum(1 for level in compiled_levels if level)
+    print(f"语料行数: {line_count}（其中标题 {headings} 行）")
+    print(f"旧实现（逐个re.match）: {legacy_seconds:.2f}s, {line_count / legacy_seconds:,.0f} 行/秒")
+    print(f"编译分类器（单次扫描）: {compiled_seconds:.2f}s, {line_count / compiled_seconds:,.0f} 行/秒")
+    print(f"加速比: {legacy_seconds / compiled_seconds:.1f}x")
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='标题分类器微基准')
+    arg_parser.add_argument('--lines', type=int, default=1000000, help='语料行数')
+    arg_parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    args = arg_parser.parse_args()
+    run(args.lines, args.seed)
@@ -1,20 +1,54 @@
 import os
+import logging
 import re
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from document_parser import DocumentParser
-import PyPDF2
-from docx import Document
+from document_text import DocumentText
+from heading_index import HeadingIndex
+
+logger = logging.getLogger(__name__)
 
 class ContentExtractor:
     """内容提取器 - 根据标题和关键词提取文档内容"""
     
     def __init__(self):
         self.parser = DocumentParser()
+        # 已加载的文档文本，同一文档的多个提取目标只读取一次文件
+        self._document_texts: Dict[Tuple, DocumentText] = {}
+    
+    def load_document_text(self, document_path: str,
+                           document_structure: Optional[Dict[str, Any]] = None) -> Optional[DocumentText]:
+        """
+        加载文档文本（按路径、大小和修改时间复用已加载的结果）
+        
+        解析结果带有cache_key（parse_document使用record_spans）时，优先从解析缓存读取文本，不再访问原文件
+        """
+        cache_key = (document_structure or {}).get('cache_key')
+        cache = self.parser.cache
+        if cache_key and cache:
+            memo_key = ('parse_cache', cache_key)
+            if memo_key not in self._document_texts:
+                data = cache.get_sidecar(cache_key, 'text')
+                if data is not None:
+                    self._document_texts[memo_key] = DocumentText.from_dict(data)
+            if memo_key in self._document_texts:
+                return self._document_texts[memo_key]
+        
+        try:
+            stat = os.stat(document_path)
+            memo_key = (os.path.abspath(document_path), stat.st_size, stat.st_mtime_ns)
+            if memo_key not in self._document_texts:
+                self._document_texts[memo_key] = DocumentText.load(document_path)
+            return self._document_texts[memo_key]
+        except Exception as e:
+            logger.warning("文档文本加载失败: %s", e)
+            return None
         
     def extract_content_by_title_and_keywords(self, document_path: str, 
                                             document_structure: Dict[str, Any],
                                             target_title: str,
-                                            keywords: List[str]) -> Optional[Dict[str, Any]]:
+                                            keywords: List[str],
+                                            document_text: Optional[DocumentText] = None) -> Optional[Dict[str, Any]]:
         """
         根据目标标题和关键词提取文档内容
         
@@ -23,89 +57,61 @@ class ContentExtractor:
             document_structure: 文档结构信息
             target_title: 目标标题
             keywords: 关键词列表
+            document_text: 已加载的文档文本（为空时从document_path加载）
             
         Returns:
             提取的内容信息，包含content, start_heading, end_heading, confidence
         """
-        print(f"\n--- 提取目标: {target_title} ---")
-        print(f"关键词: {', '.join(keywords)}")
-        
-        file_extension = os.path.splitext(document_path)[1].lower()
-        
-        if file_extension == '.pdf':
-            return self._extract_from_pdf(document_path, document_structure, target_title, keywords)
-        elif file_extension in ['.doc', '.docx']:
-            return self._extract_from_docx(document_path, document_structure, target_title, keywords)
-        else:
-            print(f"不支持的文件格式: {file_extension}")
+        logger.debug("提取目标: %s", target_title)
+        logger.debug("关键词: %s", ', '.join(keywords))
+
+        document_text = self._document_text_for(document_path, document_structure, document_text)
+        if document_text is None:
             return None
-    
-    def _extract_from_pdf(self, document_path: str, document_structure: Dict[str, Any],
-                         target_title: str, keywords: List[str]) -> Optional[Dict[str, Any]]:
-        """从PDF文档中提取内容"""
-        try:
-            with open(document_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                # 提取所有文本内容
-                full_text = ""
-                page_texts = []
-                
-                for page_num, page in enumerate(pdf_reader.pages):
-                    try:
-                        page_text = page.extract_text()
-                        page_texts.append({
-                            'page_num': page_num + 1,
-                            'text': page_text
-                        })
-                        full_text += page_text + "\n"
-                    except Exception as e:
-                        print(f"提取第{page_num + 1}页失败: {e}")
-                        continue
-                
-                # 基于标题结构和关键词提取内容
-                return self._extract_content_by_structure_and_keywords(
-                    full_text, page_texts, document_structure, target_title, keywords
-                )
-                
-        except Exception as e:
-            print(f"PDF内容提取失败: {e}")
+
+        # 基于标题结构和关键词提取内容（标题偏移索引按文档缓存，多个提取目标共用）
+        return self._extract_content_by_structure_and_keywords(
+            document_text.full_text, document_text.text_parts, document_structure, target_title, keywords,
+            locator=document_text.heading_index(document_structure.get('headings', []))
+        )
+
+    def extract_content_by_exact_title(self, document_path: str,
+                                       document_structure: Dict[str, Any],
+                                       target_title: str,
+                                       document_text: Optional[DocumentText] = None) -> Optional[Dict[str, Any]]:
+        """
+        只按标题精确匹配提取内容（extract_content_by_title_and_keywords的第一个策略）
+
+        精确匹配与关键词无关，可以在关键词确定前预先提取；未匹配时返回None，
+        调用方应再使用extract_content_by_title_and_keywords按关键词继续查找。
+        """
+        document_text = self._document_text_for(document_path, document_structure, document_text)
+        if document_text is None:
             return None
-    
-    def _extract_from_docx(self, document_path: str, document_structure: Dict[str, Any],
-                          target_title: str, keywords: List[str]) -> Optional[Dict[str, Any]]:
-        """从DOCX文档中提取内容"""
-        try:
-            doc = Document(document_path)
-            
-            # 提取所有段落文本
-            full_text = ""
-            paragraphs_info = []
-            
-            for i, para in enumerate(doc.paragraphs):
-                text = para.text.strip()
-                if text:
-                    paragraphs_info.append({
-                        'index': i,
-                        'text': text,
-                        'style': para.style.name if para.style else 'Normal'
-                    })
-                    full_text += text + "\n"
-            
-            # 基于标题结构和关键词提取内容
-            return self._extract_content_by_structure_and_keywords(
-                full_text, paragraphs_info, document_structure, target_title, keywords
-            )
-            
-        except Exception as e:
-            print(f"DOCX内容提取失败: {e}")
+
+        headings = document_structure.get('headings', [])
+        return self._find_content_by_exact_title_match(
+            document_text.full_text, headings, target_title, [], document_text.heading_index(headings)
+        )
+
+    def _document_text_for(self, document_path: str, document_structure: Dict[str, Any],
+                           document_text: Optional[DocumentText]) -> Optional[DocumentText]:
+        """检查文件格式并取得文档文本（未传入时加载）"""
+        file_extension = os.path.splitext(document_path)[1].lower()
+        if file_extension not in ['.pdf', '.doc', '.docx']:
+            logger.warning("不支持的文件格式: %s", file_extension)
             return None
+
+        if document_text is None:
+            document_text = self.load_document_text(document_path, document_structure)
+        return document_text
     
     def _extract_content_by_structure_and_keywords(self, full_text: str, 
                                                  text_parts: List[Dict],
                                                  document_structure: Dict[str, Any],
                                                  target_title: str,
-                                                 keywords: List[str]) -> Optional[Dict[str, Any]]:
+                                                 keywords: List[str],
+                                                 locator: Optional[HeadingIndex] = None) -> Optional[Dict[str, Any]]:
         """
         基于文档结构和关键词提取内容
         
@@ -115,51 +121,55 @@ class ContentExtractor:
             document_structure: 文档结构
             target_title: 目标标题
             keywords: 关键词列表
+            locator: 标题偏移索引（为空时按需构建）
             
         Returns:
             提取的内容信息
         """
         headings = document_structure.get('headings', [])
+        if locator is None:
+            locator = HeadingIndex(full_text, headings)
         
         # 策略1: 精确匹配标题
         exact_match_result = self._find_content_by_exact_title_match(
-            full_text, headings, target_title, keywords
+            full_text, headings, target_title, keywords, locator
         )
         if exact_match_result:
-            print(f"✓ 通过精确标题匹配找到内容")
+            logger.debug("✓ 通过精确标题匹配找到内容")
             return exact_match_result
         
         # 策略2: 模糊匹配标题
         fuzzy_match_result = self._find_content_by_fuzzy_title_match(
-            full_text, headings, target_title, keywords
+            full_text, headings, target_title, keywords, locator
         )
         if fuzzy_match_result:
-            print(f"✓ 通过模糊标题匹配找到内容")
+            logger.debug("✓ 通过模糊标题匹配找到内容")
             return fuzzy_match_result
         
         # 策略3: 关键词匹配
         keyword_match_result = self._find_content_by_keywords(
-            full_text, headings, keywords
+            full_text, headings, keywords, locator
         )
         if keyword_match_result:
-            print(f"✓ 通过关键词匹配找到内容")
+            logger.debug("✓ 通过关键词匹配找到内容")
             return keyword_match_result
         
         # 策略4: 智能语义匹配
         semantic_match_result = self._find_content_by_semantic_match(
-            full_text, headings, target_title, keywords
+            full_text, headings, target_title, keywords, locator
         )
         if semantic_match_result:
-            print(f"✓ 通过语义匹配找到内容")
+            logger.debug("✓ 通过语义匹配找到内容")
             return semantic_match_result
         
-        print(f"✗ 未找到匹配的内容")
+        logger.debug("✗ 未找到匹配的内容")
         return None
     
     def _find_content_by_exact_title_match(self, full_text: str, headings: List[Dict],
-                                         target_title: str, keywords: List[str]) -> Optional[Dict[str, Any]]:
+                                         target_title: str, keywords: List[str],
+                                         locator: Optional[HeadingIndex] = None) -> Optional[Dict[str, Any]]:
         """通过精确标题匹配查找内容"""
-        print(f"尝试精确匹配标题: '{target_title}'")
+        logger.debug("尝试精确匹配标题: '%s'", target_title)
         
         # 首先尝试完全匹配
         for i, heading in enumerate(headings):
@@ -170,9 +180,9 @@ class ContentExtractor:
             heading_clean = re.sub(r'[\s\u3000]+', '', heading_text.lower())
             
             if title_clean == heading_clean:
-                print(f"✓ 找到完全匹配的标题: '{heading_text}'")
+                logger.debug("✓ 找到完全匹配的标题: '%s'", heading_text)
                 return self._extract_content_between_headings(
-                    full_text, headings, i, heading_text
+                    full_text, headings, i, heading_text, locator
                 )
         
         # 其次尝试包含匹配（target_title包含在heading_text中，或vice versa）
@@ -185,18 +195,19 @@ class ContentExtractor:
             
             if len(target_core) >= 3 and len(heading_core) >= 3:
                 if target_core.lower() in heading_core.lower() or heading_core.lower() in target_core.lower():
-                    print(f"✓ 找到包含匹配的标题: '{heading_text}' (目标核心: '{target_core}')")
+                    logger.debug("✓ 找到包含匹配的标题: '%s' (目标核心: '%s')", heading_text, target_core)
                     return self._extract_content_between_headings(
-                        full_text, headings, i, heading_text
+                        full_text, headings, i, heading_text, locator
                     )
         
-        print(f"✗ 未找到精确匹配的标题")
+        logger.debug("✗ 未找到精确匹配的标题")
         return None
     
     def _find_content_by_fuzzy_title_match(self, full_text: str, headings: List[Dict],
-                                         target_title: str, keywords: List[str]) -> Optional[Dict[str, Any]]:
+                                         target_title: str, keywords: List[str],
+                                         locator: Optional[HeadingIndex] = None) -> Optional[Dict[str, Any]]:
         """通过模糊标题匹配查找内容"""
-        print(f"尝试模糊匹配标题: '{target_title}'")
+        logger.debug("尝试模糊匹配标题: '%s'", target_title)
         best_match_score = 0
         best_match_index = -1
         best_heading_text = ""
@@ -214,18 +225,19 @@ class ContentExtractor:
                 best_heading_text = heading_text
         
         if best_match_index >= 0:
-            print(f"✓ 找到最佳匹配标题: '{best_heading_text}' (分数: {best_match_score:.3f})")
+            logger.debug("✓ 找到最佳匹配标题: '%s' (分数: %.3f)", best_heading_text, best_match_score)
             return self._extract_content_between_headings(
-                full_text, headings, best_match_index, best_heading_text
+                full_text, headings, best_match_index, best_heading_text, locator
             )
         
-        print(f"✗ 模糊匹配未找到合适的标题")
+        logger.debug("✗ 模糊匹配未找到合适的标题")
         return None
     
     def _find_content_by_keywords(self, full_text: str, headings: List[Dict],
-                                keywords: List[str]) -> Optional[Dict[str, Any]]:
+                                keywords: List[str],
+                                locator: Optional[HeadingIndex] = None) -> Optional[Dict[str, Any]]:
         """通过关键词匹配查找内容"""
-        print(f"尝试关键词匹配: {keywords}")
+        logger.debug("尝试关键词匹配: %s", keywords)
         
         # 策略1: 在标题中查找包含关键词的章节
         best_heading_score = 0
@@ -246,13 +258,13 @@ class ContentExtractor:
         
         # 如果找到包含关键词的标题，提取该标题下的内容
         if best_heading_score >= 1:  # 至少包含1个关键词
-            print(f"✓ 找到包含{best_heading_score}个关键词的标题: '{best_heading_text}'")
+            logger.debug("✓ 找到包含%s个关键词的标题: '%s'", best_heading_score, best_heading_text)
             return self._extract_content_between_headings(
-                full_text, headings, best_heading_index, best_heading_text
+                full_text, headings, best_heading_index, best_heading_text, locator
             )
         
         # 策略2: 如果标题中没有找到，在文档内容中查找关键词密集区域
-        print("在标题中未找到关键词，搜索内容中的关键词密集区域...")
+        logger.debug("在标题中未找到关键词，搜索内容中的关键词密集区域...")
         lines = full_text.split('\n')
         best_region_start = -1
         best_region_score = 0
@@ -271,20 +283,23 @@ class ContentExtractor:
             end_line = min(len(lines), best_region_start + 50)
             
             content = '\n'.join(lines[start_line:end_line])
+            region_start = sum(len(line) + 1 for line in lines[:start_line])
             
-            print(f"✓ 找到关键词密集区域（第{best_region_start + 1}行附近，包含{best_region_score}个关键词）")
+            logger.debug("✓ 找到关键词密集区域（第%s行附近，包含%s个关键词）", best_region_start + 1, best_region_score)
             return {
                 'content': content,
                 'start_heading': f"关键词匹配区域（第{best_region_start + 1}行附近）",
                 'end_heading': f"区域结束（第{end_line}行）",
-                'confidence': 0.6 + (best_region_score * 0.1)
+                'confidence': 0.6 + (best_region_score * 0.1),
+                'span': (region_start, region_start + len(content))
             }
         
-        print(f"✗ 关键词匹配未找到相关内容")
+        logger.debug("✗ 关键词匹配未找到相关内容")
         return None
     
     def _find_content_by_semantic_match(self, full_text: str, headings: List[Dict],
-                                      target_title: str, keywords: List[str]) -> Optional[Dict[str, Any]]:
+                                      target_title: str, keywords: List[str],
+                                      locator: Optional[HeadingIndex] = None) -> Optional[Dict[str, Any]]:
         """通过语义匹配查找内容（基于规则的简单实现）"""
         # 创建语义匹配词典
         semantic_groups = {
@@ -309,147 +324,118 @@ class ContentExtractor:
             extended_keywords = keywords + target_group
             
             # 基于扩展关键词重新搜索
-            return self._find_content_by_keywords(full_text, headings, extended_keywords)
+            return self._find_content_by_keywords(full_text, headings, extended_keywords, locator)
         
         return None
     
     def _extract_content_between_headings(self, full_text: str, headings: List[Dict],
-                                        heading_index: int, heading_text: str) -> Dict[str, Any]:
-        """提取指定标题到下一个同级或更高级标题之间的内容"""
-        print(f"开始提取标题内容: '{heading_text}'")
+                                        heading_index: int, heading_text: str,
+                                        locator: Optional[HeadingIndex] = None) -> Dict[str, Any]:
+        """
+        提取指定标题到下一个同级或更高级标题之间的内容
         
-        current_heading = headings[heading_index]
-        current_level = current_heading['level']
+        标题位置优先从标题偏移索引中获取（一次扫描定位所有标题），索引未能定位时再使用宽松匹配
+        """
+        logger.debug("开始提取标题内容: '%s'", heading_text)
         
-        # 找到下一个同级或更高级的标题
-        next_heading_text = ""
-        next_heading_index = -1
+        if locator is None:
+            locator = HeadingIndex(full_text, headings)
         
-        for i in range(heading_index + 1, len(headings)):
-            if headings[i]['level'] <= current_level:
-                next_heading_text = headings[i]['text']
-                next_heading_index = i
-                break
+        # 找到下一个同级或更高级的标题
+        next_heading_index = locator.next_boundary(heading_index)
+        next_heading_text = headings[next_heading_index]['text'] if next_heading_index >= 0 else ""
         
-        print(f"下一个标题: '{next_heading_text}' (索引: {next_heading_index})")
+        logger.debug("下一个标题: '%s' (索引: %s)", next_heading_text, next_heading_index)
         
-        # 策略1: 尝试多种标题匹配方式
-        heading_match = None
+        # 策略1: 从标题偏移索引中获取位置（忽略大小写的精确匹配）
         start_pos = -1
-        
-        # 方式1: 精确匹配（转义特殊字符）
-        try:
-            heading_pattern = re.escape(heading_text.strip())
-            heading_match = re.search(heading_pattern, full_text, re.IGNORECASE)
-            if heading_match:
-                start_pos = heading_match.end()
-                print(f"✓ 精确匹配成功，起始位置: {start_pos}")
-        except:
-            pass
+        heading_span = locator.span(heading_index)
+        if heading_span:
+            start_pos = heading_span[1]
+            logger.debug("✓ 精确匹配成功，起始位置: %s", start_pos)
         
         # 方式2: 部分匹配（去除特殊字符）
-        if not heading_match:
-            # 创建更宽松的匹配模式
-            clean_heading = re.sub(r'[（）\(\)\[\]【】《》""''`~!@#$%^&*+=|\\:;\"\'<>,.?/]', '', heading_text).strip()
-            words = clean_heading.split()
-            if words:
-                # 使用第一个有意义的词
-                for word in words:
-                    if len(word) >= 2:  # 至少2个字符
-                        pattern = re.escape(word)
-                        matches = list(re.finditer(pattern, full_text, re.IGNORECASE))
-                        for match in matches:
-                            # 检查匹配位置前后的上下文是否像标题
-                            context_start = max(0, match.start() - 20)
-                            context_end = min(len(full_text), match.end() + 20)
-                            context = full_text[context_start:context_end]
-                            
-                            # 简单判断：如果前面有换行符，可能是标题
-                            if '\n' in full_text[context_start:match.start()]:
-                                heading_match = match
-                                start_pos = match.start()
-                                print(f"✓ 部分匹配成功（词汇: '{word}'），起始位置: {start_pos}")
-                                break
-                        if heading_match:
-                            break
-        
-        # 方式3: 关键词组合匹配
-        if not heading_match:
-            # 提取标题中的关键词
-            keywords = re.findall(r'[\u4e00-\u9fff]{2,}', heading_text)  # 提取中文词汇
-            if keywords:
-                # 查找包含多个关键词的行
-                lines = full_text.split('\n')
-                for i, line in enumerate(lines):
-                    line_lower = line.lower()
-                    heading_lower = heading_text.lower()
-                    
-                    # 计算关键词匹配数
-                    keyword_matches = sum(1 for kw in keywords if kw.lower() in line_lower)
-                    
-                    # 如果匹配了足够多的关键词，认为找到了标题
-                    if keyword_matches >= min(2, len(keywords)):  # 至少匹配2个关键词或全部关键词
-                        # 计算该行在full_text中的位置
-                        line_start = full_text.find(line)
-                        if line_start >= 0:
-                            start_pos = line_start + len(line)
-                            print(f"✓ 关键词匹配成功（匹配{keyword_matches}个关键词），起始位置: {start_pos}")
-                            break
+        if start_pos < 0:
+            start_pos = self._locate_heading_loosely(full_text, heading_text)
         
         if start_pos < 0:
-            print(f"✗ 未找到标题 '{heading_text}' 在文档中的位置")
+            logger.debug("✗ 未找到标题 '%s' 在文档中的位置", heading_text)
             return None
         
         # 找到结束位置
         end_pos = len(full_text)  # 默认到文档结尾
         
         if next_heading_text:
-            # 寻找下一个标题的位置
-            next_match = None
-            
-            # 方式1: 精确匹配下一个标题
-            try:
-                next_pattern = re.escape(next_heading_text.strip())
-                next_match = re.search(next_pattern, full_text[start_pos:], re.IGNORECASE)
-            except:
-                pass
-            
-            # 方式2: 部分匹配下一个标题
-            if not next_match:
+            # 方式1: 下一个标题在索引中的位置（需位于起始位置之后）
+            section_end = locator.section_end(heading_index, start_pos)
+            if section_end is not None:
+                end_pos = section_end
+            else:
+                # 方式2: 部分匹配下一个标题
                 next_clean = re.sub(r'[（）\(\)\[\]【】《》""''`~!@#$%^&*+=|\\:;\"\'<>,.?/]', '', next_heading_text).strip()
-                next_words = next_clean.split()
-                if next_words:
-                    for word in next_words:
-                        if len(word) >= 2:
-                            pattern = re.escape(word)
-                            next_match = re.search(pattern, full_text[start_pos:], re.IGNORECASE)
-                            if next_match:
-                                break
+                for word in next_clean.split():
+                    if len(word) >= 2:
+                        next_match = re.compile(re.escape(word), re.IGNORECASE).search(full_text, start_pos)
+                        if next_match:
+                            end_pos = next_match.start()
+                            break
             
-            if next_match:
-                end_pos = start_pos + next_match.start()
-                print(f"✓ 找到结束位置: {end_pos} (下一个标题: '{next_heading_text}')")
+            if end_pos < len(full_text):
+                logger.debug("✓ 找到结束位置: %s (下一个标题: '%s')", end_pos, next_heading_text)
         
         # 提取内容
         content = full_text[start_pos:end_pos].strip()
         
         if not content:
-            print(f"✗ 提取的内容为空")
+            logger.debug("✗ 提取的内容为空")
             return None
         
         # 清理内容
         content = self._clean_extracted_content(content)
         
-        print(f"✓ 成功提取内容: {len(content)} 字符")
-        print(f"内容预览: {content[:100]}...")
+        logger.debug("✓ 成功提取内容: %s 字符", len(content))
+        logger.debug("内容预览: %s...", content[:100])
         
         return {
             'content': content,
             'start_heading': heading_text,
             'end_heading': next_heading_text or "文档结尾",
-            'confidence': 0.9
+            'confidence': 0.9,
+            'span': (start_pos, end_pos)
         }
     
+    def _locate_heading_loosely(self, full_text: str, heading_text: str) -> int:
+        """标题不在索引中时的宽松定位，返回内容起始位置，未找到返回-1"""
+        # 方式2: 部分匹配（去除特殊字符）
+        clean_heading = re.sub(r'[（）\(\)\[\]【】《》""''`~!@#$%^&*+=|\\:;\"\'<>,.?/]', '', heading_text).strip()
+        for word in clean_heading.split():
+            if len(word) >= 2:  # 至少2个字符
+                for match in re.finditer(re.escape(word), full_text, re.IGNORECASE):
+                    # 简单判断：如果前面有换行符，可能是标题
+                    context_start = max(0, match.start() - 20)
+                    if '\n' in full_text[context_start:match.start()]:
+                        logger.debug("✓ 部分匹配成功（词汇: '%s'），起始位置: %s", word, match.start())
+                        return match.start()
+        
+        # 方式3: 关键词组合匹配
+        keywords = re.findall(r'[\u4e00-\u9fff]{2,}', heading_text)  # 提取中文词汇
+        if keywords:
+            # 查找包含多个关键词的行
+            line_start = 0
+            for line in full_text.split('\n'):
+                line_lower = line.lower()
+                
+                # 计算关键词匹配数
+                keyword_matches = sum(1 for kw in keywords if kw.lower() in line_lower)
+                
+                # 如果匹配了足够多的关键词，认为找到了标题
+                if keyword_matches >= min(2, len(keywords)):  # 至少匹配2个关键词或全部关键词
+                    logger.debug("✓ 关键词匹配成功（匹配%s个关键词），起始位置: %s", keyword_matches, line_start + len(line))
+                    return line_start + len(line)
+                line_start += len(line) + 1
+        
+        return -1
+    
     def _calculate_match_score(self, heading_text: str, target_title: str, keywords: List[str]) -> float:
         """计算标题匹配分数"""
         heading_lower = heading_text.lower()
@@ -483,7 +469,7 @@ class ContentExtractor:
             keyword_matches = sum(1 for keyword in keywords if keyword.lower() in heading_lower)
             score += (keyword_matches / len(keywords)) * 0.2
         
-        print(f"标题匹配分析: '{heading_text}' vs '{target_title}' = {score:.3f}")
+        logger.debug("标题匹配分析: '%s' vs '%s' = %.3f", heading_text, target_title, score)
         return score
     
     def _clean_extracted_content(self, content: str) -> str:
@@ -508,43 +494,46 @@ class ContentExtractor:
         return cleaned_content
     
     def extract_all_content_by_headings(self, document_path: str, 
-                                      document_structure: Dict[str, Any]) -> List[Dict[str, Any]]:
+                                      document_structure: Dict[str, Any],
+                                      document_text: Optional[DocumentText] = None) -> List[Dict[str, Any]]:
         """
         提取文档中所有标题下的内容
         
         Args:
             document_path: 文档路径
             document_structure: 文档结构
+            document_text: 已加载的文档文本（为空时从document_path加载）
             
         Returns:
             所有标题内容列表
         """
-        print(f"\n=== 提取所有标题内容 ===")
+        logger.info("提取所有标题内容")
         
         headings = document_structure.get('headings', [])
         if not headings:
-            print("文档中没有找到标题")
+            logger.info("文档中没有找到标题")
             return []
         
         file_extension = os.path.splitext(document_path)[1].lower()
+        if file_extension not in ['.pdf', '.doc', '.docx']:
+            logger.warning("不支持的文件格式: %s", file_extension)
+            return []
         
         # 获取完整文本
-        if file_extension == '.pdf':
-            full_text = self._get_pdf_full_text(document_path)
-        elif file_extension in ['.doc', '.docx']:
-            full_text = self._get_docx_full_text(document_path)
-        else:
-            print(f"不支持的文件格式: {file_extension}")
-            return []
+        if document_text is None:
+            document_text = self.load_document_text(document_path, document_structure)
+        full_text = document_text.full_text if document_text else ""
         
         if not full_text:
             return []
         
         all_contents = []
+        # 一次扫描定位所有标题，之后每个章节只是切片
+        locator = document_text.heading_index(headings)
         
         for i, heading in enumerate(headings):
             content_info = self._extract_content_between_headings(
-                full_text, headings, i, heading['text']
+                full_text, headings, i, heading['text'], locator
             )
             
             if content_info and content_info['content']:
@@ -552,43 +541,9 @@ class ContentExtractor:
                     'heading': heading,
                     'content_info': content_info
                 })
-                print(f"✓ 提取标题: {heading['text']} ({len(content_info['content'])} 字符)")
+                logger.debug("✓ 提取标题: %s (%s 字符)", heading['text'], len(content_info['content']))
             else:
-                print(f"✗ 跳过标题: {heading['text']} (无内容)")
+                logger.debug("✗ 跳过标题: %s (无内容)", heading['text'])
         
-        print(f"总共提取了 {len(all_contents)} 个标题的内容")
+        logger.info("总共提取了 %s 个标题的内容", len(all_contents))
         return all_contents
-    
-    def _get_pdf_full_text(self, document_path: str) -> str:
-        """获取PDF完整文本"""
-        try:
-            with open(document_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                full_text = ""
-                
-                for page in pdf_reader.pages:
-                    try:
-                        full_text += page.extract_text() + "\n"
-                    except:
-                        continue
-                
-                return full_text
-        except Exception as e:
-            print(f"获取PDF文本失败: {e}")
-            return ""
-    
-    def _get_docx_full_text(self, document_path: str) -> str:
-        """获取DOCX完整文本"""
-        try:
-            doc = Document(document_path)
-            full_text = ""
-            
-            for para in doc.paragraphs:
-                text = para.text.strip()
-                if text:
-                    full_text += text + "\n"
-            
-            return full_text
-        except Exception as e:
-            print(f"获取DOCX文本失败: {e}")
-            return "" 
\ No newline at end of file
@@ -1,54 +1,195 @@
 import os
+import logging
 import re
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import PyPDF2
-from docx import Document
-from docx.shared import Pt
 import chardet
+from parse_cache import ParseCache, get_default_cache
+from pdf_text import extract_page_texts
+from heading_classifier import HeadingClassifier, HeadingRuleSet, load_rule_sets, rule_sets_fingerprint
+from docx_stream import DocxStreamReader, DocxParagraph
+from docx_styles import StyleTable, font_heading_level
+from document_text import DocumentText
+
+logger = logging.getLogger(__name__)
+
+# 部署级额外标题规则文件（JSON），规则在内置规则之后匹配
+HEADING_RULES_FILE = os.environ.get('HEADING_RULES_FILE', '')
+_deployment_rule_sets = None
+
+def get_deployment_rule_sets() -> List[HeadingRuleSet]:
+    """加载部署配置的额外标题规则（只读取一次）"""
+    global _deployment_rule_sets
+    if _deployment_rule_sets is None:
+        _deployment_rule_sets = []
+        if HEADING_RULES_FILE:
+            try:
+                _deployment_rule_sets = load_rule_sets(HEADING_RULES_FILE)
+                logger.info("加载额外标题规则: %s, 共%s组", HEADING_RULES_FILE, len(_deployment_rule_sets))
+            except Exception as e:
+                logger.warning("加载额外标题规则失败: %s", e)
+    return _deployment_rule_sets
+
+# 主要标题模式（第i个模式匹配时为i+1级）
+HEADING_PATTERNS = [
+    # 级别1：章节
+    r'^第[一二三四五六七八九十\d]+章[\s\u3000]*[^\d\s].*',
+    # 级别2：节
+    r'^第[一二三四五六七八九十\d]+节[\s\u3000]*[^\d\s].*',
+    # 级别3：条款
+    r'^第[一二三四五六七八九十\d]+条[\s\u3000]*[^\d\s].*',
+    # 级别4：数字编号（如：1. 标题）
+    r'^\d+\.[\s\u3000]*[^\d\s].*',
+    # 级别5：二级数字编号（如：1.1 标题）
+    r'^\d+\.\d+[\s\u3000]*[^\d\s].*',
+    # 级别6：三级数字编号（如：1.1.1 标题）
+    r'^\d+\.\d+\.\d+[\s\u3000]*[^\d\s].*',
+    # 级别7：四级数字编号（如：1.1.1.1 标题）
+    r'^\d+\.\d+\.\d+\.\d+[\s\u3000]*[^\d\s].*',
+]
+
+# 额外的标题模式（优先级较低，从5级开始）
+SECONDARY_PATTERNS = [
+    r'^[一二三四五六七八九十]+、[\s\u3000]*[^\s].*',
+    r'^（[一二三四五六七八九十]+）[\s\u3000]*[^\s].*',
+    r'^\([一二三四五六七八九十]+\)[\s\u3000]*[^\s].*',
+    r'^[A-Z]\.[\s\u3000]*[^\s].*',
+    r'^\([A-Z]\)[\s\u3000]*[^\s].*'
+]
+
+def builtin_rule_sets() -> List[HeadingRuleSet]:
+    """内置的标题规则组：主要模式从1级开始，次要模式从5级开始"""
+    return [
+        HeadingRuleSet('primary', list(HEADING_PATTERNS), 1),
+        HeadingRuleSet('secondary', list(SECONDARY_PATTERNS), 5),
+    ]
+
+_default_parser_version = None
+
+def default_parser_version() -> str:
+    """
+    默认配置的解析器（内置规则加部署规则）的版本，与其解析缓存使用的版本一致（只计算一次）
+
+    只根据规则计算指纹，不构建解析器、不编译正则
+    """
+    global _default_parser_version
+    if _default_parser_version is None:
+        fingerprint = rule_sets_fingerprint(builtin_rule_sets() + get_deployment_rule_sets())
+        _default_parser_version = f"{DocumentParser.PARSER_VERSION}:{fingerprint}"
+    return _default_parser_version
 
 class DocumentParser:
     """文档解析器，支持PDF、DOC、DOCX格式"""
     
-    def __init__(self):
-        self.heading_patterns = [
-            # 级别1：章节
-            r'^第[一二三四五六七八九十\d]+章[\s\u3000]*[^\d\s].*',
-            # 级别2：节
-            r'^第[一二三四五六七八九十\d]+节[\s\u3000]*[^\d\s].*',
-            # 级别3：条款
-            r'^第[一二三四五六七八九十\d]+条[\s\u3000]*[^\d\s].*',
-            # 级别4：数字编号（如：1. 标题）
-            r'^\d+\.[\s\u3000]*[^\d\s].*',
-            # 级别5：二级数字编号（如：1.1 标题）
-            r'^\d+\.\d+[\s\u3000]*[^\d\s].*',
-            # 级别6：三级数字编号（如：1.1.1 标题）
-            r'^\d+\.\d+\.\d+[\s\u3000]*[^\d\s].*',
-            # 级别7：四级数字编号（如：1.1.1.1 标题）
-            r'^\d+\.\d+\.\d+\.\d+[\s\u3000]*[^\d\s].*',
-        ]
-        
-        # 额外的标题模式（优先级较低）
-        self.secondary_patterns = [
-            r'^[一二三四五六七八九十]+、[\s\u3000]*[^\s].*',
-            r'^（[一二三四五六七八九十]+）[\s\u3000]*[^\s].*',
-            r'^\([一二三四五六七八九十]+\)[\s\u3000]*[^\s].*',
-            r'^[A-Z]\.[\s\u3000]*[^\s].*',
-            r'^\([A-Z]\)[\s\u3000]*[^\s].*'
-        ]
+    # 解析器版本：解析逻辑或结果格式变化时递增，使旧的解析缓存失效
+    PARSER_VERSION = '4'
     
-    def parse_document(self, file_path: str) -> Dict[str, Any]:
-        """解析文档并返回结构化信息"""
+    def __init__(self, cache: Optional[ParseCache] = None,
+                 extra_heading_rules: Optional[List[HeadingRuleSet]] = None):
+        # 未指定缓存时使用进程默认缓存（由app配置）
+        self.cache = cache if cache is not None else get_default_cache()
+        
+        self.heading_patterns = list(HEADING_PATTERNS)
+        self.secondary_patterns = list(SECONDARY_PATTERNS)
+        
+        # 将主要模式（从1级开始）和次要模式（从5级开始）编译为单个匹配器
+        self.heading_classifier = HeadingClassifier(builtin_rule_sets())
+        for rule_set in get_deployment_rule_sets() + list(extra_heading_rules or []):
+            self.heading_classifier.add_rule_set(*rule_set)
+    
+    def parse_document(self, file_path: str, use_cache: bool = True,
+                       record_spans: bool = False) -> Dict[str, Any]:
+        """
+        解析文档并返回结构化信息（命中缓存时不再读取PDF/Word内容）
+        
+        Args:
+            file_path: 文档路径
+            use_cache: 是否使用解析缓存
+            record_spans: 是否为每个标题记录字符位置、章节范围和页码/段落范围；
+                启用缓存时文档文本会一并写入缓存，后续内容提取无需再读取原文件
+        """
         file_extension = os.path.splitext(file_path)[1].lower()
         
-        if file_extension == '.pdf':
-            return self._parse_pdf(file_path)
-        elif file_extension in ['.doc', '.docx']:
-            return self._parse_docx(file_path)
-        else:
+        if file_extension not in ['.pdf', '.doc', '.docx']:
             raise ValueError(f"不支持的文件格式: {file_extension}")
+        
+        cache_key = None
+        if self.cache and use_cache:
+            try:
+                version = f"{self.PARSER_VERSION}:{self.heading_classifier.fingerprint}"
+                if record_spans:
+                    version += ":spans"
+                cache_key = self.cache.make_key(self.cache.file_digest(file_path), version)
+                cached_result = self.cache.get(cache_key)
+                if cached_result is not None:
+                    logger.info("命中解析缓存: %s", os.path.basename(file_path))
+                    return cached_result
+            except OSError as e:
+                logger.warning("解析缓存不可用: %s", e)
+                cache_key = None
+        
+        document_text = None
+        if not record_spans:
+            if file_extension == '.pdf':
+                result = self._parse_pdf(file_path)
+            else:
+                result = self._parse_docx(file_path)
+        elif file_extension == '.pdf':
+            # 提取一次全文，文本分析和位置记录共用
+            document_text = DocumentText.from_pdf(file_path)
+            result = self._parse_pdf(file_path, document_text)
+        else:
+            # 解析过程中顺带收集段落文本，不再单独读取一遍
+            paragraphs = []
+            result = self._parse_docx(file_path, paragraphs)
+            document_text = DocumentText.from_paragraphs(paragraphs)
+        
+        if document_text is not None:
+            self._record_heading_spans(result, document_text)
+        
+        if cache_key:
+            if document_text is not None:
+                # 先写文档文本，保证读到解析结果时文本已就绪
+                self.cache.set_sidecar(cache_key, 'text', document_text.to_dict())
+                result['cache_key'] = cache_key
+            self.cache.set(cache_key, result)
+        
+        return result
+    
+    def _record_heading_spans(self, result: Dict[str, Any], document_text: DocumentText):
+        """记录每个标题的字符位置、章节范围（到下一个同级或更高级标题）以及页码（PDF）或段落（DOCX）范围"""
+        headings = result['headings']
+        if document_text.document_type == 'PDF':
+            range_key, part_key = 'page_range', 'page_num'
+        else:
+            range_key, part_key = 'paragraph_range', 'index'
+        
+        heading_index = document_text.heading_index(headings)
+        text_length = len(document_text.full_text)
+        
+        for i, heading in enumerate(headings):
+            span = heading_index.span(i)
+            heading['char_span'] = list(span) if span else None
+            heading['section_span'] = None
+            heading[range_key] = None
+            if not span:
+                continue
+            
+            section_end = heading_index.section_end(i, span[1])
+            if section_end is None:
+                section_end = text_length
+            heading['section_span'] = [span[1], section_end]
+            
+            first_part = document_text.part_at(span[0])
+            last_part = document_text.part_at(max(section_end - 1, span[0]))
+            if first_part and last_part:
+                heading[range_key] = [first_part[part_key], last_part[part_key]]
+        
+        located = sum(1 for heading in headings if heading['char_span'])
+        logger.info("记录标题位置：%s/%s个标题已定位", located, len(headings))
     
-    def _parse_pdf(self, file_path: str) -> Dict[str, Any]:
-        """解析PDF文档"""
+    def _parse_pdf(self, file_path: str, document_text: Optional[DocumentText] = None) -> Dict[str, Any]:
+        """解析PDF文档（提供document_text时直接使用其全文，不再重复提取）"""
         result = {
             'document_type': 'PDF',
             'total_pages': 0,
@@ -62,7 +203,7 @@ class DocumentParser:
                 pdf_reader = PyPDF2.PdfReader(file)
                 result['total_pages'] = len(pdf_reader.pages)
                 
-                print(f"\n=== 开始解析PDF文档，共{result['total_pages']}页 ===")
+                logger.info("开始解析PDF文档，共%s页", result['total_pages'])
                 
                 # 策略1: 优先尝试书签解析（PDF的最佳方案）
                 headings_from_bookmarks = self._extract_pdf_bookmarks_intelligent(pdf_reader)
@@ -70,13 +211,16 @@ class DocumentParser:
                 # 策略2: 如果书签无效，提取文本内容进行分析
                 full_text = ""
                 if not headings_from_bookmarks:
-                    print("书签解析未找到有效结构，提取文本内容...")
-                    for page_num, page in enumerate(pdf_reader.pages):
-                        try:
-                            text = page.extract_text()
-                            full_text += text + "\n"
-                        except:
-                            continue
+                    logger.info("书签解析未找到有效结构，提取文本内容...")
+                    if document_text is not None:
+                        full_text = document_text.full_text
+                    else:
+                        # 页数较多时按页段并行提取，结果按页序重组
+                        full_text = "".join(
+                            text + "\n"
+                            for page_index, text, error in extract_page_texts(file_path)
+                            if error is None
+                        )
                     
                     # 使用文本分析
                     headings_from_text = self._extract_headings_from_text(full_text)
@@ -95,17 +239,17 @@ class DocumentParser:
                 if headings_from_bookmarks:
                     result['headings'] = headings_from_bookmarks
                     result['extraction_method'] = 'bookmarks'
-                    print(f"使用书签解析，找到{len(headings_from_bookmarks)}个标题")
+                    logger.info("使用书签解析，找到%s个标题", len(headings_from_bookmarks))
                 elif 'headings_from_text' in locals() and headings_from_text:
                     result['headings'] = headings_from_text
                     result['extraction_method'] = 'text_analysis'
-                    print(f"使用文本分析，找到{len(headings_from_text)}个标题")
+                    logger.info("使用文本分析，找到%s个标题", len(headings_from_text))
                 else:
                     result['headings'] = []
                     result['extraction_method'] = 'no_structure_found'
-                    print("未找到任何文档结构")
+                    logger.info("未找到任何文档结构")
                 
-                print(f"=== PDF解析完成，最终找到{len(result['headings'])}个标题 ===\n")
+                logger.info("PDF解析完成，最终找到%s个标题", len(result['headings']))
                 
                 result['structure'] = self._build_document_structure(result['headings'])
                 result['content_preview'] = full_text[:500] + "..." if len(full_text) > 500 else full_text
@@ -115,8 +259,14 @@ class DocumentParser:
         
         return result
     
-    def _parse_docx(self, file_path: str) -> Dict[str, Any]:
-        """解析DOCX文档 - 智能多策略解析"""
+    def _parse_docx(self, file_path: str, paragraphs: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        解析DOCX文档 - 流式单次遍历，同时完成样式标题、文本候选标题和内容预览
+        
+        Args:
+            file_path: 文档路径
+            paragraphs: 提供时在同一次遍历中收集非空段落（index、text、style），用于构建文档文本
+        """
         result = {
             'document_type': 'DOCX',
             'total_paragraphs': 0,
@@ -126,97 +276,99 @@ class DocumentParser:
         }
         
         try:
-            doc = Document(file_path)
-            result['total_paragraphs'] = len(doc.paragraphs)
+            reader = DocxStreamReader(file_path)
             
-            print(f"\n=== 开始解析DOCX文档，共{len(doc.paragraphs)}个段落 ===")
+            logger.info("开始流式解析DOCX文档: %s", os.path.basename(file_path))
+            logger.debug("检查Word文档的样式和格式...")
             
-            # 策略1: 优先检查大纲结构和标题样式
-            headings_from_styles = self._extract_headings_from_word_styles(doc)
+            headings_from_styles = []
+            # 文本分析的候选标题与样式解析同时收集，样式解析失败时无需再次读取文档
+            text_candidates = []
+            line_number = 0
+            content_preview = ""
             
-            # 策略2: 如果样式解析效果不好，尝试文本分析
+            for para in reader.iter_paragraphs():
+                result['total_paragraphs'] += 1
+                text = para.text.strip()
+                if not text:
+                    continue
+                if paragraphs is not None:
+                    paragraphs.append({
+                        'index': para.index,
+                        'text': text,
+                        'style': para.style_name or 'Normal'
+                    })
+                
+                # 策略1: 大纲结构、标题样式和字体格式
+                heading_level = self._get_heading_level(para, reader.styles)
+                if heading_level > 0:
+                    style_name = para.style_name or 'Unknown'
+                    headings_from_styles.append({
+                        'text': text,
+                        'level': heading_level,
+                        'style': style_name,
+                        'paragraph_index': para.index
+                    })
+                    logger.debug("找到标题: 级别%s, 样式'%s', 内容: %s", heading_level, style_name, text[:50])
+                elif len(content_preview) <= 500:
+                    # 只取非标题内容作为预览
+                    content_preview += text + " "
+                
+                # 策略2: 按行匹配文本模式（行号与按段落拼接的全文一致）
+                for line in para.text.split('\n'):
+                    line_number += 1
+                    candidate = self._match_text_heading_line(line, line_number)
+                    if candidate:
+                        text_candidates.append(candidate)
+            
+            logger.info("共%s个段落", result['total_paragraphs'])
+            
+            if headings_from_styles:
+                # 验证标题层级的合理性
+                headings_from_styles = self._validate_and_fix_heading_levels(headings_from_styles)
+            
+            # 选择最佳策略
             headings_from_text = []
             if not headings_from_styles:
-                print("样式解析未找到标题，尝试文本分析...")
-                full_text = "\n".join([p.text for p in doc.paragraphs if p.text.strip()])
-                headings_from_text = self._extract_headings_from_text(full_text)
+                logger.info("样式解析未找到标题，尝试文本分析...")
+                headings_from_text = self._finish_text_headings(text_candidates)
             
-            # 选择最佳策略
             if headings_from_styles:
                 result['headings'] = headings_from_styles
                 result['extraction_method'] = 'style_based'
-                print(f"使用样式解析，找到{len(headings_from_styles)}个标题")
+                logger.info("使用样式解析，找到%s个标题", len(headings_from_styles))
             elif headings_from_text:
                 result['headings'] = headings_from_text
                 result['extraction_method'] = 'text_analysis'
-                print(f"使用文本分析，找到{len(headings_from_text)}个标题")
+                logger.info("使用文本分析，找到%s个标题", len(headings_from_text))
             else:
                 result['headings'] = []
                 result['extraction_method'] = 'no_headings_found'
-                print("未找到任何标题结构")
-            
-            # 生成内容预览
-            content_preview = ""
-            for para in doc.paragraphs:
-                text = para.text.strip()
-                if text and self._get_heading_level(para) == 0:  # 只取非标题内容
-                    content_preview += text + " "
-                    if len(content_preview) > 500:
-                        break
+                logger.info("未找到任何标题结构")
             
             result['structure'] = self._build_document_structure(result['headings'])
             result['content_preview'] = content_preview[:500] + "..." if len(content_preview) > 500 else content_preview
             
-            print(f"=== DOCX解析完成，最终找到{len(result['headings'])}个标题 ===\n")
+            logger.info("DOCX解析完成，最终找到%s个标题", len(result['headings']))
             
         except Exception as e:
-            print(f"DOCX解析错误: {str(e)}")
+            logger.error("DOCX解析错误: %s", e)
             raise Exception(f"DOCX解析错误: {str(e)}")
         
         return result
     
-    def _extract_headings_from_word_styles(self, doc) -> List[Dict[str, Any]]:
-        """从Word文档的样式和格式中提取标题"""
-        headings = []
-        
-        print("检查Word文档的样式和格式...")
-        
-        for i, para in enumerate(doc.paragraphs):
-            text = para.text.strip()
-            if not text:
-                continue
-            
-            # 获取标题级别
-            heading_level = self._get_heading_level(para)
-            
-            if heading_level > 0:
-                style_name = para.style.name if para.style else 'Unknown'
-                headings.append({
-                    'text': text,
-                    'level': heading_level,
-                    'style': style_name,
-                    'paragraph_index': i
-                })
-                print(f"  找到标题: 级别{heading_level}, 样式'{style_name}', 内容: {text[:50]}")
-        
-        # 验证标题层级的合理性
-        if headings:
-            headings = self._validate_and_fix_heading_levels(headings)
-        
-        return headings
-    
     def _validate_and_fix_heading_levels(self, headings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """验证和修复标题层级的合理性"""
         if not headings:
             return headings
         
-        print("验证标题层级合理性...")
+        logger.debug("验证标题层级合理性...")
         
         # 确保第一个标题从1级开始（如果第一个标题级别过高，调整所有标题）
         min_level = min(h['level'] for h in headings)
         if min_level > 1:
             level_offset = min_level - 1
-            print(f"调整标题级别，所有标题级别减少{level_offset}")
+            logger.debug("调整标题级别，所有标题级别减少%s", level_offset)
             for heading in headings:
                 heading['level'] = max(1, heading['level'] - level_offset)
         
@@ -228,7 +380,7 @@ class DocumentParser:
             # 如果级别跳跃过大（超过1级），调整当前级别
             if prev_level > 0 and current_level - prev_level > 1:
                 adjusted_level = prev_level + 1
-                print(f"标题级别跳跃过大: '{heading['text'][:30]}' 从{current_level}调整为{adjusted_level}")
+                logger.debug("标题级别跳跃过大: '%s' 从%s调整为%s", heading['text'][:30], current_level, adjusted_level)
                 heading['level'] = adjusted_level
                 current_level = adjusted_level
             
@@ -236,317 +388,164 @@ class DocumentParser:
         
         return headings
     
-    def _get_heading_level(self, paragraph) -> int:
-        """获取段落的标题级别 - 优化版本"""
+    def _get_heading_level(self, paragraph: DocxParagraph, styles: StyleTable) -> int:
+        """获取段落的标题级别 - 样式相关的判断直接查样式表，仅对直接设置格式的段落检查文本块"""
         text = paragraph.text.strip()
         if not text:
             return 0
         
-        style_name = paragraph.style.name.lower() if paragraph.style else ""
+        style = styles.get(paragraph.style_id)
         
-        # 1. 优先检查标准标题样式
-        if 'heading' in style_name:
-            try:
-                # 提取标题级别数字
-                match = re.search(r'heading\s*(\d+)', style_name)
-                if match:
-                    level = int(match.group(1))
-                    print(f"发现标题样式: {style_name} -> 级别 {level}, 内容: {text[:50]}")
-                    return min(level, 7)
-                else:
-                    print(f"标题样式但无级别: {style_name}, 内容: {text[:50]}")
-                    return 1
-            except Exception as e:
-                print(f"解析标题样式失败: {style_name}, 错误: {e}")
-                return 1
+        # 1. 优先检查标准标题样式（样式表中已解析出级别）
+        if style and style.heading_level:
+            logger.debug("发现标题样式: %s -> 级别 %s, 内容: %s", style.name, style.heading_level, text[:50])
+            return style.heading_level
         
-        # 2. 检查大纲级别（outline level）
-        if hasattr(paragraph, '_element') and hasattr(paragraph._element, 'get_outline_level'):
-            try:
-                outline_level = paragraph._element.get_outline_level()
-                if outline_level is not None and outline_level > 0:
-                    print(f"发现大纲级别: {outline_level}, 内容: {text[:50]}")
-                    return min(outline_level, 7)
-            except:
-                pass
-        
-        # 3. 检查段落格式的大纲级别
-        if hasattr(paragraph, 'paragraph_format') and hasattr(paragraph.paragraph_format, 'outline_level'):
-            try:
-                outline_level = paragraph.paragraph_format.outline_level
-                if outline_level is not None and outline_level > 0:
-                    print(f"发现段落大纲级别: {outline_level}, 内容: {text[:50]}")
-                    return min(outline_level, 7)
-            except:
-                pass
-        
-        # 4. 检查字体样式特征
-        if paragraph.runs:
+        # 2. 检查大纲级别（段落直接设置优先，其次为样式继承的大纲级别）
+        outline_level = paragraph.outline_level
+        if outline_level is None and style:
+            outline_level = style.outline_level
+        if outline_level:
+            logger.debug("发现段落大纲级别: %s, 内容: %s", outline_level, text[:50])
+            return min(outline_level, 7)
+        
+        # 3. 检查直接设置的字体特征（加粗、字号）
+        if paragraph.has_direct_font:
             for run in paragraph.runs:
-                # 检查是否加粗
-                is_bold = run.bold
-                # 检查字体大小
-                font_size = None
-                if run.font.size:
-                    font_size = run.font.size.pt
-                
-                # 基于字体特征判断
-                if is_bold and font_size:
-                    if font_size >= 18:
-                        print(f"字体特征判断为1级标题: 大小{font_size}, 加粗, 内容: {text[:50]}")
-                        return 1
-                    elif font_size >= 16:
-                        print(f"字体特征判断为2级标题: 大小{font_size}, 加粗, 内容: {text[:50]}")
-                        return 2
-                    elif font_size >= 14:
-                        print(f"字体特征判断为3级标题: 大小{font_size}, 加粗, 内容: {text[:50]}")
-                        return 3
-                elif is_bold:
-                    # 仅加粗，可能是4级标题
-                    print(f"仅加粗判断为4级标题: 内容: {text[:50]}")
-                    return 4
+                level = font_heading_level(run.bold, run.size)
+                if level:
+                    if run.size:
+                        logger.debug("字体特征判断为%s级标题: 大小%s, 加粗, 内容: %s", level, run.size, text[:50])
+                    else:
+                        logger.debug("仅加粗判断为4级标题: 内容: %s", text[:50])
+                    return level
+        
+        # 4. 检查样式的有效字体特征
+        if style and style.font_level:
+            logger.debug("样式字体特征判断为%s级标题: 样式'%s', 内容: %s", style.font_level, style.name, text[:50])
+            return style.font_level
         
         # 5. 最后检查文本模式（更严格的匹配）
         # 只有在长度合适且符合标题特征时才使用文本模式
         if len(text) <= 150:  # 标题通常不会太长
-            # 首先检查主要模式
-            for i, pattern in enumerate(self.heading_patterns):
-                if re.match(pattern, text):
-                    level = min(i + 1, 7)
-                    print(f"主要模式匹配第{i+1}个模式，判断为{level}级标题: {text[:50]}")
-                    return level
-            
-            # 如果主要模式没匹配，检查次要模式（起始级别为5）
-            for i, pattern in enumerate(self.secondary_patterns):
-                if re.match(pattern, text):
-                    level = min(i + 5, 7)  # 次要模式从5级开始
-                    print(f"次要模式匹配第{i+1}个模式，判断为{level}级标题: {text[:50]}")
-                    return level
+            # 主要模式优先，其次是次要模式（起始级别为5），一次匹配完成
+            heading_match = self.heading_classifier.match(text)
+            if heading_match:
+                pattern_kind = '主要' if heading_match.rule_set == 'primary' else '次要'
+                logger.debug("%s模式匹配第%s个模式，判断为%s级标题: %s", pattern_kind, heading_match.rule_index + 1, heading_match.level, text[:50])
+                return heading_match.level
         
         return 0
     
-    def _extract_headings_from_bookmarks(self, pdf_reader) -> List[Dict[str, Any]]:
-        """从PDF书签（outline）中提取标题结构"""
-        headings = []
-        
-        try:
-            # 获取PDF的outline/书签
-            outline = pdf_reader.outline
-            if not outline:
-                return headings
-            
-            print(f"Outline type: {type(outline)}")
-            print(f"Outline length: {len(outline) if hasattr(outline, '__len__') else 'N/A'}")
-            
-            def extract_bookmark_info(bookmark_item, level=1):
-                """提取单个书签信息"""
-                try:
-                    title = None
-                    
-                    # 尝试获取标题
-                    if hasattr(bookmark_item, 'title'):
-                        title = bookmark_item.title
-                    elif isinstance(bookmark_item, dict):
-                        title = bookmark_item.get('/Title', bookmark_item.get('title'))
-                    
-                    if title and isinstance(title, str):
-                        title = title.strip()
-                        if title:
-                            page_num = None
-                            try:
-                                page_num = self._get_bookmark_page(bookmark_item, pdf_reader)
-                            except:
-                                pass
-                            
-                            heading_data = {
-                                'text': title,
-                                'level': min(level, 7),
-                                'style': f'Bookmark Level {min(level, 7)}'
-                            }
-                            
-                            if page_num:
-                                heading_data['page'] = page_num
-                            
-                            headings.append(heading_data)
-                            print(f"Level {level}: {title}")
-                            
-                except Exception as e:
-                    print(f"提取书签信息出错: {str(e)}")
-            
-            def traverse_outline(items, level=1):
-                """遍历outline结构"""
-                if not items:
-                    return
-                
-                try:
-                    for item in items:
-                        if isinstance(item, list):
-                            # 如果是列表，递归处理，层级增加
-                            traverse_outline(item, level + 1)
-                        else:
-                            # 处理书签对象
-                            extract_bookmark_info(item, level)
-                            
-                except Exception as e:
-                    print(f"遍历outline出错: {str(e)}")
-            
-            # 开始处理
-            traverse_outline(outline, 1)
-            
-        except Exception as e:
-            print(f"书签解析失败: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return []
-        
-        return headings
+    def _build_page_index(self, pdf_reader) -> Dict[int, int]:
+        """构建页面对象编号到页码的映射（只遍历一次页面树）"""
+        page_index = {}
+        for page_num, page in enumerate(pdf_reader.pages):
+            page_ref = getattr(page, 'indirect_reference', None)
+            if page_ref is not None and hasattr(page_ref, 'idnum'):
+                page_index[page_ref.idnum] = page_num + 1
+        return page_index
     
-    def _get_bookmark_page(self, bookmark, pdf_reader):
-        """获取书签对应的页码"""
+    def _resolve_bookmark_page(self, bookmark, page_index: Dict[int, int], total_pages: int) -> Optional[int]:
+        """通过页面映射解析书签目标页码（O(1)）"""
         try:
-            if hasattr(bookmark, 'page'):
-                if hasattr(bookmark.page, 'idnum'):
-                    # 查找页码
-                    for page_num, page in enumerate(pdf_reader.pages):
-                        if hasattr(page, 'indirect_ref') and hasattr(page.indirect_ref, 'idnum'):
-                            if page.indirect_ref.idnum == bookmark.page.idnum:
-                                return page_num + 1
+            page = bookmark.page
+        except Exception:
             return None
-        except:
-            return None
-    
-    def _extract_pdf_bookmarks_intelligent(self, pdf_reader) -> List[Dict[str, Any]]:
-        """智能PDF书签解析方法"""
-        headings = []
         
-        try:
-            outline = pdf_reader.outline
-            if not outline:
-                print("PDF文档无书签结构")
-                return headings
-            
-            print("发现PDF书签，开始智能解析...")
-            
-            # 尝试多种解析方法
-            methods = [
-                self._extract_bookmarks_method_1,
-                self._extract_bookmarks_method_2,
-                self._extract_headings_from_bookmarks_simple
-            ]
-            
-            for i, method in enumerate(methods, 1):
-                try:
-                    print(f"尝试书签解析方法 {i}...")
-                    result = method(pdf_reader)
-                    if result and len(result) > 0:
-                        print(f"方法 {i} 成功，找到 {len(result)} 个标题")
-                        # 验证结果质量
-                        if self._validate_bookmark_quality(result):
-                            return self._optimize_bookmark_levels(result)
-                        else:
-                            print(f"方法 {i} 结果质量不佳，尝试下一种方法")
-                            continue
-                except Exception as e:
-                    print(f"方法 {i} 失败: {str(e)}")
-                    continue
-            
-            print("所有书签解析方法都失败")
-            return []
-            
-        except Exception as e:
-            print(f"书签解析整体失败: {str(e)}")
-            return []
+        if hasattr(page, 'idnum'):
+            return page_index.get(page.idnum)
+        
+        # 部分PDF直接以页索引作为目标
+        if isinstance(page, int) and 0 <= page < total_pages:
+            return page + 1
+        return None
     
-    def _extract_bookmarks_method_1(self, pdf_reader) -> List[Dict[str, Any]]:
-        """书签解析方法1：标准递归解析"""
-        headings = []
+    def _walk_pdf_outline(self, pdf_reader, outline) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        单次遍历书签树，同时生成三种层级解释
         
-        def process_outline_recursive(items, level=1):
-            if not items:
-                return
-            
-            for item in items:
-                if isinstance(item, list):
-                    process_outline_recursive(item, level + 1)
-                else:
-                    try:
-                        title = None
-                        if hasattr(item, 'title') and item.title:
-                            title = str(item.title).strip()
-                        
-                        if title and len(title) <= 200:  # 合理的标题长度
-                            headings.append({
-                                'text': title,
-                                'level': min(level, 7),
-                                'style': f'Bookmark Level {level}',
-                                'method': 'recursive'
-                            })
-                    except:
-                        continue
+        - recursive: 按嵌套深度定级，过滤过长标题
+        - flatten: 同一列表内每个书签依次加深一级（兼容层级信息缺失的书签）
+        - simple: 按嵌套深度定级，不过滤标题长度
         
-        process_outline_recursive(pdf_reader.outline)
-        return headings
-    
-    def _extract_bookmarks_method_2(self, pdf_reader) -> List[Dict[str, Any]]:
-        """书签解析方法2：扁平化解析"""
-        headings = []
+        每个标题都通过页面映射附带目标页码。
+        """
+        page_index = self._build_page_index(pdf_reader)
+        total_pages = len(pdf_reader.pages)
+        interpretations = {'recursive': [], 'flatten': [], 'simple': []}
         
-        def flatten_all_items(items, base_level=1):
+        def walk(items, level, flatten_level):
             for item in items:
+                if isinstance(item, list):
+                    walk(item, level + 1, flatten_level)
+                    continue
+                
                 try:
-                    if hasattr(item, 'title') and item.title:
-                        title = str(item.title).strip()
-                        if title and len(title) <= 200:
-                            headings.append({
-                                'text': title,
-                                'level': base_level,
-                                'style': f'Bookmark Level {base_level}',
-                                'method': 'flatten'
-                            })
-                            base_level += 1
+                    if not (hasattr(item, 'title') and item.title):
+                        continue
+                    title = str(item.title).strip()
+                    if not title:
+                        continue
                     
-                    if isinstance(item, list):
-                        flatten_all_items(item, base_level)
-                except:
+                    page_num = self._resolve_bookmark_page(item, page_index, total_pages)
+                    
+                    def make_heading(heading_level, style_level, method):
+                        heading = {
+                            'text': title,
+                            'level': heading_level,
+                            'style': f'Bookmark Level {style_level}',
+                            'method': method
+                        }
+                        if page_num:
+                            heading['page'] = page_num
+                        return heading
+                    
+                    if len(title) <= 200:  # 合理的标题长度
+                        interpretations['recursive'].append(make_heading(min(level, 7), level, 'recursive'))
+                        interpretations['flatten'].append(make_heading(flatten_level, flatten_level, 'flatten'))
+                        flatten_level += 1
+                    interpretations['simple'].append(make_heading(min(level, 7), min(level, 7), 'simple'))
+                except Exception:
                     continue
         
-        flatten_all_items(pdf_reader.outline)
-        return headings
+        walk(outline, 1, 1)
+        return interpretations
     
-    def _extract_headings_from_bookmarks_simple(self, pdf_reader) -> List[Dict[str, Any]]:
-        """简化版书签解析方法（保持原有逻辑）"""
+    def _extract_pdf_bookmarks_intelligent(self, pdf_reader) -> List[Dict[str, Any]]:
+        """智能PDF书签解析方法"""
         headings = []
         
         try:
             outline = pdf_reader.outline
             if not outline:
+                logger.info("PDF文档无书签结构")
                 return headings
             
-            def flatten_outline(items, level=1):
-                for item in items:
-                    try:
-                        if hasattr(item, 'title') and item.title:
-                            title = str(item.title).strip()
-                            if title:
-                                headings.append({
-                                    'text': title,
-                                    'level': min(level, 7),
-                                    'style': f'Bookmark Level {min(level, 7)}',
-                                    'method': 'simple'
-                                })
-                        
-                        if isinstance(item, list):
-                            flatten_outline(item, level + 1)
-                    except:
+            logger.debug("发现PDF书签，开始智能解析...")
+            
+            # 一次遍历得到所有解析方法的结果，再按优先级依次验证
+            interpretations = self._walk_pdf_outline(pdf_reader, outline)
+            methods = ['recursive', 'flatten', 'simple']
+            
+            for i, method in enumerate(methods, 1):
+                logger.debug("尝试书签解析方法 %s...", i)
+                result = interpretations[method]
+                if result and len(result) > 0:
+                    logger.debug("方法 %s 成功，找到 %s 个标题", i, len(result))
+                    # 验证结果质量
+                    if self._validate_bookmark_quality(result):
+                        return self._optimize_bookmark_levels(result)
+                    else:
+                        logger.debug("方法 %s 结果质量不佳，尝试下一种方法", i)
                         continue
             
-            flatten_outline(outline)
+            logger.info("所有书签解析方法都失败")
+            return []
             
         except Exception as e:
-            print(f"简化书签解析失败: {str(e)}")
+            logger.warning("书签解析整体失败: %s", e)
             return []
-        
-        return headings
     
     def _validate_bookmark_quality(self, headings: List[Dict[str, Any]]) -> bool:
         """验证书签解析结果的质量"""
@@ -555,22 +554,22 @@ class DocumentParser:
         
         # 检查是否有合理的标题数量
         if len(headings) < 2:
-            print("书签数量过少，可能不是有效的文档结构")
+            logger.debug("书签数量过少，可能不是有效的文档结构")
             return False
         
         # 检查是否有过长的"标题"（可能是内容片段）
         long_titles = [h for h in headings if len(h['text']) > 100]
         if len(long_titles) > len(headings) * 0.5:
-            print("标题过长的比例过高，可能解析错误")
+            logger.debug("标题过长的比例过高，可能解析错误")
             return False
         
         # 检查是否有层级结构
         levels = [h['level'] for h in headings]
         if len(set(levels)) == 1 and len(headings) > 10:
-            print("所有标题都是同一级别且数量很多，可能解析错误")
+            logger.debug("所有标题都是同一级别且数量很多，可能解析错误")
             return False
         
-        print("书签质量验证通过")
+        logger.debug("书签质量验证通过")
         return True
     
     def _optimize_bookmark_levels(self, headings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -578,12 +577,12 @@ class DocumentParser:
         if not headings:
             return headings
         
-        print("优化书签层级...")
+        logger.debug("优化书签层级...")
         
         # 如果所有书签都是同一级别，尝试通过内容推断层级
         levels = [h['level'] for h in headings]
         if len(set(levels)) == 1:
-            print("所有书签同级别，尝试通过内容推断层级")
+            logger.debug("所有书签同级别，尝试通过内容推断层级")
             for i, heading in enumerate(headings):
                 text = heading['text']
                 # 根据文本特征调整级别
@@ -598,58 +597,60 @@ class DocumentParser:
         
         return headings
 
-    def _extract_headings_from_text(self, text: str) -> List[Dict[str, Any]]:
-        """从纯文本中提取标题 - 改进版本"""
-        headings = []
-        lines = text.split('\n')
+    def _match_text_heading_line(self, line: str, line_number: int) -> Optional[Dict[str, Any]]:
+        """按文本模式匹配单行，命中时返回候选标题（含匹配的规则组）"""
+        line = line.strip()
+        if not line or len(line) > 200:  # 跳过空行和过长的行
+            return None
         
-        print("开始文本模式标题提取...")
+        # 主要模式和次要模式合并为一次匹配
+        heading_match = self.heading_classifier.match(line)
+        if not heading_match:
+            return None
         
-        for line_num, line in enumerate(lines):
-            line = line.strip()
-            if not line or len(line) > 200:  # 跳过空行和过长的行
-                continue
-            
-            # 首先检查主要模式
-            matched = False
-            for level, pattern in enumerate(self.heading_patterns, 1):
-                if re.match(pattern, line):
-                    headings.append({
-                        'text': line,
-                        'level': min(level, 7),
-                        'style': f'Text Pattern L{min(level, 7)}',
-                        'line_number': line_num + 1
-                    })
-                    print(f"  文本标题: L{min(level, 7)} - {line[:50]}")
-                    matched = True
-                    break
-            
-            # 如果主要模式没匹配，检查次要模式
-            if not matched:
-                for level, pattern in enumerate(self.secondary_patterns, 5):
-                    if re.match(pattern, line):
-                        headings.append({
-                            'text': line,
-                            'level': min(level, 7),
-                            'style': f'Text Pattern L{min(level, 7)}',
-                            'line_number': line_num + 1
-                        })
-                        print(f"  次要标题: L{min(level, 7)} - {line[:50]}")
-                        break
+        return {
+            'text': line,
+            'level': heading_match.level,
+            'style': f'Text Pattern L{heading_match.level}',
+            'line_number': line_number,
+            'rule_set': heading_match.rule_set
+        }
+    
+    def _finish_text_headings(self, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """输出候选标题并完成验证"""
+        logger.debug("开始文本模式标题提取...")
+        
+        headings = []
+        for candidate in candidates:
+            heading = dict(candidate)
+            rule_set = heading.pop('rule_set')
+            label = '文本标题' if rule_set == 'primary' else '次要标题'
+            logger.debug("%s: L%s - %s", label, heading['level'], heading['text'][:50])
+            headings.append(heading)
         
         # 验证和优化文本提取的结果
         if headings:
             headings = self._validate_and_fix_text_headings(headings)
         
-        print(f"文本模式提取完成，找到{len(headings)}个标题")
+        logger.info("文本模式提取完成，找到%s个标题", len(headings))
         return headings
     
+    def _extract_headings_from_text(self, text: str) -> List[Dict[str, Any]]:
+        """从纯文本中提取标题 - 改进版本"""
+        candidates = []
+        for line_num, line in enumerate(text.split('\n')):
+            candidate = self._match_text_heading_line(line, line_num + 1)
+            if candidate:
+                candidates.append(candidate)
+        
+        return self._finish_text_headings(candidates)
+    
     def _validate_and_fix_text_headings(self, headings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """验证和修复文本提取的标题"""
         if not headings:
             return headings
         
-        print("验证文本提取的标题...")
+        logger.debug("验证文本提取的标题...")
         
         # 移除重复的标题
         seen_texts = set()
@@ -660,7 +661,7 @@ class DocumentParser:
                 seen_texts.add(text)
                 unique_headings.append(heading)
             else:
-                print(f"移除重复标题: {text[:30]}")
+                logger.debug("移除重复标题: %s", text[:30])
         
         # 检查标题质量
         valid_headings = []
@@ -671,7 +672,7 @@ class DocumentParser:
             if self._is_likely_heading(text):
                 valid_headings.append(heading)
             else:
-                print(f"过滤无效标题: {text[:30]}")
+                logger.debug("过滤无效标题: %s", text[:30])
         
         return valid_headings
     
@@ -0,0 +1,133 @@
+import os
+import logging
+from bisect import bisect_right
+from typing import Dict, List, Any, Optional, Tuple
+from docx_stream import DocxStreamReader
+from pdf_text import extract_page_texts
+from heading_index import HeadingIndex
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentText:
+    """文档文本 - 一次加载完整文本、分页/分段文本及偏移量，供所有提取目标共享"""
+
+    def __init__(self, document_type: str, full_text: str, text_parts: List[Dict[str, Any]],
+                 offsets: List[int]):
+        """
+        Args:
+            document_type: 文档类型（PDF或DOCX）
+            full_text: 完整文本，各部分之间以换行分隔
+            text_parts: 文本部分列表（PDF为页面，DOCX为非空段落）
+            offsets: 每个文本部分在full_text中的起始字符偏移
+        """
+        self.document_type = document_type
+        self.full_text = full_text
+        self.text_parts = text_parts
+        self.offsets = offsets
+        # 按标题列表缓存的标题偏移索引
+        self._heading_indexes: Dict[Tuple[Tuple[str, int], ...], HeadingIndex] = {}
+
+    @property
+    def page_texts(self) -> List[Dict[str, Any]]:
+        """PDF页面文本列表（每项包含page_num和text）"""
+        return self.text_parts if self.document_type == 'PDF' else []
+
+    @property
+    def paragraphs(self) -> List[Dict[str, Any]]:
+        """DOCX段落列表（每项包含index、text和style）"""
+        return self.text_parts if self.document_type == 'DOCX' else []
+
+    def part_at(self, char_offset: int) -> Optional[Dict[str, Any]]:
+        """返回包含指定字符偏移的页面或段落"""
+        if not self.text_parts or char_offset < 0:
+            return None
+        position = bisect_right(self.offsets, char_offset) - 1
+        return self.text_parts[max(position, 0)]
+
+    def heading_index(self, headings: List[Dict[str, Any]]) -> HeadingIndex:
+        """返回给定标题列表在本文档中的偏移索引（同一标题列表只扫描一次全文）"""
+        key = tuple((heading['text'], heading['level']) for heading in headings)
+        if key not in self._heading_indexes:
+            # 解析时已记录标题位置（record_spans）的直接复用，无需扫描全文
+            spans = None
+            if headings and all('char_span' in heading for heading in headings):
+                spans = [heading['char_span'] for heading in headings]
+            self._heading_indexes[key] = HeadingIndex(self.full_text, headings, spans)
+        return self._heading_indexes[key]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """序列化为可写入解析缓存的字典"""
+        return {
+            'document_type': self.document_type,
+            'full_text': self.full_text,
+            'text_parts': self.text_parts,
+            'offsets': self.offsets
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'DocumentText':
+        return cls(data['document_type'], data['full_text'], data['text_parts'], data['offsets'])
+
+    @classmethod
+    def load(cls, file_path: str) -> 'DocumentText':
+        """根据扩展名加载PDF或DOCX文档文本"""
+        file_extension = os.path.splitext(file_path)[1].lower()
+
+        if file_extension == '.pdf':
+            return cls.from_pdf(file_path)
+        elif file_extension in ['.doc', '.docx']:
+            return cls.from_docx(file_path)
+        else:
+            raise ValueError(f"不支持的文件格式: {file_extension}")
+
+    @classmethod
+    def from_pdf(cls, file_path: str, max_workers: Optional[int] = None) -> 'DocumentText':
+        """逐页提取PDF文本（页数较多时并行提取，提取失败的页面会被跳过）"""
+        full_text_parts = []
+        page_texts = []
+        offsets = []
+        position = 0
+
+        for page_index, page_text, error in extract_page_texts(file_path, max_workers=max_workers):
+            if error is not None:
+                logger.warning("提取第%s页失败: %s", page_index + 1, error)
+                continue
+
+            page_texts.append({
+                'page_num': page_index + 1,
+                'text': page_text
+            })
+            offsets.append(position)
+            full_text_parts.append(page_text + "\n")
+            position += len(page_text) + 1
+
+        return cls('PDF', ''.join(full_text_parts), page_texts, offsets)
+
+    @classmethod
+    def from_docx(cls, file_path: str) -> 'DocumentText':
+        """流式提取DOCX中所有非空段落的文本"""
+        paragraphs = []
+        for para in DocxStreamReader(file_path).iter_paragraphs():
+            text = para.text.strip()
+            if text:
+                paragraphs.append({
+                    'index': para.index,
+                    'text': text,
+                    'style': para.style_name or 'Normal'
+                })
+        return cls.from_paragraphs(paragraphs)
+
+    @classmethod
+    def from_paragraphs(cls, paragraphs: List[Dict[str, Any]]) -> 'DocumentText':
+        """由非空段落列表（每项包含index、text和style）构建DOCX文档文本"""
+        full_text_parts = []
+        offsets = []
+        position = 0
+
+        for paragraph in paragraphs:
+            offsets.append(position)
+            full_text_parts.append(paragraph['text'] + "\n")
+            position += len(paragraph['text']) + 1
+
+        return cls('DOCX', ''.join(full_text_parts), paragraphs, offsets)
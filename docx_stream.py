@@ -0,0 +1,155 @@
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from docx_styles import W_NS, W_VAL, StyleTable, on_off, parse_font_size, parse_outline_level
+
+REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+
+def _w(tag: str) -> str:
+    return f'{{{W_NS}}}{tag}'
+
+
+W_BODY = _w('body')
+W_P = _w('p')
+W_R = _w('r')
+W_T = _w('t')
+W_TAB = _w('tab')
+W_BR = _w('br')
+W_CR = _w('cr')
+W_PPR = _w('pPr')
+W_RPR = _w('rPr')
+W_PSTYLE = _w('pStyle')
+W_OUTLINE_LVL = _w('outlineLvl')
+W_B = _w('b')
+W_SZ = _w('sz')
+
+
+class DocxRun(NamedTuple):
+    """文本块的直接格式：加粗（None表示未设置）和字号（磅）"""
+    bold: Optional[bool]
+    size: Optional[float]
+
+
+class DocxParagraph(NamedTuple):
+    """正文中的一个段落"""
+    index: int
+    text: str
+    style_id: Optional[str]
+    style_name: Optional[str]
+    outline_level: Optional[int]   # 段落直接设置的大纲级别，0表示显式设置为正文
+    runs: List[DocxRun]
+
+    @property
+    def has_direct_font(self) -> bool:
+        """是否有文本块直接设置了加粗或字号"""
+        return any(run.bold is not None or run.size is not None for run in self.runs)
+
+
+class DocxStreamReader:
+    """流式DOCX读取器 - 对word/document.xml增量解析，单次遍历、内存占用与文档大小无关"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.styles = StyleTable()
+
+    def _read_relationships(self, zf: zipfile.ZipFile, rels_path: str) -> Dict[str, str]:
+        """读取关系文件，返回关系类型（末段）到目标路径的映射"""
+        if rels_path not in zf.namelist():
+            return {}
+        root = ET.fromstring(zf.read(rels_path))
+        relationships = {}
+        for rel in root.iter(f'{{{REL_NS}}}Relationship'):
+            rel_type = rel.get('Type', '').rsplit('/', 1)[-1]
+            relationships.setdefault(rel_type, rel.get('Target', ''))
+        return relationships
+
+    def _locate_parts(self, zf: zipfile.ZipFile) -> Tuple[str, Optional[str]]:
+        """定位主文档部件和样式部件的路径"""
+        package_rels = self._read_relationships(zf, '_rels/.rels')
+        document_part = package_rels.get('officeDocument', 'word/document.xml').lstrip('/')
+
+        part_dir, part_name = posixpath.split(document_part)
+        document_rels = self._read_relationships(zf, posixpath.join(part_dir, '_rels', part_name + '.rels'))
+        styles_target = document_rels.get('styles')
+        if styles_target:
+            styles_part = posixpath.normpath(posixpath.join(part_dir, styles_target)).lstrip('/')
+        else:
+            styles_part = posixpath.join(part_dir, 'styles.xml')
+
+        return document_part, styles_part if styles_part in zf.namelist() else None
+
+    def _load_styles(self, zf: zipfile.ZipFile, styles_part: Optional[str]):
+        """构建本文档的段落样式表"""
+        self.styles = StyleTable.from_xml(zf.read(styles_part)) if styles_part else StyleTable()
+
+    def _build_paragraph(self, p: ET.Element, index: int) -> DocxParagraph:
+        """把段落元素转换为DocxParagraph"""
+        style_id = None
+        outline_level = None
+        p_pr = p.find(W_PPR)
+        if p_pr is not None:
+            p_style = p_pr.find(W_PSTYLE)
+            if p_style is not None:
+                style_id = p_style.get(W_VAL)
+            outline_level = parse_outline_level(p_pr.find(W_OUTLINE_LVL))
+
+        text_parts = []
+        runs = []
+        for r in p.iterfind(W_R):
+            bold = None
+            size = None
+            r_pr = r.find(W_RPR)
+            if r_pr is not None:
+                b = r_pr.find(W_B)
+                if b is not None:
+                    bold = on_off(b)
+                size = parse_font_size(r_pr.find(W_SZ))
+            runs.append(DocxRun(bold, size))
+
+            for child in r:
+                if child.tag == W_T:
+                    text_parts.append(child.text or '')
+                elif child.tag == W_TAB:
+                    text_parts.append('\t')
+                elif child.tag in (W_BR, W_CR):
+                    text_parts.append('\n')
+
+        style = self.styles.get(self.styles.resolve_style_id(style_id))
+        return DocxParagraph(
+            index=index,
+            text=''.join(text_parts),
+            style_id=style.style_id if style else None,
+            style_name=style.name if style else None,
+            outline_level=outline_level,
+            runs=runs
+        )
+
+    def iter_paragraphs(self) -> Iterator[DocxParagraph]:
+        """按文档顺序逐个产出正文段落（不含表格内段落），处理完的元素立即释放"""
+        with zipfile.ZipFile(self.file_path) as zf:
+            document_part, styles_part = self._locate_parts(zf)
+            self._load_styles(zf, styles_part)
+
+            with zf.open(document_part) as stream:
+                body = None
+                body_depth = -1
+                depth = 0
+                index = 0
+
+                for event, element in ET.iterparse(stream, events=('start', 'end')):
+                    if event == 'start':
+                        depth += 1
+                        if element.tag == W_BODY and body is None:
+                            body = element
+                            body_depth = depth
+                        continue
+
+                    if body is not None and depth == body_depth + 1:
+                        if element.tag == W_P:
+                            yield self._build_paragraph(element, index)
+                            index += 1
+                        # 正文的直接子元素处理完即移除，保持内存占用有界
+                        body.remove(element)
+                    depth -= 1
@@ -0,0 +1,178 @@
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, NamedTuple, Optional
+from docx.styles import BabelFish
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+# 标题最大级别
+MAX_HEADING_LEVEL = 7
+
+# OOXML中表示"关"的布尔取值
+_OFF_VALUES = {'0', 'false', 'off'}
+
+_HEADING_NAME_PATTERN = re.compile(r'heading\s*(\d+)')
+
+
+def _w(tag: str) -> str:
+    return f'{{{W_NS}}}{tag}'
+
+
+W_VAL = _w('val')
+
+
+def on_off(element: ET.Element) -> bool:
+    """解析w:b等开关元素，未写val时表示开"""
+    return element.get(W_VAL, 'true').lower() not in _OFF_VALUES
+
+
+def parse_outline_level(element: Optional[ET.Element]) -> Optional[int]:
+    """
+    解析w:outlineLvl（从0开始，9表示正文）
+
+    Returns:
+        从1开始的大纲级别；显式设置为正文时返回0，未设置返回None
+    """
+    if element is None:
+        return None
+    try:
+        value = int(element.get(W_VAL, '9'))
+    except ValueError:
+        return None
+    return value + 1 if 0 <= value < 9 else 0
+
+
+def parse_font_size(element: Optional[ET.Element]) -> Optional[float]:
+    """解析w:sz（以半磅为单位），返回磅值"""
+    if element is None:
+        return None
+    try:
+        return int(element.get(W_VAL)) / 2
+    except (TypeError, ValueError):
+        return None
+
+
+def font_heading_level(bold: Optional[bool], size: Optional[float]) -> int:
+    """根据加粗和字号判断标题级别：加粗且字号>=18/16/14为1/2/3级，仅加粗（字号未知）为4级"""
+    if not bold:
+        return 0
+    if size:
+        if size >= 18:
+            return 1
+        elif size >= 16:
+            return 2
+        elif size >= 14:
+            return 3
+        return 0
+    return 4
+
+
+class StyleInfo(NamedTuple):
+    """段落样式的解析结果（属性已沿basedOn继承链合并）"""
+    style_id: str
+    name: Optional[str]
+    heading_level: int        # 由样式名（heading N）确定的级别，非标题样式为0
+    outline_level: Optional[int]   # 0表示显式设置为正文
+    bold: Optional[bool]
+    size: Optional[float]
+    font_level: int           # 由样式有效字体确定的级别，0表示不构成标题
+
+
+class StyleTable:
+    """段落样式表 - 每个文档从styles.xml构建一次，段落分类时按样式ID直接查表"""
+
+    def __init__(self, styles: Optional[Dict[str, StyleInfo]] = None,
+                 default_style_id: Optional[str] = None):
+        self.styles: Dict[str, StyleInfo] = styles or {}
+        self.default_style_id = default_style_id
+
+    def get(self, style_id: Optional[str]) -> Optional[StyleInfo]:
+        return self.styles.get(style_id) if style_id is not None else None
+
+    def resolve_style_id(self, style_id: Optional[str]) -> Optional[str]:
+        """未指定或未定义的样式回退到默认段落样式（与python-docx一致）"""
+        if style_id is None or style_id not in self.styles:
+            return self.default_style_id
+        return style_id
+
+    @classmethod
+    def from_xml(cls, styles_xml: bytes) -> 'StyleTable':
+        """解析styles.xml，合并继承链和文档默认格式，得到每个段落样式的有效属性"""
+        root = ET.fromstring(styles_xml)
+
+        # 文档默认格式（样式链中都未设置时生效）
+        default_bold = None
+        default_size = None
+        default_rpr = root.find(f"{_w('docDefaults')}/{_w('rPrDefault')}/{_w('rPr')}")
+        if default_rpr is not None:
+            b = default_rpr.find(_w('b'))
+            default_bold = on_off(b) if b is not None else None
+            default_size = parse_font_size(default_rpr.find(_w('sz')))
+
+        # 先收集每个样式自身定义的属性
+        raw_styles = {}
+        default_style_id = None
+        for style in root.iter(_w('style')):
+            if style.get(_w('type'), 'paragraph') != 'paragraph':
+                continue
+            style_id = style.get(_w('styleId'))
+            if style_id is None:
+                continue
+            # 与python-docx一致：取文档顺序中最后一个默认段落样式
+            if style.get(_w('default'), '0').lower() in ('1', 'true', 'on'):
+                default_style_id = style_id
+            if style_id in raw_styles:
+                continue
+
+            name_element = style.find(_w('name'))
+            name = name_element.get(W_VAL) if name_element is not None else None
+            based_on = style.find(_w('basedOn'))
+            p_pr = style.find(_w('pPr'))
+            r_pr = style.find(_w('rPr'))
+            b = r_pr.find(_w('b')) if r_pr is not None else None
+
+            raw_styles[style_id] = {
+                'name': BabelFish.internal2ui(name) if name else None,
+                'based_on': based_on.get(W_VAL) if based_on is not None else None,
+                'outline_level': parse_outline_level(p_pr.find(_w('outlineLvl')) if p_pr is not None else None),
+                'bold': on_off(b) if b is not None else None,
+                'size': parse_font_size(r_pr.find(_w('sz')) if r_pr is not None else None),
+            }
+
+        def inherited(style_id: str, attribute: str):
+            """沿basedOn链查找第一个设置了该属性的样式"""
+            visited = set()
+            while style_id in raw_styles and style_id not in visited:
+                visited.add(style_id)
+                value = raw_styles[style_id][attribute]
+                if value is not None:
+                    return value
+                style_id = raw_styles[style_id]['based_on']
+            return None
+
+        styles = {}
+        for style_id, raw in raw_styles.items():
+            heading_level = 0
+            style_name = (raw['name'] or '').lower()
+            if 'heading' in style_name:
+                match = _HEADING_NAME_PATTERN.search(style_name)
+                heading_level = min(int(match.group(1)), MAX_HEADING_LEVEL) if match else 1
+
+            bold = inherited(style_id, 'bold')
+            if bold is None:
+                bold = default_bold
+            size = inherited(style_id, 'size')
+            if size is None:
+                size = default_size
+
+            styles[style_id] = StyleInfo(
+                style_id=style_id,
+                name=raw['name'],
+                heading_level=heading_level,
+                outline_level=inherited(style_id, 'outline_level'),
+                bold=bold,
+                size=size,
+                font_level=font_heading_level(bold, size)
+            )
+
+        return cls(styles, default_style_id)
@@ -0,0 +1,106 @@
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 淘汰时清理到上限的比例，避免每次写入都触发淘汰
+_EVICT_TARGET_RATIO = 0.9
+# 两次扫描缓存目录的最短间隔（秒）
+_EVICT_INTERVAL = 300
+# 写入中断遗留的临时文件超过该时间（秒）后删除
+_STALE_TMP_SECONDS = 3600
+
+
+def touch_entry(entry_path: str):
+    """记录条目的最近访问时间（显式设置atime，不依赖文件系统的atime策略；mtime保持为写入时间，用于判断过期）"""
+    try:
+        stat = os.stat(entry_path)
+        os.utime(entry_path, ns=(time.time_ns(), stat.st_mtime_ns))
+    except OSError:
+        pass
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        logger.warning("删除缓存文件失败 %s: %s", path, e)
+        return False
+
+
+def evict_cache_dir(cache_dir: str, max_bytes: int, ttl: int = 0) -> int:
+    """
+    清理按键分目录存储的文件缓存（<cache_dir>/<键前两位>/<键>[.附属数据].json）
+
+    同一个键的条目和附属数据作为一组处理：写入时间超过ttl（0表示不过期）的组直接删除；
+    总大小仍超过max_bytes时按最近访问时间从旧到新删除，直到低于上限的90%。
+
+    Returns:
+        删除的组数
+    """
+    now = time.time()
+    groups: Dict[str, Dict[str, Any]] = {}
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith('.tmp'):
+                if now - stat.st_mtime > _STALE_TMP_SECONDS:
+                    _remove(path)
+                continue
+            group = groups.setdefault(os.path.join(root, name.split('.', 1)[0]), {
+                'paths': [], 'size': 0, 'written': stat.st_mtime, 'accessed': stat.st_mtime
+            })
+            group['paths'].append(path)
+            group['size'] += stat.st_size
+            group['written'] = min(group['written'], stat.st_mtime)
+            group['accessed'] = max(group['accessed'], stat.st_atime)
+
+    evicted = 0
+    total = sum(group['size'] for group in groups.values())
+    target = max_bytes * _EVICT_TARGET_RATIO if total > max_bytes else total
+    for group in sorted(groups.values(), key=lambda group: group['accessed']):
+        expired = ttl and now - group['written'] > ttl
+        if not expired and total <= target:
+            continue
+        for path in group['paths']:
+            _remove(path)
+        total -= group['size']
+        evicted += 1
+
+    if evicted:
+        logger.info("缓存目录 %s 淘汰 %s 条，剩余 %.1f MB", cache_dir, evicted, total / 1024 / 1024)
+    return evicted
+
+
+class CacheDirEvictor:
+    """在写入时按需清理缓存目录（每个进程最多每5分钟扫描一次，扫描期间其他写入不等待）"""
+
+    def __init__(self, cache_dir: str, max_bytes: int, ttl: int = 0):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._last_run: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def maybe_evict(self):
+        if self._last_run is not None and time.monotonic() - self._last_run < _EVICT_INTERVAL:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._last_run = time.monotonic()
+            evict_cache_dir(self.cache_dir, self.max_bytes, self.ttl)
+        except Exception as e:
+            logger.warning("清理缓存目录 %s 失败: %s", self.cache_dir, e)
+        finally:
+            self._lock.release()
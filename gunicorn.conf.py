@@ -0,0 +1,7 @@
+# gunicorn配置（gunicorn启动时自动加载当前目录下的gunicorn.conf.py）
+
+
+def post_worker_init(worker):
+    """worker加载应用后执行初始化（恢复中断的实时分析）；在处理请求的worker中执行，使用--preload时主进程不执行"""
+    from app import init_app
+    init_app()
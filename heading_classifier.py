@@ -0,0 +1,142 @@
+import re
+import json
+import hashlib
+from typing import Dict, List, NamedTuple, Optional, Pattern, Sequence, Tuple
+
+# 标题最大级别
+MAX_HEADING_LEVEL = 7
+
+# 数字反向引用（合并后分组编号会变化），前面的成对反斜杠是转义的反斜杠本身
+_BACKREFERENCE = re.compile(r'(?<!\\)(?:\\\\)*\\[1-9]')
+# 模式开头的全局内联标志，如(?i)
+_LEADING_FLAGS = re.compile(r'\(\?([aiLmsux]+)\)')
+
+
+class HeadingRuleSet(NamedTuple):
+    """一组标题规则：第i个模式匹配时级别为 start_level + i"""
+    name: str
+    patterns: List[str]
+    start_level: int
+
+
+class HeadingMatch(NamedTuple):
+    """标题匹配结果"""
+    level: int
+    rule_set: str
+    rule_index: int
+
+
+class HeadingClassifier:
+    """标题分类器 - 将多组规则编译为一个带命名分支的正则，每行只扫描一次即可确定标题级别"""
+
+    def __init__(self, rule_sets: Optional[Sequence[HeadingRuleSet]] = None):
+        """
+        Args:
+            rule_sets: 按优先级排列的规则组，靠前的规则组和模式优先匹配
+        """
+        self.rule_sets: List[HeadingRuleSet] = []
+        self._fingerprint: Optional[str] = None
+        # 按优先级排列的匹配器：(正则, 命名分支到匹配结果的映射)，单独匹配的模式映射的键为None
+        self._segments: List[Tuple[Pattern, Dict[Optional[str], HeadingMatch]]] = []
+        for rule_set in rule_sets or []:
+            self.rule_sets.append(HeadingRuleSet(*rule_set))
+        self._compile()
+
+    def add_rule_set(self, name: str, patterns: List[str], start_level: int):
+        """追加一组规则（优先级低于已有规则），用于按部署扩展标题格式"""
+        self.rule_sets.append(HeadingRuleSet(name, list(patterns), start_level))
+        self._compile()
+
+    def _compile(self):
+        """
+        把所有规则编译为尽量少的正则：相邻的可合并模式组成一个正则，每个模式对应一个命名分支
+
+        含命名分组（合并后可能重名）、数字反向引用（合并后分组编号变化）或(?x)（注释会吞掉合并时补的括号）的模式
+        不能放进合并的正则，单独编译并按原有顺序匹配；开头的其他全局内联标志（如(?i)）改为只作用于该模式的局部标志。
+        """
+        self._segments = []
+        self._fingerprint = None
+        alternatives: List[str] = []
+        branches: Dict[Optional[str], HeadingMatch] = {}
+
+        for set_index, rule_set in enumerate(self.rule_sets):
+            for rule_index, pattern in enumerate(rule_set.patterns):
+                # 校验单个模式，避免错误信息指向合并后的大正则
+                compiled = re.compile(pattern)
+                heading_match = HeadingMatch(
+                    min(rule_set.start_level + rule_index, MAX_HEADING_LEVEL),
+                    rule_set.name,
+                    rule_index
+                )
+                if compiled.groupindex or _BACKREFERENCE.search(pattern) or compiled.flags & re.VERBOSE:
+                    self._add_combined(alternatives, branches)
+                    alternatives, branches = [], {}
+                    self._segments.append((compiled, {None: heading_match}))
+                    continue
+
+                branch = f"r{set_index}_{rule_index}"
+                alternatives.append(f"(?P<{branch}>{_scope_leading_flags(pattern)})")
+                branches[branch] = heading_match
+
+        self._add_combined(alternatives, branches)
+
+    def _add_combined(self, alternatives: List[str], branches: Dict[Optional[str], HeadingMatch]):
+        """把相邻的可合并模式编译为一个正则（正则分支按书写顺序尝试，与逐个模式依次匹配的优先级一致）"""
+        if not alternatives:
+            return
+        self._segments.append((re.compile('|'.join(alternatives)), branches))
+
+    def match(self, text: str) -> Optional[HeadingMatch]:
+        """匹配一行文本，返回命中的规则及级别，未命中返回None"""
+        for matcher, branches in self._segments:
+            match = matcher.match(text)
+            if match:
+                # 单独匹配的模式只有一个结果（键为None），合并的正则按命中的分支确定
+                return branches[None] if None in branches else branches[match.lastgroup]
+        return None
+
+    def classify(self, text: str) -> int:
+        """返回文本的标题级别，非标题返回0"""
+        heading_match = self.match(text)
+        return heading_match.level if heading_match else 0
+
+    @property
+    def fingerprint(self) -> str:
+        """规则集指纹，规则变化时解析缓存随之失效"""
+        if self._fingerprint is None:
+            self._fingerprint = rule_sets_fingerprint(self.rule_sets)
+        return self._fingerprint
+
+
+def rule_sets_fingerprint(rule_sets: Sequence[HeadingRuleSet]) -> str:
+    """规则组的指纹（与用这些规则组构建的HeadingClassifier.fingerprint相同，不需要编译正则）"""
+    payload = json.dumps([list(rule_set) for rule_set in rule_sets], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def _scope_leading_flags(pattern: str) -> str:
+    """把模式开头的全局内联标志改为局部标志：(?i)abc -> (?i:abc)（全局标志不在正则开头时Python 3.11起会报错）"""
+    flags = ''
+    match = _LEADING_FLAGS.match(pattern)
+    while match:
+        flags += match.group(1)
+        pattern = pattern[match.end():]
+        match = _LEADING_FLAGS.match(pattern)
+    if not flags:
+        return pattern
+    return f"(?{''.join(dict.fromkeys(flags))}:{pattern})"
+
+
+def load_rule_sets(file_path: str) -> List[HeadingRuleSet]:
+    """
+    从JSON文件加载额外的标题规则组
+
+    文件格式：[{"name": "...", "start_level": 3, "patterns": ["^...", ...]}, ...]
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    return [
+        HeadingRuleSet(item.get('name', f'custom_{i}'), list(item['patterns']), int(item.get('start_level', 1)))
+        for i, item in enumerate(data)
+    ]
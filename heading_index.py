@@ -0,0 +1,160 @@
+from bisect import bisect_left
+from collections import deque
+from typing import Dict, List, Any, Optional, Tuple
+
+# 标题在文本中的位置：(起始偏移, 结束偏移)
+Span = Tuple[int, int]
+
+
+def _fold_case(text: str) -> str:
+    """转为小写且保持长度不变，保证折叠后的偏移与原文一致"""
+    folded = text.lower()
+    if len(folded) == len(text):
+        return folded
+    return ''.join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+class AhoCorasick:
+    """Aho-Corasick多模式匹配自动机：一次扫描找出所有模式的全部出现位置"""
+
+    def __init__(self, patterns: List[str]):
+        self.patterns = patterns
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+
+        for pattern_id, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(pattern_id)
+
+        # 按广度优先构建失败指针，并合并后缀状态的输出
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fallback = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fallback if fallback != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find_all(self, text: str) -> Dict[int, List[int]]:
+        """扫描文本，返回每个模式编号对应的（升序）起始偏移列表"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        lengths = [len(pattern) for pattern in self.patterns]
+        occurrences: Dict[int, List[int]] = {}
+
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                for pattern_id in output[state]:
+                    occurrences.setdefault(pattern_id, []).append(position - lengths[pattern_id] + 1)
+        return occurrences
+
+
+class HeadingIndex:
+    """
+    标题偏移索引 - 一次扫描定位全文中所有标题（忽略大小写）
+
+    按标题顺序为每个标题选取前一个标题之后的第一次出现作为其位置，之后提取任一章节或全部章节都只是切片。
+    """
+
+    def __init__(self, full_text: str, headings: List[Dict[str, Any]],
+                 spans: Optional[List[Optional[Span]]] = None):
+        """
+        Args:
+            full_text: 完整文本
+            headings: 标题列表（需包含text和level）
+            spans: 解析时已记录的标题位置，提供时不再扫描全文（仅在需要额外查找时才扫描）
+        """
+        self.full_text = full_text
+        self.headings = headings
+
+        self._heading_keys = [_fold_case(heading['text'].strip()) for heading in headings]
+        self._occurrences: Optional[Dict[str, List[int]]] = None
+
+        # 每个标题的下一个同级或更高级标题（单调栈，O(n)）
+        self._next_boundaries = [-1] * len(headings)
+        stack: List[int] = []
+        for i in range(len(headings) - 1, -1, -1):
+            level = headings[i]['level']
+            while stack and headings[stack[-1]]['level'] > level:
+                stack.pop()
+            self._next_boundaries[i] = stack[-1] if stack else -1
+            stack.append(i)
+
+        if spans is not None:
+            self.spans: List[Optional[Span]] = [tuple(span) if span else None for span in spans]
+            return
+
+        # 按顺序定位：每个标题取上一个已定位标题之后的第一次出现
+        self.spans = []
+        cursor = 0
+        for key in self._heading_keys:
+            span = self._find_key(key, cursor)
+            self.spans.append(span)
+            if span:
+                cursor = span[1]
+
+    def _scan(self) -> Dict[str, List[int]]:
+        """一次扫描全文，记录每个标题文本的所有出现位置"""
+        if self._occurrences is None:
+            patterns = sorted({key for key in self._heading_keys if key})
+            occurrences = AhoCorasick(patterns).find_all(_fold_case(self.full_text)) if patterns else {}
+            self._occurrences = {pattern: occurrences.get(i, []) for i, pattern in enumerate(patterns)}
+        return self._occurrences
+
+    def _find_key(self, key: str, from_pos: int) -> Optional[Span]:
+        positions = self._scan().get(key)
+        if not positions:
+            return None
+        i = bisect_left(positions, from_pos)
+        if i == len(positions):
+            return None
+        return positions[i], positions[i] + len(key)
+
+    def find(self, heading_text: str, from_pos: int = 0) -> Optional[Span]:
+        """查找标题文本在from_pos之后的第一次出现（仅限索引中的标题）"""
+        return self._find_key(_fold_case(heading_text.strip()), from_pos)
+
+    def span(self, heading_index: int) -> Optional[Span]:
+        """返回第heading_index个标题的位置，未能按顺序定位时退回到首次出现的位置"""
+        span = self.spans[heading_index]
+        if span is None:
+            span = self._find_key(self._heading_keys[heading_index], 0)
+        return span
+
+    def next_boundary(self, heading_index: int) -> int:
+        """返回下一个同级或更高级标题的索引，没有则返回-1"""
+        return self._next_boundaries[heading_index]
+
+    def section_end(self, heading_index: int, start_pos: int) -> Optional[int]:
+        """
+        返回章节结束位置：下一个同级或更高级标题在start_pos之后的起始偏移
+
+        Returns:
+            结束偏移；没有后续同级标题时为全文长度；后续标题无法定位时为None
+        """
+        next_index = self._next_boundaries[heading_index]
+        if next_index < 0:
+            return len(self.full_text)
+        next_span = self.spans[next_index]
+        if next_span is None or next_span[0] < start_pos:
+            next_span = self.find(self.headings[next_index]['text'], start_pos)
+        return next_span[0] if next_span else None
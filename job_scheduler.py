@@ -0,0 +1,213 @@
+import os
+import math
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Coroutine, Deque, Dict, Optional
+
+import async_runner
+
+logger = logging.getLogger(__name__)
+
+# 同时执行的分析任务数
+ANALYSIS_MAX_WORKERS = int(os.environ.get('ANALYSIS_MAX_WORKERS', '4') or 4)
+# 等待执行的任务上限，队列满时拒绝新任务
+ANALYSIS_QUEUE_SIZE = int(os.environ.get('ANALYSIS_QUEUE_SIZE', '20') or 0)
+# 还没有完成过任务时用于估算等待时间的单个任务耗时（秒）
+DEFAULT_JOB_SECONDS = 60
+# 估算平均耗时使用的最近完成任务数
+_DURATION_SAMPLES = 20
+
+
+class QueueFullError(Exception):
+    """分析队列已满"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class _Job:
+    job_id: str
+    factory: Callable[[], Coroutine[Any, Any, Any]]
+    on_queue_update: Optional[Callable[[int, int], None]] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+    future: Optional[Future] = None
+    cancel_requested: bool = False
+
+
+class JobScheduler:
+    """
+    分析任务调度器 - 固定数量的任务同时执行，其余任务在有界队列中按先后顺序等待
+
+    任务是协程工厂，在后台事件循环中执行；队列满时submit抛出QueueFullError（附带建议的重试秒数），
+    排队位置变化时通过on_queue_update(位置, 预计等待秒数)通知调用方，位置0表示任务开始执行。
+    cancel可以移除排队中的任务，或取消执行中的任务（在当前等待的位置抛出CancelledError，中断进行中的HTTP请求）。
+    """
+
+    def __init__(self, max_workers: int = ANALYSIS_MAX_WORKERS, max_queue: int = ANALYSIS_QUEUE_SIZE):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._queue: Deque[_Job] = deque()
+        self._running: Dict[str, _Job] = {}
+        self._durations: Deque[float] = deque(maxlen=_DURATION_SAMPLES)
+        self._lock = threading.Lock()
+
+    def _average_seconds(self) -> float:
+        if not self._durations:
+            return DEFAULT_JOB_SECONDS
+        return sum(self._durations) / len(self._durations)
+
+    def _estimate_wait(self, position: int) -> int:
+        """排在第position位的任务的预计等待秒数（按最近任务的平均耗时和并发数估算）"""
+        if position <= 0:
+            return 0
+        return int(math.ceil(math.ceil(position / self.max_workers) * self._average_seconds()))
+
+    def submit(self, job_id: str, factory: Callable[[], Coroutine[Any, Any, Any]],
+               on_queue_update: Optional[Callable[[int, int], None]] = None) -> int:
+        """
+        提交任务
+
+        Args:
+            job_id: 任务ID
+            factory: 创建任务协程的函数（任务开始执行时才调用）
+            on_queue_update: 排队位置变化的回调(位置, 预计等待秒数)
+
+        Returns:
+            排队位置，0表示已开始执行
+
+        Raises:
+            QueueFullError: 等待中的任务已达上限
+        """
+        job = _Job(job_id, factory, on_queue_update)
+        with self._lock:
+            if len(self._running) < self.max_workers and not self._queue:
+                self._running[job_id] = job
+                position = 0
+            elif len(self._queue) >= self.max_queue:
+                retry_after = self._estimate_wait(len(self._queue) + 1)
+                raise QueueFullError(
+                    f"当前分析任务较多（{len(self._running)}个执行中，{len(self._queue)}个排队），请约{retry_after}秒后重试",
+                    retry_after
+                )
+            else:
+                self._queue.append(job)
+                position = len(self._queue)
+                wait = self._estimate_wait(position)
+
+        if position == 0:
+            self._start(job)
+        else:
+            logger.info("分析任务 %s 进入队列，第 %s 位，预计等待 %s 秒", job_id, position, wait)
+            self._notify(job, position, wait)
+        return position
+
+    def _start(self, job: _Job):
+        logger.debug("分析任务 %s 开始执行", job.job_id)
+        self._notify(job, 0, 0)
+        # 检查取消标记和设置future在同一个锁内：cancel要么看到future直接取消，要么留下标记在这里处理
+        with self._lock:
+            if not job.cancel_requested:
+                job.future = async_runner.submit(self._run(job))
+                return
+        logger.info("分析任务 %s 在开始执行前已取消", job.job_id)
+        self._finished(job, None)
+
+    async def _run(self, job: _Job):
+        started_at = time.monotonic()
+        duration = None
+        try:
+            await job.factory()
+            duration = time.monotonic() - started_at
+        except Exception:
+            duration = time.monotonic() - started_at
+            raise
+        finally:
+            # 被取消的任务不计入平均耗时
+            self._finished(job, duration)
+
+    def _finished(self, job: _Job, duration: Optional[float]):
+        with self._lock:
+            self._running.pop(job.job_id, None)
+            if duration is not None:
+                self._durations.append(duration)
+        self._advance()
+
+    def _advance(self):
+        """有空闲名额时启动排队中的任务，并通知其余任务新的排队位置"""
+        with self._lock:
+            next_jobs = []
+            while self._queue and len(self._running) < self.max_workers:
+                next_job = self._queue.popleft()
+                self._running[next_job.job_id] = next_job
+                next_jobs.append(next_job)
+            waiting = [(queued, index + 1, self._estimate_wait(index + 1)) for index, queued in enumerate(self._queue)]
+
+        for next_job in next_jobs:
+            logger.info("分析任务 %s 排队 %.1f 秒后开始执行", next_job.job_id, time.monotonic() - next_job.enqueued_at)
+            self._start(next_job)
+        for queued, position, wait in waiting:
+            self._notify(queued, position, wait)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        取消任务
+
+        Returns:
+            是否取消成功（任务不存在或已经结束时返回False）
+        """
+        with self._lock:
+            queued = next((job for job in self._queue if job.job_id == job_id), None)
+            if queued is not None:
+                self._queue.remove(queued)
+            running = self._running.get(job_id)
+            if running is not None:
+                running.cancel_requested = True
+                future = running.future
+
+        if queued is not None:
+            logger.info("分析任务 %s 已从队列中移除", job_id)
+            self._advance()
+            return True
+        if running is None:
+            return False
+        if future is None:
+            # 刚离开队列、还没有提交到事件循环：_start看到取消标记后不再执行
+            logger.info("分析任务 %s 已取消", job_id)
+            return True
+        if future.cancel():
+            # 任务协程在当前等待处收到CancelledError，结束后由_run释放名额
+            logger.info("分析任务 %s 已取消", job_id)
+            return True
+        return False
+
+    def cancel_requested(self, job_id: str) -> bool:
+        """执行中的任务是否已通过cancel取消（任务协程据此区分主动取消和事件循环关闭等原因导致的CancelledError）"""
+        with self._lock:
+            job = self._running.get(job_id)
+            return job is not None and job.cancel_requested
+
+    @staticmethod
+    def _notify(job: _Job, position: int, wait: int):
+        if job.on_queue_update is None:
+            return
+        try:
+            job.on_queue_update(position, wait)
+        except Exception as e:
+            logger.warning("更新任务 %s 的排队状态失败: %s", job.job_id, e)
+
+    def stats(self) -> Dict[str, Any]:
+        """执行中和排队中的任务数及平均耗时"""
+        with self._lock:
+            return {
+                'running': len(self._running),
+                'queued': len(self._queue),
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'average_job_seconds': round(self._average_seconds(), 1)
+            }
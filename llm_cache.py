@@ -0,0 +1,180 @@
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# 缓存条目有效期（秒），默认7天
+LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', str(7 * 24 * 3600)) or 0)
+# 缓存总大小上限（MB），超过时按最近最少使用淘汰
+LLM_CACHE_MAX_MB = int(os.environ.get('LLM_CACHE_MAX_MB', '256') or 256)
+
+# 淘汰时清理到上限的比例，避免每次写入都触发淘汰
+_EVICT_TARGET_RATIO = 0.9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class ResponseCache:
+    """AI响应缓存 - 以(模型, API地址, Agent类型, 提示词摘要, 温度)为键，存储在SQLite中，跨用户、跨进程共享"""
+
+    def __init__(self, db_path: str, ttl: int = LLM_CACHE_TTL, max_bytes: int = LLM_CACHE_MAX_MB * 1024 * 1024):
+        """
+        初始化响应缓存
+
+        Args:
+            db_path: SQLite数据库文件路径，多个worker可以指向同一文件
+            ttl: 条目有效期（秒），0表示不过期
+            max_bytes: 缓存响应的总大小上限（字节）
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+
+        # 每个线程（及fork后的进程）使用独立连接
+        self._local = threading.local()
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def make_key(model: str, base_url: str, agent_type: str, prompt: str, temperature: float) -> str:
+        """生成缓存键（提示词只参与摘要，不落盘）"""
+        prompt_digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        material = json.dumps([model, base_url, agent_type, prompt_digest, temperature], ensure_ascii=False)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存的响应，未命中或已过期时返回None"""
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute('SELECT response, created_at FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                row = None
+
+            if row is None:
+                self._increment(conn, 'misses')
+                return None
+
+            conn.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+            self._increment(conn, 'hits')
+            return row[0]
+        except sqlite3.Error as e:
+            logger.warning("读取AI响应缓存失败: %s", e)
+            return None
+
+    def set(self, key: str, response: str) -> bool:
+        """写入响应，超过大小上限时淘汰过期条目和最近最少使用的条目"""
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        if size > self.max_bytes:
+            return False
+
+        try:
+            conn = self._connect()
+            conn.execute(
+                'INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+                (key, response, size, now, now)
+            )
+            self._evict(conn, now)
+            return True
+        except sqlite3.Error as e:
+            logger.warning("写入AI响应缓存失败: %s", e)
+            return False
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        if self.ttl:
+            conn.execute('DELETE FROM responses WHERE created_at < ?', (now - self.ttl,))
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+        target = self.max_bytes * _EVICT_TARGET_RATIO
+        evicted = 0
+        rows = conn.execute('SELECT key, size FROM responses ORDER BY accessed_at').fetchall()
+        for key, size in rows:
+            if total <= target:
+                break
+            conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            total -= size
+            evicted += 1
+
+        if evicted:
+            self._increment(conn, 'evictions', evicted)
+            logger.debug("AI响应缓存淘汰 %s 条", evicted)
+
+    @staticmethod
+    def _increment(conn: sqlite3.Connection, name: str, amount: int = 1):
+        conn.execute(
+            'INSERT INTO stats (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + ?',
+            (name, amount, amount)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中/未命中/淘汰计数及当前条目数和大小"""
+        try:
+            conn = self._connect()
+            counters = dict(conn.execute('SELECT name, value FROM stats').fetchall())
+            entries, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        except sqlite3.Error as e:
+            logger.warning("读取AI响应缓存统计失败: %s", e)
+            return {}
+
+        return {
+            'hits': counters.get('hits', 0),
+            'misses': counters.get('misses', 0),
+            'evictions': counters.get('evictions', 0),
+            'entries': entries,
+            'size_bytes': total,
+            'max_bytes': self.max_bytes,
+            'ttl': self.ttl
+        }
+
+
+_default_cache: Optional[ResponseCache] = None
+
+
+def configure_default_response_cache(db_path: str) -> ResponseCache:
+    """配置进程默认的AI响应缓存，未显式传入response_cache的AIAnalyzer都会使用它"""
+    global _default_cache
+    _default_cache = ResponseCache(db_path)
+    return _default_cache
+
+
+def get_default_response_cache() -> Optional[ResponseCache]:
+    """获取进程默认的AI响应缓存（未配置时为None，即不缓存）"""
+    return _default_cache
@@ -0,0 +1,347 @@
+import os
+import time
+import random
+import socket
+import logging
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+logger = logging.getLogger(__name__)
+
+# 每个API地址保持的最大空闲连接数（并发请求超过该值时多出的连接用完即关闭）
+LLM_POOL_MAXSIZE = int(os.environ.get('LLM_POOL_MAXSIZE', '20') or 20)
+# TCP keep-alive：连接空闲多少秒后开始探测（0表示不开启TCP探测，仅使用HTTP keep-alive）
+LLM_TCP_KEEPALIVE_IDLE = int(os.environ.get('LLM_TCP_KEEPALIVE_IDLE', '60') or 0)
+
+# 异步客户端的最大并发连接数（超过时请求在连接池中排队等待，而不是占用线程）
+LLM_ASYNC_MAX_CONNECTIONS = int(os.environ.get('LLM_ASYNC_MAX_CONNECTIONS', '200') or 200)
+# 异步客户端空闲连接的保活时间（秒）
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get('LLM_KEEPALIVE_EXPIRY', '60') or 60)
+
+# 可重试错误（网络错误、429、5xx）的最大重试次数
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', '3') or 0)
+# 指数退避的基础间隔和最大间隔（秒），实际等待时间在[0, 当前间隔]内随机
+LLM_BACKOFF_BASE = float(os.environ.get('LLM_BACKOFF_BASE', '1') or 1)
+LLM_BACKOFF_MAX = float(os.environ.get('LLM_BACKOFF_MAX', '30') or 30)
+# 熔断：同一API地址连续失败（5xx或网络错误）多少次后熔断，熔断后多少秒允许一次试探请求
+LLM_BREAKER_THRESHOLD = int(os.environ.get('LLM_BREAKER_THRESHOLD', '5') or 5)
+LLM_BREAKER_RESET = float(os.environ.get('LLM_BREAKER_RESET', '30') or 30)
+
+# 可以重试的HTTP状态码（其余非200状态码直接失败）
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# 结构化输出（response_format）：auto依次尝试json_schema、json_object，接口拒绝（400/422）时降级为普通文本；
+# json_schema、json_object只尝试指定的格式；off不请求结构化输出
+LLM_RESPONSE_FORMAT = os.environ.get('LLM_RESPONSE_FORMAT', 'auto').lower()
+
+# 接口拒绝结构化输出时返回的状态码
+RESPONSE_FORMAT_REJECTED_CODES = {400, 422}
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_pid: Optional[int] = None
+_sessions_lock = threading.Lock()
+
+
+def _socket_options():
+    """HTTP连接的socket选项：在默认选项基础上开启TCP keep-alive，防止空闲连接被中间设备静默断开"""
+    options = list(HTTPConnection.default_socket_options)
+    if LLM_TCP_KEEPALIVE_IDLE > 0:
+        options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, LLM_TCP_KEEPALIVE_IDLE))
+    return options
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """带TCP keep-alive选项的连接池适配器"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = _socket_options()
+        super().init_poolmanager(*args, **kwargs)
+
+
+def _pool_key(base_url: str) -> str:
+    """按协议和主机区分连接池（同一主机的不同路径共用连接）"""
+    parts = urlsplit(base_url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    # 会话在所有用户之间共享，不保存服务端下发的cookie
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = KeepAliveAdapter(pool_connections=1, pool_maxsize=LLM_POOL_MAXSIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session(base_url: str) -> requests.Session:
+    """
+    获取进程内共享的HTTP会话（按API地址复用连接池）
+
+    所有AIAnalyzer实例共用同一会话，同一分析的后续调用直接复用已建立的TCP/TLS连接。
+    进程fork后会重新创建，避免父子进程共用socket。
+    """
+    global _sessions_pid
+    key = _pool_key(base_url)
+    with _sessions_lock:
+        if _sessions_pid != os.getpid():
+            _sessions.clear()
+            _sessions_pid = os.getpid()
+        session = _sessions.get(key)
+        if session is None:
+            session = _create_session()
+            _sessions[key] = session
+            logger.debug("创建API连接池: %s (最大连接数 %s)", key, LLM_POOL_MAXSIZE)
+        return session
+
+
+def close_sessions():
+    """关闭所有共享会话及其连接"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+_async_clients: Dict[Tuple[int, str], httpx.AsyncClient] = {}
+_async_clients_lock = threading.Lock()
+
+
+def get_async_client(base_url: str) -> httpx.AsyncClient:
+    """
+    获取当前事件循环内共享的异步HTTP客户端（按API地址复用连接池）
+
+    httpx.AsyncClient绑定创建它的事件循环，因此按(事件循环, API地址)缓存；必须在协程中调用。
+    """
+    loop = asyncio.get_running_loop()
+    key = (id(loop), _pool_key(base_url))
+    with _async_clients_lock:
+        client = _async_clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_ASYNC_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_POOL_MAXSIZE,
+                    keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+                ),
+                trust_env=True
+            )
+            _async_clients[key] = client
+            logger.debug("创建异步API连接池: %s (最大连接数 %s)", key[1], LLM_ASYNC_MAX_CONNECTIONS)
+        return client
+
+
+async def close_async_clients():
+    """关闭当前事件循环中的所有异步客户端"""
+    loop_id = id(asyncio.get_running_loop())
+    with _async_clients_lock:
+        clients = [(key, client) for key, client in _async_clients.items() if key[0] == loop_id]
+        for key, _ in clients:
+            del _async_clients[key]
+    for _, client in clients:
+        await client.aclose()
+
+
+class LLMAPIError(Exception):
+    """AI接口调用失败（已按重试策略重试）"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(LLMAPIError):
+    """API地址处于熔断状态，请求未发出"""
+
+
+class CircuitBreaker:
+    """
+    按API地址熔断：连续失败达到阈值后在reset_timeout内直接失败，
+    到期后放行一次试探请求，成功则恢复，失败则继续熔断
+
+    熔断器由所有用户共享，只有服务端故障（5xx、网络错误）计为失败；429、401、403等与请求方
+    （密钥、配额）相关的响应说明服务可用，不会因为某个用户的密钥被限流而让其他用户直接失败。
+    """
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, reset_timeout: float = LLM_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self, key: str):
+        """请求发出前检查，熔断中抛出CircuitOpenError"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(f"API服务暂不可用（{key} 已熔断，约{remaining:.0f}秒后重试）")
+            # 熔断到期，放行一个试探请求；试探期间重新计时，其他请求继续直接失败
+            self._opened_at = time.monotonic()
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self, key: str):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.threshold:
+                if self._opened_at is None or self._probing:
+                    logger.warning("API地址 %s 连续失败 %s 次，熔断 %s 秒", key, self._failures, self.reset_timeout)
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(base_url: str) -> CircuitBreaker:
+    """获取API地址对应的熔断器（进程内共享）"""
+    key = _pool_key(base_url)
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker()
+        return breaker
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After响应头（秒数或HTTP日期），无法解析时返回None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """第attempt次重试前的等待时间：服务端给出Retry-After时按其等待，否则为带随机抖动的指数退避"""
+    if retry_after is not None:
+        return min(retry_after, LLM_BACKOFF_MAX)
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+def _classify_failure(response: Any, body: str, key: str,
+                      breaker: CircuitBreaker) -> Tuple[LLMAPIError, Optional[float]]:
+    """
+    处理非200响应并更新熔断器
+
+    Returns:
+        (错误, 服务端建议的等待秒数或None)；不可重试的错误直接抛出
+    """
+    error = LLMAPIError(f"API调用失败: {response.status_code} - {body[:500]}", response.status_code)
+    if response.status_code >= 500:
+        breaker.record_failure(key)
+    else:
+        # 服务有响应，问题在请求方（密钥无效、限流、配额等），不计入熔断
+        breaker.record_success()
+    if response.status_code not in RETRYABLE_STATUS_CODES:
+        raise error
+    return error, parse_retry_after(response.headers.get('Retry-After'))
+
+
+def _next_delay(attempt: int, error: LLMAPIError, retry_after: Optional[float]) -> float:
+    if attempt >= LLM_MAX_RETRIES:
+        raise error
+    delay = backoff_delay(attempt, retry_after)
+    logger.warning("%s，%.1f秒后第 %s 次重试", error, delay, attempt + 1)
+    return delay
+
+
+def call_with_retry(base_url: str, send: Callable[[], requests.Response]) -> requests.Response:
+    """
+    按重试策略发送请求：网络错误和可重试状态码以指数退避（带抖动、遵循Retry-After）重试，
+    并按API地址熔断
+
+    Args:
+        base_url: API地址（决定使用的熔断器）
+        send: 发送一次请求的函数
+
+    Returns:
+        状态码为200的响应
+
+    Raises:
+        LLMAPIError: 重试耗尽、不可重试的错误或熔断中
+    """
+    key = _pool_key(base_url)
+    breaker = get_breaker(base_url)
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        breaker.before_call(key)
+        try:
+            response = send()
+        except requests.exceptions.RequestException as e:
+            breaker.record_failure(key)
+            failure = LLMAPIError(f"网络请求失败: {e}"), None
+        else:
+            if response.status_code == 200:
+                breaker.record_success()
+                return response
+            failure = _classify_failure(response, response.text, key, breaker)
+        time.sleep(_next_delay(attempt, *failure))
+
+
+async def call_with_retry_async(base_url: str, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+    """
+    call_with_retry的异步版本（退避期间不占用线程）
+
+    send可以返回流式响应；失败的响应会被读取并关闭，成功的响应由调用方负责关闭。
+    """
+    key = _pool_key(base_url)
+    breaker = get_breaker(base_url)
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        breaker.before_call(key)
+        try:
+            response = await send()
+        except httpx.HTTPError as e:
+            breaker.record_failure(key)
+            failure = LLMAPIError(f"网络请求失败: {e}"), None
+        else:
+            if response.status_code == 200:
+                breaker.record_success()
+                return response
+            body = (await response.aread()).decode('utf-8', 'replace')
+            await response.aclose()
+            failure = _classify_failure(response, body, key, breaker)
+        await asyncio.sleep(_next_delay(attempt, *failure))
+
+
+_unsupported_formats: Dict[Tuple[str, str], set] = {}
+_unsupported_formats_lock = threading.Lock()
+
+
+def response_format_supported(base_url: str, model: str, kind: str) -> bool:
+    """该API地址和模型是否可能支持某种结构化输出（被拒绝过的格式不再尝试）"""
+    with _unsupported_formats_lock:
+        return kind not in _unsupported_formats.get((_pool_key(base_url), model), ())
+
+
+def mark_response_format_unsupported(base_url: str, model: str, kind: str):
+    """记录该API地址和模型不支持某种结构化输出（进程内有效）"""
+    with _unsupported_formats_lock:
+        kinds = _unsupported_formats.setdefault((_pool_key(base_url), model), set())
+        if kind not in kinds:
+            kinds.add(kind)
+            logger.info("API地址 %s 的模型 %s 不支持 %s 结构化输出，后续不再请求", _pool_key(base_url), model, kind)
@@ -0,0 +1,56 @@
+import os
+import sys
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+# 日志级别（DEBUG/INFO/WARNING/ERROR）
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# DEBUG日志采样：每个调用点每N条只输出1条（1表示全部输出），用于在大文档上开启调试而不刷屏
+LOG_DEBUG_SAMPLE_EVERY = int(os.environ.get('LOG_DEBUG_SAMPLE_EVERY', '1') or 1)
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(name)s] %(message)s'
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+class DebugSampler(logging.Filter):
+    """按调用点对DEBUG日志采样，被丢弃的记录不会进行消息格式化"""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self._counters: Dict[Tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.every <= 1:
+            return True
+        call_site = (record.pathname, record.lineno)
+        with self._lock:
+            count = self._counters.get(call_site, 0)
+            self._counters[call_site] = count + 1
+        return count % self.every == 0
+
+
+def configure_logging(level: Optional[str] = None, sample_every: Optional[int] = None):
+    """
+    配置根日志（只生效一次）
+
+    Args:
+        level: 日志级别，为空时使用LOG_LEVEL配置
+        sample_every: DEBUG日志采样间隔，为空时使用LOG_DEBUG_SAMPLE_EVERY配置
+    """
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE_EVERY if sample_every is None else sample_every))
+
+        root_logger = logging.getLogger()
+        root_logger.addHandler(handler)
+        root_logger.setLevel(getattr(logging, (level or LOG_LEVEL).upper(), logging.INFO))
+        _configured = True
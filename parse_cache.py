@@ -0,0 +1,139 @@
+import os
+import logging
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from file_cache import CacheDirEvictor, touch_entry
+
+logger = logging.getLogger(__name__)
+
+# 解析缓存条目（含文档文本等附属数据）的有效期（秒），默认30天，0表示不过期
+PARSE_CACHE_TTL = int(os.environ.get('PARSE_CACHE_TTL', str(30 * 24 * 3600)) or 0)
+# 解析缓存总大小上限（MB），超过时按最近最少使用淘汰
+PARSE_CACHE_MAX_MB = int(os.environ.get('PARSE_CACHE_MAX_MB', '1024') or 1024)
+# 进程内记忆的文件摘要数（按最近使用淘汰）
+_DIGEST_MEMO_SIZE = 1024
+
+
+class ParseCache:
+    """文档解析结果缓存 - 以文件内容SHA-256和解析器版本为键，跨用户、跨进程共享"""
+
+    def __init__(self, cache_dir: str, ttl: int = PARSE_CACHE_TTL, max_bytes: int = PARSE_CACHE_MAX_MB * 1024 * 1024):
+        """
+        初始化解析缓存
+
+        Args:
+            cache_dir: 缓存目录，多个worker可以指向同一目录
+            ttl: 条目有效期（秒），0表示不过期
+            max_bytes: 缓存目录的总大小上限（字节），写入时定期清理过期和最近最少使用的条目
+        """
+        self.cache_dir = cache_dir
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+        self._evictor = CacheDirEvictor(cache_dir, max_bytes, ttl)
+
+        # 进程内的文件摘要缓存，避免同一文件在多轮对话中重复计算SHA-256（文件修改后旧的键按最近使用淘汰）
+        self._digest_memo: 'OrderedDict[Tuple[str, int, int], str]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def file_digest(self, file_path: str) -> str:
+        """计算文件内容的SHA-256摘要（按路径、大小和修改时间记忆）"""
+        stat = os.stat(file_path)
+        memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+        with self._lock:
+            digest = self._digest_memo.get(memo_key)
+            if digest:
+                self._digest_memo.move_to_end(memo_key)
+        if digest:
+            return digest
+
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+
+        with self._lock:
+            self._digest_memo[memo_key] = digest
+            while len(self._digest_memo) > _DIGEST_MEMO_SIZE:
+                self._digest_memo.popitem(last=False)
+        return digest
+
+    def make_key(self, file_digest: str, version: str) -> str:
+        """根据文件摘要和解析器版本生成缓存键"""
+        return hashlib.sha256(f"{file_digest}:{version}".encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key: str, suffix: str = '.json') -> str:
+        return os.path.join(self.cache_dir, key[:2], key + suffix)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存的解析结果，未命中时返回None"""
+        return self._read_json(self._entry_path(key))
+
+    def set(self, key: str, result: Dict[str, Any]) -> bool:
+        """写入解析结果（先写临时文件再原子替换，保证并发worker读到完整内容）"""
+        return self._write_json(self._entry_path(key), result)
+
+    def get_sidecar(self, key: str, name: str) -> Optional[Dict[str, Any]]:
+        """读取与解析结果关联的附属数据（如文档文本），未命中时返回None"""
+        return self._read_json(self._entry_path(key, f'.{name}.json'))
+
+    def set_sidecar(self, key: str, name: str, data: Dict[str, Any]) -> bool:
+        """写入与解析结果关联的附属数据"""
+        return self._write_json(self._entry_path(key, f'.{name}.json'), data)
+
+    def _read_json(self, entry_path: str) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(entry_path):
+            return None
+
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            touch_entry(entry_path)
+            return data
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("读取解析缓存失败: %s", e)
+            return None
+
+    def _write_json(self, entry_path: str, data: Dict[str, Any]) -> bool:
+        entry_dir = os.path.dirname(entry_path)
+
+        try:
+            os.makedirs(entry_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=entry_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, entry_path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        except Exception as e:
+            logger.warning("写入解析缓存失败: %s", e)
+            return False
+
+        self._evictor.maybe_evict()
+        return True
+
+
+_default_cache: Optional[ParseCache] = None
+
+
+def configure_default_cache(cache_dir: str) -> ParseCache:
+    """配置进程默认的解析缓存，未显式传入cache的DocumentParser都会使用它"""
+    global _default_cache
+    _default_cache = ParseCache(cache_dir)
+    return _default_cache
+
+
+def get_default_cache() -> Optional[ParseCache]:
+    """获取进程默认的解析缓存（未配置时为None，即不缓存）"""
+    return _default_cache
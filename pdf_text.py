@@ -0,0 +1,105 @@
+import os
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+import PyPDF2
+
+logger = logging.getLogger(__name__)
+
+# 并行提取的进程数（0表示使用CPU核数，1表示始终串行）
+PDF_EXTRACT_WORKERS = int(os.environ.get('PDF_EXTRACT_WORKERS', '0') or 0)
+# 页数少于该值时串行提取，进程调度开销不划算
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', '64') or 64)
+# 每个进程大约分到的页段数量，页段越多负载越均衡
+SHARDS_PER_WORKER = 4
+
+# 单页提取结果：(页索引, 文本, 错误信息)，失败时文本为None
+PageText = Tuple[int, Optional[str], Optional[str]]
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[PageText]:
+    """在工作进程中提取[start, end)页的文本"""
+    results = []
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        for page_index in range(start, end):
+            try:
+                results.append((page_index, pdf_reader.pages[page_index].extract_text(), None))
+            except Exception as e:
+                results.append((page_index, None, str(e)))
+    return results
+
+
+def _get_executor(max_workers: int) -> ProcessPoolExecutor:
+    """获取（必要时创建）进程内共享的提取进程池"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != max_workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ProcessPoolExecutor(max_workers=max_workers)
+            _executor_workers = max_workers
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = None
+
+
+def resolve_worker_count(max_workers: Optional[int] = None) -> int:
+    """解析实际使用的进程数"""
+    workers = PDF_EXTRACT_WORKERS if max_workers is None else max_workers
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def extract_page_texts(file_path: str, max_workers: Optional[int] = None,
+                       min_pages: Optional[int] = None) -> List[PageText]:
+    """
+    逐页提取PDF文本，页数较多时将页段分发到进程池并行提取
+
+    Args:
+        file_path: PDF文件路径
+        max_workers: 进程数（为空时使用PDF_EXTRACT_WORKERS配置）
+        min_pages: 启用并行的最小页数（为空时使用PDF_PARALLEL_MIN_PAGES配置）
+
+    Returns:
+        按页序排列的(页索引, 文本, 错误信息)列表
+    """
+    with open(file_path, 'rb') as file:
+        total_pages = len(PyPDF2.PdfReader(file).pages)
+
+    workers = resolve_worker_count(max_workers)
+    if min_pages is None:
+        min_pages = PDF_PARALLEL_MIN_PAGES
+
+    if workers <= 1 or total_pages < max(min_pages, 2):
+        return _extract_page_range(file_path, 0, total_pages)
+
+    shard_count = min(total_pages, workers * SHARDS_PER_WORKER)
+    shard_size = -(-total_pages // shard_count)
+    ranges = [(start, min(start + shard_size, total_pages))
+              for start in range(0, total_pages, shard_size)]
+
+    try:
+        executor = _get_executor(workers)
+        futures = [executor.submit(_extract_page_range, file_path, start, end) for start, end in ranges]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+    except BrokenProcessPool as e:
+        logger.warning("并行提取进程池异常，改为串行提取: %s", e)
+        _reset_executor()
+        return _extract_page_range(file_path, 0, total_pages)
@@ -0,0 +1,347 @@
+import json
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import async_runner
+from artifact_cache import ArtifactCache, get_default_artifact_cache
+
+logger = logging.getLogger(__name__)
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+class PipelineError(Exception):
+    """流水线定义错误（产物未声明、输入无来源、存在环等）"""
+
+
+class EmptyArtifactError(Exception):
+    """必需的步骤产物为空（如未生成提取目标），后续步骤无法执行"""
+
+    def __init__(self, node: 'Node', artifacts: Dict[str, Any]):
+        super().__init__(f"步骤 {node.name} 没有产出结果")
+        self.node = node
+        self.artifacts = artifacts  # 失败前已得到的产物
+
+
+@dataclass
+class Artifact:
+    """
+    步骤产物的类型声明
+
+    encode/decode用于缓存产物（编码结果必须可以JSON序列化）
+    """
+    name: str
+    type: Any
+    encode: Callable[[Any], Any] = _identity
+    decode: Callable[[Any], Any] = _identity
+
+
+@dataclass
+class Param:
+    """流水线参数（由调用方提供），fingerprint返回参与缓存键的可JSON序列化的值"""
+    name: str
+    fingerprint: Callable[[Any], Any] = _identity
+
+
+@dataclass
+class Node:
+    """
+    流水线步骤
+
+    run/run_async以关键字参数接收inputs（以及runtime中声明的运行时参数），单个输出时直接返回产物，
+    多个输出时按outputs顺序返回元组；返回Uncached包装的结果时不写入共享缓存（仍写入任务检查点）。
+    同一步骤的产物只由输入决定：缓存键由步骤名、版本和所有输入的摘要组成，逻辑变化时需要提升version。
+    """
+    name: str
+    inputs: Tuple[str, ...]
+    outputs: Tuple[str, ...]
+    run: Optional[Callable[..., Any]] = None
+    run_async: Optional[Callable[..., Awaitable[Any]]] = None
+    step: int = 0                                       # 对应的进度步骤编号
+    version: str = '1'
+    required: bool = False                              # 产物为空时抛出EmptyArtifactError
+    cache: bool = True                                  # 产物是否写入缓存（已有专用缓存的步骤可关闭）
+    when: Optional[Callable[..., bool]] = None          # 以inputs为参数，返回False时跳过该步骤
+    default: Optional[Callable[..., Any]] = None        # 跳过时的产物，以inputs为参数
+    runtime: Tuple[str, ...] = ()                       # 不参与缓存键的运行时参数（流式回调等）
+
+
+class Uncached:
+    """步骤结果不写入共享缓存（如AI调用失败后使用了模拟响应）"""
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+class PipelineObserver:
+    """流水线执行过程的回调，artifacts为目前已得到的全部产物（包括参数）"""
+
+    def on_start(self, node: Node, artifacts: Dict[str, Any]):
+        """步骤开始执行（复用缓存和跳过的步骤不回调）"""
+
+    def on_complete(self, node: Node, artifacts: Dict[str, Any], cached: bool):
+        """步骤完成，cached表示产物来自缓存（跳过的步骤不回调）"""
+
+
+class Pipeline:
+    """
+    分析流水线 - 按依赖顺序执行声明式的步骤，每个步骤的产物以输入摘要为键缓存
+
+    参数的摘要由Param.fingerprint计算，步骤产物的摘要由步骤的缓存键派生，因此重新运行时
+    输入没有变化的步骤（及其上游）直接复用缓存，只有变化的步骤及其下游重新执行。
+    """
+
+    def __init__(self, params: Iterable[Param], artifacts: Iterable[Artifact], nodes: Iterable[Node],
+                 cache: Optional[ArtifactCache] = None):
+        """
+        初始化流水线
+
+        Args:
+            params: 参数声明
+            artifacts: 产物声明
+            nodes: 步骤（顺序不限，按依赖关系排序）
+            cache: 产物缓存，默认使用进程默认缓存（未配置时不缓存）
+        """
+        self.params = {param.name: param for param in params}
+        self.artifacts = {artifact.name: artifact for artifact in artifacts}
+        self.nodes = self._sort(list(nodes))
+        self._cache = cache
+
+    @property
+    def cache(self) -> Optional[ArtifactCache]:
+        return self._cache if self._cache is not None else get_default_artifact_cache()
+
+    def _sort(self, nodes: List[Node]) -> List[Node]:
+        """检查声明并按依赖关系排序（保持声明顺序）"""
+        producers: Dict[str, Node] = {}
+        for node in nodes:
+            for output in node.outputs:
+                if output not in self.artifacts:
+                    raise PipelineError(f"步骤 {node.name} 的产物 {output} 未声明")
+                if output in producers or output in self.params:
+                    raise PipelineError(f"产物 {output} 重复定义")
+                producers[output] = node
+        for node in nodes:
+            for name in node.inputs:
+                if name not in producers and name not in self.params:
+                    raise PipelineError(f"步骤 {node.name} 的输入 {name} 没有来源")
+
+        ordered: List[Node] = []
+        available = set(self.params)
+        pending = list(nodes)
+        while pending:
+            ready = [node for node in pending if all(name in available for name in node.inputs)]
+            if not ready:
+                raise PipelineError(f"步骤之间存在循环依赖: {[node.name for node in pending]}")
+            for node in ready:
+                ordered.append(node)
+                available.update(node.outputs)
+                pending.remove(node)
+        return ordered
+
+    def plan(self, targets: Optional[Iterable[str]] = None) -> List[Node]:
+        """得到targets所需的步骤（按执行顺序），未指定时为全部步骤"""
+        if targets is None:
+            return list(self.nodes)
+
+        needed = set(targets)
+        selected = []
+        for node in reversed(self.nodes):
+            if needed.intersection(node.outputs):
+                selected.append(node)
+                needed.update(node.inputs)
+        return list(reversed(selected))
+
+    @staticmethod
+    def _digest(material: Any) -> str:
+        text = json.dumps(material, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _fingerprint_params(self, values: Dict[str, Any]) -> Dict[str, str]:
+        """计算参数的摘要（可能需要读取文件）"""
+        missing = [name for name in self.params if name not in values]
+        if missing:
+            raise PipelineError(f"缺少流水线参数: {missing}")
+        return {
+            name: self._digest([name, param.fingerprint(values[name])])
+            for name, param in self.params.items()
+        }
+
+    def _prepare(self, node: Node, artifacts: Dict[str, Any],
+                 identities: Dict[str, str]) -> Tuple[str, Dict[str, Any]]:
+        """步骤的缓存键和输入参数"""
+        key = self._digest([node.name, node.version, [identities[name] for name in node.inputs]])
+        return key, {name: artifacts[name] for name in node.inputs}
+
+    @staticmethod
+    def _runtime_args(node: Node, runtime: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if not runtime:
+            return {}
+        return {name: runtime[name] for name in node.runtime if name in runtime}
+
+    def _split(self, node: Node, result: Any) -> Dict[str, Any]:
+        """把步骤返回值按outputs拆分并检查类型"""
+        values = result if len(node.outputs) > 1 else (result,)
+        if len(values) != len(node.outputs):
+            raise PipelineError(f"步骤 {node.name} 应返回 {len(node.outputs)} 个产物")
+
+        outputs = dict(zip(node.outputs, values))
+        for name, value in outputs.items():
+            expected = self.artifacts[name].type
+            if value is not None and not isinstance(value, expected):
+                raise TypeError(f"步骤 {node.name} 的产物 {name} 类型错误: {type(value).__name__}")
+        return outputs
+
+    def _finish(self, node: Node, result: Any, artifacts: Dict[str, Any],
+                allow_empty: bool = False) -> Tuple[Dict[str, Any], bool]:
+        """
+        处理步骤返回值
+
+        Returns:
+            (产物, 是否可以写入共享缓存)
+        """
+        shareable = True
+        if isinstance(result, Uncached):
+            result = result.value
+            shareable = False
+        outputs = self._split(node, result)
+        if node.required and not allow_empty and any(not value for value in outputs.values()):
+            raise EmptyArtifactError(node, artifacts)
+        return outputs, shareable
+
+    def _skipped(self, node: Node, inputs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """步骤被跳过时返回默认产物，否则返回None"""
+        if node.when is None or node.when(**inputs):
+            return None
+        result = node.default(**inputs) if node.default is not None else None
+        if result is None and len(node.outputs) > 1:
+            result = (None,) * len(node.outputs)
+        logger.debug("跳过步骤 %s", node.name)
+        return self._split(node, result)
+
+    def _load(self, node: Node, key: str, checkpoint: Optional[Any] = None) -> Optional[Dict[str, Any]]:
+        """读取检查点或缓存中的产物，都未命中时返回None"""
+        if not node.cache:
+            return None
+        for store in (checkpoint, self.cache):
+            if store is None:
+                continue
+            encoded = store.get(key)
+            if encoded is None:
+                continue
+            try:
+                outputs = {name: self.artifacts[name].decode(encoded[name]) for name in node.outputs}
+            except Exception as e:
+                logger.warning("步骤 %s 的缓存产物无法解析: %s", node.name, e)
+                continue
+            logger.info("步骤 %s 复用%s产物", node.name, '检查点' if store is checkpoint else '缓存')
+            return outputs
+        return None
+
+    def _store(self, node: Node, key: str, outputs: Dict[str, Any], shareable: bool,
+               checkpoint: Optional[Any] = None):
+        """产物写入检查点，可共享时同时写入缓存"""
+        stores = [store for store in (checkpoint, self.cache if shareable else None) if store is not None]
+        if not node.cache or not stores:
+            return
+        try:
+            encoded = {name: self.artifacts[name].encode(value) for name, value in outputs.items()}
+        except Exception as e:
+            logger.warning("步骤 %s 的产物无法缓存: %s", node.name, e)
+            return
+        for store in stores:
+            store.set(key, encoded, node.name)
+
+    def _publish(self, key: str, outputs: Dict[str, Any], artifacts: Dict[str, Any], identities: Dict[str, str]):
+        for name, value in outputs.items():
+            artifacts[name] = value
+            identities[name] = self._digest([key, name])
+
+    def run(self, values: Dict[str, Any], targets: Optional[Iterable[str]] = None,
+            runtime: Optional[Dict[str, Any]] = None,
+            observer: Optional[PipelineObserver] = None,
+            checkpoint: Optional[Any] = None,
+            allow_empty: bool = False) -> Dict[str, Any]:
+        """
+        在当前线程中执行流水线
+
+        Args:
+            values: 参数值
+            targets: 需要的产物，只执行得到它们所需的步骤；默认执行全部步骤
+            runtime: 运行时参数（按步骤声明的runtime传入，不参与缓存键）
+            observer: 执行过程的回调
+            checkpoint: 任务自己的产物存储（接口同ArtifactCache），优先于缓存读取，
+                所有产物（包括不可共享的）都会写入，用于中断后恢复
+            allow_empty: 忽略步骤的required，必需的产物为空时仍继续执行后续步骤
+
+        Returns:
+            参数和所有已执行步骤的产物
+
+        Raises:
+            EmptyArtifactError: 必需的产物为空（allow_empty为False时）
+        """
+        observer = observer or PipelineObserver()
+        artifacts = dict(values)
+        identities = self._fingerprint_params(values)
+
+        for node in self.plan(targets):
+            key, inputs = self._prepare(node, artifacts, identities)
+            outputs = self._skipped(node, inputs)
+            if outputs is not None:
+                self._publish(key, outputs, artifacts, identities)
+                continue
+
+            outputs = self._load(node, key, checkpoint)
+            cached = outputs is not None
+            if not cached:
+                observer.on_start(node, artifacts)
+                if node.run is None:
+                    raise PipelineError(f"步骤 {node.name} 没有同步实现")
+                result = node.run(**inputs, **self._runtime_args(node, runtime))
+                outputs, shareable = self._finish(node, result, artifacts, allow_empty)
+                self._store(node, key, outputs, shareable, checkpoint)
+
+            self._publish(key, outputs, artifacts, identities)
+            observer.on_complete(node, artifacts, cached)
+        return artifacts
+
+    async def run_async(self, values: Dict[str, Any], targets: Optional[Iterable[str]] = None,
+                        runtime: Optional[Dict[str, Any]] = None,
+                        observer: Optional[PipelineObserver] = None,
+                        checkpoint: Optional[Any] = None,
+                        allow_empty: bool = False) -> Dict[str, Any]:
+        """
+        在事件循环中执行流水线（参数同run）
+
+        优先使用步骤的run_async，没有时在线程池中执行run；缓存读写也在线程池中进行。
+        """
+        observer = observer or PipelineObserver()
+        artifacts = dict(values)
+        identities = await async_runner.run_blocking(self._fingerprint_params, values)
+
+        for node in self.plan(targets):
+            key, inputs = self._prepare(node, artifacts, identities)
+            outputs = self._skipped(node, inputs)
+            if outputs is not None:
+                self._publish(key, outputs, artifacts, identities)
+                continue
+
+            outputs = await async_runner.run_blocking(self._load, node, key, checkpoint)
+            cached = outputs is not None
+            if not cached:
+                observer.on_start(node, artifacts)
+                kwargs = dict(inputs, **self._runtime_args(node, runtime))
+                if node.run_async is not None:
+                    result = await node.run_async(**kwargs)
+                else:
+                    result = await async_runner.run_blocking(node.run, **kwargs)
+                outputs, shareable = self._finish(node, result, artifacts, allow_empty)
+                await async_runner.run_blocking(self._store, node, key, outputs, shareable, checkpoint)
+
+            self._publish(key, outputs, artifacts, identities)
+            observer.on_complete(node, artifacts, cached)
+        return artifacts
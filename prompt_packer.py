@@ -0,0 +1,178 @@
+import os
+import re
+import logging
+from dataclasses import dataclass, field, replace
+from typing import Any, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 分析提示词的token预算（含提示词模板本身），超出时按优先级和置信度裁剪提取内容
+LLM_PROMPT_TOKEN_BUDGET = int(os.environ.get('LLM_PROMPT_TOKEN_BUDGET', '24000') or 24000)
+# 裁剪后的内容片段至少保留的token数，剩余预算不足时整段舍弃
+MIN_SECTION_TOKENS = 200
+# 每个内容片段在提示词中的格式开销（标题行、置信度行等）
+SECTION_OVERHEAD_TOKENS = 20
+# 与已保留片段重叠超过该比例的片段视为重复
+OVERLAP_RATIO = 0.8
+
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]')
+
+TRUNCATION_MARK = '...'
+
+
+def estimate_tokens(text: str) -> int:
+    """本地估算token数：中日韩字符和全角标点约1个token，其余字符约4个字符1个token"""
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    return cjk_count + (len(text) - cjk_count + 3) // 4
+
+
+def _trim_to_tokens(text: str, max_tokens: int) -> str:
+    """把文本截断到不超过max_tokens（尽量在换行处截断）"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    # 二分查找满足预算的最长前缀
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+
+    cut = low
+    line_break = text.rfind('\n', 0, cut)
+    if line_break > cut * 0.8:
+        cut = line_break
+    return text[:cut].rstrip() + TRUNCATION_MARK
+
+
+@dataclass
+class PackResult:
+    """打包结果"""
+    contents: List[Any]                  # 保留的内容（保持原有顺序，可能已截断）
+    content_tokens: int                  # 内容部分的估算token数
+    prompt_tokens: int = 0               # 整个提示词的估算token数（由调用方在组装后填写）
+    budget: int = LLM_PROMPT_TOKEN_BUDGET
+    trimmed: List[str] = field(default_factory=list)     # 被截断的内容标题
+    dropped: List[str] = field(default_factory=list)     # 因预算不足舍弃的内容标题
+    duplicates: List[str] = field(default_factory=list)  # 因与其他内容重复舍弃的标题
+
+    def stats(self) -> dict:
+        """供进度日志（steps_log）记录的统计信息"""
+        return {
+            'prompt_tokens': self.prompt_tokens,
+            'token_budget': self.budget,
+            'content_tokens': self.content_tokens,
+            'packed_count': len(self.contents),
+            'trimmed_count': len(self.trimmed),
+            'dropped_count': len(self.dropped),
+            'duplicate_count': len(self.duplicates)
+        }
+
+
+class PromptPacker:
+    """
+    提示词打包器 - 在token预算内装入尽可能有价值的提取内容
+
+    按优先级和置信度排序，先去除重复或重叠的内容，再依次装入；装不下的内容截断或舍弃。
+    内容对象需提供title、content、confidence属性，可选priority和span属性。
+    """
+
+    def __init__(self, budget: int = LLM_PROMPT_TOKEN_BUDGET, max_section_chars: Optional[int] = None,
+                 remove_duplicates: bool = True):
+        """
+        Args:
+            budget: 整个提示词的token预算
+            max_section_chars: 单个内容片段的最大字符数（超出部分先行截断），为空时不限制
+            remove_duplicates: 打包前是否去除重复或重叠的内容
+        """
+        self.budget = budget
+        self.max_section_chars = max_section_chars
+        self.remove_duplicates = remove_duplicates
+
+    @staticmethod
+    def _rank_key(item: Tuple[int, Any]) -> Tuple[float, float, int]:
+        index, content = item
+        return -(getattr(content, 'priority', 0) or 0), -(content.confidence or 0), index
+
+    @staticmethod
+    def _overlap(span: Sequence[int], other: Sequence[int]) -> int:
+        return max(0, min(span[1], other[1]) - max(span[0], other[0]))
+
+    def _is_duplicate(self, content: Any, kept: List[Any]) -> bool:
+        text = content.content.strip()
+        span = getattr(content, 'span', None)
+        for other in kept:
+            other_span = getattr(other, 'span', None)
+            if span and other_span and span[1] > span[0]:
+                if self._overlap(span, other_span) >= (span[1] - span[0]) * OVERLAP_RATIO:
+                    return True
+            elif text and text in other.content:
+                return True
+        return False
+
+    def deduplicate(self, contents: List[Any]) -> Tuple[List[Any], List[str]]:
+        """
+        去除重复或重叠的内容（保留优先级和置信度更高的一方）
+
+        Returns:
+            (保留的内容（保持原有顺序）, 被去除的内容标题)
+        """
+        kept: List[Tuple[int, Any]] = []
+        duplicates = []
+        for index, content in sorted(enumerate(contents), key=self._rank_key):
+            if self._is_duplicate(content, [item for _, item in kept]):
+                duplicates.append(content.title)
+            else:
+                kept.append((index, content))
+        return [content for _, content in sorted(kept, key=lambda item: item[0])], duplicates
+
+    def pack(self, contents: List[Any], overhead_tokens: int = 0) -> PackResult:
+        """
+        在预算内打包内容
+
+        Args:
+            contents: 提取的内容列表
+            overhead_tokens: 提示词中内容以外部分（模板、需求、文档信息等）的token数
+
+        Returns:
+            打包结果
+        """
+        remaining = self.budget - overhead_tokens
+        unique, duplicates = self.deduplicate(contents) if self.remove_duplicates else (contents, [])
+        ranked = sorted(enumerate(unique), key=self._rank_key)
+
+        kept: List[Tuple[int, Any]] = []
+        result = PackResult(contents=[], content_tokens=0, budget=self.budget, duplicates=duplicates)
+        for index, content in ranked:
+            text = content.content
+            if self.max_section_chars is not None and len(text) > self.max_section_chars:
+                text = text[:self.max_section_chars] + TRUNCATION_MARK
+
+            section_overhead = SECTION_OVERHEAD_TOKENS + estimate_tokens(content.title)
+            tokens = estimate_tokens(text) + section_overhead
+            if tokens > remaining:
+                available = remaining - section_overhead
+                if available < MIN_SECTION_TOKENS:
+                    result.dropped.append(content.title)
+                    continue
+                text = _trim_to_tokens(text, available)
+                tokens = estimate_tokens(text) + section_overhead
+                result.trimmed.append(content.title)
+
+            if text != content.content:
+                content = replace(content, content=text)
+            kept.append((index, content))
+            remaining -= tokens
+            result.content_tokens += tokens
+
+        # 按原有顺序输出
+        result.contents = [content for _, content in sorted(kept, key=lambda item: item[0])]
+        if result.trimmed or result.dropped or result.duplicates:
+            logger.info("提示词打包: 保留 %s 个内容（截断 %s 个），舍弃 %s 个，去重 %s 个，内容约 %s tokens",
+                        len(result.contents), len(result.trimmed), len(result.dropped),
+                        len(result.duplicates), result.content_tokens)
+        return result
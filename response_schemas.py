@@ -0,0 +1,86 @@
+from typing import Any, Dict
+
+# 各类AI调用期望的JSON结构，用于请求结构化输出（response_format）。
+# 自由键值的对象（如detailed_analysis）无法用严格模式描述，因此统一使用非严格模式，
+# 接口不支持时逐级降级为json_object或普通文本，解析端始终兼容三种情况。
+
+_STRING_MAP = {"type": "object", "additionalProperties": {"type": "string"}}
+_STRING_LIST = {"type": "array", "items": {"type": "string"}}
+
+EXTRACTION_TARGETS_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "extraction_targets": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string"},
+                    "keywords": _STRING_LIST,
+                    "priority": {"type": "integer"},
+                    "description": {"type": "string"}
+                },
+                "required": ["title", "keywords", "priority", "description"]
+            }
+        }
+    },
+    "required": ["extraction_targets"]
+}
+
+ANALYSIS_RESULT_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "detailed_analysis": {"type": "object"},
+        "recommendations": _STRING_LIST,
+        "extracted_data": {"type": "object"},
+        "confidence_score": {"type": "number"},
+        "analysis_depth": {"type": "string"},
+        "key_insights": _STRING_LIST,
+        "potential_issues": _STRING_LIST,
+        "stakeholder_impact": _STRING_MAP
+    },
+    "required": ["summary", "detailed_analysis", "recommendations", "extracted_data", "confidence_score"]
+}
+
+SECTION_ANALYSIS_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "key_points": {"type": "object"},
+        "recommendations": _STRING_LIST,
+        "extracted_data": {"type": "object"},
+        "relevance": {"type": "number"}
+    },
+    "required": ["summary", "key_points", "recommendations", "extracted_data", "relevance"]
+}
+
+ADDITIONAL_EXTRACTION_DECISION_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "need_additional": {"type": "boolean"},
+        "reason": {"type": "string"},
+        "suggested_keywords": _STRING_LIST,
+        "confidence": {"type": "number"}
+    },
+    "required": ["need_additional", "reason", "suggested_keywords", "confidence"]
+}
+
+REEXTRACTION_DECISION_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "need_reextraction": {"type": "boolean"},
+        "reason": {"type": "string"},
+        "confidence": {"type": "number"}
+    },
+    "required": ["need_reextraction", "reason", "confidence"]
+}
+
+# 结构化输出的名称（json_schema.name）到结构的映射
+RESPONSE_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "extraction_targets": EXTRACTION_TARGETS_SCHEMA,
+    "analysis_result": ANALYSIS_RESULT_SCHEMA,
+    "section_analysis": SECTION_ANALYSIS_SCHEMA,
+    "additional_extraction_decision": ADDITIONAL_EXTRACTION_DECISION_SCHEMA,
+    "reextraction_decision": REEXTRACTION_DECISION_SCHEMA
+}
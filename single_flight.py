@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class FlightAbandoned(Exception):
+    """发起请求的调用方被取消，等待者需要重新发起（或加入新的请求）"""
+
+
+class Flight:
+    """
+    一次进行中的上游调用
+
+    结果通过concurrent.futures.Future分发，同步线程和事件循环中的协程都可以等待；
+    流式输出的增量文本会转发给所有订阅者（后加入的订阅者先补发已输出的部分）。
+    """
+
+    def __init__(self):
+        self.future: Future = Future()
+        self.waiters = 0
+        self._chunks: List[str] = []
+        self._listeners: List[Callable[[str], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def streamed(self) -> bool:
+        """是否有流式输出转发过"""
+        with self._lock:
+            return bool(self._chunks)
+
+    def publish(self, text: str):
+        """转发一段增量文本（由发起请求的调用方调用）"""
+        with self._lock:
+            self._chunks.append(text)
+            for listener in self._listeners:
+                try:
+                    listener(text)
+                except Exception as e:
+                    logger.warning("转发流式输出失败: %s", e)
+
+    def subscribe(self, listener: Callable[[str], None]):
+        with self._lock:
+            for chunk in self._chunks:
+                listener(chunk)
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[str], None]):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def wait(self) -> Any:
+        """在当前线程中等待结果"""
+        return self.future.result()
+
+    async def wait_async(self, on_token: Optional[Callable[[str], None]] = None) -> Any:
+        """
+        在协程中等待结果
+
+        Args:
+            on_token: 增量文本回调；发起方没有流式输出时，结果到达后一次性回调完整文本
+        """
+        if on_token is not None:
+            self.subscribe(on_token)
+        try:
+            # shield: 等待者被取消时不能取消共享的Future
+            result = await asyncio.shield(asyncio.wrap_future(self.future))
+        finally:
+            if on_token is not None:
+                self.unsubscribe(on_token)
+        if on_token is not None and not self.streamed:
+            on_token(result)
+        return result
+
+
+class SingleFlight:
+    """
+    合并相同的进行中调用：同一键的第一个调用方发出请求，其余调用方等待并共享其结果
+
+    调用完成（成功或失败）后立即移除，之后的调用重新发起（结果复用由响应缓存负责）。
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self._lock = threading.Lock()
+
+    def join(self, key: str) -> Tuple[Flight, bool]:
+        """
+        加入键对应的调用
+
+        Returns:
+            (调用, 是否由当前调用方发起)；发起方必须调用finish或abandon
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.waiters += 1
+                return flight, False
+            flight = self._flights[key] = Flight()
+            return flight, True
+
+    def _remove(self, key: str, flight: Flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def finish(self, key: str, flight: Flight, result: Any = None, error: Optional[BaseException] = None):
+        """发起方完成调用，把结果或错误分发给所有等待者"""
+        self._remove(key, flight)
+        if flight.waiters:
+            logger.info("相同的AI调用合并了 %s 个等待者", flight.waiters)
+        if error is not None:
+            flight.future.set_exception(error)
+        else:
+            flight.future.set_result(result)
+
+    def abandon(self, key: str, flight: Flight):
+        """发起方被取消：通知等待者重新发起"""
+        self._remove(key, flight)
+        flight.future.set_exception(FlightAbandoned())
+
+    def in_flight(self) -> int:
+        """当前进行中的调用数"""
+        with self._lock:
+            return len(self._flights)
+
+
+_default_single_flight = SingleFlight()
+
+
+def get_default_single_flight() -> SingleFlight:
+    """进程内共享的调用合并器（所有AIAnalyzer实例共用）"""
+    return _default_single_flight
@@ -4,6 +4,7 @@ class AIAnalysisManager {
     constructor() {
         this.aiRequestInput = document.getElementById('aiRequestInput');
         this.startAiAnalysisBtn = document.getElementById('startAiAnalysisBtn');
+        this.cancelAnalysisBtn = document.getElementById('cancelAnalysisBtn');
         this.chatInput = document.getElementById('chatInput');
         this.sendChatBtn = document.getElementById('sendChatBtn');
         this.apiKeyInput = document.getElementById('apiKeyInput');
@@ -17,7 +18,9 @@ class AIAnalysisManager {
         this.currentConversationId = null;
         this.currentAnalysisData = null;
         this.eventSource = null;  // SSE连接
+        this.streamingText = {};  // 各步骤的AI流式输出
         this.isAnalysisInProgress = false;
+        this.awaitingResumeId = null;  // 服务重启中断、等待重新提供API密钥的分析
         
         this.initializeEventListeners();
         this.loadAiConfig();
@@ -30,6 +33,11 @@ class AIAnalysisManager {
             this.startAiAnalysisBtn.addEventListener('click', () => this.startAiAnalysis());
         }
         
+        // 取消分析按钮
+        if (this.cancelAnalysisBtn) {
+            this.cancelAnalysisBtn.addEventListener('click', () => this.cancelAnalysis());
+        }
+        
         // 聊天发送按钮
         if (this.sendChatBtn) {
             this.sendChatBtn.addEventListener('click', () => this.sendChatMessage());
@@ -82,6 +90,10 @@ class AIAnalysisManager {
         
         this.startAiAnalysisBtn.disabled = !canAnalyze;
         
+        if (this.cancelAnalysisBtn) {
+            this.cancelAnalysisBtn.style.display = this.isAnalysisInProgress && this.currentConversationId ? 'inline-block' : 'none';
+        }
+        
         // 更新按钮样式
         if (canAnalyze) {
             this.startAiAnalysisBtn.classList.remove('btn-secondary');
@@ -101,10 +113,16 @@ class AIAnalysisManager {
     }
 
     resetAnalysisState() {
+        // 切换文件时取消仍在进行的分析
+        if (this.isAnalysisInProgress && this.currentConversationId) {
+            this.requestCancel(this.currentConversationId);
+        }
+        
         // 重置分析状态
         this.isAnalysisInProgress = false;
         this.currentConversationId = null;
         this.currentAnalysisData = null;
+        this.awaitingResumeId = null;
         
         // 关闭SSE连接
         if (this.eventSource) {
@@ -286,6 +304,11 @@ class AIAnalysisManager {
         } catch (error) {
             console.warn('保存AI配置失败:', error);
         }
+        
+        // 有等待API密钥的中断分析时，用新保存的密钥继续
+        if (this.awaitingResumeId) {
+            this.resumeAnalysis(this.awaitingResumeId);
+        }
     }
 
     async startAiAnalysis() {
@@ -342,7 +365,7 @@ class AIAnalysisManager {
             
         } catch (error) {
             console.error('AI分析失败:', error);
-            showAlert('AI分析失败，请检查网络连接', 'danger');
+            showAlert(error.userMessage || 'AI分析失败，请检查网络连接', error.userMessage ? 'warning' : 'danger');
             this.isAnalysisInProgress = false;
             
             // 更新按钮状态
@@ -487,8 +510,16 @@ class AIAnalysisManager {
             
             const data = await response.json();
             
+            // 分析队列已满
+            if (response.status === 429) {
+                const error = new Error(data.error || '当前分析任务较多，请稍后重试');
+                error.userMessage = error.message;
+                throw error;
+            }
+            
             if (data.success) {
                 this.currentConversationId = data.conversation_id;
+                this.updateAnalysisButtonState();
                 
                 // 开始监听实时进度
                 this.startProgressMonitoring(data.conversation_id);
@@ -503,15 +534,67 @@ class AIAnalysisManager {
         }
     }
 
+    async resumeAnalysis(conversationId) {
+        // 服务重启导致分析中断：用当前配置的API密钥从中断处继续（已完成的步骤不会重新执行）
+        if (this.resumingConversationId === conversationId) return;
+        
+        const apiKey = this.apiKeyInput ? this.apiKeyInput.value.trim() : '';
+        if (!apiKey) {
+            this.awaitingResumeId = conversationId;
+            showAlert('服务重启导致分析中断，请在AI配置中填写API密钥并保存后继续', 'warning');
+            return;
+        }
+        
+        this.resumingConversationId = conversationId;
+        try {
+            const response = await fetch(`/api/analysis/${conversationId}/resume`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ api_key: apiKey })
+            });
+            const data = await response.json();
+            
+            if (data.success) {
+                this.awaitingResumeId = null;
+                this.startProgressMonitoring(conversationId);
+                console.log('AI分析已恢复，对话ID:', conversationId);
+            } else {
+                // 队列已满等情况保留等待状态，保存配置时再次尝试
+                this.awaitingResumeId = conversationId;
+                showAlert(data.error || '继续分析失败', 'warning');
+            }
+        } catch (error) {
+            console.error('恢复分析失败:', error);
+            this.awaitingResumeId = conversationId;
+        } finally {
+            this.resumingConversationId = null;
+        }
+    }
+
     startProgressMonitoring(conversationId) {
         // 关闭之前的SSE连接
         if (this.eventSource) {
             this.eventSource.close();
         }
         
+        // 重新连接时服务端会从头推送流式输出
+        this.streamingText = {};
+        
         // 建立SSE连接监听进度
         this.eventSource = new EventSource(`/api/progress/${conversationId}`);
         
+        // AI流式输出的增量文本
+        this.eventSource.addEventListener('token', (event) => {
+            try {
+                const tokenData = JSON.parse(event.data);
+                this.appendStreamText(tokenData.step, tokenData.text);
+            } catch (error) {
+                console.error('解析流式输出失败:', error);
+            }
+        });
+        
         this.eventSource.onmessage = (event) => {
             try {
                 const progressData = JSON.parse(event.data);
@@ -520,6 +603,10 @@ class AIAnalysisManager {
                 // 如果分析完成
                 if (progressData.status === 'completed') {
                     this.onAnalysisCompleted(conversationId);
+                } else if (progressData.status === 'cancelled') {
+                    this.onAnalysisCancelled();
+                } else if (progressData.status === 'awaiting_credentials') {
+                    this.resumeAnalysis(conversationId);
                 }
             } catch (error) {
                 console.error('解析进度数据失败:', error);
@@ -561,6 +648,42 @@ class AIAnalysisManager {
             </div>
         `;
         
+        // 排队等待中（步骤0）
+        const queueStep = steps.find(step => step.step === 0 && step.status === 'queued');
+        if (queueStep) {
+            const queueInfo = queueStep.result || {};
+            stepsHtml += `
+                <div class="step-item pending">
+                    <div class="step-icon">
+                        <i class="fas fa-clock text-muted"></i>
+                    </div>
+                    <div class="step-content">
+                        <h6>排队等待中</h6>
+                        <p class="text-muted mb-0">${queueStep.message}</p>
+                        <div class="step-result mt-2">
+                            <small class="text-info">队列位置: 第 ${queueInfo.queue_position} 位，预计等待约 ${queueInfo.estimated_wait} 秒</small>
+                        </div>
+                    </div>
+                </div>
+            `;
+        }
+        
+        // 服务重启导致中断，等待重新提供API密钥（步骤0）
+        const awaitingStep = steps.find(step => step.step === 0 && step.status === 'awaiting_credentials');
+        if (awaitingStep) {
+            stepsHtml += `
+                <div class="step-item pending">
+                    <div class="step-icon">
+                        <i class="fas fa-key text-warning"></i>
+                    </div>
+                    <div class="step-content">
+                        <h6>等待继续分析</h6>
+                        <p class="text-muted mb-0">${awaitingStep.message}</p>
+                    </div>
+                </div>
+            `;
+        }
+        
         // 过滤并显示AI分析步骤（排除步骤0）
         const validSteps = steps.filter(step => step.step > 0);
         
@@ -596,6 +719,7 @@ class AIAnalysisManager {
                         <h6>${this.getStepName(stepNumber)}</h6>
                         <p class="text-muted mb-0">${step.message || this.getStepDescription(stepNumber)}</p>
                         ${step.result ? this.formatStepResult(step) : ''}
+                        ${step.status === 'running' ? `<pre class="step-stream" id="stepStream${stepNumber}" style="display: none;"></pre>` : ''}
                     </div>
                 </div>
             `;
@@ -603,12 +727,32 @@ class AIAnalysisManager {
         
         this.stepsList.innerHTML = stepsHtml;
         
+        // 恢复正在进行的步骤已收到的流式输出
+        Object.keys(this.streamingText).forEach(stepNumber => {
+            this.renderStreamText(stepNumber);
+        });
+        
         // 滚动到当前步骤
         if (progressData.step > 0) {
             this.stepsList.scrollTop = this.stepsList.scrollHeight;
         }
     }
 
+    appendStreamText(stepNumber, text) {
+        this.streamingText[stepNumber] = (this.streamingText[stepNumber] || '') + text;
+        this.renderStreamText(stepNumber);
+    }
+
+    renderStreamText(stepNumber) {
+        const streamElement = document.getElementById(`stepStream${stepNumber}`);
+        const text = this.streamingText[stepNumber];
+        if (!streamElement || !text) return;
+        
+        streamElement.textContent = text;
+        streamElement.style.display = 'block';
+        streamElement.scrollTop = streamElement.scrollHeight;
+    }
+
     getStepName(stepNumber) {
         const stepNames = {
             1: '解析文档结构',
@@ -657,10 +801,54 @@ class AIAnalysisManager {
             resultHtml += `<small class="text-info">置信度: ${(result.confidence_score * 100).toFixed(1)}%</small><br>`;
         }
         
+        if (result.prompt_stats && result.prompt_stats.prompt_tokens) {
+            const stats = result.prompt_stats;
+            const omitted = stats.dropped_count + stats.duplicate_count;
+            resultHtml += `<small class="text-muted">提示词约 ${stats.prompt_tokens} tokens（预算 ${stats.token_budget}）${omitted ? `，省略 ${omitted} 个内容` : ''}</small><br>`;
+        }
+        
         resultHtml += '</div>';
         return resultHtml;
     }
 
+    async requestCancel(conversationId) {
+        try {
+            const response = await fetch(`/api/analysis/${conversationId}/cancel`, { method: 'POST' });
+            return await response.json();
+        } catch (error) {
+            console.warn('取消分析失败:', error);
+            return { success: false };
+        }
+    }
+
+    async cancelAnalysis() {
+        if (!this.isAnalysisInProgress || !this.currentConversationId) return;
+        
+        const result = await this.requestCancel(this.currentConversationId);
+        if (!result.success) {
+            showAlert(result.error || '取消分析失败', 'warning');
+        }
+        // 取消成功后由SSE推送的cancelled状态结束分析
+    }
+
+    onAnalysisCancelled() {
+        console.log('AI分析已取消');
+        this.isAnalysisInProgress = false;
+        
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
+        }
+        
+        this.updateAnalysisButtonState();
+        
+        if (window.fileManager) {
+            window.fileManager.clearCurrentAnalysis();
+        }
+        
+        showAlert('分析已取消', 'info');
+    }
+
     async onAnalysisCompleted(conversationId) {
         console.log('AI分析完成');
         this.isAnalysisInProgress = false;
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import pytest
+import requests
+
+import ai_analyzer
+import analysis_pipeline
+import artifact_cache
+import llm_cache
+import llm_client
+from ai_analyzer import AnalysisResult, ExtractedContent, ExtractionTarget
+from job_scheduler import JobScheduler
+from pipeline import Node, Pipeline
+
+
+def wait_until(predicate, timeout: float = 5.0) -> bool:
+    """轮询等待后台事件循环中的状态变化，超时返回False"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def stub_analysis_pipeline(calls, targets=True, contents=True):
+    """
+    与分析流水线参数、产物和步骤编号相同的流水线，AI步骤记录调用时使用的API密钥
+
+    targets/contents为False时需求分析/内容提取的产物为空
+    """
+    def parse(file_path):
+        calls.append(('parse', None))
+        return {'headings': [{'text': '投标保证金', 'level': 1}], 'document_type': 'docx'}
+
+    def requirement(analyzer, user_request, document_structure):
+        calls.append(('requirement_analysis', analyzer.api_key))
+        return [ExtractionTarget('投标保证金', ['保证金'], 1, '保证金金额')] if targets else []
+
+    def extraction(analyzer, extraction_targets, document_structure, file_path):
+        calls.append(('extraction', analyzer.api_key))
+        if not contents or not extraction_targets:
+            return []
+        return [ExtractedContent('投标保证金', '保证金为5万元', '投标保证金', '', 0.9, 1)]
+
+    def analysis(analyzer, user_request, extracted_contents, document_structure, on_token=None):
+        calls.append(('enhanced_analysis', analyzer.api_key))
+        summary = '保证金为5万元' if extracted_contents else '文档中没有找到相关内容'
+        return AnalysisResult(summary, {'保证金': '5万元'}, [], {}, 0.9)
+
+    async def analysis_async(**inputs):
+        return analysis(**inputs)
+
+    def judgment(analyzer, user_request, extracted_contents, initial_analysis, document_structure):
+        calls.append(('additional_judgment', analyzer.api_key))
+        return False, []
+
+    return Pipeline(analysis_pipeline.PARAMS, analysis_pipeline.ARTIFACTS, [
+        Node('parse', ('file_path',), ('document_structure',), run=parse, step=1, cache=False),
+        Node('requirement_analysis', ('analyzer', 'user_request', 'document_structure'), ('extraction_targets',),
+             run=requirement, step=2, required=True),
+        Node('extraction', ('analyzer', 'extraction_targets', 'document_structure', 'file_path'),
+             ('extracted_contents',), run=extraction, step=3, required=True),
+        Node('enhanced_analysis', ('analyzer', 'user_request', 'extracted_contents', 'document_structure'),
+             ('initial_analysis',), run=analysis, run_async=analysis_async, step=4, runtime=('on_token',)),
+        Node('additional_judgment',
+             ('analyzer', 'user_request', 'extracted_contents', 'initial_analysis', 'document_structure'),
+             ('need_additional', 'additional_keywords'), run=judgment, step=5),
+        Node('additional_extraction', ('need_additional',), ('additional_contents',), step=6,
+             when=lambda need_additional: need_additional, default=lambda **inputs: []),
+        Node('final_enhanced_analysis', ('additional_contents', 'initial_analysis'), ('final_analysis',), step=7,
+             when=lambda additional_contents, **inputs: bool(additional_contents),
+             default=lambda initial_analysis, **inputs: initial_analysis),
+    ])
+
+
+class FakeLLMServer:
+    """
+    替换共享HTTP会话的AI接口：记录每次请求，按顺序返回statuses中的状态码（用完后返回200），
+    成功时回复reply；设置gate后请求阻塞到gate被set为止
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.statuses = []
+        self.reply = '{"summary": "ok"}'
+        self.gate = None
+        self._lock = threading.Lock()
+
+    def post(self, url, headers, json, timeout):
+        with self._lock:
+            self.requests.append({'url': url, 'headers': headers, 'json': json})
+            status_code = self.statuses.pop(0) if self.statuses else 200
+        if self.gate is not None:
+            self.gate.wait(5)
+        return _completion(status_code, self.reply)
+
+
+def _completion(status_code, reply):
+    response = requests.Response()
+    response.status_code = status_code
+    body = {'choices': [{'message': {'content': reply}}]} if status_code == 200 else {'error': 'rejected'}
+    response._content = json.dumps(body).encode('utf-8')
+    return response
+
+
+@pytest.fixture
+def llm_server(monkeypatch):
+    """AIAnalyzer的同步调用改为发往FakeLLMServer，并使用独立的熔断器、结构化输出记录，不使用默认响应缓存"""
+    server = FakeLLMServer()
+    monkeypatch.setattr(ai_analyzer, 'get_session', lambda base_url: server)
+    monkeypatch.setattr(llm_cache, '_default_cache', None)
+    monkeypatch.setattr(llm_client, '_breakers', {})
+    monkeypatch.setattr(llm_client, '_unsupported_formats', {})
+    return server
+
+
+@pytest.fixture(autouse=True)
+def isolated_artifact_cache(monkeypatch):
+    """测试之间不共享进程默认的产物缓存（导入app时会配置）"""
+    monkeypatch.setattr(artifact_cache, '_default_cache', None)
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """在临时目录中导入app（上传和数据目录都是相对当前目录的路径）"""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(tmp_path_factory.mktemp('app'))
+        import app
+        yield app
+
+
+@pytest.fixture
+def busy_scheduler(app_module, monkeypatch):
+    """只有一个执行名额且已被占用的调度器，max_queue由测试设置"""
+    scheduler = JobScheduler(max_workers=1, max_queue=0)
+    release = threading.Event()
+
+    async def busy():
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+
+    scheduler.submit('busy', busy)
+    monkeypatch.setattr(app_module, 'analysis_scheduler', scheduler)
+    yield scheduler
+    release.set()
+    wait_until(lambda: scheduler.stats()['running'] == 0)
+
+
+@pytest.fixture
+def client(app_module):
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 'user1'
+    upload_folder = app_module.get_user_upload_folder('user1')
+    with open(os.path.join(upload_folder, 'tender.docx'), 'wb') as f:
+        f.write(b'not parsed: the job never starts')
+    return client
@@ -0,0 +1,127 @@
+import json
+import os
+import stat
+
+import pytest
+
+from ai_analyzer import AIAnalyzer
+from analysis_checkpoint import AnalysisCheckpoint, claim_interrupted
+from job_scheduler import JobScheduler
+from tests.conftest import stub_analysis_pipeline, wait_until
+from tests.test_pipeline import _Recorder, _build
+
+
+class _Shutdown(Exception):
+    """模拟进程在步骤执行中退出"""
+
+
+def _interrupted(**kwargs):
+    raise _Shutdown()
+
+
+@pytest.fixture
+def data_folder(tmp_path):
+    return str(tmp_path / 'data')
+
+
+def _create(data_folder, conversation_id='analysis_1'):
+    return AnalysisCheckpoint.create(os.path.join(data_folder, 'user1'), conversation_id, {
+        'conversation_id': conversation_id, 'user_request': '保证金', 'has_api_key': False
+    })
+
+
+def test_checkpoint_survives_shutdown_and_resumes_from_last_completed_step(data_folder):
+    values = {'document': 'a b', 'request': '保证金'}
+    checkpoint = _create(data_folder)
+    calls = []
+    pipeline = _build(calls, cache=None)
+    pipeline.nodes[-1].run = _interrupted
+    with pytest.raises(_Shutdown):
+        pipeline.run(values, checkpoint=checkpoint)
+    assert calls == ['parse', 'extract']
+    # 进程退出：认领随之释放，检查点文件保留
+    checkpoint.release()
+
+    resumed, = claim_interrupted(data_folder)
+    assert resumed.job['user_request'] == '保证金'
+    calls.clear()
+    observer = _Recorder()
+    artifacts = _build(calls, cache=None).run(values, observer=observer, checkpoint=resumed)
+    assert calls == ['analyze']
+    assert observer.completed == [('parse', True), ('extract', True), ('analyze', False)]
+    assert artifacts['result'] == {'request': '保证金', 'sections': ['A', 'B']}
+
+    resumed.discard()
+    assert not os.path.exists(resumed.path)
+    assert claim_interrupted(data_folder) == []
+
+
+def test_held_checkpoint_is_not_claimed_again(data_folder):
+    checkpoint = _create(data_folder)
+    assert claim_interrupted(data_folder) == []
+
+    checkpoint.release()
+    claimed = claim_interrupted(data_folder)
+    assert [c.job['conversation_id'] for c in claimed] == ['analysis_1']
+    assert claim_interrupted(data_folder) == []
+    claimed[0].discard()
+
+
+def test_checkpoint_file_is_private_and_has_no_credentials(data_folder):
+    checkpoint = _create(data_folder)
+    checkpoint.set('key', {'text': 'A B'}, 'parse')
+
+    assert stat.S_IMODE(os.stat(checkpoint.path).st_mode) == 0o600
+    with open(checkpoint.path, encoding='utf-8') as f:
+        saved = json.load(f)
+    assert 'api_key' not in saved['job']
+    assert saved['artifacts']['key'] == {'node': 'parse', 'value': {'text': 'A B'}}
+
+    checkpoint.discard()
+    assert checkpoint.set('other', 1) is False
+    assert not os.path.exists(checkpoint.path)
+
+
+def test_analysis_with_api_key_resumes_past_completed_steps(app_module, client, monkeypatch):
+    calls = []
+    pipeline = stub_analysis_pipeline(calls)
+    monkeypatch.setattr(app_module, 'REALTIME_ANALYSIS_PIPELINE', pipeline)
+    monkeypatch.setattr(app_module, 'analysis_scheduler', JobScheduler(max_workers=1, max_queue=0))
+
+    conversation_id = 'analysis_resume_with_key'
+    job = {
+        'conversation_id': conversation_id,
+        'user_id': 'user1',
+        'filename': 'tender.docx',
+        'file_path': os.path.join(app_module.UPLOAD_FOLDER, 'user1', 'tender.docx'),
+        'user_request': '投标保证金',
+        'has_api_key': True,
+        'base_url': 'http://127.0.0.1:9/v1'
+    }
+    checkpoint = AnalysisCheckpoint.create(app_module.get_user_data_folder('user1'), conversation_id, job)
+    values = {'file_path': job['file_path'], 'user_request': job['user_request'],
+              'analyzer': AIAnalyzer(api_key='secret', base_url=job['base_url'])}
+    # 需求分析和内容提取完成后进程退出
+    pipeline.run(values, targets=['extracted_contents'], checkpoint=checkpoint)
+    checkpoint.release()
+    assert [name for name, _ in calls] == ['parse', 'requirement_analysis', 'extraction']
+
+    calls.clear()
+    app_module.resume_interrupted_analyses()
+    assert app_module.progress_tracker[conversation_id]['status'] == 'awaiting_credentials'
+    assert calls == []
+
+    response = client.post(f'/api/analysis/{conversation_id}/resume', json={'api_key': 'secret'}).get_json()
+    assert response['success'] is True
+    assert response['queue_position'] == 0
+    assert wait_until(lambda: app_module.progress_tracker.get(conversation_id, {}).get('status') == 'completed')
+
+    # 已完成的AI步骤使用检查点中的产物，之后的步骤使用重新提供的密钥
+    assert calls == [('parse', None), ('enhanced_analysis', 'secret'), ('additional_judgment', 'secret')]
+    messages = {step['step']: step['message'] for step in app_module.progress_tracker[conversation_id]['steps']}
+    assert '复用已有结果' in messages[2] and '复用已有结果' in messages[3]
+    result = app_module.analysis_results_store[conversation_id]
+    assert result['analysis_result']['summary'] == '保证金为5万元'
+    assert result['extracted_contents'][0]['content'] == '保证金为5万元'
+    assert not os.path.exists(checkpoint.path)
+    assert conversation_id not in app_module.analysis_owners
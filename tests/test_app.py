@@ -0,0 +1,150 @@
+import glob
+import os
+
+import pytest
+
+from job_scheduler import DEFAULT_JOB_SECONDS
+from tests.conftest import stub_analysis_pipeline
+
+
+def _start_analysis(client):
+    return client.post('/api/ai-analyze-realtime', json={
+        'filename': 'tender.docx', 'user_request': '投标保证金', 'api_key': 'secret'
+    })
+
+
+def _checkpoints(app_module):
+    return glob.glob(os.path.join(app_module.DATA_FOLDER, 'user1', 'checkpoint_*.json'))
+
+
+def test_queue_full_returns_429_with_retry_after(app_module, busy_scheduler, client):
+    response = _start_analysis(client)
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == str(DEFAULT_JOB_SECONDS)
+    body = response.get_json()
+    assert body['success'] is False
+    assert body['retry_after'] == DEFAULT_JOB_SECONDS
+    # 被拒绝的任务不留下检查点和所属用户
+    assert _checkpoints(app_module) == []
+    assert app_module.analysis_owners == {}
+
+
+def test_cancel_queued_analysis(app_module, busy_scheduler, client, monkeypatch):
+    monkeypatch.setattr(busy_scheduler, 'max_queue', 1)
+    conversation_id = _start_analysis(client).get_json()['conversation_id']
+    assert busy_scheduler.stats()['queued'] == 1
+    assert len(_checkpoints(app_module)) == 1
+
+    # 只有发起者可以取消
+    other = app_module.app.test_client()
+    with other.session_transaction() as session:
+        session['user_id'] = 'user2'
+    assert other.post(f'/api/analysis/{conversation_id}/cancel').get_json()['success'] is False
+
+    assert client.post(f'/api/analysis/{conversation_id}/cancel').get_json()['success'] is True
+    assert busy_scheduler.stats()['queued'] == 0
+    assert app_module.progress_tracker[conversation_id]['status'] == 'cancelled'
+    assert _checkpoints(app_module) == []
+    assert conversation_id not in app_module.analysis_owners
+
+    # 已取消的任务不能再取消
+    assert client.post(f'/api/analysis/{conversation_id}/cancel').get_json()['success'] is False
+
+
+def _interrupted_checkpoint(app_module, conversation_id, has_api_key):
+    """上次进程退出时留下的检查点（已释放认领）"""
+    checkpoint = app_module.AnalysisCheckpoint.create(app_module.get_user_data_folder('user1'), conversation_id, {
+        'conversation_id': conversation_id,
+        'user_id': 'user1',
+        'filename': 'tender.docx',
+        'file_path': os.path.join(app_module.UPLOAD_FOLDER, 'user1', 'tender.docx'),
+        'user_request': '投标保证金',
+        'has_api_key': has_api_key,
+        'base_url': 'http://127.0.0.1:9/v1'
+    })
+    checkpoint.release()
+    return checkpoint
+
+
+def test_resume_requeues_interrupted_analysis(app_module, busy_scheduler, client, monkeypatch):
+    monkeypatch.setattr(busy_scheduler, 'max_queue', 1)
+    _interrupted_checkpoint(app_module, 'analysis_resume', has_api_key=False)
+
+    app_module.resume_interrupted_analyses()
+    assert busy_scheduler.stats()['queued'] == 1
+    assert app_module.analysis_owners['analysis_resume'] == 'user1'
+    # 恢复的任务由当前进程持有，不会被再次认领
+    assert app_module.claim_interrupted(app_module.DATA_FOLDER) == []
+
+    assert app_module.cancel_analysis('analysis_resume', '测试结束') is True
+    assert _checkpoints(app_module) == []
+
+
+def test_interrupted_analysis_with_api_key_waits_for_credentials(app_module, busy_scheduler, client):
+    _interrupted_checkpoint(app_module, 'analysis_with_key', has_api_key=True)
+
+    app_module.resume_interrupted_analyses()
+    progress = app_module.progress_tracker['analysis_with_key']
+    assert progress['status'] == 'awaiting_credentials'
+    assert progress['steps'][-1]['status'] == 'awaiting_credentials'
+    assert busy_scheduler.stats()['queued'] == 0
+    # 检查点保留且没有被持有，恢复接口可以认领
+    assert len(_checkpoints(app_module)) == 1
+    assert client.post('/api/analysis/analysis_with_key/resume', json={}).get_json() == {
+        'success': False, 'error': '请提供API密钥'
+    }
+
+    # 其他用户无法恢复或取消
+    other = app_module.app.test_client()
+    with other.session_transaction() as session:
+        session['user_id'] = 'user2'
+    assert other.post('/api/analysis/analysis_with_key/resume', json={'api_key': 'k'}).get_json()['success'] is False
+    assert other.post('/api/analysis/analysis_with_key/cancel').get_json()['success'] is False
+
+    assert client.post('/api/analysis/analysis_with_key/cancel').get_json()['success'] is True
+    assert progress['status'] == 'cancelled'
+    assert _checkpoints(app_module) == []
+
+
+def test_interrupted_analysis_waiting_too_long_is_discarded(app_module, busy_scheduler, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'ANALYSIS_RESUME_TTL', 1)
+    checkpoint = _interrupted_checkpoint(app_module, 'analysis_expired', has_api_key=True)
+    checkpoint.job['created_at'] -= 10
+    checkpoint._save()
+
+    app_module.resume_interrupted_analyses()
+    assert 'analysis_expired' not in app_module.progress_tracker
+    assert _checkpoints(app_module) == []
+
+
+def _analyze_with_empty_extraction(app_module, client, monkeypatch, url, targets, **payload):
+    calls = []
+    monkeypatch.setattr(app_module, 'ANALYSIS_PIPELINE', stub_analysis_pipeline(calls, targets=targets, contents=False))
+    body = dict({'filename': 'tender.docx', 'api_key': 'secret'}, **payload)
+    return client.post(url, json=body).get_json(), calls
+
+
+@pytest.mark.parametrize('targets, failed_step, error', [
+    (False, 2, 'AI无法理解您的需求或生成提取目标'),
+    (True, 3, 'AI生成了提取目标，但未能从文档中提取到相关内容'),
+])
+def test_steps_endpoint_fails_the_step_with_empty_output(app_module, client, monkeypatch, targets, failed_step, error):
+    body, calls = _analyze_with_empty_extraction(app_module, client, monkeypatch, '/api/ai-analyze-steps', targets,
+                                                 user_request='投标保证金')
+    assert body['success'] is True
+    assert body['final_result'] is None
+    assert body['steps'][-1]['step'] == failed_step
+    assert body['steps'][-1]['status'] == 'failed'
+    assert body['steps'][-1]['error'] == error
+    assert ('enhanced_analysis', 'secret') not in calls
+
+
+@pytest.mark.parametrize('targets', [False, True])
+def test_reanalyze_continues_with_empty_extraction(app_module, client, monkeypatch, targets):
+    body, calls = _analyze_with_empty_extraction(app_module, client, monkeypatch, '/api/ai-reanalyze', targets,
+                                                 new_request='投标保证金', conversation_id='analysis_chat')
+    assert body['success'] is True
+    assert body['data']['extracted_contents'] == []
+    assert body['data']['analysis_result']['summary'] == '文档中没有找到相关内容'
+    assert [name for name, _ in calls] == ['parse', 'requirement_analysis', 'extraction', 'enhanced_analysis']
@@ -0,0 +1,48 @@
+import pytest
+
+import analysis_pipeline
+import document_parser
+from document_parser import DocumentParser, default_parser_version
+from heading_classifier import HeadingRuleSet
+
+
+@pytest.fixture
+def fresh_version(monkeypatch):
+    """清除默认版本的缓存，测试结束后恢复"""
+    monkeypatch.setattr(document_parser, '_default_parser_version', None)
+
+
+def test_default_parser_version_matches_a_default_parser(fresh_version):
+    parser = DocumentParser()
+    assert default_parser_version() == f"{DocumentParser.PARSER_VERSION}:{parser.heading_classifier.fingerprint}"
+    parse = next(node for node in analysis_pipeline.ANALYSIS_PIPELINE.nodes if node.name == 'parse')
+    assert parse.version == default_parser_version()
+
+
+def test_default_parser_version_does_not_build_a_parser(fresh_version, monkeypatch):
+    def refuse(self, *args, **kwargs):
+        raise AssertionError('不应构建解析器')
+
+    monkeypatch.setattr(DocumentParser, '__init__', refuse)
+    version = default_parser_version()
+
+    monkeypatch.setattr(document_parser, 'rule_sets_fingerprint', refuse)
+    assert default_parser_version() == version
+
+
+def test_default_parser_version_follows_deployment_rules(fresh_version, monkeypatch):
+    builtin = default_parser_version()
+    monkeypatch.setattr(document_parser, '_default_parser_version', None)
+    monkeypatch.setattr(document_parser, '_deployment_rule_sets',
+                        [HeadingRuleSet('deployment', [r'^附件[\d]+.*'], 3)])
+
+    version = default_parser_version()
+    assert version != builtin
+    assert version == f"{DocumentParser.PARSER_VERSION}:{DocumentParser().heading_classifier.fingerprint}"
+
+
+def test_fingerprint_changes_when_a_rule_set_is_added():
+    parser = DocumentParser()
+    before = parser.heading_classifier.fingerprint
+    parser.heading_classifier.add_rule_set('extra', [r'^附件[\d]+.*'], 3)
+    assert parser.heading_classifier.fingerprint != before
@@ -0,0 +1,180 @@
+import random
+import re
+
+import pytest
+
+from content_extractor import ContentExtractor
+from document_text import DocumentText
+from heading_index import AhoCorasick, HeadingIndex
+
+_SPECIAL_CHARS = r'[（）\(\)\[\]【】《》""''`~!@#$%^&*+=|\\:;\"\'<>,.?/]'
+
+
+def _find_all_reference(text, patterns):
+    """逐个模式重复str.find的参考实现"""
+    occurrences = {}
+    for pattern_id, pattern in enumerate(patterns):
+        position = text.find(pattern)
+        while position >= 0:
+            occurrences.setdefault(pattern_id, []).append(position)
+            position = text.find(pattern, position + 1)
+    return occurrences
+
+
+def _extract_reference(full_text, headings, heading_index):
+    """改为标题偏移索引之前的章节提取：每个标题各自在全文中查找第一次出现"""
+    heading_text = headings[heading_index]['text']
+    level = headings[heading_index]['level']
+    next_heading_text = next((h['text'] for h in headings[heading_index + 1:] if h['level'] <= level), '')
+
+    start_pos = -1
+    match = re.search(re.escape(heading_text.strip()), full_text, re.IGNORECASE)
+    if match:
+        start_pos = match.end()
+    if start_pos < 0:
+        for word in re.sub(_SPECIAL_CHARS, '', heading_text).strip().split():
+            if len(word) >= 2:
+                for match in re.finditer(re.escape(word), full_text, re.IGNORECASE):
+                    if '\n' in full_text[max(0, match.start() - 20):match.start()]:
+                        start_pos = match.start()
+                        break
+                if start_pos >= 0:
+                    break
+    if start_pos < 0:
+        keywords = re.findall(r'[\u4e00-\u9fff]{2,}', heading_text)
+        for line in full_text.split('\n') if keywords else []:
+            if sum(1 for kw in keywords if kw.lower() in line.lower()) >= min(2, len(keywords)):
+                start_pos = full_text.find(line) + len(line)
+                break
+    if start_pos < 0:
+        return None
+
+    end_pos = len(full_text)
+    if next_heading_text:
+        match = re.search(re.escape(next_heading_text.strip()), full_text[start_pos:], re.IGNORECASE)
+        if not match:
+            for word in re.sub(_SPECIAL_CHARS, '', next_heading_text).strip().split():
+                if len(word) >= 2:
+                    match = re.search(re.escape(word), full_text[start_pos:], re.IGNORECASE)
+                    if match:
+                        break
+        if match:
+            end_pos = start_pos + match.start()
+
+    content = full_text[start_pos:end_pos].strip()
+    return content or None
+
+
+def _extract(full_text, headings, heading_index, locator=None):
+    result = ContentExtractor()._extract_content_between_headings(
+        full_text, headings, heading_index, headings[heading_index]['text'], locator)
+    return result['content'] if result else None
+
+
+def _headings(*items):
+    return [{'text': text, 'level': level} for text, level in items]
+
+
+def test_automaton_matches_repeated_find_on_overlapping_patterns():
+    patterns = ['he', 'she', 'his', 'hers', '保证金', '投标保证金', '金额', 'aa']
+    text = 'ushers his hershe 投标保证金金额 保证金额 aaaa'
+    assert AhoCorasick(patterns).find_all(text) == _find_all_reference(text, patterns)
+
+
+def test_automaton_matches_repeated_find_on_random_text():
+    rng = random.Random(7)
+    for _ in range(200):
+        patterns = sorted({''.join(rng.choice('ab') for _ in range(rng.randint(1, 4))) for _ in range(5)})
+        text = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 40)))
+        assert AhoCorasick(patterns).find_all(text) == _find_all_reference(text, patterns)
+
+
+def test_unique_headings_extract_the_same_sections_as_before():
+    headings = _headings(('第一章 总则', 1), ('1.1 项目概况', 2), ('1.2 投标保证金', 2), ('第二章 评标办法', 1))
+    full_text = ('第一章 总则\n本章为总则。\n1.1 项目概况\n本项目为设备采购。\n'
+                 '1.2 投标保证金\n保证金为五万元。\n第二章 评标办法\n综合评分法。\n')
+    locator = HeadingIndex(full_text, headings)
+    for i in range(len(headings)):
+        assert _extract(full_text, headings, i, locator) == _extract_reference(full_text, headings, i)
+    assert _extract(full_text, headings, 0, locator) == '本章为总则。\n1.1 项目概况\n本项目为设备采购。\n1.2 投标保证金\n保证金为五万元。'
+
+
+def test_duplicate_headings_are_located_in_document_order():
+    headings = _headings(('第一章 投标须知', 1), ('一、总则', 2), ('第二章 合同条款', 1), ('一、总则', 2))
+    full_text = '第一章 投标须知\n一、总则\n须知总则内容。\n第二章 合同条款\n一、总则\n合同总则内容。\n'
+    locator = HeadingIndex(full_text, headings)
+
+    assert _extract(full_text, headings, 1, locator) == '须知总则内容。'
+    assert _extract(full_text, headings, 3, locator) == '合同总则内容。'
+    # 之前两个同名标题都定位到第一次出现，第二个章节取到的是第一章的内容
+    assert _extract_reference(full_text, headings, 3) == '须知总则内容。\n第二章 合同条款\n一、总则\n合同总则内容。'
+
+
+def test_heading_contained_in_an_earlier_heading_is_not_matched_inside_it():
+    headings = _headings(('投标保证金', 1), ('保证金', 1), ('金额', 1))
+    full_text = '投标保证金\n按招标文件缴纳。\n保证金\n退还方式见合同。\n金额\n五万元。\n'
+    locator = HeadingIndex(full_text, headings)
+
+    assert [_extract(full_text, headings, i, locator) for i in range(3)] == ['按招标文件缴纳。', '退还方式见合同。', '五万元。']
+    # 之前“保证金”定位到“投标保证金”内部，其章节把“投标保证金”的内容和自己的内容都包括进来
+    assert _extract_reference(full_text, headings, 1) == '按招标文件缴纳。\n保证金\n退还方式见合同。'
+
+
+def test_out_of_order_headings_fall_back_to_the_first_occurrence():
+    headings = _headings(('第二章 评标办法', 1), ('第一章 总则', 1))
+    full_text = '第一章 总则\n总则内容。\n第二章 评标办法\n评标内容。\n'
+    locator = HeadingIndex(full_text, headings)
+
+    assert locator.spans[1] is None
+    assert locator.span(1) == (0, len('第一章 总则'))
+    for i in range(len(headings)):
+        assert _extract(full_text, headings, i, locator) == _extract_reference(full_text, headings, i)
+
+
+def test_headings_are_matched_ignoring_case():
+    headings = _headings(('Part A Scope', 1), ('Part B Terms', 1))
+    full_text = 'PART A SCOPE\nscope text\npart b terms\nterms text\n'
+    locator = HeadingIndex(full_text, headings)
+    assert [_extract(full_text, headings, i, locator) for i in range(2)] == ['scope text', 'terms text']
+
+
+@pytest.mark.parametrize('heading, body, expected', [
+    # 标题中的空白与原文不同：按第一个词（前面有换行）宽松定位，内容包含该行
+    ('第三章 评标办法', '第三章  评标办法\n综合评分法。\n', '第三章  评标办法\n综合评分法。'),
+    # 标题去除符号后仍找不到：按包含多个关键词的行定位，内容从该行之后开始
+    ('（投标文件）编制', '关于投标文件的编制说明\n按要求装订。\n', '按要求装订。'),
+])
+def test_loose_fallback_matches_the_previous_extraction(heading, body, expected):
+    headings = _headings(('第一章 总则', 1), (heading, 1), ('第九章 附件', 1))
+    full_text = '第一章 总则\n总则内容。\n' + body + '第九章 附件\n'
+    locator = HeadingIndex(full_text, headings)
+
+    assert locator.spans[1] is None
+    assert _extract(full_text, headings, 1, locator) == expected
+    assert _extract_reference(full_text, headings, 1) == expected
+
+
+def test_next_heading_found_only_loosely_still_ends_the_section():
+    headings = _headings(('第一章 总则', 1), ('第二章 评标办法', 1))
+    full_text = '第一章 总则\n总则内容。\n第二章　评标办法\n评标内容。\n'
+    locator = HeadingIndex(full_text, headings)
+
+    assert _extract(full_text, headings, 0, locator) == '总则内容。'
+    assert _extract_reference(full_text, headings, 0) == '总则内容。'
+
+
+def test_recorded_spans_give_the_same_sections_as_scanning():
+    paragraphs = [{'index': i, 'text': text, 'style': 'Normal'} for i, text in enumerate(
+        ['第一章 总则', '一、总则', '总则内容。', '第二章 合同', '一、总则', '合同内容。'])]
+    document_text = DocumentText.from_paragraphs(paragraphs)
+    headings = _headings(('第一章 总则', 1), ('一、总则', 2), ('第二章 合同', 1), ('一、总则', 2))
+    scanned = HeadingIndex(document_text.full_text, headings)
+
+    recorded = [dict(heading, char_span=list(span)) for heading, span in zip(headings, scanned.spans)]
+    locator = document_text.heading_index(recorded)
+    assert locator.spans == scanned.spans
+    assert document_text.heading_index(recorded) is locator
+
+    contents = ContentExtractor().extract_all_content_by_headings('tender.docx', {'headings': recorded}, document_text)
+    assert [item['content_info']['content'] for item in contents] == [
+        '一、总则\n总则内容。', '总则内容。', '一、总则\n合同内容。', '合同内容。']
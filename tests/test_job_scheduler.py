@@ -0,0 +1,112 @@
+import asyncio
+import threading
+
+import pytest
+
+from job_scheduler import DEFAULT_JOB_SECONDS, JobScheduler, QueueFullError
+from tests.conftest import wait_until
+
+
+class _Jobs:
+    """记录任务的开始和取消，任务一直执行到release"""
+
+    def __init__(self, scheduler: JobScheduler):
+        self.scheduler = scheduler
+        self.started = []
+        self.cancelled = []
+        self.finished = []
+        self.release = threading.Event()
+
+    def factory(self, job_id: str):
+        async def run():
+            self.started.append(job_id)
+            try:
+                while not self.release.is_set():
+                    await asyncio.sleep(0.01)
+            except asyncio.CancelledError:
+                self.cancelled.append((job_id, self.scheduler.cancel_requested(job_id)))
+                raise
+            self.finished.append(job_id)
+        return run
+
+    def submit(self, job_id: str, on_queue_update=None) -> int:
+        return self.scheduler.submit(job_id, self.factory(job_id), on_queue_update)
+
+
+@pytest.fixture
+def jobs():
+    jobs = _Jobs(JobScheduler(max_workers=1, max_queue=2))
+    yield jobs
+    jobs.release.set()
+    wait_until(lambda: jobs.scheduler.stats()['running'] == 0)
+
+
+def test_submit_runs_then_queues(jobs):
+    updates = []
+    assert jobs.submit('a') == 0
+    assert jobs.submit('b', lambda position, wait: updates.append((position, wait))) == 1
+    assert updates == [(1, DEFAULT_JOB_SECONDS)]
+    assert wait_until(lambda: jobs.started == ['a'])
+
+    jobs.release.set()
+    assert wait_until(lambda: jobs.finished == ['a', 'b'])
+    assert updates[-1] == (0, 0)
+    assert jobs.scheduler.stats()['queued'] == 0
+
+
+def test_queue_full_raises_with_retry_after(jobs):
+    jobs.submit('a')
+    jobs.submit('b')
+    jobs.submit('c')
+    with pytest.raises(QueueFullError) as error:
+        jobs.submit('d')
+    # 单个worker时第3位需要等前面3个任务（按默认耗时估算）
+    assert error.value.retry_after == 3 * DEFAULT_JOB_SECONDS
+    assert jobs.scheduler.stats()['queued'] == 2
+
+
+def test_cancel_queued_job(jobs):
+    updates = []
+    jobs.submit('a')
+    jobs.submit('b')
+    jobs.submit('c', lambda position, wait: updates.append(position))
+
+    assert jobs.scheduler.cancel('b') is True
+    assert updates[-1] == 1
+
+    jobs.release.set()
+    assert wait_until(lambda: jobs.finished == ['a', 'c'])
+    assert 'b' not in jobs.started
+    assert jobs.scheduler.cancel('b') is False
+
+
+def test_cancel_running_job(jobs):
+    jobs.submit('a')
+    jobs.submit('b')
+    assert wait_until(lambda: jobs.started == ['a'])
+
+    assert jobs.scheduler.cancel('a') is True
+    # 任务协程在等待处收到CancelledError，并能区分这是主动取消
+    assert wait_until(lambda: jobs.cancelled == [('a', True)])
+    assert wait_until(lambda: jobs.started == ['a', 'b'])
+    assert jobs.scheduler.cancel_requested('b') is False
+
+    jobs.release.set()
+    assert wait_until(lambda: jobs.finished == ['b'])
+    assert jobs.scheduler.cancel('a') is False
+
+
+def test_cancel_between_dequeue_and_start(jobs):
+    """任务刚离开队列、还没有提交到事件循环时取消，任务不再执行"""
+    def cancel_on_start(position, wait):
+        if position == 0:
+            jobs.scheduler.cancel('b')
+
+    jobs.submit('a')
+    jobs.submit('b', cancel_on_start)
+    jobs.submit('c')
+
+    jobs.release.set()
+    assert wait_until(lambda: jobs.finished == ['a', 'c'])
+    assert 'b' not in jobs.started
+    assert jobs.scheduler.stats()['running'] == 0
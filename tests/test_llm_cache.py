@@ -0,0 +1,123 @@
+import pytest
+
+import llm_cache
+from ai_analyzer import AgentType, AIAnalyzer
+from llm_cache import ResponseCache
+
+BASE_URL = 'https://llm.example.com/v1'
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(llm_cache, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return ResponseCache(str(tmp_path / 'llm' / 'responses.db'), ttl=3600, max_bytes=1000)
+
+
+def _key(prompt, **overrides):
+    params = {'model': 'deepseek-v3', 'base_url': BASE_URL, 'agent_type': 'analyzer', 'temperature': 0.3}
+    params.update(overrides)
+    return ResponseCache.make_key(params['model'], params['base_url'], params['agent_type'], prompt,
+                                  params['temperature'])
+
+
+def test_hits_and_misses_are_counted(cache):
+    key = _key('prompt')
+    assert cache.get(key) is None
+    assert cache.set(key, '回复')
+    assert cache.get(key) == '回复'
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+    assert stats['size_bytes'] == len('回复'.encode('utf-8'))
+
+
+def test_key_covers_every_request_parameter():
+    base = _key('prompt')
+    assert _key('prompt') == base
+    for variant in [_key('other prompt'), _key('prompt', model='gpt-4o'), _key('prompt', base_url='https://b.example.com'),
+                    _key('prompt', agent_type='chat_manager'), _key('prompt', temperature=0.7)]:
+        assert variant != base
+
+
+def test_entries_expire_after_ttl(cache, clock):
+    key = _key('prompt')
+    cache.set(key, 'reply')
+    clock.now += 3600
+    assert cache.get(key) == 'reply'
+
+    clock.now += 1
+    assert cache.get(key) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_entries_are_evicted(cache, clock):
+    for i in range(4):
+        clock.now += 1
+        cache.set(_key(f'prompt {i}'), str(i) * 300)
+    # 写入第4条时超过1000字节的上限，按最近访问时间淘汰到不超过900字节：淘汰最早写入的prompt 0
+    assert cache.stats()['entries'] == 3
+
+    clock.now += 1
+    cache.get(_key('prompt 1'))
+    clock.now += 1
+    cache.set(_key('prompt 4'), '4' * 300)
+    # prompt 1刚被读取过，淘汰的是prompt 2
+    assert [cache.get(_key(f'prompt {i}')) is not None for i in range(5)] == [False, True, False, True, True]
+    assert cache.stats()['evictions'] == 2
+
+
+def test_expired_entries_are_evicted_before_recent_ones(cache, clock):
+    cache.set(_key('old'), 'o' * 400)
+    clock.now += 1800
+    cache.set(_key('recent'), 'r' * 400)
+    cache.get(_key('old'))
+    clock.now += 1801
+    cache.set(_key('new'), 'n' * 400)
+
+    assert cache.get(_key('old')) is None
+    assert cache.get(_key('recent')) is not None
+
+
+def test_response_larger_than_the_cache_is_not_stored(cache):
+    assert not cache.set(_key('prompt'), 'x' * 1001)
+    assert cache.stats()['entries'] == 0
+
+
+def test_cache_is_shared_between_instances(tmp_path, clock):
+    path = str(tmp_path / 'responses.db')
+    ResponseCache(path).set(_key('prompt'), 'reply')
+    assert ResponseCache(path).get(_key('prompt')) == 'reply'
+
+
+def test_analyzers_with_different_api_keys_share_cached_responses(llm_server, cache):
+    first = AIAnalyzer(api_key='key-a', base_url=BASE_URL, response_cache=cache)
+    second = AIAnalyzer(api_key='key-b', base_url=BASE_URL, response_cache=cache)
+
+    assert first._call_ai_api('分析招标文件', AgentType.ANALYZER) == llm_server.reply
+    assert second._call_ai_api('分析招标文件', AgentType.ANALYZER) == llm_server.reply
+    assert len(llm_server.requests) == 1
+    assert llm_server.requests[0]['headers']['Authorization'] == 'Bearer key-a'
+
+
+def test_failed_calls_are_not_cached(llm_server, cache):
+    analyzer = AIAnalyzer(api_key='key', base_url=BASE_URL, response_cache=cache)
+    llm_server.statuses = [401]
+    with pytest.raises(Exception):
+        analyzer._call_ai_api('分析招标文件', AgentType.ANALYZER)
+
+    assert analyzer._call_ai_api('分析招标文件', AgentType.ANALYZER) == llm_server.reply
+    assert len(llm_server.requests) == 2
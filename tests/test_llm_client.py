@@ -0,0 +1,169 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+import requests
+
+import llm_client
+from llm_client import CircuitOpenError, LLMAPIError, call_with_retry, call_with_retry_async
+
+BASE_URL = 'https://llm.example.com/v1'
+
+
+def _response(status_code: int, body: bytes = b'{}', headers=None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    response.headers.update(headers or {})
+    return response
+
+
+class _Server:
+    """按顺序返回预设响应（或抛出网络错误）的send函数"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return _response(result) if isinstance(result, int) else result
+
+
+class _Clock:
+    """替换llm_client使用的time模块：退避等待只记录不真正等待，monotonic可以手动推进"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.delays = []
+
+    def sleep(self, delay):
+        self.delays.append(delay)
+
+    def monotonic(self):
+        return self.now
+
+    time = staticmethod(time.time)
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    """每个测试使用独立的熔断器和时钟"""
+    clock = _Clock()
+    monkeypatch.setattr(llm_client, '_breakers', {})
+    monkeypatch.setattr(llm_client, 'LLM_MAX_RETRIES', 3)
+    monkeypatch.setattr(llm_client, 'time', clock)
+    return clock
+
+
+@pytest.mark.parametrize('status_code', [429, 500, 502, 503, 504])
+def test_retryable_status_is_retried(clock, status_code):
+    server = _Server(status_code, status_code, 200)
+    assert call_with_retry(BASE_URL, server).status_code == 200
+    assert server.calls == 3
+    assert len(clock.delays) == 2
+
+
+def test_network_error_is_retried(clock):
+    server = _Server(requests.exceptions.ConnectionError('reset'), 200)
+    assert call_with_retry(BASE_URL, server).status_code == 200
+    assert server.calls == 2
+
+
+@pytest.mark.parametrize('status_code', [400, 401, 403, 404, 422])
+def test_client_error_fails_without_retry(clock, status_code):
+    server = _Server(status_code)
+    with pytest.raises(LLMAPIError) as error:
+        call_with_retry(BASE_URL, server)
+    assert error.value.status_code == status_code
+    assert server.calls == 1
+    assert clock.delays == []
+
+
+def test_retries_exhausted_raise_last_error(clock):
+    server = _Server(503, 503, 503, 503)
+    with pytest.raises(LLMAPIError) as error:
+        call_with_retry(BASE_URL, server)
+    assert error.value.status_code == 503
+    assert server.calls == 4
+
+
+def test_retry_after_is_honoured(clock):
+    server = _Server(_response(429, headers={'Retry-After': '7'}), 200)
+    call_with_retry(BASE_URL, server)
+    assert clock.delays == [7.0]
+
+
+def test_backoff_is_jittered_exponential_and_capped(monkeypatch):
+    monkeypatch.setattr(llm_client, 'LLM_BACKOFF_BASE', 1.0)
+    monkeypatch.setattr(llm_client, 'LLM_BACKOFF_MAX', 5.0)
+    monkeypatch.setattr(llm_client, 'random', SimpleNamespace(uniform=lambda low, high: high))
+    assert [llm_client.backoff_delay(attempt) for attempt in range(5)] == [1.0, 2.0, 4.0, 5.0, 5.0]
+    assert llm_client.backoff_delay(0, retry_after=60) == 5.0
+
+
+def test_parse_retry_after():
+    assert llm_client.parse_retry_after('3') == 3.0
+    assert llm_client.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert llm_client.parse_retry_after('soon') is None
+    assert llm_client.parse_retry_after(None) is None
+
+
+def test_server_errors_open_the_circuit(monkeypatch):
+    monkeypatch.setattr(llm_client, 'LLM_MAX_RETRIES', 0)
+    for _ in range(llm_client.LLM_BREAKER_THRESHOLD):
+        with pytest.raises(LLMAPIError):
+            call_with_retry(BASE_URL, _Server(500))
+
+    server = _Server(200)
+    with pytest.raises(CircuitOpenError):
+        call_with_retry(BASE_URL, server)
+    assert server.calls == 0
+    # 熔断按主机区分
+    assert call_with_retry('https://other.example.com/v1', _Server(200)).status_code == 200
+
+
+@pytest.mark.parametrize('status_code', [429, 401, 403])
+def test_one_tenants_key_errors_do_not_open_the_circuit(monkeypatch, status_code):
+    monkeypatch.setattr(llm_client, 'LLM_MAX_RETRIES', 0)
+    for _ in range(llm_client.LLM_BREAKER_THRESHOLD * 2):
+        with pytest.raises(LLMAPIError) as error:
+            call_with_retry(BASE_URL, _Server(status_code))
+        assert not isinstance(error.value, CircuitOpenError)
+
+    assert call_with_retry(BASE_URL, _Server(200)).status_code == 200
+
+
+def test_open_circuit_lets_one_probe_through_after_reset(clock, monkeypatch):
+    monkeypatch.setattr(llm_client, 'LLM_MAX_RETRIES', 0)
+    for _ in range(llm_client.LLM_BREAKER_THRESHOLD):
+        with pytest.raises(LLMAPIError):
+            call_with_retry(BASE_URL, _Server(500))
+
+    clock.now += llm_client.LLM_BREAKER_RESET + 1
+    # 试探请求失败后继续熔断
+    with pytest.raises(LLMAPIError):
+        call_with_retry(BASE_URL, _Server(500))
+    with pytest.raises(CircuitOpenError):
+        call_with_retry(BASE_URL, _Server(200))
+
+    clock.now += llm_client.LLM_BREAKER_RESET + 1
+    assert call_with_retry(BASE_URL, _Server(200)).status_code == 200
+    assert call_with_retry(BASE_URL, _Server(200)).status_code == 200
+
+
+def test_async_retry_reads_and_closes_failed_responses(monkeypatch):
+    monkeypatch.setattr(llm_client, 'LLM_BACKOFF_BASE', 0.0)
+    responses = [httpx.Response(503, content=b'busy'), httpx.Response(200, content=b'{}')]
+
+    async def send():
+        return responses.pop(0)
+
+    response = asyncio.run(call_with_retry_async(BASE_URL, send))
+    assert response.status_code == 200
+    assert responses == []
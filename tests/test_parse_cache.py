@@ -0,0 +1,205 @@
+import os
+import time
+
+import docx
+import pytest
+
+import file_cache
+import parse_cache
+from document_parser import DocumentParser
+from file_cache import CacheDirEvictor, evict_cache_dir
+from heading_classifier import HeadingRuleSet
+from parse_cache import ParseCache
+
+
+@pytest.fixture
+def tender(tmp_path):
+    path = str(tmp_path / 'tender.docx')
+    document = docx.Document()
+    for text in ['第一章 总则', '本项目为办公设备采购。', '1.1 投标保证金', '投标保证金为人民币五万元。',
+                 '附件1 报价表', '报价表格式见下。']:
+        document.add_paragraph(text)
+    document.save(path)
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ParseCache(str(tmp_path / 'parse_cache'))
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """记录实际读取DOCX的次数（命中缓存时不读取）"""
+    calls = []
+    parse_docx = DocumentParser._parse_docx
+
+    def counting(self, *args, **kwargs):
+        calls.append(args[0])
+        return parse_docx(self, *args, **kwargs)
+
+    monkeypatch.setattr(DocumentParser, '_parse_docx', counting)
+    return calls
+
+
+def _entries(cache_dir):
+    return sorted(name for _, _, files in os.walk(cache_dir) for name in files)
+
+
+def test_second_parse_hits_the_cache_across_parsers(tender, cache, parses):
+    first = DocumentParser(cache=cache).parse_document(tender)
+    second = DocumentParser(cache=cache).parse_document(tender)
+
+    assert len(parses) == 1
+    assert second == first
+    assert [h['text'] for h in first['headings']][:2] == ['第一章 总则', '1.1 投标保证金']
+
+
+def test_use_cache_false_bypasses_the_cache(tender, cache, parses):
+    DocumentParser(cache=cache).parse_document(tender)
+    DocumentParser(cache=cache).parse_document(tender, use_cache=False)
+    assert len(parses) == 2
+
+
+def test_parser_version_bump_invalidates_entries(tender, cache, parses, monkeypatch):
+    DocumentParser(cache=cache).parse_document(tender)
+    monkeypatch.setattr(DocumentParser, 'PARSER_VERSION', DocumentParser.PARSER_VERSION + '-next')
+    DocumentParser(cache=cache).parse_document(tender)
+    DocumentParser(cache=cache).parse_document(tender)
+    assert len(parses) == 2
+
+
+def test_heading_rule_change_invalidates_entries(tender, cache, parses):
+    default = DocumentParser(cache=cache).parse_document(tender)
+    extra = [HeadingRuleSet('attachments', [r'^附件\d+.*'], 2)]
+    with_rules = DocumentParser(cache=cache, extra_heading_rules=extra).parse_document(tender)
+    DocumentParser(cache=cache, extra_heading_rules=extra).parse_document(tender)
+
+    assert len(parses) == 2
+    assert '附件1 报价表' not in [h['text'] for h in default['headings']]
+    assert '附件1 报价表' in [h['text'] for h in with_rules['headings']]
+
+
+def test_changed_file_content_invalidates_entries(tender, cache, parses):
+    DocumentParser(cache=cache).parse_document(tender)
+    document = docx.Document(tender)
+    document.add_paragraph('第二章 投标须知')
+    document.save(tender)
+
+    result = DocumentParser(cache=cache).parse_document(tender)
+    assert len(parses) == 2
+    assert '第二章 投标须知' in [h['text'] for h in result['headings']]
+
+
+def test_spans_variant_is_cached_separately_with_document_text(tender, cache, parses):
+    parser = DocumentParser(cache=cache)
+    plain = parser.parse_document(tender)
+    spans = parser.parse_document(tender, record_spans=True)
+
+    assert len(parses) == 2
+    assert 'char_span' not in plain['headings'][0] and 'cache_key' not in plain
+    assert spans['headings'][0]['char_span'] is not None
+    assert cache.get_sidecar(spans['cache_key'], 'text') is not None
+
+    assert parser.parse_document(tender, record_spans=True) == spans
+    assert parser.parse_document(tender) == plain
+    assert len(parses) == 2
+
+
+def test_unreadable_entry_is_a_miss(tender, cache, parses):
+    result = DocumentParser(cache=cache).parse_document(tender)
+    for root, _, files in os.walk(cache.cache_dir):
+        for name in files:
+            with open(os.path.join(root, name), 'w') as f:
+                f.write('{')
+
+    assert DocumentParser(cache=cache).parse_document(tender) == result
+    assert len(parses) == 2
+
+
+def test_file_digest_memo_follows_content_and_is_bounded(tmp_path, cache, monkeypatch):
+    monkeypatch.setattr(parse_cache, '_DIGEST_MEMO_SIZE', 2)
+    paths = []
+    for i in range(3):
+        path = tmp_path / f'{i}.bin'
+        path.write_bytes(b'x' * i)
+        paths.append(str(path))
+
+    digests = [cache.file_digest(path) for path in paths]
+    assert len(set(digests)) == 3
+    assert len(cache._digest_memo) == 2
+
+    with open(paths[0], 'wb') as f:
+        f.write(b'changed')
+    assert cache.file_digest(paths[0]) not in digests
+
+
+def _write(cache_dir, key, suffix='.json', size=100, written=None, accessed=None):
+    entry_dir = os.path.join(cache_dir, key[:2])
+    os.makedirs(entry_dir, exist_ok=True)
+    path = os.path.join(entry_dir, key + suffix)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    now = time.time()
+    written = now if written is None else written
+    os.utime(path, (now if accessed is None else accessed, written))
+    return path
+
+
+def test_eviction_removes_least_recently_accessed_groups_with_their_sidecars(tmp_path):
+    cache_dir = str(tmp_path)
+    now = time.time()
+    _write(cache_dir, 'aa01', accessed=now - 30)
+    _write(cache_dir, 'aa01', '.text.json', accessed=now - 30)
+    _write(cache_dir, 'bb02', accessed=now - 20)
+    _write(cache_dir, 'cc03', accessed=now - 10)
+
+    # 400字节超过200字节的上限，按访问时间从旧到新淘汰到180字节以下：最旧的一组（条目和附属数据）和次旧的条目
+    assert evict_cache_dir(cache_dir, max_bytes=200) == 2
+    assert _entries(cache_dir) == ['cc03.json']
+
+
+def test_eviction_keeps_everything_under_the_limit(tmp_path):
+    _write(str(tmp_path), 'aa01')
+    _write(str(tmp_path), 'bb02')
+    assert evict_cache_dir(str(tmp_path), max_bytes=1000) == 0
+    assert len(_entries(str(tmp_path))) == 2
+
+
+def test_eviction_removes_expired_groups_and_stale_temp_files(tmp_path):
+    cache_dir = str(tmp_path)
+    now = time.time()
+    _write(cache_dir, 'aa01', written=now - 7200)
+    _write(cache_dir, 'aa01', '.text.json')
+    _write(cache_dir, 'bb02')
+    _write(cache_dir, 'bb02', '.tmp', written=now - 2 * file_cache._STALE_TMP_SECONDS)
+    _write(cache_dir, 'cc03', '.tmp')
+
+    assert evict_cache_dir(cache_dir, max_bytes=10 ** 6, ttl=3600) == 1
+    assert _entries(cache_dir) == ['bb02.json', 'cc03.tmp']
+
+
+def test_reading_an_entry_refreshes_its_access_time_only(tmp_path):
+    cache = ParseCache(str(tmp_path))
+    key = cache.make_key('digest', 'version')
+    cache.set(key, {'headings': []})
+    path = cache._entry_path(key)
+    os.utime(path, (1000, 2000))
+
+    assert cache.get(key) == {'headings': []}
+    stat = os.stat(path)
+    assert stat.st_atime > 2000 and stat.st_mtime == 2000
+
+
+def test_evictor_scans_at_most_once_per_interval(tmp_path, monkeypatch):
+    scans = []
+    monkeypatch.setattr(file_cache, 'evict_cache_dir', lambda *args: scans.append(args))
+    evictor = CacheDirEvictor(str(tmp_path), 100, 60)
+
+    evictor.maybe_evict()
+    evictor.maybe_evict()
+    assert scans == [(str(tmp_path), 100, 60)]
+
+    evictor._last_run -= file_cache._EVICT_INTERVAL
+    evictor.maybe_evict()
+    assert len(scans) == 2
@@ -0,0 +1,146 @@
+import pytest
+
+from artifact_cache import ArtifactCache
+from pipeline import Artifact, EmptyArtifactError, Node, Param, Pipeline, PipelineObserver, Uncached
+
+
+class _Recorder(PipelineObserver):
+    def __init__(self):
+        self.completed = []
+
+    def on_complete(self, node, artifacts, cached):
+        self.completed.append((node.name, cached))
+
+
+def _build(calls, cache, analyze_version='1'):
+    """parse(document) -> text -> extract(text) -> sections -> analyze(sections, request) -> result"""
+    def parse(document):
+        calls.append('parse')
+        return document.upper()
+
+    def extract(text):
+        calls.append('extract')
+        return text.split()
+
+    def analyze(sections, request):
+        calls.append('analyze')
+        return {'request': request, 'sections': sections}
+
+    return Pipeline(
+        [Param('document'), Param('request')],
+        [Artifact('text', str), Artifact('sections', list), Artifact('result', dict)],
+        [
+            Node('analyze', ('sections', 'request'), ('result',), run=analyze, version=analyze_version),
+            Node('parse', ('document',), ('text',), run=parse),
+            Node('extract', ('text',), ('sections',), run=extract),
+        ],
+        cache=cache
+    )
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ArtifactCache(str(tmp_path / 'pipeline_cache'))
+
+
+def test_downstream_input_change_reuses_upstream_artifacts(cache):
+    calls = []
+    pipeline = _build(calls, cache)
+    first = pipeline.run({'document': 'a b', 'request': '保证金'})
+    assert calls == ['parse', 'extract', 'analyze']
+    assert first['result'] == {'request': '保证金', 'sections': ['A', 'B']}
+
+    calls.clear()
+    observer = _Recorder()
+    second = pipeline.run({'document': 'a b', 'request': '资格要求'}, observer=observer)
+    assert calls == ['analyze']
+    assert observer.completed == [('parse', True), ('extract', True), ('analyze', False)]
+    assert second['result'] == {'request': '资格要求', 'sections': ['A', 'B']}
+
+
+def test_unchanged_inputs_reuse_everything_and_upstream_change_reruns_all(cache):
+    calls = []
+    pipeline = _build(calls, cache)
+    pipeline.run({'document': 'a b', 'request': '保证金'})
+
+    calls.clear()
+    pipeline.run({'document': 'a b', 'request': '保证金'})
+    assert calls == []
+
+    pipeline.run({'document': 'a c', 'request': '保证金'})
+    assert calls == ['parse', 'extract', 'analyze']
+
+
+def test_version_change_reruns_only_that_step(cache):
+    calls = []
+    _build(calls, cache).run({'document': 'a b', 'request': '保证金'})
+
+    calls.clear()
+    _build(calls, cache, analyze_version='2').run({'document': 'a b', 'request': '保证金'})
+    assert calls == ['analyze']
+
+
+def test_targets_run_only_required_steps(cache):
+    calls = []
+    artifacts = _build(calls, cache).run({'document': 'a b', 'request': '保证金'}, targets=['sections'])
+    assert calls == ['parse', 'extract']
+    assert 'result' not in artifacts
+
+
+def test_uncached_result_is_not_shared(cache):
+    calls = []
+
+    def analyze(sections, request):
+        calls.append('analyze')
+        return Uncached({'mock': True})
+
+    pipeline = _build([], cache)
+    pipeline.nodes[-1].run = analyze
+    pipeline.run({'document': 'a b', 'request': '保证金'})
+    pipeline.run({'document': 'a b', 'request': '保证金'})
+    assert calls == ['analyze', 'analyze']
+
+
+def test_analysis_steps_are_versioned_by_their_code():
+    import analysis_pipeline
+
+    for pipeline in (analysis_pipeline.ANALYSIS_PIPELINE, analysis_pipeline.REALTIME_ANALYSIS_PIPELINE):
+        for node in pipeline.nodes:
+            assert node.version != '1', node.name
+
+
+def test_source_version_changes_with_code():
+    from analysis_pipeline import _source_version
+
+    def before(text):
+        return text.strip()
+
+    def after(text):
+        return text.strip().lower()
+
+    assert _source_version(before) == _source_version(before)
+    assert _source_version(before) != _source_version(after)
+
+
+def test_required_step_with_empty_output_stops_the_run(cache):
+    pipeline = _build([], cache)
+    extract = next(node for node in pipeline.nodes if node.name == 'extract')
+    extract.required = True
+
+    with pytest.raises(EmptyArtifactError) as error:
+        pipeline.run({'document': '', 'request': '保证金'})
+    assert error.value.node is extract
+    assert error.value.artifacts['text'] == ''
+    # 空产物不写入缓存，下次仍会重新执行
+    with pytest.raises(EmptyArtifactError):
+        pipeline.run({'document': '', 'request': '保证金'})
+
+
+def test_allow_empty_continues_past_required_steps(cache):
+    calls = []
+    pipeline = _build(calls, cache)
+    next(node for node in pipeline.nodes if node.name == 'extract').required = True
+
+    artifacts = pipeline.run({'document': '', 'request': '保证金'}, allow_empty=True)
+    assert calls == ['parse', 'extract', 'analyze']
+    assert artifacts['result'] == {'request': '保证金', 'sections': []}
@@ -0,0 +1,87 @@
+from ai_analyzer import ExtractedContent
+from prompt_packer import (
+    MIN_SECTION_TOKENS, SECTION_OVERHEAD_TOKENS, TRUNCATION_MARK, PromptPacker, estimate_tokens
+)
+
+
+def _content(title, content, priority=0, confidence=0.9, span=None):
+    return ExtractedContent(title=title, content=content, start_heading=title, end_heading='',
+                            confidence=confidence, priority=priority, span=span)
+
+
+def _cost(content):
+    return estimate_tokens(content.content) + estimate_tokens(content.title) + SECTION_OVERHEAD_TOKENS
+
+
+def test_estimate_tokens_counts_cjk_characters_individually():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('投标保证金') == 5
+    assert estimate_tokens('abcdefgh') == 2
+    assert estimate_tokens('保证金 50000') == 3 + 2
+
+
+def test_everything_fits_within_the_budget():
+    contents = [_content('资格要求', '具有独立法人资格。'), _content('保证金', '五万元。')]
+    result = PromptPacker(budget=1000).pack(contents, overhead_tokens=100)
+
+    assert result.contents == contents
+    assert result.content_tokens == sum(_cost(content) for content in contents)
+    assert (result.trimmed, result.dropped, result.duplicates) == ([], [], [])
+
+
+def test_higher_priority_content_is_packed_first_and_order_is_kept():
+    low = _content('其他', '其' * 400, priority=1)
+    high = _content('保证金', '金' * 400, priority=9)
+    result = PromptPacker(budget=_cost(high) + MIN_SECTION_TOKENS - 1).pack([low, high])
+
+    assert [content.title for content in result.contents] == ['保证金']
+    assert result.dropped == ['其他']
+
+
+def test_content_that_does_not_fit_is_trimmed():
+    first = _content('资格要求', '资' * 300, priority=2)
+    second = _content('评标办法', '评标\n' * 300, priority=1)
+    budget = _cost(first) + SECTION_OVERHEAD_TOKENS + estimate_tokens('评标办法') + MIN_SECTION_TOKENS
+    result = PromptPacker(budget=budget).pack([first, second])
+
+    assert result.trimmed == ['评标办法']
+    trimmed = result.contents[1]
+    assert trimmed.content.endswith(TRUNCATION_MARK) and len(trimmed.content) < len(second.content)
+    assert result.content_tokens <= budget
+    # 原内容对象不被修改
+    assert second.content == '评标\n' * 300
+
+
+def test_overlapping_spans_keep_the_more_confident_content():
+    broad = _content('投标须知', '须知全文', confidence=0.6, span=(0, 100))
+    narrow = _content('投标须知第一节', '第一节', confidence=0.9, span=(10, 95))
+    other = _content('合同条款', '合同', span=(200, 300))
+    result = PromptPacker(budget=1000).pack([broad, narrow, other])
+
+    assert [content.title for content in result.contents] == ['投标须知第一节', '合同条款']
+    assert result.duplicates == ['投标须知']
+
+
+def test_contained_text_without_spans_is_a_duplicate():
+    whole = _content('保证金', '投标保证金为五万元，开标前缴纳。')
+    part = _content('保证金金额', '投标保证金为五万元', priority=0, confidence=0.5)
+    result = PromptPacker(budget=1000).pack([whole, part])
+    assert result.duplicates == ['保证金金额']
+
+    result = PromptPacker(budget=1000, remove_duplicates=False).pack([whole, part])
+    assert result.contents == [whole, part]
+
+
+def test_max_section_chars_truncates_before_packing():
+    result = PromptPacker(budget=1000, max_section_chars=10).pack([_content('保证金', '金' * 50)])
+    assert result.contents[0].content == '金' * 10 + TRUNCATION_MARK
+    assert result.trimmed == []
+
+
+def test_stats_report_the_packing_outcome():
+    result = PromptPacker(budget=1000).pack([_content('保证金', '五万元。')])
+    result.prompt_tokens = 500
+    assert result.stats() == {
+        'prompt_tokens': 500, 'token_budget': 1000, 'content_tokens': result.content_tokens,
+        'packed_count': 1, 'trimmed_count': 0, 'dropped_count': 0, 'duplicate_count': 0
+    }
@@ -0,0 +1,96 @@
+import pytest
+
+import llm_client
+from ai_analyzer import AgentType, AIAnalyzer
+from llm_client import LLMAPIError, response_format_supported
+
+BASE_URL = 'https://llm.example.com/v1'
+
+
+def _call(analyzer, schema='analysis_result'):
+    return analyzer._call_ai_api('分析招标文件', AgentType.ANALYZER, response_schema=schema)
+
+
+def _formats(server):
+    return [(request['json'].get('response_format') or {}).get('type') for request in server.requests]
+
+
+def test_structured_output_is_requested_with_the_schema(llm_server):
+    assert _call(AIAnalyzer(api_key='key', base_url=BASE_URL)) == llm_server.reply
+
+    request = llm_server.requests[0]['json']
+    assert request['response_format']['json_schema']['name'] == 'analysis_result'
+    assert 'JSON' in request['messages'][0]['content']
+
+
+def test_rejected_format_is_downgraded_and_remembered(llm_server):
+    analyzer = AIAnalyzer(api_key='key', base_url=BASE_URL)
+    llm_server.statuses = [400]
+    assert _call(analyzer) == llm_server.reply
+    assert _formats(llm_server) == ['json_schema', 'json_object']
+    assert not response_format_supported(BASE_URL, analyzer.model, 'json_schema')
+
+    # 之后的调用（包括其他分析器）直接使用json_object
+    llm_server.requests.clear()
+    _call(AIAnalyzer(api_key='other', base_url=BASE_URL + '/'), schema='extraction_targets')
+    assert _formats(llm_server) == ['json_object']
+
+
+def test_all_formats_rejected_falls_back_to_plain_text(llm_server):
+    analyzer = AIAnalyzer(api_key='key', base_url=BASE_URL)
+    llm_server.statuses = [422, 400]
+    assert _call(analyzer) == llm_server.reply
+    assert _formats(llm_server) == ['json_schema', 'json_object', None]
+
+    llm_server.requests.clear()
+    _call(analyzer)
+    assert _formats(llm_server) == [None]
+
+
+def test_rejections_are_remembered_per_host_and_model(llm_server):
+    llm_server.statuses = [400]
+    _call(AIAnalyzer(api_key='key', base_url=BASE_URL, model='deepseek-v3'))
+
+    llm_server.requests.clear()
+    _call(AIAnalyzer(api_key='key', base_url=BASE_URL, model='gpt-4o'))
+    _call(AIAnalyzer(api_key='key', base_url='https://other.example.com/v1', model='deepseek-v3'))
+    _call(AIAnalyzer(api_key='key', base_url='https://LLM.example.com/v2', model='deepseek-v3'))
+    assert _formats(llm_server) == ['json_schema', 'json_schema', 'json_object']
+
+
+def test_rejection_is_not_remembered_when_the_downgraded_call_fails(llm_server):
+    analyzer = AIAnalyzer(api_key='key', base_url=BASE_URL)
+    llm_server.statuses = [400, 401]
+    with pytest.raises(LLMAPIError) as raised:
+        _call(analyzer)
+
+    assert raised.value.status_code == 401
+    assert response_format_supported(BASE_URL, analyzer.model, 'json_schema')
+
+
+def test_plain_request_errors_are_not_downgraded(llm_server):
+    llm_server.statuses = [400]
+    with pytest.raises(LLMAPIError):
+        _call(AIAnalyzer(api_key='key', base_url=BASE_URL), schema=None)
+    assert _formats(llm_server) == [None]
+
+
+@pytest.mark.parametrize('mode, expected', [
+    ('off', [None]),
+    ('json_object', ['json_object']),
+    ('json_schema', ['json_schema']),
+])
+def test_response_format_mode(llm_server, mode, expected):
+    analyzer = AIAnalyzer(api_key='key', base_url=BASE_URL)
+    analyzer.response_format_mode = mode
+    _call(analyzer)
+    assert _formats(llm_server) == expected
+
+
+def test_single_format_mode_falls_back_to_plain_text(llm_server):
+    analyzer = AIAnalyzer(api_key='key', base_url=BASE_URL)
+    analyzer.response_format_mode = 'json_object'
+    llm_server.statuses = [400]
+    _call(analyzer)
+    assert _formats(llm_server) == ['json_object', None]
+    assert llm_client._unsupported_formats == {('https://llm.example.com', 'deepseek-v3'): {'json_object'}}
@@ -0,0 +1,150 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ai_analyzer import AgentType, AIAnalyzer
+from llm_client import LLMAPIError
+from single_flight import FlightAbandoned, SingleFlight
+from tests.conftest import wait_until
+
+BASE_URL = 'https://llm.example.com/v1'
+
+
+def test_first_caller_leads_and_later_callers_wait():
+    flights = SingleFlight()
+    flight, leader = flights.join('key')
+    waiter_flight, waiter_leads = flights.join('key')
+
+    assert leader and not waiter_leads
+    assert waiter_flight is flight and flight.waiters == 1
+    assert flights.join('other')[1]
+
+
+def test_result_is_delivered_to_every_waiter_and_the_flight_removed():
+    flights = SingleFlight()
+    flight, _ = flights.join('key')
+    with ThreadPoolExecutor(3) as pool:
+        results = [pool.submit(flights.join('key')[0].wait) for _ in range(3)]
+        flights.finish('key', flight, result='reply')
+        assert [result.result(timeout=5) for result in results] == ['reply'] * 3
+
+    assert flights.in_flight() == 0
+    assert flights.join('key')[1]
+
+
+def test_error_is_raised_in_every_waiter():
+    flights = SingleFlight()
+    flight, _ = flights.join('key')
+    error = LLMAPIError('API调用失败: 401', 401)
+    with ThreadPoolExecutor(2) as pool:
+        waits = [pool.submit(flights.join('key')[0].wait) for _ in range(2)]
+        flights.finish('key', flight, error=error)
+        for wait in waits:
+            with pytest.raises(LLMAPIError) as raised:
+                wait.result(timeout=5)
+            assert raised.value is error
+
+    assert flights.in_flight() == 0
+
+
+def test_abandoned_flight_tells_waiters_to_retry():
+    flights = SingleFlight()
+    flight, _ = flights.join('key')
+    waiter, _ = flights.join('key')
+    flights.abandon('key', flight)
+
+    with pytest.raises(FlightAbandoned):
+        waiter.wait()
+    assert flights.join('key')[1]
+
+
+def test_async_waiter_receives_streamed_text_including_what_it_missed():
+    flights = SingleFlight()
+    flight, _ = flights.join('key')
+    flight.publish('投标')
+
+    async def wait():
+        tokens = []
+        waiter, _ = flights.join('key')
+        task = asyncio.ensure_future(waiter.wait_async(tokens.append))
+        await asyncio.sleep(0)
+        flight.publish('保证金')
+        flights.finish('key', flight, result='投标保证金')
+        return await task, tokens
+
+    assert asyncio.run(wait()) == ('投标保证金', ['投标', '保证金'])
+
+
+def test_async_waiter_gets_the_whole_reply_when_the_leader_did_not_stream():
+    flights = SingleFlight()
+    flight, _ = flights.join('key')
+
+    async def wait():
+        tokens = []
+        task = asyncio.ensure_future(flights.join('key')[0].wait_async(tokens.append))
+        await asyncio.sleep(0)
+        flights.finish('key', flight, result='完整回复')
+        return await task, tokens
+
+    assert asyncio.run(wait()) == ('完整回复', ['完整回复'])
+
+
+def test_cancelled_async_waiter_does_not_cancel_the_flight():
+    flights = SingleFlight()
+    flight, _ = flights.join('key')
+
+    async def cancel_waiter():
+        task = asyncio.ensure_future(flights.join('key')[0].wait_async())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_waiter())
+    assert not flight.future.cancelled()
+    flights.finish('key', flight, result='reply')
+    assert flight.wait() == 'reply'
+
+
+def _concurrent_calls(analyzers, server, prompt='分析招标文件'):
+    """让所有分析器同时发起相同的调用，第一个请求在其余调用方开始等待后才返回"""
+    server.gate = threading.Event()
+    flights = analyzers[0].single_flight
+    with ThreadPoolExecutor(len(analyzers)) as pool:
+        calls = [pool.submit(analyzer._call_ai_api, prompt, AgentType.ANALYZER) for analyzer in analyzers]
+        wait_until(lambda: sum(flight.waiters + 1 for flight in flights._flights.values()) == len(analyzers)
+                   or len(server.requests) == len(analyzers))
+        server.gate.set()
+        return [call.exception(timeout=5) or call.result() for call in calls]
+
+
+def test_identical_concurrent_calls_send_one_request(llm_server):
+    flights = SingleFlight()
+    analyzers = [AIAnalyzer(api_key='key', base_url=BASE_URL, single_flight=flights) for _ in range(4)]
+
+    assert _concurrent_calls(analyzers, llm_server) == [llm_server.reply] * 4
+    assert len(llm_server.requests) == 1
+    assert flights.in_flight() == 0
+
+
+def test_failed_call_fails_every_coalesced_caller(llm_server):
+    flights = SingleFlight()
+    analyzers = [AIAnalyzer(api_key='key', base_url=BASE_URL, single_flight=flights) for _ in range(3)]
+    llm_server.statuses = [401]
+
+    errors = _concurrent_calls(analyzers, llm_server)
+    assert len(llm_server.requests) == 1
+    assert all(isinstance(error, LLMAPIError) and error.status_code == 401 for error in errors)
+    # 失败的调用不会留下，之后重新发起
+    assert analyzers[0]._call_ai_api('分析招标文件', AgentType.ANALYZER) == llm_server.reply
+
+
+def test_calls_with_different_api_keys_are_not_coalesced(llm_server):
+    flights = SingleFlight()
+    analyzers = [AIAnalyzer(api_key=f'key-{i}', base_url=BASE_URL, single_flight=flights) for i in range(2)]
+
+    assert _concurrent_calls(analyzers, llm_server) == [llm_server.reply] * 2
+    assert sorted(request['headers']['Authorization'] for request in llm_server.requests) == [
+        'Bearer key-0', 'Bearer key-1']
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from tolerant_json import loads_tolerant
+
+
+def test_plain_json():
+    assert loads_tolerant('{"a": 1, "b": [1, 2]}') == {'a': 1, 'b': [1, 2]}
+
+
+def test_code_fence_and_surrounding_text():
+    text = '以下是分析结果：\n```json\n{"need_additional": false, "keywords": ["保证金"]}\n```\n请参考。'
+    assert loads_tolerant(text) == {'need_additional': False, 'keywords': ['保证金']}
+
+
+def test_prose_around_json_without_fence():
+    assert loads_tolerant('结果如下 {"ok": true} 以上') == {'ok': True}
+
+
+def test_trailing_commas():
+    assert loads_tolerant('{"items": [1, 2, ], "name": "x", }') == {'items': [1, 2], 'name': 'x'}
+
+
+def test_truncated_inside_string():
+    text = '{"summary": "投标保证金为人民币", "items": [{"title": "资格要求", "content": "具有独立法人'
+    result = loads_tolerant(text)
+    assert result['summary'] == '投标保证金为人民币'
+    assert result['items'][0]['title'] == '资格要求'
+
+
+def test_truncated_after_key_drops_incomplete_member():
+    text = '{"keywords": ["保证金", "资质"], "need_additional": true, "reason":'
+    assert loads_tolerant(text) == {'keywords': ['保证金', '资质'], 'need_additional': True}
+
+
+def test_truncated_array_in_fence():
+    text = '```json\n[{"a": 1}, {"a": 2}, {"a": 3'
+    assert loads_tolerant(text) == [{'a': 1}, {'a': 2}, {'a': 3}]
+
+
+def test_truncated_literal_keeps_complete_literals():
+    assert loads_tolerant('{"flags": [true, false, tr') == {'flags': [True, False]}
+    assert loads_tolerant('{"a": 1, "b": nul') == {'a': 1}
+
+
+def test_unrepairable_text_raises():
+    with pytest.raises(json.JSONDecodeError):
+        loads_tolerant('模型没有返回JSON')
@@ -0,0 +1,170 @@
+import re
+import json
+from typing import Any, Iterator, List, Optional, Tuple
+
+# 截断修复时最多回退尝试的逗号位置数
+MAX_REPAIR_ATTEMPTS = 50
+
+_CODE_FENCE_PATTERN = re.compile(r'```(?:json)?\s*(.*?)(?:```|$)', re.DOTALL | re.IGNORECASE)
+# 末尾未完成的键值（"key": 或 "key": tru 之类的残缺字面量）
+_DANGLING_MEMBER_PATTERN = re.compile(r',?\s*"(?:[^"\\]|\\.)*"\s*:\s*[A-Za-z0-9.+\-]*\s*$')
+# 末尾残缺的数组元素字面量
+_DANGLING_LITERAL_PATTERN = re.compile(r'(?<=[\[,])\s*[A-Za-z.+\-][A-Za-z0-9.+\-]*\s*$')
+
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+class _ScanState:
+    """扫描到文本末尾（JSON未闭合）时的状态"""
+
+    def __init__(self):
+        self.stack: List[str] = []
+        self.in_string = False
+        self.escape = False
+        # 字符串外的逗号位置及当时未闭合的括号
+        self.commas: List[Tuple[int, Tuple[str, ...]]] = []
+
+
+def _scan(text: str) -> Tuple[str, Optional[_ScanState]]:
+    """
+    从text开头（必须是{或[）扫描到对应的闭合括号
+
+    Returns:
+        (完整的JSON片段, None)；未闭合时返回(整个文本, 扫描状态)
+    """
+    state = _ScanState()
+    for i, char in enumerate(text):
+        if state.in_string:
+            if state.escape:
+                state.escape = False
+            elif char == '\\':
+                state.escape = True
+            elif char == '"':
+                state.in_string = False
+            continue
+
+        if char == '"':
+            state.in_string = True
+        elif char in '{[':
+            state.stack.append(char)
+        elif char in '}]':
+            if state.stack:
+                state.stack.pop()
+            if not state.stack:
+                return text[:i + 1], None
+        elif char == ',':
+            state.commas.append((i, tuple(state.stack)))
+    return text, state
+
+
+def _close(fragment: str, stack: Tuple[str, ...]) -> str:
+    return fragment + ''.join(_CLOSERS[bracket] for bracket in reversed(stack))
+
+
+def _strip_dangling(fragment: str) -> str:
+    """
+    去掉末尾未完成的成员（只有键没有值、残缺的字面量）及之后多余的逗号
+
+    只去掉一次：完整的字面量和残缺的字面量无法区分（true/tru），反复去掉会误删前面完整的成员。
+    """
+    fragment = _DANGLING_MEMBER_PATTERN.sub('', fragment.rstrip())
+    fragment = _DANGLING_LITERAL_PATTERN.sub('', fragment).rstrip()
+    if fragment.endswith(','):
+        fragment = fragment[:-1].rstrip()
+    return fragment
+
+
+def _remove_trailing_commas(text: str) -> str:
+    """去除对象和数组中最后一个元素后的多余逗号（字符串内的内容不受影响）"""
+    result = []
+    in_string = False
+    escape = False
+    pending_comma = None
+    for char in text:
+        if in_string:
+            result.append(char)
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char == ',':
+            if pending_comma is not None:
+                result.append(pending_comma)
+            pending_comma = char
+            continue
+        if pending_comma is not None:
+            if char.isspace():
+                pending_comma += char
+                continue
+            if char not in '}]':
+                result.append(pending_comma)
+            else:
+                result.append(pending_comma[1:])
+            pending_comma = None
+
+        if char == '"':
+            in_string = True
+        result.append(char)
+
+    if pending_comma is not None:
+        result.append(pending_comma)
+    return ''.join(result)
+
+
+def _candidates(fragment: str, state: Optional[_ScanState]) -> Iterator[str]:
+    """按修复程度由轻到重生成候选JSON文本"""
+    if state is None:
+        yield fragment
+        yield _remove_trailing_commas(fragment)
+        return
+
+    # 补全未闭合的字符串
+    if state.in_string:
+        closed = fragment[:-1] if state.escape else fragment
+        yield _close(closed + '"', tuple(state.stack))
+    else:
+        trimmed = fragment.rstrip()
+        yield _close(trimmed[:-1] if trimmed.endswith(',') else trimmed, tuple(state.stack))
+
+    yield _remove_trailing_commas(_close(_strip_dangling(fragment), tuple(state.stack)))
+
+    # 逐个回退到之前的逗号处截断（丢弃最后一个不完整的元素）
+    for position, stack in reversed(state.commas[-MAX_REPAIR_ATTEMPTS:]):
+        yield _close(fragment[:position], stack)
+
+
+def loads_tolerant(text: str) -> Any:
+    """
+    容错解析AI返回的JSON
+
+    依次处理：代码块包裹、JSON前后的说明文字、多余的尾随逗号，以及输出被截断导致的
+    未闭合字符串/对象/数组（丢弃最后一个不完整的成员后补全括号）。
+
+    Raises:
+        json.JSONDecodeError: 无法修复为合法JSON
+    """
+    text = text.strip()
+    fence = _CODE_FENCE_PATTERN.search(text)
+    if fence and '{' not in text[:fence.start()] and '[' not in text[:fence.start()]:
+        text = fence.group(1).strip()
+
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as error:
+        original_error = error
+
+    starts = [index for index in (text.find('{'), text.find('[')) if index != -1]
+    if not starts:
+        raise original_error
+
+    fragment, state = _scan(text[min(starts):])
+    for candidate in _candidates(fragment, state):
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    raise original_error